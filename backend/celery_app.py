@@ -47,13 +47,16 @@ app.conf.update(
         # Core reward and activity tasks
         'tasks.celery_tasks.process_hourly_rewards': {'queue': 'rewards'},
         'tasks.celery_tasks.process_activity_decay': {'queue': 'activity'},
+        'tasks.celery_tasks.flush_activity_buffer': {'queue': 'activity'},
 
         # Event-driven tasks (high frequency, real-time)
         'tasks.celery_tasks.process_pinning_queue': {'queue': 'events'},
+        'tasks.celery_tasks.expire_temporary_unlock': {'queue': 'events'},
 
         # Settlement tasks (financial operations, require reliability)
         'tasks.celery_tasks.auto_settle_expired_board_task': {'queue': 'settlements'},
         'tasks.celery_tasks.process_expired_board_tasks': {'queue': 'settlements'},
+        'store.celery_tasks.settle_game': {'queue': 'settlements'},
 
         # Voting and verification tasks (community operations)
         'tasks.celery_tasks.process_checkin_voting_results': {'queue': 'voting'},
@@ -117,6 +120,7 @@ try:
     django.setup()
     # Import all task modules to register them with Celery
     from tasks.celery_tasks import *
+    from store.celery_tasks import *
     from utils.email import send_email_task
 except Exception as e:
     print(f"Warning: Could not import tasks: {e}")
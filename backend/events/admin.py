@@ -3,6 +3,7 @@ from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.contrib import messages
+from store.active_effects import invalidate_active_effects
 from .models import (
     EventDefinition,
     EventEffect,
@@ -13,6 +14,14 @@ from .models import (
 )
 
 
+def _deactivate_user_effects(queryset):
+    """批量停用效果；批量更新不触发保存信号，这里直接清除相关用户的活跃效果缓存"""
+    user_ids = set(queryset.values_list('user_id', flat=True))
+    updated = queryset.update(is_active=False)
+    invalidate_active_effects(*user_ids)
+    return updated
+
+
 class EventEffectInline(admin.TabularInline):
     model = EventEffect
     extra = 1
@@ -58,8 +67,8 @@ class EventDefinitionAdmin(admin.ModelAdmin):
             'fields': ['name', 'category', 'title', 'description', 'is_active']
         }),
         ('调度配置', {
-            'fields': ['schedule_type', 'interval_value', 'cron_expression'],
-            'description': '设置事件的触发方式和频率'
+            'fields': ['schedule_type', 'interval_value', 'cron_expression', 'next_run_at'],
+            'description': '设置事件的触发方式和频率；下次调度时间留空则立即调度'
         }),
         ('元数据', {
             'fields': ['created_by', 'created_at', 'updated_at'],
@@ -268,6 +277,11 @@ class EventOccurrenceAdmin(admin.ModelAdmin):
                 <div>影响用户: {affected_count}/{total_targets}</div>
             '''
 
+            chunks = log_entry.get('chunks')
+            if chunks:
+                done_chunks = sum(1 for chunk in chunks if chunk.get('status') == 'done')
+                html += f'<div>分块进度: {done_chunks}/{len(chunks)}</div>'
+
             if 'error' in log_entry:
                 html += f'<div style="color: #F44336;">错误: {log_entry["error"]}</div>'
 
@@ -368,7 +382,7 @@ class UserGameEffectAdmin(admin.ModelAdmin):
     actions = ['deactivate_effects']
 
     def deactivate_effects(self, request, queryset):
-        updated = queryset.update(is_active=False)
+        updated = _deactivate_user_effects(queryset)
         self.message_user(request, f'已停用 {updated} 个游戏效果', messages.SUCCESS)
     deactivate_effects.short_description = '停用选中的效果'
 
@@ -389,7 +403,7 @@ class UserCoinsMultiplierAdmin(admin.ModelAdmin):
     actions = ['deactivate_multipliers']
 
     def deactivate_multipliers(self, request, queryset):
-        updated = queryset.update(is_active=False)
+        updated = _deactivate_user_effects(queryset)
         self.message_user(request, f'已停用 {updated} 个积分倍数', messages.SUCCESS)
     deactivate_multipliers.short_description = '停用选中的倍数'
 
@@ -13,8 +13,10 @@ Created: 2024-12-30
 
 import logging
 from celery import shared_task
+from django.conf import settings
 from django.utils import timezone
 from django.db import transaction
+from django.db.models import BooleanField, Case, DateTimeField, Value, When
 from datetime import timedelta
 from .models import EventDefinition, EventOccurrence, EventEffect, EventEffectExecution
 from .effects import get_effect_executor
@@ -25,369 +27,567 @@ logger = logging.getLogger('events.celery_tasks')
 
 @shared_task(bind=True, max_retries=3, default_retry_delay=60)
 def schedule_pending_events(self):
-    """调度待执行的事件 - 每分钟运行"""
+    """
+    调度待执行的事件 - 每分钟运行
+
+    用一次索引查询（is_active, next_run_at）选出预调度窗口内到期的事件定义，
+    批量预先创建窗口内的事件发生并在同一事务中推进各定义的 next_run_at；
+    每分钟的查询数量与事件定义数量无关。
+    """
     try:
         logger.info("Starting event scheduling...")
 
-        with transaction.atomic():
-            now = timezone.now()
+        now = timezone.now()
+        lookahead = timedelta(minutes=getattr(settings, 'EVENT_SCHEDULE_LOOKAHEAD_MINUTES', 10))
 
-            # 查找需要调度的事件定义
-            active_events = EventDefinition.objects.filter(
-                is_active=True,
-                schedule_type__in=['interval_hours', 'interval_days']
-            )
+        with transaction.atomic():
+            scheduled_count = _schedule_due_definitions(now, now + lookahead)
+            cancelled_count = _cancel_unscheduled_occurrences(now)
 
-            scheduled_count = 0
-
-            for event_def in active_events:
-                # 检查是否需要创建新的事件发生
-                last_occurrence = EventOccurrence.objects.filter(
-                    event_definition=event_def
-                ).order_by('-scheduled_at').first()
-
-                should_schedule = False
-                next_time = now
-
-                if event_def.schedule_type == 'interval_hours':
-                    interval = timedelta(hours=event_def.interval_value or 1)
-                elif event_def.schedule_type == 'interval_days':
-                    interval = timedelta(days=event_def.interval_value or 1)
-                else:
-                    continue
-
-                if not last_occurrence:
-                    should_schedule = True
-                else:
-                    next_time = last_occurrence.scheduled_at + interval
-                    should_schedule = now >= next_time
-
-                if should_schedule:
-                    occurrence = EventOccurrence.objects.create(
-                        event_definition=event_def,
-                        scheduled_at=next_time,
-                        trigger_type='scheduled'
-                    )
-                    scheduled_count += 1
-                    logger.info(f"Scheduled event {event_def.name} for {next_time}")
-
-            logger.info(f"Event scheduling completed: {scheduled_count} events scheduled")
+        logger.info(
+            f"Event scheduling completed: {scheduled_count} events scheduled, "
+            f"{cancelled_count} pre-created occurrences cancelled"
+        )
 
-            return {
-                'status': 'success',
-                'scheduled_count': scheduled_count,
-                'timestamp': now.isoformat()
-            }
+        return {
+            'status': 'success',
+            'scheduled_count': scheduled_count,
+            'cancelled_count': cancelled_count,
+            'timestamp': now.isoformat()
+        }
 
     except Exception as exc:
         logger.error(f"Event scheduling failed: {exc}", exc_info=True)
         raise self.retry(exc=exc, countdown=min(60 * (2 ** self.request.retries), 300))
 
 
-@shared_task(bind=True, max_retries=3, default_retry_delay=60)
-def execute_pending_events(self):
-    """执行待处理的事件 - 每分钟运行"""
-    try:
-        logger.info("Starting event execution...")
-
-        with transaction.atomic():
-            now = timezone.now()
-
-            # 查找需要执行的事件
-            pending_occurrences = EventOccurrence.objects.filter(
-                status='pending',
-                scheduled_at__lte=now
-            ).select_related('event_definition').prefetch_related('event_definition__effects')
-
-            if not pending_occurrences.exists():
-                logger.info("No pending events to execute")
-                return {
-                    'status': 'success',
-                    'executed_count': 0,
-                    'message': 'No pending events',
-                    'timestamp': now.isoformat()
-                }
-
-            executed_count = 0
-
-            for occurrence in pending_occurrences:
-                try:
-                    logger.info(f"Executing event: {occurrence.event_definition.name}")
+def _schedule_due_definitions(now, horizon):
+    """为 next_run_at 不晚于 horizon 的事件定义创建事件发生，返回创建数量"""
+    due_definitions = list(
+        EventDefinition.objects.select_for_update(skip_locked=True).filter(
+            is_active=True,
+            schedule_type__in=EventDefinition.INTERVAL_SCHEDULE_TYPES,
+            next_run_at__lte=horizon
+        ).only('id', 'name', 'schedule_type', 'interval_value', 'next_run_at')
+    )
+    if not due_definitions:
+        return 0
+
+    occurrences = []
+    next_runs = {}
+    for event_def in due_definitions:
+        interval = event_def.get_interval()
+        run_times = _pending_run_times(event_def.next_run_at, interval, now, horizon)
+        occurrences.extend(
+            EventOccurrence(event_definition=event_def, scheduled_at=run_at, trigger_type='scheduled')
+            for run_at in run_times
+        )
+        next_runs[event_def.id] = run_times[-1] + interval
+        logger.info(f"Scheduled event {event_def.name} for {', '.join(t.isoformat() for t in run_times)}")
+
+    EventOccurrence.objects.bulk_create(occurrences)
+    EventDefinition.objects.filter(id__in=next_runs).update(
+        next_run_at=Case(
+            *[When(id=definition_id, then=Value(next_run)) for definition_id, next_run in next_runs.items()],
+            output_field=DateTimeField()
+        )
+    )
+    return len(occurrences)
 
-                    occurrence.status = 'executing'
-                    occurrence.started_at = now
-                    occurrence.save()
 
-                    # 执行所有效果
-                    total_affected = 0
-                    execution_log = []
+def _pending_run_times(next_run_at, interval, now, horizon):
+    """
+    预调度窗口内的计划执行时间
 
-                    effects = occurrence.event_definition.effects.filter(is_active=True).order_by('priority')
+    调度中断（worker 停机）错过的多次执行只补一次最近的，不逐次补发。
+    """
+    if next_run_at <= now - interval:
+        next_run_at += ((now - next_run_at) // interval) * interval
 
-                    for effect in effects:
-                        effect_result = _execute_single_effect(occurrence, effect)
-                        total_affected += effect_result['affected_count']
-                        execution_log.append(effect_result)
+    run_times = [next_run_at]
+    while run_times[-1] + interval <= horizon:
+        run_times.append(run_times[-1] + interval)
+    return run_times
 
-                    # 更新执行结果
-                    occurrence.status = 'completed'
-                    occurrence.completed_at = now
-                    occurrence.affected_users_count = total_affected
-                    occurrence.execution_log = execution_log
-                    occurrence.save()
 
-                    # 发送系统通知
-                    _send_event_notifications(occurrence)
+def _cancel_unscheduled_occurrences(now):
+    """取消已停用或不再按间隔调度的事件预先创建的未来事件发生"""
+    return EventOccurrence.objects.filter(
+        status='pending',
+        trigger_type='scheduled',
+        scheduled_at__gt=now
+    ).exclude(
+        event_definition__is_active=True,
+        event_definition__schedule_type__in=EventDefinition.INTERVAL_SCHEDULE_TYPES
+    ).update(status='cancelled', completed_at=now)
 
-                    executed_count += 1
-                    logger.info(f"Executed event {occurrence.event_definition.name}, affected {total_affected} users")
 
-                except Exception as e:
-                    occurrence.status = 'failed'
-                    occurrence.error_message = str(e)
-                    occurrence.completed_at = now
-                    occurrence.save()
-                    logger.error(f"Failed to execute event {occurrence.id}: {e}")
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def execute_pending_events(self):
+    """
+    执行待处理的事件 - 每分钟运行
 
-            logger.info(f"Event execution completed: {executed_count} events executed")
+    只负责认领到期的事件并规划分块（写入 execution_log），实际执行由
+    execute_event_chunk 子任务逐块完成；执行中但长时间没有进展的事件
+    （worker 崩溃）会从中断的分块继续。
+    """
+    try:
+        logger.info("Starting event execution...")
 
+        now = timezone.now()
+        pending_ids = list(EventOccurrence.objects.filter(
+            status='pending',
+            scheduled_at__lte=now
+        ).values_list('id', flat=True))
+
+        executed_count = 0
+        for occurrence_id in pending_ids:
+            occurrence = _claim_occurrence(occurrence_id, now)
+            if occurrence is None:
+                continue
+            executed_count += 1
+            logger.info(f"Dispatching event: {occurrence.event_definition.name}")
+            _dispatch_occurrence(occurrence.id)
+
+        resumed_count = 0
+        for occurrence in _stalled_occurrences(now):
+            resumed_count += 1
+            logger.warning(f"Resuming stalled event occurrence {occurrence.id}")
+            _dispatch_occurrence(occurrence.id)
+
+        if not executed_count and not resumed_count:
+            logger.info("No pending events to execute")
             return {
                 'status': 'success',
-                'executed_count': executed_count,
+                'executed_count': 0,
+                'message': 'No pending events',
                 'timestamp': now.isoformat()
             }
 
+        logger.info(f"Event execution dispatched: {executed_count} events started, {resumed_count} resumed")
+
+        return {
+            'status': 'success',
+            'executed_count': executed_count,
+            'resumed_count': resumed_count,
+            'timestamp': now.isoformat()
+        }
+
     except Exception as exc:
         logger.error(f"Event execution failed: {exc}", exc_info=True)
         raise self.retry(exc=exc, countdown=min(60 * (2 ** self.request.retries), 300))
 
 
 @shared_task(bind=True, max_retries=3, default_retry_delay=60)
-def trigger_manual_event(self, event_definition_id: str, triggered_by_user_id: int = None):
-    """手动触发事件执行"""
+def execute_event_chunk(self, occurrence_id: str):
+    """执行事件的下一个分块（独立事务），完成后链式调度下一块"""
     try:
-        logger.info(f"Manually triggering event {event_definition_id}")
-
-        with transaction.atomic():
-            # 获取事件定义
-            try:
-                event_def = EventDefinition.objects.get(id=event_definition_id)
-            except EventDefinition.DoesNotExist:
-                logger.error(f"Event definition {event_definition_id} not found")
-                return {
-                    'status': 'error',
-                    'message': 'Event definition not found'
-                }
+        state = _process_next_chunk(occurrence_id)
+        if state == 'chunk_done':
+            transaction.on_commit(lambda: execute_event_chunk.delay(occurrence_id))
+        return {
+            'status': 'success',
+            'occurrence_id': occurrence_id,
+            'state': state
+        }
 
-            # 获取触发用户
-            triggered_by = None
-            if triggered_by_user_id:
-                try:
-                    from users.models import User
-                    triggered_by = User.objects.get(id=triggered_by_user_id)
-                except User.DoesNotExist:
-                    pass
-
-            # 创建事件发生记录
-            now = timezone.now()
-            occurrence = EventOccurrence.objects.create(
-                event_definition=event_def,
-                scheduled_at=now,
-                trigger_type='manual',
-                triggered_by=triggered_by
+    except Exception as exc:
+        logger.error(f"Event chunk execution failed for {occurrence_id}: {exc}", exc_info=True)
+        if self.request.retries >= self.max_retries:
+            EventOccurrence.objects.filter(id=occurrence_id, status='executing').update(
+                status='failed',
+                error_message=str(exc),
+                completed_at=timezone.now()
             )
+            raise
+        raise self.retry(exc=exc, countdown=min(60 * (2 ** self.request.retries), 300))
 
-            # 立即执行
-            occurrence.status = 'executing'
-            occurrence.started_at = now
-            occurrence.save()
-
-            total_affected = 0
-            execution_log = []
 
-            effects = event_def.effects.filter(is_active=True).order_by('priority')
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def trigger_manual_event(self, event_definition_id: str, triggered_by_user_id: int = None):
+    """手动触发事件执行（在当前任务内逐块执行完毕）"""
+    try:
+        logger.info(f"Manually triggering event {event_definition_id}")
 
-            for effect in effects:
-                effect_result = _execute_single_effect(occurrence, effect)
-                total_affected += effect_result['affected_count']
-                execution_log.append(effect_result)
+        # 获取事件定义
+        try:
+            event_def = EventDefinition.objects.get(id=event_definition_id)
+        except EventDefinition.DoesNotExist:
+            logger.error(f"Event definition {event_definition_id} not found")
+            return {
+                'status': 'error',
+                'message': 'Event definition not found'
+            }
 
-            # 更新执行结果
-            occurrence.status = 'completed'
-            occurrence.completed_at = timezone.now()
-            occurrence.affected_users_count = total_affected
-            occurrence.execution_log = execution_log
-            occurrence.save()
+        # 获取触发用户
+        triggered_by = None
+        if triggered_by_user_id:
+            try:
+                from users.models import User
+                triggered_by = User.objects.get(id=triggered_by_user_id)
+            except User.DoesNotExist:
+                pass
 
-            # 发送系统通知
-            _send_event_notifications(occurrence)
+        # 创建事件发生记录并立即执行
+        now = timezone.now()
+        occurrence = EventOccurrence.objects.create(
+            event_definition=event_def,
+            scheduled_at=now,
+            trigger_type='manual',
+            triggered_by=triggered_by
+        )
+        occurrence = _claim_occurrence(occurrence.id, now)
+        occurrence = _run_occurrence_inline(occurrence.id)
 
-            logger.info(f"Manually executed event {event_def.name}, affected {total_affected} users")
+        logger.info(f"Manually executed event {event_def.name}, affected {occurrence.affected_users_count} users")
 
-            return {
-                'status': 'success',
-                'event_name': event_def.name,
-                'affected_users': total_affected,
-                'execution_log': execution_log,
-                'timestamp': now.isoformat()
-            }
+        return {
+            'status': 'success',
+            'event_name': event_def.name,
+            'affected_users': occurrence.affected_users_count,
+            'execution_log': occurrence.execution_log,
+            'timestamp': now.isoformat()
+        }
 
     except Exception as exc:
         logger.error(f"Manual event execution failed: {exc}", exc_info=True)
         raise self.retry(exc=exc, countdown=min(60 * (2 ** self.request.retries), 300))
 
 
-def _execute_single_effect(occurrence, effect):
-    """执行单个事件效果"""
-    try:
-        logger.info(f"Executing effect: {effect.effect_type} for event {occurrence.event_definition.name}")
-
-        executor = get_effect_executor(effect)
-        target_users = executor.get_target_users()
+# 每个分块包含的目标用户数
+EVENT_CHUNK_SIZE = 200
 
-        affected_count = 0
-        user_results = []
+# 执行中的事件超过该时间没有分块进展，视为 worker 中断，重新调度
+EVENT_CHUNK_STALL_TIMEOUT = timedelta(minutes=10)
 
-        for user in target_users:
-            try:
-                execution_data = executor.execute_for_user(user)
 
-                # 记录执行结果
-                execution_record = EventEffectExecution.objects.create(
-                    occurrence=occurrence,
-                    effect=effect,
-                    target_user=user,
-                    effect_data=execution_data,
-                    rollback_data=execution_data if executor.can_rollback() else {}
-                )
+def _claim_occurrence(occurrence_id, now):
+    """
+    认领待执行的事件（pending -> executing）并规划分块
 
-                # 设置过期时间
-                if effect.duration_minutes:
-                    execution_record.expires_at = timezone.now() + timedelta(minutes=effect.duration_minutes)
-                    execution_record.save()
+    使用条件更新认领，并发的调度任务不会重复执行同一事件。
+    Returns:
+        EventOccurrence 或 None（已被其他任务认领）
+    """
+    with transaction.atomic():
+        claimed = EventOccurrence.objects.filter(id=occurrence_id, status='pending').update(
+            status='executing',
+            started_at=now
+        )
+        if not claimed:
+            return None
 
-                affected_count += 1
-                user_results.append({
-                    'user_id': user.id,
-                    'username': user.username,
-                    'result': execution_data
-                })
+        occurrence = EventOccurrence.objects.select_related('event_definition').get(id=occurrence_id)
+        occurrence.execution_log = _plan_occurrence(occurrence)
+        occurrence.save(update_fields=['execution_log'])
+        return occurrence
 
-            except Exception as e:
-                logger.error(f"Failed to execute effect for user {user.id}: {e}")
-                user_results.append({
-                    'user_id': user.id,
-                    'username': user.username,
-                    'error': str(e)
-                })
 
-        logger.info(f"Effect execution completed: {affected_count}/{len(target_users)} users affected")
+def _plan_occurrence(occurrence):
+    """
+    为每个启用的效果确定目标用户并切分为分块，返回 execution_log
 
-        return {
-            'effect_type': effect.effect_type,
-            'target_type': effect.target_type,
-            'affected_count': affected_count,
-            'total_targets': len(target_users),
-            'user_results': user_results[:10]  # 限制日志大小，只保存前10个结果
-        }
+    分块只记录用户ID区间边界 (after_id, through_id]，执行时在区间内重新确定目标；
+    首尾区间不设边界，各区间合起来覆盖全部用户。
+    """
+    execution_log = []
+    effects = occurrence.event_definition.effects.filter(is_active=True).order_by('priority')
 
-    except Exception as e:
-        logger.error(f"Effect execution failed: {e}")
-        return {
+    for effect in effects:
+        entry = {
+            'effect_id': str(effect.id),
             'effect_type': effect.effect_type,
             'target_type': effect.target_type,
-            'error': str(e),
             'affected_count': 0,
-            'total_targets': 0
+            'total_targets': 0,
+            'user_results': [],
+            'chunks': []
         }
+        try:
+            user_ids = get_effect_executor(effect).get_target_user_ids()
+        except Exception as e:
+            logger.error(f"Failed to plan effect {effect.effect_type} for event {occurrence.event_definition.name}: {e}")
+            entry['error'] = str(e)
+            execution_log.append(entry)
+            continue
+
+        entry['total_targets'] = len(user_ids)
+        boundaries = user_ids[EVENT_CHUNK_SIZE - 1:-1:EVENT_CHUNK_SIZE]
+        entry['chunks'] = [
+            {'status': 'pending', 'after_id': after_id, 'through_id': through_id}
+            for after_id, through_id in zip([None] + boundaries, boundaries + [None])
+        ] if user_ids else []
+        execution_log.append(entry)
+
+    return execution_log
+
+
+def _dispatch_occurrence(occurrence_id):
+    """事务提交后调度事件的第一个（或下一个未完成的）分块"""
+    occurrence_id = str(occurrence_id)
+    transaction.on_commit(lambda: execute_event_chunk.delay(occurrence_id))
+
+
+def _stalled_occurrences(now):
+    """执行中但长时间没有分块进展的事件"""
+    cutoff = now - EVENT_CHUNK_STALL_TIMEOUT
+    stalled = []
+    for occurrence in EventOccurrence.objects.filter(status='executing', started_at__lt=cutoff):
+        # 旧格式日志（无分块信息）无法续跑
+        if not all('chunks' in entry or 'error' in entry for entry in occurrence.execution_log):
+            continue
+        progress = [
+            chunk['completed_at']
+            for entry in occurrence.execution_log
+            for chunk in entry.get('chunks', [])
+            if chunk.get('completed_at')
+        ]
+        last_progress = max(progress) if progress else occurrence.started_at.isoformat()
+        if last_progress < cutoff.isoformat():
+            stalled.append(occurrence)
+    return stalled
+
+
+def _run_occurrence_inline(occurrence_id):
+    """在当前进程内逐块执行事件直至完成（每块仍是独立事务），返回最新的事件记录"""
+    while _process_next_chunk(occurrence_id) == 'chunk_done':
+        pass
+    return EventOccurrence.objects.get(id=occurrence_id)
+
+
+def _process_next_chunk(occurrence_id):
+    """
+    执行事件的下一个未完成分块
+
+    在锁定事件记录的同一事务中执行该分块并记录进度：中途失败时整块回滚，
+    下次从同一分块重新开始；所有分块完成后结束事件并批量发送通知。
+
+    Returns:
+        'chunk_done'：完成了一个分块，还可能有剩余分块
+        'completed'：事件已全部完成
+        None：事件不在执行中（已完成、已取消或不存在）
+    """
+    with transaction.atomic():
+        occurrence = EventOccurrence.objects.select_for_update().filter(
+            id=occurrence_id, status='executing'
+        ).first()
+        if occurrence is None:
+            return None
+
+        for entry in occurrence.execution_log:
+            chunk = next((c for c in entry.get('chunks', []) if c['status'] == 'pending'), None)
+            if chunk is None:
+                continue
+
+            effect = EventEffect.objects.select_related('event_definition').get(id=entry['effect_id'])
+            user_ids = get_effect_executor(effect).get_target_user_ids(chunk['after_id'], chunk['through_id'])
+            affected_count, user_results = _execute_effect_for_users(occurrence, effect, user_ids)
+
+            entry['affected_count'] += affected_count
+            entry['user_results'] = (entry['user_results'] + user_results)[:10]  # 限制日志大小
+            chunk.update({
+                'status': 'done',
+                'size': len(user_ids),
+                'affected': affected_count,
+                'completed_at': timezone.now().isoformat()
+            })
+            occurrence.save(update_fields=['execution_log'])
+            return 'chunk_done'
+
+        occurrence.status = 'completed'
+        occurrence.completed_at = timezone.now()
+        occurrence.affected_users_count = sum(entry['affected_count'] for entry in occurrence.execution_log)
+        occurrence.save(update_fields=['status', 'completed_at', 'affected_users_count'])
+
+        _send_event_notifications(occurrence)
+
+        logger.info(
+            f"Executed event {occurrence.event_definition.name}, "
+            f"affected {occurrence.affected_users_count} users"
+        )
+        return 'completed'
+
+
+def _execute_effect_for_users(occurrence, effect, user_ids):
+    """
+    对一批用户执行单个效果，执行记录批量写入
+
+    每个用户在独立的保存点中执行，单个用户失败不影响其他用户；
+    已有执行记录的用户（重复调度）会被跳过。
+
+    Returns:
+        (affected_count, user_results)
+    """
+    from users.models import User
+
+    executor = get_effect_executor(effect)
+    can_rollback = executor.can_rollback()
+    expires_at = None
+    if effect.duration_minutes:
+        expires_at = timezone.now() + timedelta(minutes=effect.duration_minutes)
+
+    already_executed = set(EventEffectExecution.objects.filter(
+        occurrence=occurrence,
+        effect=effect,
+        target_user_id__in=user_ids
+    ).values_list('target_user_id', flat=True))
+
+    executions = []
+    user_results = []
+    for user in User.objects.filter(id__in=user_ids).exclude(id__in=already_executed).order_by('id'):
+        try:
+            with transaction.atomic():
+                execution_data = executor.execute_for_user(user)
+        except Exception as e:
+            logger.error(f"Failed to execute effect for user {user.id}: {e}")
+            user_results.append({
+                'user_id': user.id,
+                'username': user.username,
+                'error': str(e)
+            })
+            continue
+
+        executions.append(EventEffectExecution(
+            occurrence=occurrence,
+            effect=effect,
+            target_user=user,
+            effect_data=execution_data,
+            rollback_data=execution_data if can_rollback else {},
+            expires_at=expires_at
+        ))
+        user_results.append({
+            'user_id': user.id,
+            'username': user.username,
+            'result': execution_data
+        })
+
+    EventEffectExecution.objects.bulk_create(executions)
+    return len(executions), user_results
+
+
+# 每个事务处理的过期执行记录数
+EXPIRED_EFFECTS_CHUNK_SIZE = 500
 
 
 @shared_task(bind=True, max_retries=3, default_retry_delay=60)
 def process_expired_effects(self):
-    """处理过期的持续效果 - 每小时运行"""
+    """处理过期的持续效果 - 每小时运行（分块批量回滚，每块一个事务）"""
     try:
         logger.info("Starting expired effects processing...")
 
-        with transaction.atomic():
-            now = timezone.now()
-
-            # 查找过期的效果执行记录
-            expired_executions = EventEffectExecution.objects.filter(
-                expires_at__lte=now,
-                is_expired=False,
-                is_rolled_back=False
-            ).select_related('effect', 'target_user')
-
-            if not expired_executions.exists():
-                logger.info("No expired effects to process")
-                return {
-                    'status': 'success',
-                    'processed_count': 0,
-                    'message': 'No expired effects',
-                    'timestamp': now.isoformat()
-                }
-
-            processed_count = 0
-
-            for execution in expired_executions:
-                try:
-                    effect = execution.effect
-                    executor = get_effect_executor(effect)
-
-                    if executor.can_rollback():
-                        success = executor.rollback_for_user(
-                            execution.target_user,
-                            execution.rollback_data
-                        )
-
-                        if success:
-                            execution.is_rolled_back = True
-                            execution.rolled_back_at = now
-
-                    execution.is_expired = True
-                    execution.save()
-                    processed_count += 1
-
-                    logger.debug(f"Processed expired effect for {execution.target_user.username}")
-
-                except Exception as e:
-                    logger.error(f"Failed to process expired effect {execution.id}: {e}")
-
-            # 清理过期的持续效果模型
-            _cleanup_expired_persistent_effects(now)
+        now = timezone.now()
 
-            logger.info(f"Expired effects processing completed: {processed_count} effects processed")
+        # 查找过期的效果执行记录
+        expired_ids = list(EventEffectExecution.objects.filter(
+            expires_at__lte=now,
+            is_expired=False,
+            is_rolled_back=False
+        ).order_by('expires_at').values_list('id', flat=True))
 
+        if not expired_ids:
+            logger.info("No expired effects to process")
             return {
                 'status': 'success',
-                'processed_count': processed_count,
+                'processed_count': 0,
+                'message': 'No expired effects',
                 'timestamp': now.isoformat()
             }
 
+        processed_count = 0
+        rolled_back_count = 0
+        for i in range(0, len(expired_ids), EXPIRED_EFFECTS_CHUNK_SIZE):
+            processed, rolled_back = _expire_executions_chunk(expired_ids[i:i + EXPIRED_EFFECTS_CHUNK_SIZE], now)
+            processed_count += processed
+            rolled_back_count += rolled_back
+
+        # 清理过期的持续效果模型
+        _cleanup_expired_persistent_effects(now)
+
+        logger.info(
+            f"Expired effects processing completed: {processed_count} effects processed, "
+            f"{rolled_back_count} rolled back"
+        )
+
+        return {
+            'status': 'success',
+            'processed_count': processed_count,
+            'rolled_back_count': rolled_back_count,
+            'timestamp': now.isoformat()
+        }
+
     except Exception as exc:
         logger.error(f"Expired effects processing failed: {exc}", exc_info=True)
         raise self.retry(exc=exc, countdown=min(60 * (2 ** self.request.retries), 300))
 
 
+def _expire_executions_chunk(execution_ids, now):
+    """
+    在一个事务内处理一块过期执行记录
+
+    按效果分组调用执行器的 rollback_for_users 批量回滚，再用一条 UPDATE
+    标记整块的过期/回滚状态；某个效果的批量回滚失败时，该组记录保持未处理，
+    下次运行时重试。
+
+    Returns:
+        (processed_count, rolled_back_count)
+    """
+    with transaction.atomic():
+        executions = list(EventEffectExecution.objects.select_for_update(of=('self',)).filter(
+            id__in=execution_ids,
+            is_expired=False,
+            is_rolled_back=False
+        ).select_related('effect__event_definition', 'target_user'))
+
+        by_effect = {}
+        for execution in executions:
+            by_effect.setdefault(execution.effect_id, []).append(execution)
+
+        processed_ids = []
+        rolled_back_ids = set()
+        for effect_executions in by_effect.values():
+            effect = effect_executions[0].effect
+            try:
+                with transaction.atomic():
+                    executor = get_effect_executor(effect)
+                    if executor.can_rollback():
+                        rolled_back_ids |= executor.rollback_for_users(effect_executions)
+            except Exception as e:
+                logger.error(f"Failed to roll back expired effect {effect.id}: {e}")
+                continue
+            processed_ids.extend(execution.id for execution in effect_executions)
+
+        if processed_ids:
+            EventEffectExecution.objects.filter(id__in=processed_ids).update(
+                is_expired=True,
+                is_rolled_back=Case(
+                    When(id__in=rolled_back_ids, then=Value(True)),
+                    default=Value(False),
+                    output_field=BooleanField()
+                ),
+                rolled_back_at=Case(
+                    When(id__in=rolled_back_ids, then=Value(now)),
+                    default=Value(None),
+                    output_field=DateTimeField()
+                )
+            )
+
+    return len(processed_ids), len(rolled_back_ids)
+
+
 def _cleanup_expired_persistent_effects(now):
     """清理过期的持续效果模型"""
     from .models import UserGameEffect, UserCoinsMultiplier
 
-    # 清理过期的游戏效果
-    expired_game_effects = UserGameEffect.objects.filter(
+    # 清理过期的游戏效果与积分倍数
+    game_count = UserGameEffect.objects.filter(
         expires_at__lte=now,
         is_active=True
-    )
-    game_count = expired_game_effects.count()
-    expired_game_effects.update(is_active=False)
+    ).update(is_active=False)
 
-    # 清理过期的积分倍数
-    expired_coins_multipliers = UserCoinsMultiplier.objects.filter(
+    coins_count = UserCoinsMultiplier.objects.filter(
         expires_at__lte=now,
         is_active=True
-    )
-    coins_count = expired_coins_multipliers.count()
-    expired_coins_multipliers.update(is_active=False)
+    ).update(is_active=False)
 
     if game_count > 0 or coins_count > 0:
         logger.info(f"Cleaned up {game_count} game effects and {coins_count} coins multipliers")
@@ -483,100 +683,96 @@ def event_system_health_check(self):
 
 
 def _send_event_notifications(occurrence):
-    """发送事件通知"""
+    """发送事件通知（一次查询执行记录，批量写入通知）"""
     try:
         # 获取受影响的用户（限制数量避免过多通知）
-        affected_users = EventEffectExecution.objects.filter(
+        affected_user_ids = list(EventEffectExecution.objects.filter(
             occurrence=occurrence
-        ).values_list('target_user', flat=True).distinct()[:100]  # 最多100个用户
-
-        notification_count = 0
-
-        for user_id in affected_users:
-            try:
-                from users.models import User
-                user = User.objects.get(id=user_id)
-
-                # 获取该用户受到的具体影响
-                user_effects = EventEffectExecution.objects.filter(
-                    occurrence=occurrence,
-                    target_user=user
-                ).select_related('effect')
-
-                # 构建影响描述
-                effect_descriptions = []
-                for execution in user_effects:
-                    effect_data = execution.effect_data
-                    effect_type = execution.effect.effect_type
-
-                    if effect_type == 'coins_add':
-                        amount = effect_data.get('amount_changed', 0)
-                        if amount > 0:
-                            effect_descriptions.append(f"获得了 {amount} 积分")
-                    elif effect_type == 'coins_subtract':
-                        amount = abs(effect_data.get('amount_changed', 0))
-                        if amount > 0:
-                            effect_descriptions.append(f"失去了 {amount} 积分")
-                    elif effect_type == 'item_distribute':
-                        item_type = effect_data.get('item_type', '道具')
-                        quantity = effect_data.get('quantity', 1)
-                        effect_descriptions.append(f"获得了 {quantity} 个 {item_type}")
-                    elif effect_type == 'task_freeze_all':
-                        frozen_count = effect_data.get('frozen_task_count', 0)
-                        if frozen_count > 0:
-                            effect_descriptions.append(f"有 {frozen_count} 个任务被冻结")
-                    elif effect_type == 'task_unfreeze_all':
-                        unfrozen_count = effect_data.get('unfrozen_task_count', 0)
-                        if unfrozen_count > 0:
-                            effect_descriptions.append(f"有 {unfrozen_count} 个任务被解冻")
-                    elif effect_type in ['temporary_coins_multiplier', 'temporary_game_enhancement']:
-                        multiplier = effect_data.get('multiplier', 1.0)
-                        duration = effect_data.get('duration_minutes', 60)
-                        if effect_type == 'temporary_coins_multiplier':
-                            effect_descriptions.append(f"获得了 {duration} 分钟的 {multiplier}x 积分倍数")
-                        else:
-                            effect_descriptions.append(f"获得了 {duration} 分钟的 {multiplier}x 游戏增强")
-
-                # 如果没有具体描述，使用默认描述
-                if not effect_descriptions:
-                    effect_descriptions.append("受到了系统事件的影响")
-
-                effects_text = "、".join(effect_descriptions)
-
-                # 自定义通知标题和消息
-                custom_title = f"系统事件：{occurrence.event_definition.title}"
-                custom_message = f"{occurrence.event_definition.description}\n\n你受到的影响：{effects_text}"
-
-                Notification.create_notification(
-                    recipient=user,
-                    notification_type='system_event_occurred',  # 使用专用的系统事件类型
-                    title=custom_title,  # 自定义标题
-                    message=custom_message,  # 自定义消息内容
-                    actor=None,
-                    related_object_type='event_occurrence',
-                    related_object_id=occurrence.id,
-                    extra_data={
-                        'event_title': occurrence.event_definition.title,
-                        'event_description': occurrence.event_definition.description,
-                        'event_category': occurrence.event_definition.category,
-                        'effects_count': occurrence.event_definition.effects.count(),
-                        'user_effects': effects_text,  # 添加用户具体影响描述
-                        'effects_detail': [exec.effect_data for exec in user_effects]  # 详细效果数据
-                    },
-                    priority='urgent'  # 事件通知使用紧急优先级
-                )
-
-                notification_count += 1
-
-            except Exception as e:
-                logger.error(f"Failed to send notification to user {user_id}: {e}")
-
-        logger.info(f"Sent {notification_count} event notifications for {occurrence.event_definition.name}")
+        ).values_list('target_user', flat=True).distinct()[:100])  # 最多100个用户
+
+        executions_by_user = {user_id: [] for user_id in affected_user_ids}
+        executions = EventEffectExecution.objects.filter(
+            occurrence=occurrence,
+            target_user_id__in=affected_user_ids
+        ).select_related('effect').order_by('executed_at')
+        for execution in executions:
+            executions_by_user[execution.target_user_id].append(execution)
+
+        event_def = occurrence.event_definition
+        effects_count = event_def.effects.count()
+
+        entries = []
+        for user_id, user_effects in executions_by_user.items():
+            effects_text = "、".join(_describe_user_effects(user_effects))
+
+            entries.append({
+                'recipient_id': user_id,
+                'notification_type': 'system_event_occurred',  # 使用专用的系统事件类型
+                'title': f"系统事件：{event_def.title}",
+                'message': f"{event_def.description}\n\n你受到的影响：{effects_text}",
+                'related_object_type': 'event_occurrence',
+                'related_object_id': occurrence.id,
+                'extra_data': {
+                    'event_title': event_def.title,
+                    'event_description': event_def.description,
+                    'event_category': event_def.category,
+                    'effects_count': effects_count,
+                    'user_effects': effects_text,  # 用户具体影响描述
+                    'effects_detail': [execution.effect_data for execution in user_effects]  # 详细效果数据
+                },
+                'priority': 'urgent'  # 事件通知使用紧急优先级
+            })
+
+        created = Notification.bulk_create_notifications(entries)
+
+        logger.info(f"Sent {len(created)} event notifications for {event_def.name}")
 
     except Exception as e:
         logger.error(f"Failed to send event notifications: {e}")
 
 
+def _describe_user_effects(executions):
+    """构建用户受到的影响描述"""
+    effect_descriptions = []
+    for execution in executions:
+        effect_data = execution.effect_data
+        effect_type = execution.effect.effect_type
+
+        if effect_type == 'coins_add':
+            amount = effect_data.get('amount_changed', 0)
+            if amount > 0:
+                effect_descriptions.append(f"获得了 {amount} 积分")
+        elif effect_type == 'coins_subtract':
+            amount = abs(effect_data.get('amount_changed', 0))
+            if amount > 0:
+                effect_descriptions.append(f"失去了 {amount} 积分")
+        elif effect_type == 'item_distribute':
+            item_type = effect_data.get('item_type', '道具')
+            quantity = effect_data.get('quantity', 1)
+            effect_descriptions.append(f"获得了 {quantity} 个 {item_type}")
+        elif effect_type == 'task_freeze_all':
+            frozen_count = effect_data.get('frozen_task_count', 0)
+            if frozen_count > 0:
+                effect_descriptions.append(f"有 {frozen_count} 个任务被冻结")
+        elif effect_type == 'task_unfreeze_all':
+            unfrozen_count = effect_data.get('unfrozen_task_count', 0)
+            if unfrozen_count > 0:
+                effect_descriptions.append(f"有 {unfrozen_count} 个任务被解冻")
+        elif effect_type in ['temporary_coins_multiplier', 'temporary_game_enhancement']:
+            multiplier = effect_data.get('multiplier', 1.0)
+            duration = effect_data.get('duration_minutes', 60)
+            if effect_type == 'temporary_coins_multiplier':
+                effect_descriptions.append(f"获得了 {duration} 分钟的 {multiplier}x 积分倍数")
+            else:
+                effect_descriptions.append(f"获得了 {duration} 分钟的 {multiplier}x 游戏增强")
+
+    # 如果没有具体描述，使用默认描述
+    if not effect_descriptions:
+        effect_descriptions.append("受到了系统事件的影响")
+
+    return effect_descriptions
+
+
 # 健康检查辅助函数
 @shared_task(bind=True)
 def debug_event_system(self):
@@ -12,9 +12,10 @@ Created: 2024-12-30
 import logging
 import math
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, TYPE_CHECKING
+from typing import Dict, List, Any, Set, TYPE_CHECKING
 from django.contrib.auth import get_user_model
 from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 from datetime import timedelta
 
@@ -33,8 +34,12 @@ class BaseEffectExecutor(ABC):
         self.effect = effect
 
     @abstractmethod
-    def get_target_users(self) -> List[User]:
-        """获取目标用户列表"""
+    def get_target_users(self, id_range=(None, None)) -> List[User]:
+        """
+        获取目标用户列表
+
+        id_range 为分块执行时限定的目标用户ID区间 (after_id, through_id]，None 表示该侧不限
+        """
         pass
 
     @abstractmethod
@@ -42,6 +47,24 @@ class BaseEffectExecutor(ABC):
         """为单个用户执行效果"""
         pass
 
+    def get_target_user_ids(self, after_id=None, through_id=None) -> List[int]:
+        """获取目标用户ID列表（结果按ID排序）；分块执行时只取 (after_id, through_id] 区间内的用户"""
+        user_ids = sorted(user.pk for user in self.get_target_users((after_id, through_id)))
+        return [
+            user_id for user_id in user_ids
+            if (after_id is None or user_id > after_id) and (through_id is None or user_id <= through_id)
+        ]
+
+    @staticmethod
+    def _in_id_range(queryset, id_range):
+        """把用户查询限定在分块的ID区间内"""
+        after_id, through_id = id_range
+        if after_id is not None:
+            queryset = queryset.filter(id__gt=after_id)
+        if through_id is not None:
+            queryset = queryset.filter(id__lte=through_id)
+        return queryset
+
     def can_rollback(self) -> bool:
         """是否支持回滚"""
         return False
@@ -50,24 +73,45 @@ class BaseEffectExecutor(ABC):
         """回滚用户效果"""
         return False
 
-    def _get_target_users_by_type(self) -> List[User]:
+    def rollback_for_users(self, executions: List['EventEffectExecution']) -> Set[Any]:
+        """
+        批量回滚一批执行记录（同一效果）
+
+        默认逐条调用 rollback_for_user，每条在独立保存点中执行，单条失败只记录日志；
+        支持集合操作的执行器应覆盖此方法，用少量 SQL 完成整批回滚。
+
+        Returns:
+            成功回滚的执行记录ID集合
+        """
+        rolled_back = set()
+        for execution in executions:
+            try:
+                with transaction.atomic():
+                    if self.rollback_for_user(execution.target_user, execution.rollback_data):
+                        rolled_back.add(execution.id)
+            except Exception as e:
+                logger.error(f"Failed to roll back execution {execution.id}: {e}")
+        return rolled_back
+
+    def _get_target_users_by_type(self, id_range=(None, None)) -> List[User]:
         """根据目标类型获取用户列表"""
         User = get_user_model()
         target_type = self.effect.target_type
         target_params = self.effect.target_parameters
+        active_users = self._in_id_range(User.objects.filter(is_active=True), id_range)
 
         if target_type == 'all_users':
-            return list(User.objects.filter(is_active=True))
+            return list(active_users)
 
         elif target_type == 'random_percentage':
+            # 分块执行时在每个ID区间内按比例抽样
             percentage = target_params.get('percentage', 10)
-            all_users = User.objects.filter(is_active=True)
-            count = int(all_users.count() * percentage / 100)
-            return list(all_users.order_by('?')[:count])
+            count = int(active_users.count() * percentage / 100)
+            return list(active_users.order_by('?')[:count])
 
         elif target_type == 'level_based':
             levels = target_params.get('levels', [1])
-            return list(User.objects.filter(is_active=True, level__in=levels))
+            return list(active_users.filter(level__in=levels))
 
         elif target_type == 'active_task_users':
             from tasks.models import LockTask
@@ -75,15 +119,12 @@ class BaseEffectExecutor(ABC):
                 task_type='lock',
                 status__in=['active', 'voting']
             ).values_list('user', flat=True).distinct()
-            return list(User.objects.filter(id__in=active_task_users, is_active=True))
+            return list(active_users.filter(id__in=active_task_users))
 
         elif target_type == 'recent_active_users':
             days = target_params.get('days', 7)
             cutoff_date = timezone.now() - timedelta(days=days)
-            return list(User.objects.filter(
-                is_active=True,
-                last_active__gte=cutoff_date
-            ))
+            return list(active_users.filter(last_active__gte=cutoff_date))
 
         return []
 
@@ -91,20 +132,34 @@ class BaseEffectExecutor(ABC):
 class CoinsEffectExecutor(BaseEffectExecutor):
     """积分效果执行器"""
 
-    def get_target_users(self) -> List[User]:
-        return self._get_target_users_by_type()
+    def get_target_users(self, id_range=(None, None)) -> List[User]:
+        return self._get_target_users_by_type(id_range)
 
     def execute_for_user(self, user: User) -> Dict[str, Any]:
+        from users.services.coins_ledger import CoinsLedgerService
+
         effect_params = self.effect.effect_parameters
         amount = effect_params.get('amount', 0)
 
         old_coins = user.coins
+        delta = 0
         if self.effect.effect_type == 'coins_add':
-            user.coins += amount
+            delta = amount
         elif self.effect.effect_type == 'coins_subtract':
-            user.coins = max(0, user.coins - amount)
-
-        user.save(update_fields=['coins'])
+            # 扣除不超过当前余额（余额最低为0）
+            delta = -min(amount, user.coins)
+
+        if delta:
+            CoinsLedgerService.apply_changes([{
+                'user': user,
+                'amount': delta,
+                'change_type': 'event_reward' if delta > 0 else 'event_cost',
+                'description': f'系统事件：{self.effect.event_definition.title}',
+                'metadata': {
+                    'event_id': str(self.effect.event_definition_id),
+                    'effect_id': str(self.effect.id),
+                },
+            }])
 
         # 更新用户活跃度
         user.update_activity(1)
@@ -121,22 +176,59 @@ class CoinsEffectExecutor(BaseEffectExecutor):
         return True
 
     def rollback_for_user(self, user: User, execution_data: Dict[str, Any]) -> bool:
-        old_coins = execution_data.get('old_coins')
-        if old_coins is not None:
-            user.coins = old_coins
-            user.save(update_fields=['coins'])
-            logger.info(f"Rolled back coins for {user.username} to {old_coins}")
-            return True
-        return False
+        return bool(self._rollback_changes([(user.id, execution_data)]))
+
+    def rollback_for_users(self, executions: List['EventEffectExecution']) -> Set[Any]:
+        rolled_back_user_ids = self._rollback_changes(
+            [(execution.target_user_id, execution.rollback_data) for execution in executions]
+        )
+        return {execution.id for execution in executions if execution.target_user_id in rolled_back_user_ids}
+
+    def _rollback_changes(self, changes) -> Set[int]:
+        """
+        冲正积分变动：按 amount_changed 反向记账（扣回时不超过当前余额），
+        锁定余额的查询与记账各一次，而不是把余额覆盖回旧值。
+
+        Returns:
+            完成冲正的用户ID集合
+        """
+        from users.services.coins_ledger import CoinsLedgerService
+
+        changes = [(user_id, data.get('amount_changed')) for user_id, data in changes if data.get('amount_changed')]
+        if not changes:
+            return set()
+
+        with transaction.atomic():
+            balances = dict(User.objects.select_for_update().filter(
+                id__in={user_id for user_id, _ in changes}
+            ).values_list('id', 'coins'))
+
+            entries = []
+            for user_id, amount_changed in changes:
+                if user_id not in balances:
+                    continue
+                delta = -amount_changed if amount_changed < 0 else -min(amount_changed, balances[user_id])
+                balances[user_id] += delta
+                entries.append({
+                    'user_id': user_id,
+                    'amount': delta,
+                    'change_type': 'event_reward' if delta > 0 else 'event_cost',
+                    'description': f'系统事件效果过期：{self.effect.event_definition.title}',
+                    'metadata': {'effect_id': str(self.effect.id), 'rollback': True},
+                })
+            CoinsLedgerService.apply_changes(entries)
+
+        logger.info(f"Rolled back coins effect {self.effect.id} for {len(entries)} users")
+        return {entry['user_id'] for entry in entries}
 
 
 class ItemDistributeEffectExecutor(BaseEffectExecutor):
     """道具分发效果执行器"""
 
-    def get_target_users(self) -> List[User]:
+    def get_target_users(self, id_range=(None, None)) -> List[User]:
         # 检查背包容量，只返回有空间的用户
         from store.models import Item
-        target_users = self._get_target_users_by_type()
+        target_users = self._get_target_users_by_type(id_range)
 
         result = []
         for user in target_users:
@@ -205,7 +297,7 @@ class ItemDistributeEffectExecutor(BaseEffectExecutor):
 class TaskFreezeEffectExecutor(BaseEffectExecutor):
     """任务冻结效果执行器"""
 
-    def get_target_users(self) -> List[User]:
+    def get_target_users(self, id_range=(None, None)) -> List[User]:
         # 获取有活跃任务的用户
         User = get_user_model()
         from tasks.models import LockTask
@@ -223,7 +315,7 @@ class TaskFreezeEffectExecutor(BaseEffectExecutor):
                 is_frozen=True
             ).values_list('user', flat=True).distinct()
 
-        return list(User.objects.filter(id__in=active_task_users, is_active=True))
+        return list(self._in_id_range(User.objects.filter(id__in=active_task_users, is_active=True), id_range))
 
     def execute_for_user(self, user: User) -> Dict[str, Any]:
         from tasks.models import LockTask, TaskTimelineEvent
@@ -369,12 +461,51 @@ class TaskFreezeEffectExecutor(BaseEffectExecutor):
 
         return False
 
+    def rollback_for_users(self, executions: List['EventEffectExecution']) -> Set[Any]:
+        from tasks.models import LockTask
+
+        # 冻结的回滚是解冻，解冻的回滚是重新冻结
+        task_ids_by_execution = {}
+        for execution in executions:
+            data = execution.rollback_data
+            if data.get('action') == 'freeze':
+                task_ids_by_execution[execution.id] = data.get('frozen_task_ids', [])
+            elif data.get('action') == 'unfreeze':
+                task_ids_by_execution[execution.id] = data.get('unfrozen_task_ids', [])
+
+        action = 'freeze' if self.effect.effect_type == 'task_freeze_all' else 'unfreeze'
+        owners = {execution.id: execution.target_user_id for execution in executions}
+        candidates = LockTask.objects.filter(
+            id__in={task_id for task_ids in task_ids_by_execution.values() for task_id in task_ids},
+            user_id__in=set(owners.values()),
+            is_frozen=(action == 'freeze')
+        )
+        changeable = {(str(task_id), user_id) for task_id, user_id in candidates.values_list('id', 'user_id')}
+
+        rolled_back = set()
+        task_ids = set()
+        for execution_id, execution_task_ids in task_ids_by_execution.items():
+            matched = {str(task_id) for task_id in execution_task_ids if (str(task_id), owners[execution_id]) in changeable}
+            if matched:
+                rolled_back.add(execution_id)
+                task_ids |= matched
+
+        if task_ids:
+            tasks = LockTask.objects.filter(id__in=task_ids)
+            if action == 'freeze':
+                updated = tasks.update(is_frozen=False, frozen_at=None, frozen_end_time=None)
+            else:
+                updated = tasks.update(is_frozen=True, frozen_at=timezone.now(), frozen_end_time=F('end_time'))
+            logger.info(f"Rolled back {action} of {updated} tasks for {len(rolled_back)} executions")
+
+        return rolled_back
+
 
 class TemporaryCoinsMultiplierExecutor(BaseEffectExecutor):
     """临时积分倍数效果执行器"""
 
-    def get_target_users(self) -> List[User]:
-        return self._get_target_users_by_type()
+    def get_target_users(self, id_range=(None, None)) -> List[User]:
+        return self._get_target_users_by_type(id_range)
 
     def execute_for_user(self, user: User) -> Dict[str, Any]:
         from .models import UserCoinsMultiplier
@@ -420,12 +551,16 @@ class TemporaryCoinsMultiplierExecutor(BaseEffectExecutor):
                 pass
         return False
 
+    def rollback_for_users(self, executions: List['EventEffectExecution']) -> Set[Any]:
+        from .models import UserCoinsMultiplier
+        return _deactivate_persistent_effects(UserCoinsMultiplier, executions, 'multiplier_id')
+
 
 class TemporaryGameEnhancementExecutor(BaseEffectExecutor):
     """临时游戏增强效果执行器"""
 
-    def get_target_users(self) -> List[User]:
-        return self._get_target_users_by_type()
+    def get_target_users(self, id_range=(None, None)) -> List[User]:
+        return self._get_target_users_by_type(id_range)
 
     def execute_for_user(self, user: User) -> Dict[str, Any]:
         from .models import UserGameEffect
@@ -474,11 +609,43 @@ class TemporaryGameEnhancementExecutor(BaseEffectExecutor):
                 pass
         return False
 
+    def rollback_for_users(self, executions: List['EventEffectExecution']) -> Set[Any]:
+        from .models import UserGameEffect
+        return _deactivate_persistent_effects(UserGameEffect, executions, 'game_effect_id')
+
+
+def _deactivate_persistent_effects(model, executions, id_key) -> Set[Any]:
+    """一次 UPDATE 停用一批执行记录创建的持续效果，返回成功回滚的执行记录ID"""
+    from store.active_effects import invalidate_active_effects
+
+    effect_ids = {}
+    for execution in executions:
+        effect_id = execution.rollback_data.get(id_key)
+        if effect_id:
+            effect_ids[effect_id] = execution
+
+    existing = {
+        (str(effect_id), user_id)
+        for effect_id, user_id in model.objects.filter(id__in=list(effect_ids)).values_list('id', 'user_id')
+    }
+    matched = {
+        effect_id: execution for effect_id, execution in effect_ids.items()
+        if (str(effect_id), execution.target_user_id) in existing
+    }
+    if not matched:
+        return set()
+
+    # 批量更新不触发 post_save，需要手动清除活跃效果缓存
+    model.objects.filter(id__in=list(matched)).update(is_active=False)
+    invalidate_active_effects(*{execution.target_user_id for execution in matched.values()})
+    logger.info(f"Deactivated {len(matched)} {model.__name__} records")
+    return {execution.id for execution in matched.values()}
+
 
 class StoreDiscountEffectExecutor(BaseEffectExecutor):
     """商店折扣效果执行器"""
 
-    def get_target_users(self) -> List[User]:
+    def get_target_users(self, id_range=(None, None)) -> List[User]:
         # 商店折扣是全局效果，返回空列表，在执行时特殊处理
         return []
 
@@ -533,16 +700,11 @@ def get_effect_executor(effect: 'EventEffect') -> BaseEffectExecutor:
 
 def apply_coins_multiplier(user: User, base_coins: int) -> int:
     """应用积分倍数 - 在现有积分增加函数中调用"""
-    from .models import UserCoinsMultiplier
-
-    active_multiplier = UserCoinsMultiplier.objects.filter(
-        user=user,
-        is_active=True,
-        expires_at__gt=timezone.now()
-    ).first()
+    from store.active_effects import get_active_effects
 
-    if active_multiplier and active_multiplier.is_valid:
-        multiplied_coins = int(base_coins * active_multiplier.multiplier)
+    multiplier = get_active_effects(user).coins_multiplier
+    if multiplier != 1.0:
+        multiplied_coins = int(base_coins * multiplier)
         logger.info(f"Applied coins multiplier for {user.username}: {base_coins} -> {multiplied_coins}")
         return multiplied_coins
 
@@ -551,16 +713,11 @@ def apply_coins_multiplier(user: User, base_coins: int) -> int:
 
 def apply_game_result_modifiers(user: User, base_reward: int) -> int:
     """应用游戏结果修改器 - 在游戏结算函数中调用"""
-    from .models import UserGameEffect
-
-    active_effect = UserGameEffect.objects.filter(
-        user=user,
-        is_active=True,
-        expires_at__gt=timezone.now()
-    ).first()
+    from store.active_effects import get_active_effects
 
-    if active_effect and active_effect.is_valid:
-        modified_reward = int(base_reward * active_effect.multiplier)
+    multiplier = get_active_effects(user).game_multiplier
+    if multiplier != 1.0:
+        modified_reward = int(base_reward * multiplier)
         logger.info(f"Applied game modifier for {user.username}: {base_reward} -> {modified_reward}")
         return modified_reward
 
@@ -13,7 +13,6 @@ Created: 2024-12-30
 
 from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
-from django.db import transaction
 from events.models import EventDefinition, EventOccurrence
 from events.celery_tasks import trigger_manual_event
 from users.models import User
@@ -175,61 +174,39 @@ class Command(BaseCommand):
                 )
 
     def _execute_event_sync(self, event_def, triggered_by):
-        """Execute event synchronously"""
-        from events.celery_tasks import _execute_single_effect
+        """Execute event synchronously (chunk by chunk, each chunk in its own transaction)"""
+        from events.celery_tasks import _claim_occurrence, _run_occurrence_inline
 
         self.stdout.write(
             self.style.SUCCESS('Executing event synchronously...')
         )
 
         try:
-            with transaction.atomic():
-                now = timezone.now()
-
-                # Create event occurrence
-                occurrence = EventOccurrence.objects.create(
-                    event_definition=event_def,
-                    scheduled_at=now,
-                    trigger_type='manual',
-                    triggered_by=triggered_by,
-                    status='executing',
-                    started_at=now
-                )
-
-                # Execute all effects
-                total_affected = 0
-                execution_log = []
-
-                effects = event_def.effects.filter(is_active=True).order_by('priority')
-
-                for effect in effects:
-                    self.stdout.write(f'Executing effect: {effect.get_effect_type_display()}')
-
-                    effect_result = _execute_single_effect(occurrence, effect)
-                    total_affected += effect_result['affected_count']
-                    execution_log.append(effect_result)
-
-                    self.stdout.write(
-                        f'  Affected {effect_result["affected_count"]}/{effect_result.get("total_targets", 0)} users'
-                    )
+            now = timezone.now()
+
+            # Create event occurrence
+            occurrence = EventOccurrence.objects.create(
+                event_definition=event_def,
+                scheduled_at=now,
+                trigger_type='manual',
+                triggered_by=triggered_by
+            )
 
-                # Update occurrence
-                occurrence.status = 'completed'
-                occurrence.completed_at = timezone.now()
-                occurrence.affected_users_count = total_affected
-                occurrence.execution_log = execution_log
-                occurrence.save()
+            _claim_occurrence(occurrence.id, now)
+            occurrence = _run_occurrence_inline(occurrence.id)
 
-                # Send notifications to affected users
-                from events.celery_tasks import _send_event_notifications
-                _send_event_notifications(occurrence)
+            for log_entry in occurrence.execution_log:
+                self.stdout.write(
+                    f'Effect {log_entry["effect_type"]}: '
+                    f'affected {log_entry["affected_count"]}/{log_entry.get("total_targets", 0)} users'
+                )
 
-                return {
-                    'status': 'success',
-                    'occurrence_id': str(occurrence.id),
-                    'total_affected': total_affected,
-                    'execution_log': execution_log
-                }
+            return {
+                'status': 'success',
+                'occurrence_id': str(occurrence.id),
+                'total_affected': occurrence.affected_users_count,
+                'execution_log': occurrence.execution_log
+            }
 
         except Exception as e:
             self.stdout.write(
@@ -238,10 +215,11 @@ class Command(BaseCommand):
 
             # Update occurrence status
             if 'occurrence' in locals():
-                occurrence.status = 'failed'
-                occurrence.error_message = str(e)
-                occurrence.completed_at = timezone.now()
-                occurrence.save()
+                EventOccurrence.objects.filter(id=occurrence.id).update(
+                    status='failed',
+                    error_message=str(e),
+                    completed_at=timezone.now()
+                )
 
             return {
                 'status': 'error',
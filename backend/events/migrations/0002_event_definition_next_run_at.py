@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:43
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+from django.utils import timezone
+
+
+def backfill_next_run_at(apps, schema_editor):
+    """Derive next_run_at from each interval definition's latest scheduled occurrence."""
+    EventDefinition = apps.get_model('events', 'EventDefinition')
+    EventOccurrence = apps.get_model('events', 'EventOccurrence')
+
+    now = timezone.now()
+    latest = dict(
+        EventOccurrence.objects.filter(trigger_type='scheduled').values('event_definition').annotate(
+            latest=Max('scheduled_at')
+        ).values_list('event_definition', 'latest')
+    )
+    definitions = EventDefinition.objects.filter(schedule_type__in=['interval_hours', 'interval_days'])
+    for definition in definitions:
+        if definition.schedule_type == 'interval_hours':
+            interval = timedelta(hours=definition.interval_value or 1)
+        else:
+            interval = timedelta(days=definition.interval_value or 1)
+        last_scheduled = latest.get(definition.id)
+        definition.next_run_at = last_scheduled + interval if last_scheduled else now
+        definition.save(update_fields=['next_run_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventdefinition',
+            name='next_run_at',
+            field=models.DateTimeField(blank=True, help_text='下次计划调度时间（创建计划事件发生时推进）', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='eventdefinition',
+            index=models.Index(fields=['is_active', 'next_run_at'], name='event_defin_is_acti_f67090_idx'),
+        ),
+        migrations.RunPython(backfill_next_run_at, migrations.RunPython.noop),
+    ]
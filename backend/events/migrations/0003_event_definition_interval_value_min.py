@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:48
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0002_event_definition_next_run_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='eventdefinition',
+            name='interval_value',
+            field=models.IntegerField(blank=True, help_text='间隔数值', null=True, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+    ]
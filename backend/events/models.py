@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.core.validators import MinValueValidator
 from django.utils import timezone
 from datetime import timedelta
 import uuid
@@ -22,6 +23,9 @@ class EventDefinition(models.Model):
         ('cron', '定时触发'),
     ]
 
+    # 由调度器按 next_run_at 自动创建事件发生的调度类型
+    INTERVAL_SCHEDULE_TYPES = ('interval_hours', 'interval_days')
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=100, unique=True, help_text="事件名称")
     category = models.CharField(max_length=20, choices=EVENT_CATEGORY_CHOICES)
@@ -30,8 +34,14 @@ class EventDefinition(models.Model):
 
     # 调度配置
     schedule_type = models.CharField(max_length=20, choices=SCHEDULE_TYPE_CHOICES)
-    interval_value = models.IntegerField(null=True, blank=True, help_text="间隔数值")
+    interval_value = models.IntegerField(
+        null=True, blank=True, validators=[MinValueValidator(1)], help_text="间隔数值"
+    )
     cron_expression = models.CharField(max_length=100, null=True, blank=True)
+    next_run_at = models.DateTimeField(
+        null=True, blank=True,
+        help_text="下次计划调度时间（创建计划事件发生时推进）"
+    )
 
     # 状态控制
     is_active = models.BooleanField(default=True, help_text="是否启用")
@@ -46,23 +56,55 @@ class EventDefinition(models.Model):
         verbose_name = '事件定义'
         verbose_name_plural = '事件定义'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active', 'next_run_at']),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.get_category_display()})"
 
-    def get_next_scheduled_time(self):
-        """获取下次调度时间"""
-        if self.schedule_type == 'manual':
-            return None
-
-        now = timezone.now()
+    def save(self, *args, **kwargs):
+        # 间隔调度的事件首次保存时立即可调度；改为其他调度类型时不再由调度器处理
+        if kwargs.get('update_fields') is None:
+            if self.schedule_type in self.INTERVAL_SCHEDULE_TYPES:
+                if self.next_run_at is None:
+                    self.next_run_at = timezone.now()
+            else:
+                self.next_run_at = None
+        super().save(*args, **kwargs)
+
+    def get_interval(self):
+        """调度间隔，非间隔调度返回 None（未设置或非正的间隔数值按 1 处理，调度循环总能前进）"""
+        interval_value = max(self.interval_value or 1, 1)
         if self.schedule_type == 'interval_hours':
-            return now + timedelta(hours=self.interval_value or 1)
+            return timedelta(hours=interval_value)
         elif self.schedule_type == 'interval_days':
-            return now + timedelta(days=self.interval_value or 1)
-
+            return timedelta(days=interval_value)
         return None
 
+    def advance_next_run(self, scheduled_at):
+        """
+        计划事件发生创建后推进 next_run_at（条件 UPDATE，只会向后推进）
+
+        调度器批量创建时自行推进；其他途径（后台、脚本）创建的计划事件发生
+        由 events.signals 调用此方法。
+        """
+        interval = self.get_interval()
+        if interval is None:
+            return
+        next_run_at = scheduled_at + interval
+        EventDefinition.objects.filter(id=self.id).filter(
+            models.Q(next_run_at__isnull=True) | models.Q(next_run_at__lt=next_run_at)
+        ).update(next_run_at=next_run_at)
+        if self.next_run_at is None or self.next_run_at < next_run_at:
+            self.next_run_at = next_run_at
+
+    def get_next_scheduled_time(self):
+        """获取下次调度时间"""
+        if self.schedule_type not in self.INTERVAL_SCHEDULE_TYPES:
+            return None
+        return self.next_run_at
+
 
 class EventEffect(models.Model):
     """事件效果配置"""
@@ -0,0 +1,21 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from store.active_effects import invalidate_active_effects
+from .models import EventOccurrence, UserCoinsMultiplier, UserGameEffect
+
+
+@receiver(post_save, sender=UserCoinsMultiplier)
+@receiver(post_delete, sender=UserCoinsMultiplier)
+@receiver(post_save, sender=UserGameEffect)
+@receiver(post_delete, sender=UserGameEffect)
+def invalidate_event_effect_cache(sender, instance, **kwargs):
+    """活动效果变化时清除用户活跃效果缓存"""
+    invalidate_active_effects(instance.user_id)
+
+
+@receiver(post_save, sender=EventOccurrence)
+def advance_event_schedule(sender, instance, created, **kwargs):
+    """计划事件发生创建后推进事件定义的下次调度时间"""
+    if created and instance.trigger_type == 'scheduled':
+        instance.event_definition.advance_next_run(instance.scheduled_at)
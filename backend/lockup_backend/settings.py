@@ -69,6 +69,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # 可选的热点路径性能采集，未开启 INSTRUMENTATION_ENABLED 时自动移除
+    'utils.instrumentation.InstrumentationMiddleware',
 ]
 
 ROOT_URLCONF = 'lockup_backend.urls'
@@ -191,7 +193,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -203,6 +205,9 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Token -> user snapshot cache for read-only API requests (seconds, 0 disables)
+AUTH_TOKEN_CACHE_SECONDS = int(os.getenv('AUTH_TOKEN_CACHE_SECONDS', '30'))
+
 # CORS settings
 CORS_ALLOWED_ORIGINS_ENV = os.getenv('CORS_ALLOWED_ORIGINS', '')
 if CORS_ALLOWED_ORIGINS_ENV:
@@ -305,6 +310,14 @@ else:
     # Production environment - automatically use production domain
     FRONTEND_URL = os.getenv('FRONTEND_URL', 'https://lock-up.zheermao.top')
 
+# Strict mode verification codes
+# - stored: random code saved on the task and rotated daily (default)
+# - derived: HMAC of task ID + daily window, computed on read; daily rotation writes nothing
+STRICT_CODE_MODE = os.getenv('STRICT_CODE_MODE', 'stored')
+STRICT_CODE_SECRET = os.getenv('STRICT_CODE_SECRET', SECRET_KEY)
+# Record a timeline event per task when the derived code rolls over (one bulk insert)
+STRICT_CODE_AUDIT_EVENTS = os.getenv('STRICT_CODE_AUDIT_EVENTS', 'False').lower() == 'true'
+
 # Production Security Settings (only if not in DEBUG mode)
 if not DEBUG:
     # SSL/HTTPS Settings
@@ -359,6 +372,9 @@ CELERY_TASK_REJECT_ON_WORKER_LOST = True
 CELERY_TASK_RETRY_DELAY = 60        # 1 minute base retry delay
 CELERY_TASK_MAX_RETRIES = 3         # Maximum retry attempts
 
+# Event scheduler: interval events are pre-created this many minutes ahead
+EVENT_SCHEDULE_LOOKAHEAD_MINUTES = int(os.getenv('EVENT_SCHEDULE_LOOKAHEAD_MINUTES', '10'))
+
 # Celery Result settings
 CELERY_RESULT_EXPIRES = 3600  # 1 hour
 
@@ -540,3 +556,28 @@ else:
             'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         }
     }
+
+# Activity write-behind buffer: update_activity records deltas in the cache and
+# flush_activity_buffer writes them in bulk every few seconds. Defaults to on only
+# with Redis, since a locmem buffer is per-process and invisible to the worker.
+ACTIVITY_WRITE_BEHIND = os.getenv('ACTIVITY_WRITE_BEHIND', 'True' if REDIS_URL else 'False').lower() == 'true'
+ACTIVITY_FLUSH_INTERVAL_SECONDS = int(os.getenv('ACTIVITY_FLUSH_INTERVAL_SECONDS', '5'))
+
+# Job-run metrics: batch Celery tasks record counts, durations, failures and a
+# bounded sample of items per run in tasks.JobRun instead of returning per-item lists.
+JOB_RUN_SAMPLE_SIZE = int(os.getenv('JOB_RUN_SAMPLE_SIZE', '20'))
+JOB_RUN_RETENTION_DAYS = int(os.getenv('JOB_RUN_RETENTION_DAYS', '14'))
+
+# Hot-path instrumentation (opt-in): per-request and per-Celery-task wall time,
+# DB query count/time and cache hit ratio, kept in a rolling in-memory histogram
+# (last INSTRUMENTATION_WINDOW samples per URL name / task name) and served by
+# /api/metrics/ to staff users.
+INSTRUMENTATION_ENABLED = os.getenv('INSTRUMENTATION_ENABLED', 'False').lower() == 'true'
+INSTRUMENTATION_WINDOW = int(os.getenv('INSTRUMENTATION_WINDOW', '500'))
+INSTRUMENTATION_PUBLISH_SECONDS = int(os.getenv('INSTRUMENTATION_PUBLISH_SECONDS', '30'))
+
+# Timeline read model: timeline events older than TIMELINE_SETTLE_SECONDS are folded
+# into pre-rendered tasks.TaskTimelineEntry rows on read (runs of hourly rewards become
+# one segment of at most TIMELINE_SEGMENT_MAX_HOURS); newer events are rendered live.
+TIMELINE_SETTLE_SECONDS = int(os.getenv('TIMELINE_SETTLE_SECONDS', '600'))
+TIMELINE_SEGMENT_MAX_HOURS = int(os.getenv('TIMELINE_SEGMENT_MAX_HOURS', '24'))
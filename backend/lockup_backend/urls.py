@@ -19,6 +19,8 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from utils.views import instrumentation_metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
 
@@ -29,6 +31,7 @@ urlpatterns = [
     path('api/store/', include('store.urls')),  # 商店和游戏功能
     path('api/telegram/', include('telegram_bot.urls')),  # Telegram Bot 功能
     path('api/game/', include('phantom_city.urls')),  # 幻城游戏
+    path('api/metrics/', instrumentation_metrics, name='instrumentation-metrics'),  # 性能采集指标
 ]
 
 # 提供媒体文件访问（开发环境和生产环境）
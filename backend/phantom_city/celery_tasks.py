@@ -126,34 +126,36 @@ def decay_depilation_charge():
 
 @shared_task(name='phantom_city.expire_control_transfers')
 def expire_control_transfers():
-    """每10分钟：到期控制权撤销"""
+    """每10分钟：到期控制权撤销（集合更新 + 批量通知）"""
+    from django.db import transaction
     from .models import GameControlTransfer
-    from users.models import Notification
+    from .services import _notify_game_bulk
 
     now = timezone.now()
-    expired = GameControlTransfer.objects.filter(
-        is_active=True,
-        expires_at__lte=now,
-    )
-
-    count = 0
-    for transfer in expired:
-        transfer.is_active = False
-        transfer.revoked_at = now
-        transfer.revoked_reason = 'expired'
-        transfer.save(update_fields=['is_active', 'revoked_at', 'revoked_reason'])
-        count += 1
-
-        # 通知受让方
-        try:
-            Notification.create_notification(
-                recipient=transfer.grantee,
-                notification_type='game_control_transfer_expired',
-                title='锁控制权到期',
-                message=f'你对 {transfer.grantor.username} 锁的控制权已到期。',
-            )
-        except Exception as e:
-            logger.warning(f'发送控制权到期通知失败: {e}')
+    with transaction.atomic():
+        rows = list(
+            GameControlTransfer.objects.select_for_update(skip_locked=True)
+            .filter(is_active=True, expires_at__lte=now)
+            .values_list('id', 'grantee_id', 'grantor__username')
+        )
+        if not rows:
+            logger.info('控制权到期处理完成，共撤销 0 条记录')
+            return 0
+
+        count = GameControlTransfer.objects.filter(
+            id__in=[row[0] for row in rows], is_active=True,
+        ).update(is_active=False, revoked_at=now, revoked_reason='expired')
+
+    # 通知受让方
+    _notify_game_bulk([
+        {
+            'recipient_id': grantee_id,
+            'notification_type': 'game_control_transfer_expired',
+            'title': '锁控制权到期',
+            'message': f'你对 {grantor_username} 锁的控制权已到期。',
+        }
+        for _, grantee_id, grantor_username in rows
+    ])
 
     logger.info(f'控制权到期处理完成，共撤销 {count} 条记录')
     return count
@@ -162,23 +164,15 @@ def expire_control_transfers():
 @shared_task(name='phantom_city.process_detention_releases')
 def process_detention_releases():
     """每5分钟：到期收押自动释放"""
-    from .models import DetentionRecord
     from .services import DetentionService
 
-    now = timezone.now()
-    expired_detentions = DetentionRecord.objects.filter(
-        status='active',
-        release_at__lte=now,
-    )
-
-    count = 0
-    for detention in expired_detentions:
-        try:
-            DetentionService.release(detention, reason='released_timeout')
-            count += 1
-        except Exception as e:
-            logger.error(f'释放收押 {detention.id} 失败: {e}')
+    try:
+        released_ids = DetentionService.release_expired(reason='released_timeout')
+    except Exception as e:
+        logger.error(f'批量释放收押失败: {e}')
+        return 0
 
+    count = len(released_ids)
     logger.info(f'收押到期释放完成，共释放 {count} 名囚犯')
     return count
 
@@ -227,8 +221,9 @@ def respawn_crystals():
 def recalculate_market_rates():
     """每6小时：根据供需重算市场价格"""
     from .services import CrystalService
-    CrystalService.recalculate_market_rates()
+    updated = CrystalService.recalculate_market_rates()
     logger.info('市场价格重算完成')
+    return updated
 
 
 @shared_task(name='phantom_city.generate_checkpoint_npcs')
@@ -253,19 +248,16 @@ def generate_checkpoint_npcs():
 
 @shared_task(name='phantom_city.cleanup_expired_channels')
 def cleanup_expired_channels():
-    """每2小时：清理已结束的加密频道消息"""
+    """每2小时：清理已结束的加密频道消息（单条 __in 删除）"""
     from .models import EncryptedChannel, EncryptedMessage
 
     cutoff = timezone.now() - timedelta(hours=24)
     closed_channels = EncryptedChannel.objects.filter(
         is_active=False,
         closed_at__lte=cutoff,
-    )
+    ).values('id')
 
-    count = 0
-    for channel in closed_channels:
-        deleted, _ = EncryptedMessage.objects.filter(channel=channel).delete()
-        count += deleted
+    count, _ = EncryptedMessage.objects.filter(channel_id__in=closed_channels).delete()
 
     logger.info(f'加密频道清理完成，共删除 {count} 条消息')
     return count
@@ -273,19 +265,13 @@ def cleanup_expired_channels():
 
 @shared_task(name='phantom_city.reset_inspection_tokens')
 def reset_inspection_tokens():
-    """每天午夜：重置小s配额"""
+    """每天午夜：重置小s配额（单条 UPDATE）"""
     from .models import PatrolProfile
-    from django.utils import timezone
 
     today = timezone.now().date()
-    profiles = PatrolProfile.objects.exclude(inspection_tokens_last_reset=today)
-    count = 0
-
-    for profile in profiles:
-        profile.inspection_tokens = 10
-        profile.inspection_tokens_last_reset = today
-        profile.save(update_fields=['inspection_tokens', 'inspection_tokens_last_reset'])
-        count += 1
+    count = PatrolProfile.objects.exclude(
+        inspection_tokens_last_reset=today
+    ).update(inspection_tokens=10, inspection_tokens_last_reset=today)
 
     logger.info(f'配额重置完成，共重置 {count} 个档案')
     return count
@@ -6,6 +6,8 @@ import logging
 from datetime import timedelta
 from django.utils import timezone
 from django.db import transaction
+from django.db.models import F, IntegerField, Value
+from django.db.models.functions import Cast, Floor, Greatest
 from django.conf import settings
 
 from .models import (
@@ -805,6 +807,61 @@ class DetentionService:
             f'你已从禁闭室获释，回到了闺房。',
         )
 
+    @classmethod
+    @transaction.atomic
+    def release_expired(cls, now=None, reason='released_timeout'):
+        """批量释放所有到期收押（Celery任务调用）
+
+        锁定并收集到期记录的ID后，以少量集合更新完成释放、撤销控制权、
+        移回闺房，通知在事务提交后一次性批量写入。返回被释放的收押记录ID列表。
+        """
+        now = now or timezone.now()
+        rows = list(
+            DetentionRecord.objects.select_for_update(skip_locked=True)
+            .filter(status='active', release_at__lte=now)
+            .values_list('id', 'prisoner_id', 'control_transfer_id')
+        )
+        if not rows:
+            return []
+
+        detention_ids = [row[0] for row in rows]
+        prisoner_ids = list({row[1] for row in rows})
+        transfer_ids = [row[2] for row in rows if row[2]]
+
+        DetentionRecord.objects.filter(
+            id__in=detention_ids, status='active'
+        ).update(status=reason, released_at=now)
+
+        if transfer_ids:
+            GameControlTransfer.objects.filter(id__in=transfer_ids).update(
+                is_active=False, revoked_at=now, revoked_reason=reason,
+            )
+
+        # 将囚犯移回闺房
+        salon_zone = GameZone.objects.filter(name='salon').first()
+        if salon_zone:
+            PlayerZonePresence.objects.filter(
+                user_id__in=prisoner_ids, exited_at__isnull=True
+            ).update(exited_at=now)
+            PlayerZonePresence.objects.bulk_create([
+                PlayerZonePresence(user_id=prisoner_id, zone=salon_zone)
+                for prisoner_id in prisoner_ids
+            ])
+
+        # 通知在事务提交后写入，通知失败不会影响（或中断）释放事务
+        notifications = [
+            {
+                'recipient_id': prisoner_id,
+                'notification_type': 'game_detention_released',
+                'title': '收押解除',
+                'message': '你已从禁闭室获释，回到了闺房。',
+            }
+            for prisoner_id in prisoner_ids
+        ]
+        transaction.on_commit(lambda: _notify_game_bulk(notifications))
+
+        return detention_ids
+
 
 # ─────────────────────────────────────────────
 # TransactionService — 灰色市场交易
@@ -1293,20 +1350,22 @@ class CrystalService:
 
     @classmethod
     def recalculate_market_rates(cls):
-        """根据供需重算市场价格（Celery任务调用）"""
-        rates = GameMarketRate.objects.all()
-        for rate in rates:
-            # 供需压力影响价格
-            demand = rate.demand_pressure
-            new_price = int(rate.base_price_crystals * demand)
-            new_price = max(1, new_price)  # 最低1刀具
+        """根据供需重算市场价格（Celery任务调用）
 
-            rate.current_price_crystals = new_price
-            # 重置交易量
-            rate.units_traded_last_period = 0
-            rate.save(update_fields=['current_price_crystals', 'units_traded_last_period'])
+        单条 UPDATE 完成全部定价：价格 = floor(基准价 × 供需压力)，最低1刀具，
+        同时重置交易量。
+        """
+        updated = GameMarketRate.objects.update(
+            current_price_crystals=Greatest(
+                Cast(Floor(F('base_price_crystals') * F('demand_pressure')), IntegerField()),
+                Value(1),
+            ),
+            units_traded_last_period=0,
+            last_recalculated_at=timezone.now(),
+        )
 
-        logger.info(f'市场价格已重算，共更新 {rates.count()} 条记录')
+        logger.info(f'市场价格已重算，共更新 {updated} 条记录')
+        return updated
 
 
 # ─────────────────────────────────────────────
@@ -2180,6 +2239,18 @@ def _notify_game(recipient, notification_type, title, message, actor=None, prior
         logger.warning(f'发送通知失败: {e}')
 
 
+def _notify_game_bulk(entries):
+    """批量发送游戏通知，entries 参数同 Notification.bulk_create_notifications"""
+    if not entries:
+        return []
+    try:
+        from users.models import Notification
+        return Notification.bulk_create_notifications(entries)
+    except Exception as e:
+        logger.warning(f'批量发送通知失败: {e}')
+        return []
+
+
 def _send_zone_system_message(user, content):
     """向用户当前区域发送系统消息"""
     presence = PlayerZonePresence.objects.filter(
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:51
+
+from django.db import migrations, models
+from django.db.models import IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def _current_crown_weights(apps):
+    """Vote multipliers of the currently active influence crowns (latest crown wins)."""
+    UserEffect = apps.get_model('store', 'UserEffect')
+    now = timezone.now()
+    crowns = UserEffect.objects.filter(
+        Q(expires_at__isnull=True) | Q(expires_at__gt=now),
+        effect_type='influence_crown',
+        is_active=True
+    ).order_by('created_at').values_list('user_id', 'properties')
+    return {user_id: int((properties or {}).get('vote_multiplier', 3)) for user_id, properties in crowns}
+
+
+def _weighted_sum(model, parent_field, outer_field='pk', **filters):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{parent_field: OuterRef(outer_field)}, **filters).order_by().values(parent_field).annotate(
+                total=Sum('weight')
+            ).values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def backfill_checkin_vote_tallies(apps, schema_editor):
+    """Freeze existing vote weights from the voters' current crowns (what reads used before) and derive the tallies."""
+    CheckinVote = apps.get_model('posts', 'CheckinVote')
+    CheckinVotingSession = apps.get_model('posts', 'CheckinVotingSession')
+
+    CheckinVote.objects.update(weight=1)
+    for user_id, weight in _current_crown_weights(apps).items():
+        CheckinVote.objects.filter(voter_id=user_id).update(weight=weight)
+
+    CheckinVotingSession.objects.filter(post_id__in=CheckinVote.objects.values('post_id')).update(
+        weighted_pass_votes=_weighted_sum(CheckinVote, 'post', 'post', vote_type='pass'),
+        weighted_reject_votes=_weighted_sum(CheckinVote, 'post', 'post', vote_type='reject')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_alter_comment_content_alter_post_content'),
+        ('store', '0017_game_player_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checkinvote',
+            name='weight',
+            field=models.PositiveIntegerField(blank=True, null=True, help_text='投票权重（创建时按影响力皇冠效果固定）'),
+        ),
+        migrations.AddField(
+            model_name='checkinvotingsession',
+            name='weighted_pass_votes',
+            field=models.PositiveIntegerField(default=0, help_text='加权通过票数（投票时原子累加）'),
+        ),
+        migrations.AddField(
+            model_name='checkinvotingsession',
+            name='weighted_reject_votes',
+            field=models.PositiveIntegerField(default=0, help_text='加权拒绝票数（投票时原子累加）'),
+        ),
+        migrations.RunPython(backfill_checkin_vote_tallies, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
@@ -430,6 +431,11 @@ class CheckinVote(models.Model):
         default=5,
         help_text='投票花费的积分'
     )
+    weight = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text='投票权重（创建时按影响力皇冠效果固定）'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -442,6 +448,21 @@ class CheckinVote(models.Model):
     def __str__(self):
         return f"{self.voter.username} voted {self.get_vote_type_display()} on post {self.post.id}"
 
+    def save(self, *args, **kwargs):
+        """新投票固定投票权重，并在同一事务内原子累加投票会话的加权票数"""
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+
+        if self.weight is None:
+            from store.active_effects import get_active_effects
+            self.weight = get_active_effects(self.voter_id).vote_weight
+        tally_field = 'weighted_pass_votes' if self.vote_type == 'pass' else 'weighted_reject_votes'
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            CheckinVotingSession.objects.filter(post_id=self.post_id).update(
+                **{tally_field: F(tally_field) + self.weight}
+            )
+
 
 class CheckinVotingSession(models.Model):
     """打卡动态投票会话"""
@@ -461,6 +482,8 @@ class CheckinVotingSession(models.Model):
     )
     voting_deadline = models.DateTimeField(help_text='投票截止时间（次日凌晨4点）')
     total_coins_collected = models.IntegerField(default=0, help_text='收集的总积分')
+    weighted_pass_votes = models.PositiveIntegerField(default=0, help_text='加权通过票数（投票时原子累加）')
+    weighted_reject_votes = models.PositiveIntegerField(default=0, help_text='加权拒绝票数（投票时原子累加）')
     is_processed = models.BooleanField(default=False, help_text='是否已处理投票结果')
     result = models.CharField(
         max_length=20,
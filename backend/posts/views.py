@@ -1,12 +1,12 @@
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from django.db.models import Q
+from django.db.models import F, Q
 from django.utils import timezone
 from datetime import timedelta
 from django.shortcuts import get_object_or_404
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
-from django.db import transaction
+from django.db import IntegrityError, transaction
 import logging
 from .models import Post, PostLike, Comment, CommentLike, CheckinVote, CheckinVotingSession
 from .serializers import (
@@ -16,6 +16,7 @@ from .serializers import (
 )
 from users.models import Notification
 from tasks.models import LockTask
+from tasks.strict_codes import get_strict_code, is_derived_mode
 from tasks.pagination import DynamicPageNumberPagination
 
 logger = logging.getLogger(__name__)
@@ -173,10 +174,11 @@ class PostListCreateView(generics.ListCreateAPIView):
                 strict_mode=True
             ).first()
 
-            if active_strict_task and active_strict_task.strict_code:
+            strict_code = get_strict_code(active_strict_task) if active_strict_task else None
+            if strict_code:
                 # 在内容末尾添加验证码
                 current_content = data.get('content', '')
-                data['content'] = f"{current_content}\n\n验证码：{active_strict_task.strict_code}"
+                data['content'] = f"{current_content}\n\n验证码：{strict_code}"
 
         return data
 
@@ -272,6 +274,10 @@ class PostListCreateView(generics.ListCreateAPIView):
         """更新用户的严格模式任务验证码"""
         from tasks.models import LockTask, TaskTimelineEvent
 
+        # 推导验证码按日期窗口自动轮换，首次打卡无需写回任务
+        if is_derived_mode():
+            return
+
         try:
             # 获取用户的所有活跃严格模式任务
             strict_tasks = LockTask.objects.filter(
@@ -863,25 +869,34 @@ def vote_checkin_post(request, pk):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    # 扣除用户积分
-    request.user.deduct_coins(
-        amount=5,
-        change_type='checkin_vote',
-        description='打卡投票消耗',
-        metadata={'post_id': str(post.id)}
-    )
+    try:
+        with transaction.atomic():
+            # 扣除用户积分
+            request.user.deduct_coins(
+                amount=5,
+                change_type='checkin_vote',
+                description='打卡投票消耗',
+                metadata={'post_id': str(post.id)}
+            )
 
-    # 创建投票记录
-    vote = CheckinVote.objects.create(
-        post=post,
-        voter=request.user,
-        vote_type=vote_type,
-        coins_spent=5
-    )
+            # 创建投票记录（投票权重在创建时固定，并原子累加到投票会话的加权票数）
+            vote = CheckinVote.objects.create(
+                post=post,
+                voter=request.user,
+                vote_type=vote_type,
+                coins_spent=5
+            )
 
-    # 更新投票会话的积分总数
-    voting_session.total_coins_collected += 5
-    voting_session.save(update_fields=['total_coins_collected'])
+            # 原子累加投票会话的积分总数
+            CheckinVotingSession.objects.filter(pk=voting_session.pk).update(
+                total_coins_collected=F('total_coins_collected') + 5
+            )
+    except IntegrityError:
+        return Response(
+            {'error': '您已经对该动态投过票了'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    voting_session.refresh_from_db(fields=['total_coins_collected'])
 
     # 创建投票通知给动态作者
     Notification.create_notification(
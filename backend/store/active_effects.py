@@ -0,0 +1,182 @@
+"""
+用户活跃效果解析
+
+统一读取一个或一批用户当前生效的效果：道具效果（UserEffect：幸运符、活力药水、
+影响力皇冠等）与活动效果（UserCoinsMultiplier、UserGameEffect），返回不可变快照。
+
+快照按用户缓存，TTL 不超过其中最早到期效果的剩余时间，因此效果到期后不会读到
+旧快照；效果记录保存或删除时由信号清除缓存（见 store.signals / events.signals）。
+请求路径使用 get_active_effects，Celery 批量任务使用 get_active_effects_bulk，
+一批用户只需三次查询。
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+ACTIVE_EFFECTS_CACHE_TTL = 300  # 秒
+
+
+@dataclass(frozen=True)
+class EffectSnapshot:
+    """单个道具效果（只读）"""
+    id: str
+    effect_type: str
+    properties: dict
+    expires_at: datetime | None
+
+
+@dataclass(frozen=True)
+class ActiveEffects:
+    """用户在某一时刻生效的全部效果"""
+    user_id: int
+    computed_at: datetime
+    effects: tuple = ()
+    coins_multiplier: float = 1.0
+    game_multiplier: float = 1.0
+    valid_until: datetime | None = None
+
+    def get(self, effect_type):
+        """返回指定类型最新创建的生效效果，没有则返回 None"""
+        for effect in self.effects:
+            if effect.effect_type == effect_type:
+                return effect
+        return None
+
+    def has(self, effect_type):
+        return self.get(effect_type) is not None
+
+    def get_property(self, effect_type, key, default=None):
+        effect = self.get(effect_type)
+        if effect is None:
+            return default
+        return effect.properties.get(key, default)
+
+    @property
+    def vote_weight(self):
+        """投票权重：影响力皇冠生效时为其倍数（默认3倍），否则为1"""
+        crown = self.get('influence_crown')
+        if crown is None:
+            return 1
+        return int(crown.properties.get('vote_multiplier', 3))
+
+    def is_fresh(self, now):
+        """快照在 now 时刻是否仍然准确"""
+        if now < self.computed_at:
+            return False
+        return self.valid_until is None or now < self.valid_until
+
+
+def _cache_key(user_id):
+    return f'active_effects:{user_id}'
+
+
+def _user_id(user):
+    return getattr(user, 'pk', user)
+
+
+def invalidate_active_effects(*user_ids):
+    """
+    清除用户活跃效果缓存（效果创建、失效、删除时调用）
+
+    立即清除一次，并在事务提交后再清除一次，避免其他连接在提交前
+    读到旧数据并写回缓存。
+    """
+    if not user_ids:
+        return
+    keys = [_cache_key(user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_active_effects(user, now=None):
+    """获取单个用户的活跃效果快照"""
+    user_id = _user_id(user)
+    return get_active_effects_bulk([user_id], now=now)[user_id]
+
+
+def get_active_effects_bulk(users, now=None):
+    """
+    批量获取用户活跃效果快照
+
+    Args:
+        users: 用户实例或用户ID的可迭代对象
+        now: 判定时刻，默认当前时间
+
+    Returns:
+        dict: {user_id: ActiveEffects}
+    """
+    now = now or timezone.now()
+    user_ids = list(dict.fromkeys(_user_id(user) for user in users))
+    if not user_ids:
+        return {}
+
+    cached = cache.get_many([_cache_key(user_id) for user_id in user_ids])
+    snapshots = {}
+    missing = []
+    for user_id in user_ids:
+        snapshot = cached.get(_cache_key(user_id))
+        if snapshot is not None and snapshot.is_fresh(now):
+            snapshots[user_id] = snapshot
+        else:
+            missing.append(user_id)
+
+    if missing:
+        for user_id, snapshot in _load_active_effects(missing, now).items():
+            snapshots[user_id] = snapshot
+            ttl = ACTIVE_EFFECTS_CACHE_TTL
+            if snapshot.valid_until is not None:
+                ttl = min(ttl, int((snapshot.valid_until - now).total_seconds()))
+            if ttl > 0:
+                cache.set(_cache_key(user_id), snapshot, ttl)
+
+    return snapshots
+
+
+def _load_active_effects(user_ids, now):
+    """从数据库加载一批用户的活跃效果（三次查询）"""
+    from events.models import UserCoinsMultiplier, UserGameEffect
+    from store.models import UserEffect
+
+    effects = {user_id: [] for user_id in user_ids}
+    expiries = {user_id: [] for user_id in user_ids}
+    coins_multipliers = {}
+    game_multipliers = {}
+
+    item_effects = UserEffect.objects.filter(
+        Q(expires_at__isnull=True) | Q(expires_at__gt=now),
+        user_id__in=user_ids,
+        is_active=True
+    ).order_by('-created_at').values_list('id', 'user_id', 'effect_type', 'properties', 'expires_at')
+    for effect_id, user_id, effect_type, properties, expires_at in item_effects:
+        effects[user_id].append(EffectSnapshot(str(effect_id), effect_type, properties or {}, expires_at))
+        if expires_at:
+            expiries[user_id].append(expires_at)
+
+    # 多个同类活动效果同时生效时，以最新创建的为准
+    for model, target in ((UserCoinsMultiplier, coins_multipliers), (UserGameEffect, game_multipliers)):
+        rows = model.objects.filter(
+            user_id__in=user_ids,
+            is_active=True,
+            expires_at__gt=now
+        ).order_by('-created_at').values_list('user_id', 'multiplier', 'expires_at')
+        for user_id, multiplier, expires_at in rows:
+            if user_id not in target:
+                target[user_id] = multiplier
+                expiries[user_id].append(expires_at)
+
+    return {
+        user_id: ActiveEffects(
+            user_id=user_id,
+            computed_at=now,
+            effects=tuple(effects[user_id]),
+            coins_multiplier=coins_multipliers.get(user_id, 1.0),
+            game_multiplier=game_multipliers.get(user_id, 1.0),
+            valid_until=min(expiries[user_id]) if expiries[user_id] else None,
+        )
+        for user_id in user_ids
+    }
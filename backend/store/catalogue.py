@@ -0,0 +1,135 @@
+"""
+商店目录缓存
+
+商品目录（StoreItem + ItemType）变化很少，却在每次打开商店时都被重新查询和
+序列化。这里把序列化后的目录按版本号缓存：商品或道具类型被修改时
+（store.signals）、或有限库存被扣减时递增版本号，旧版本的缓存自然过期。
+
+按用户等级的可购买过滤在内存中完成；响应带 ETag / Last-Modified，
+客户端携带 If-None-Match / If-Modified-Since 时目录未变化则返回 304。
+"""
+
+import hashlib
+import json
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+CATALOGUE_VERSION_KEY = 'store_catalogue:version'
+CATALOGUE_CACHE_TTL = 60 * 60 * 24  # 秒
+
+# 可探索区域（静态目录）
+EXPLORATION_ZONES = (
+    {
+        'name': 'forest',
+        'display_name': '神秘森林',
+        'description': '古老的森林，充满了未知的秘密',
+        'difficulty': 'normal'
+    },
+    {
+        'name': 'mountain',
+        'display_name': '雾山',
+        'description': '云雾缭绕的高山，隐藏着珍贵的宝物',
+        'difficulty': 'hard'
+    },
+    {
+        'name': 'beach',
+        'display_name': '月光海滩',
+        'description': '月光下的海滩，经常有意外收获',
+        'difficulty': 'easy'
+    },
+    {
+        'name': 'desert',
+        'display_name': '沙漠绿洲',
+        'description': '干燥的沙漠中的生命之源',
+        'difficulty': 'normal'
+    },
+    {
+        'name': 'cave',
+        'display_name': '深邃洞穴',
+        'description': '黑暗的洞穴深处藏着最珍贵的财宝',
+        'difficulty': 'hard'
+    },
+)
+
+
+def _new_version():
+    return {'version': uuid.uuid4().hex[:12], 'updated_at': timezone.now()}
+
+
+def get_catalogue_version():
+    """当前目录版本 {'version', 'updated_at'}，不存在时初始化"""
+    version = cache.get(CATALOGUE_VERSION_KEY)
+    if version is None:
+        version = _new_version()
+        if not cache.add(CATALOGUE_VERSION_KEY, version, None):
+            version = cache.get(CATALOGUE_VERSION_KEY) or version
+    return version
+
+
+def invalidate_store_catalogue():
+    """递增目录版本（商品、道具类型或有限库存变化时调用，事务提交后再递增一次）"""
+    cache.set(CATALOGUE_VERSION_KEY, _new_version(), None)
+    transaction.on_commit(lambda: cache.set(CATALOGUE_VERSION_KEY, _new_version(), None))
+
+
+def get_store_catalogue():
+    """
+    获取当前版本的商品目录
+
+    Returns:
+        dict: {'version', 'updated_at', 'items': [序列化后的在售商品]}
+    """
+    version = get_catalogue_version()
+    key = f"store_catalogue:{version['version']}"
+    catalogue = cache.get(key)
+    if catalogue is None:
+        from .models import StoreItem
+        from .serializers import StoreItemSerializer
+
+        store_items = StoreItem.objects.filter(is_available=True).select_related('item_type')
+        catalogue = {
+            'version': version['version'],
+            'updated_at': version['updated_at'],
+            'items': StoreItemSerializer(store_items, many=True).data,
+        }
+        cache.set(key, catalogue, CATALOGUE_CACHE_TTL)
+    return catalogue
+
+
+def get_catalogue_for_user(user, catalogue=None):
+    """按用户等级过滤目录中的可购买商品（内存中完成）"""
+    catalogue = catalogue or get_store_catalogue()
+    level = getattr(user, 'level', None)
+    if level is None:
+        return list(catalogue['items'])
+    return [item for item in catalogue['items'] if item['level_requirement'] <= level]
+
+
+def conditional_response(request, data, etag, last_modified=None, status_code=200):
+    """
+    生成带 ETag / Last-Modified 的响应；条件请求命中时返回 304
+
+    Args:
+        etag: 不带引号的 ETag 值
+        last_modified: datetime，可选
+    """
+    etag = f'"{etag}"'
+    last_modified_ts = int(last_modified.timestamp()) if last_modified else None
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+    response = not_modified or Response(data, status=status_code)
+    response['ETag'] = etag
+    if last_modified_ts is not None:
+        response['Last-Modified'] = http_date(last_modified_ts)
+    return response
+
+
+def payload_etag(data):
+    """按响应内容计算 ETag（用于含用户状态、无法用版本号表达的响应）"""
+    body = json.dumps(data, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.md5(body.encode('utf-8')).hexdigest()
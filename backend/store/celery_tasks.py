@@ -0,0 +1,29 @@
+"""
+Store Celery Tasks
+
+商店小游戏的异步结算：满员的游戏在加入事务提交后提交到 settlements 队列。
+"""
+
+import logging
+
+from celery import shared_task
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def settle_game(self, game_id):
+    """结算一局满员的小游戏（已结算或不存在的游戏直接跳过）"""
+    from store.services.games import GameSettlementService
+
+    try:
+        result = GameSettlementService.settle(game_id)
+        return {
+            'status': 'success' if result is not None else 'skipped',
+            'game_id': game_id,
+            'result': result
+        }
+
+    except Exception as exc:
+        logger.error(f"Game settlement failed for {game_id}: {exc}", exc_info=True)
+        raise self.retry(exc=exc, countdown=min(30 * (2 ** self.request.retries), 300))
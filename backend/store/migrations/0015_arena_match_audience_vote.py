@@ -0,0 +1,111 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+def backfill_arena_tables(apps, schema_editor):
+    """
+    Move arena audience/votes out of Game.game_data into the dedicated tables.
+    """
+    Game = apps.get_model('store', 'Game')
+    GameParticipant = apps.get_model('store', 'GameParticipant')
+    ArenaMatch = apps.get_model('store', 'ArenaMatch')
+    ArenaAudience = apps.get_model('store', 'ArenaAudience')
+    ArenaVote = apps.get_model('store', 'ArenaVote')
+
+    for game in Game.objects.filter(game_type='arena').iterator():
+        data = game.game_data or {}
+        config = data.get('config', {})
+        audience_list = data.get('audience', [])
+        votes = data.get('votes', {})
+
+        challenger_id = None
+        for participant in GameParticipant.objects.filter(game=game):
+            if (participant.action or {}).get('role') == 'challenger':
+                challenger_id = participant.user_id
+                break
+
+        deadline = parse_datetime(config.get('deadline') or '') or timezone.now()
+        ticket_price = config.get('audience_ticket_price', 5)
+
+        ArenaMatch.objects.create(
+            game=game,
+            challenger_id=challenger_id,
+            audience_ticket_price=ticket_price,
+            max_audience=max(config.get('max_audience', 20), len(audience_list)),
+            winner_reward_percentage=config.get('winner_reward_percentage', 80),
+            deadline=deadline,
+            audience_count=len(audience_list),
+            voted_count=sum(1 for a in audience_list if a.get('has_voted')),
+            creator_votes=votes.get('creator', 0),
+            challenger_votes=votes.get('challenger', 0),
+        )
+        ArenaAudience.objects.bulk_create([
+            ArenaAudience(game=game, user_id=a['user_id'], ticket_price=ticket_price)
+            for a in audience_list
+        ], ignore_conflicts=True)
+        ArenaVote.objects.bulk_create([
+            ArenaVote(game=game, voter_id=a['user_id'], vote_for=a['vote_for'])
+            for a in audience_list
+            if a.get('has_voted') and a.get('vote_for') in ('creator', 'challenger')
+        ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_add_arena_game_type'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArenaAudience',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticket_price', models.IntegerField()),
+                ('joined_at', models.DateTimeField(auto_now_add=True)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='arena_audience', to='store.game')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='arena_seats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('game', 'user'), name='unique_arena_audience')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArenaMatch',
+            fields=[
+                ('game', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='arena_match', serialize=False, to='store.game')),
+                ('audience_ticket_price', models.IntegerField(default=5)),
+                ('max_audience', models.IntegerField(default=20)),
+                ('winner_reward_percentage', models.IntegerField(default=80)),
+                ('deadline', models.DateTimeField()),
+                ('audience_count', models.IntegerField(default=0)),
+                ('voted_count', models.IntegerField(default=0)),
+                ('creator_votes', models.IntegerField(default=0)),
+                ('challenger_votes', models.IntegerField(default=0)),
+                ('challenger', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='arena_challenges', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.CheckConstraint(condition=models.Q(('audience_count__lte', models.F('max_audience'))), name='arena_audience_within_capacity')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArenaVote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vote_for', models.CharField(choices=[('creator', '发起者'), ('challenger', '挑战者')], max_length=20)),
+                ('voted_at', models.DateTimeField(auto_now_add=True)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='arena_votes', to='store.game')),
+                ('voter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='arena_votes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('game', 'voter'), name='unique_arena_vote')],
+            },
+        ),
+        migrations.RunPython(backfill_arena_tables, migrations.RunPython.noop),
+    ]
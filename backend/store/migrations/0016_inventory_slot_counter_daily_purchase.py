@@ -0,0 +1,68 @@
+# Generated by Django 5.2.7 on 2026-10-19 03:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def backfill_counters(apps, schema_editor):
+    """
+    Initialise inventory slot counters from the current items and today's
+    daily purchase counters from today's purchases.
+    """
+    UserInventory = apps.get_model('store', 'UserInventory')
+    Item = apps.get_model('store', 'Item')
+    Purchase = apps.get_model('store', 'Purchase')
+    DailyPurchaseCounter = apps.get_model('store', 'DailyPurchaseCounter')
+
+    item_counts = Item.objects.filter(inventory=OuterRef('pk')).order_by().values('inventory').annotate(
+        total=Count('id')
+    ).values('total')
+    UserInventory.objects.update(
+        used_slot_count=Coalesce(Subquery(item_counts, output_field=IntegerField()), 0)
+    )
+
+    today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    today_counts = Purchase.objects.filter(
+        created_at__gte=today_start, store_item__daily_limit__isnull=False
+    ).values('user_id', 'store_item_id').annotate(total=Count('id'))
+    DailyPurchaseCounter.objects.bulk_create([
+        DailyPurchaseCounter(
+            user_id=row['user_id'], store_item_id=row['store_item_id'],
+            date=today_start.date(), count=row['total']
+        )
+        for row in today_counts
+    ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_arena_match_audience_vote'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userinventory',
+            name='used_slot_count',
+            field=models.PositiveIntegerField(default=0, help_text='已占用格数（由道具保存/删除信号维护）'),
+        ),
+        migrations.CreateModel(
+            name='DailyPurchaseCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('store_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_purchase_counters', to='store.storeitem')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_purchase_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'store_item', 'date'), name='unique_daily_purchase_counter')],
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:10
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_player_count(apps, schema_editor):
+    """Initialise the seat counter from the existing participants."""
+    Game = apps.get_model('store', 'Game')
+    GameParticipant = apps.get_model('store', 'GameParticipant')
+
+    participant_counts = GameParticipant.objects.filter(game=OuterRef('pk')).order_by().values('game').annotate(
+        total=Count('id')
+    ).values('total')
+    Game.objects.update(
+        player_count=Coalesce(Subquery(participant_counts, output_field=IntegerField()), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_inventory_slot_counter_daily_purchase'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='player_count',
+            field=models.PositiveIntegerField(default=0, help_text='已占用座位数（加入时条件递增）'),
+        ),
+        migrations.RunPython(backfill_player_count, migrations.RunPython.noop),
+    ]
@@ -44,20 +44,31 @@ class UserInventory(models.Model):
     """用户背包"""
 
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='inventory')
+    used_slot_count = models.PositiveIntegerField(default=0, help_text='已占用格数（由道具保存/删除信号维护）')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    @staticmethod
+    def max_slots_for_level(level):
+        """根据用户等级计算背包容量"""
+        slots_map = {1: 6, 2: 12, 3: 18, 4: 24}
+        return slots_map.get(min(level or 1, 4), 6)
+
     @property
     def max_slots(self):
         """根据用户等级计算背包容量"""
-        user_level = getattr(self.user, 'level', 1)
-        slots_map = {1: 6, 2: 12, 3: 18, 4: 24}
-        return slots_map.get(min(user_level, 4), 6)
+        return self.max_slots_for_level(getattr(self.user, 'level', 1))
 
     @property
     def used_slots(self):
         """已使用的背包格数"""
-        return self.items.count()
+        return self.used_slot_count
+
+    def recount_slots(self):
+        """按实际道具数量重新计算已占用格数（修复计数偏差）"""
+        self.used_slot_count = self.items.count()
+        UserInventory.objects.filter(pk=self.pk).update(used_slot_count=self.used_slot_count)
+        return self.used_slot_count
 
     @property
     def available_slots(self):
@@ -149,6 +160,23 @@ class Purchase(models.Model):
         return f"{self.user.username} 购买 {self.store_item.name}"
 
 
+class DailyPurchaseCounter(models.Model):
+    """用户每日购买计数（用于每日购买限制）"""
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_purchase_counters')
+    store_item = models.ForeignKey(StoreItem, on_delete=models.CASCADE, related_name='daily_purchase_counters')
+    date = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'store_item', 'date'], name='unique_daily_purchase_counter'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.store_item.name} {self.date}: {self.count}"
+
+
 class Game(models.Model):
     """游戏实例"""
 
@@ -175,6 +203,7 @@ class Game(models.Model):
     # 游戏参数
     bet_amount = models.IntegerField(default=1, help_text='下注积分')
     max_players = models.IntegerField(default=2)
+    player_count = models.PositiveIntegerField(default=0, help_text='已占用座位数（加入时条件递增）')
 
     # 游戏状态
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='waiting')
@@ -210,6 +239,91 @@ class GameParticipant(models.Model):
         return f"{self.user.username} in {self.game}"
 
 
+class ArenaMatch(models.Model):
+    """角斗场对局配置与计数器（观众数、票数以 F() 原子累加）"""
+
+    game = models.OneToOneField(Game, on_delete=models.CASCADE, primary_key=True, related_name='arena_match')
+    challenger = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='arena_challenges'
+    )
+
+    # 对局配置
+    audience_ticket_price = models.IntegerField(default=5)
+    max_audience = models.IntegerField(default=20)
+    winner_reward_percentage = models.IntegerField(default=80)
+    deadline = models.DateTimeField()
+
+    # 计数器
+    audience_count = models.IntegerField(default=0)
+    voted_count = models.IntegerField(default=0)
+    creator_votes = models.IntegerField(default=0)
+    challenger_votes = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(audience_count__lte=models.F('max_audience')),
+                name='arena_audience_within_capacity',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Arena {self.game_id}: {self.creator_votes} vs {self.challenger_votes}"
+
+    @property
+    def votes(self):
+        return {'creator': self.creator_votes, 'challenger': self.challenger_votes}
+
+    @property
+    def config(self):
+        return {
+            'audience_ticket_price': self.audience_ticket_price,
+            'max_audience': self.max_audience,
+            'deadline': self.deadline.isoformat(),
+            'winner_reward_percentage': self.winner_reward_percentage,
+        }
+
+
+class ArenaAudience(models.Model):
+    """角斗场观众席位"""
+
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='arena_audience')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='arena_seats')
+    ticket_price = models.IntegerField()
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['game', 'user'], name='unique_arena_audience'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} watching {self.game_id}"
+
+
+class ArenaVote(models.Model):
+    """角斗场观众投票（每位观众每局一票）"""
+
+    VOTE_CHOICES = [
+        ('creator', '发起者'),
+        ('challenger', '挑战者'),
+    ]
+
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='arena_votes')
+    voter = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='arena_votes')
+    vote_for = models.CharField(max_length=20, choices=VOTE_CHOICES)
+    voted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['game', 'voter'], name='unique_arena_vote'),
+        ]
+
+    def __str__(self):
+        return f"{self.voter.username} -> {self.vote_for} ({self.game_id})"
+
+
 class DriftBottle(models.Model):
     """漂流瓶"""
 
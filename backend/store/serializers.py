@@ -98,6 +98,7 @@ class GameSerializer(serializers.ModelSerializer):
     class Meta:
         model = Game
         fields = '__all__'
+        read_only_fields = ['player_count']
 
 
 class DriftBottleSerializer(serializers.ModelSerializer):
@@ -0,0 +1 @@
+# Store services package
\ No newline at end of file
@@ -0,0 +1,501 @@
+"""
+商店小游戏撮合与结算
+
+加入游戏时以条件 UPDATE 占座（player_count = player_count + 1 WHERE
+player_count < max_players AND status = 'waiting'），并发加入不会超出人数上限；
+满员的游戏转为 active 并在事务提交后交给 Celery 结算任务（store.celery_tasks.settle_game），
+最后一位加入者不必等待结算。结算在锁定游戏记录后进行，每局的积分变动
+通过积分账本一次批量记账，通知批量写入；客户端通过游戏状态接口获取结果。
+"""
+
+import logging
+import random
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import status
+
+from store.models import Game, GameParticipant, GameSession, Item, UserInventory
+from tasks.models import LockTask, TaskTimelineEvent
+from users.models import Notification
+from users.services.coins_ledger import CoinsLedgerService, InsufficientCoinsError
+
+logger = logging.getLogger(__name__)
+
+# 满员后超过该时间仍未结算的游戏，查询状态时重新提交结算
+SETTLEMENT_STALL_SECONDS = 60
+
+RPS_CHOICES = ('rock', 'paper', 'scissors')
+RPS_BEATS = {'rock': 'scissors', 'paper': 'rock', 'scissors': 'paper'}
+RPS_LOSER_PENALTY_MINUTES = 30
+
+
+class GameError(Exception):
+    """加入游戏失败（message 直接返回给用户）"""
+
+    def __init__(self, message, status_code=status.HTTP_400_BAD_REQUEST):
+        self.message = message
+        self.status_code = status_code
+        super().__init__(message)
+
+
+class GameMatchmakingService:
+    """小游戏撮合：校验、扣费、占座，满员后提交异步结算"""
+
+    @classmethod
+    def join(cls, user, game_id, action=None):
+        """
+        加入等待中的游戏
+
+        Returns:
+            dict: {'game', 'participants', 'max_participants', 'is_full'}
+
+        Raises:
+            GameError: 游戏不存在或已满、重复参与、缺少锁任务、积分或背包不足
+        """
+        with transaction.atomic():
+            game = Game.objects.filter(id=game_id, status='waiting').first()
+            if game is None:
+                raise GameError('游戏不存在或已开始', status.HTTP_404_NOT_FOUND)
+
+            cls._check_eligibility(user, game)
+            cls._claim_seat(game)
+
+            try:
+                CoinsLedgerService.debit(
+                    user,
+                    game.bet_amount,
+                    change_type='game_participation',
+                    description=f'参与{game.get_game_type_display()}游戏消耗',
+                    metadata={'game_id': str(game.id), 'game_type': game.game_type}
+                )
+            except InsufficientCoinsError:
+                raise GameError('积分不足')
+
+            try:
+                with transaction.atomic():
+                    GameParticipant.objects.create(game=game, user=user, action=action or {})
+            except IntegrityError:
+                raise GameError('您已经参与了这个游戏')
+
+            # 小游戏活跃度奖励
+            user.update_activity(points=1)
+
+            is_full = game.player_count >= game.max_players
+            if is_full:
+                Game.objects.filter(id=game.id, status='waiting').update(status='active', started_at=timezone.now())
+                game.status = 'active'
+                cls.schedule_settlement(game.id)
+
+        return {
+            'game': game,
+            'participants': game.player_count,
+            'max_participants': game.max_players,
+            'is_full': is_full,
+        }
+
+    @staticmethod
+    def _check_eligibility(user, game):
+        # 只对非掷骰子游戏检查带锁任务限制
+        if game.game_type != 'dice':
+            if not LockTask.objects.filter(user=user, status='active').exists():
+                raise GameError('只有正在进行锁任务时才能参与游戏')
+
+        # 检查是否已经参与
+        if GameParticipant.objects.filter(game=game, user=user).exists():
+            raise GameError('您已经参与了这个游戏')
+
+        # 检查积分
+        if user.coins < game.bet_amount:
+            raise GameError('积分不足')
+
+        # 对于掷骰子游戏，如果有物品奖励，需要检查参与者背包空间
+        if game.game_type == 'dice' and game.game_data.get('item_reward_id'):
+            inventory, _ = UserInventory.objects.get_or_create(user=user)
+            if inventory.available_slots < 1:
+                raise GameError(f'背包空间不足，剩余{inventory.available_slots}格，无法参与有奖励物品的游戏')
+
+    @staticmethod
+    def _claim_seat(game):
+        """条件递增占座；满员或已开始时失败"""
+        claimed = Game.objects.filter(
+            id=game.id,
+            status='waiting',
+            player_count__lt=F('max_players')
+        ).update(player_count=F('player_count') + 1)
+        if not claimed:
+            raise GameError('游戏人数已满')
+        # 占座的 UPDATE 已锁定该行，读回的计数即本次占座后的人数
+        game.player_count = Game.objects.filter(id=game.id).values_list('player_count', flat=True).get()
+
+    @staticmethod
+    def schedule_settlement(game_id):
+        """事务提交后提交结算任务"""
+        from store.celery_tasks import settle_game
+
+        game_id = str(game_id)
+        transaction.on_commit(lambda: settle_game.delay(game_id))
+
+    @classmethod
+    def get_status(cls, user, game_id):
+        """
+        游戏状态（供客户端轮询结算结果）
+
+        满员后长时间未结算的游戏（结算任务丢失）会被重新提交结算。
+        """
+        game = Game.objects.select_related('creator').filter(id=game_id).first()
+        if game is None:
+            raise GameError('游戏不存在', status.HTTP_404_NOT_FOUND)
+
+        now = timezone.now()
+        if game.status == 'active' and game.game_type in GameSettlementService.SETTLERS:
+            if game.started_at and now - game.started_at > timedelta(seconds=SETTLEMENT_STALL_SECONDS):
+                logger.warning(f"Game {game.id} still unsettled, resubmitting settlement")
+                cls.schedule_settlement(game.id)
+
+        participant = GameParticipant.objects.filter(game=game, user=user).first()
+        data = {
+            'id': str(game.id),
+            'game_type': game.game_type,
+            'status': game.status,
+            'bet_amount': game.bet_amount,
+            'participants': game.player_count,
+            'max_participants': game.max_players,
+            'is_creator': game.creator_id == user.id,
+            'is_participant': participant is not None,
+            'your_action': participant.action if participant else None,
+            'started_at': game.started_at.isoformat() if game.started_at else None,
+            'completed_at': game.completed_at.isoformat() if game.completed_at else None,
+        }
+        if game.result:
+            data['result'] = game.result
+        return data
+
+
+class GameSettlementService:
+    """满员游戏的结算（由 Celery 任务调用）"""
+
+    SETTLERS = {
+        'rock_paper_scissors': '_settle_rock_paper_scissors',
+        'dice': '_settle_dice',
+    }
+
+    @classmethod
+    def settle(cls, game_id):
+        """
+        结算一局满员的游戏
+
+        Returns:
+            dict: 结算结果；游戏不存在、已结算或无需结算时返回 None
+        """
+        with transaction.atomic():
+            game = Game.objects.select_for_update(of=('self',)).select_related('creator').filter(
+                id=game_id, status='active'
+            ).first()
+            if game is None or game.game_type not in cls.SETTLERS:
+                return None
+
+            participants = list(
+                GameParticipant.objects.filter(game=game).select_related('user').order_by('joined_at')
+            )
+            result = getattr(cls, cls.SETTLERS[game.game_type])(game, participants)
+
+        logger.info(f"Settled {game.game_type} game {game.id}: {result}")
+        return result
+
+    @classmethod
+    def _settle_rock_paper_scissors(cls, game, participants):
+        results = []
+        for participant in participants:
+            # 如果玩家没有提供有效选择，随机分配一个
+            choice = participant.action.get('choice')
+            if choice not in RPS_CHOICES:
+                participant.action = {'choice': random.choice(RPS_CHOICES)}
+                participant.save(update_fields=['action'])
+            results.append({'player': participant.user.username, 'choice': participant.action['choice']})
+
+        if len(participants) != 2:
+            logger.warning(f"Rock-paper-scissors game {game.id} has {len(participants)} players, skipped")
+            return None
+
+        p1, p2 = participants
+        choice1, choice2 = p1.action['choice'], p2.action['choice']
+        if choice1 == choice2:
+            return cls._restart_after_tie(game, participants, results)
+
+        winner, loser = (p1, p2) if RPS_BEATS[choice1] == choice2 else (p2, p1)
+        game.result = {
+            'winner': winner.user.username,
+            'loser': loser.user.username,
+            'winner_choice': winner.action['choice'],
+            'loser_choice': loser.action['choice'],
+            'game_results': results
+        }
+        game.status = 'completed'
+        game.completed_at = timezone.now()
+        game.save(update_fields=['result', 'status', 'completed_at'])
+
+        cls._add_loser_penalty(game, winner.user, loser.user)
+
+        Notification.bulk_create_notifications([
+            {
+                'recipient': winner.user,
+                'notification_type': 'game_result',
+                'actor': loser.user,
+                'title': '石头剪刀布获胜',
+                'message': f'恭喜！您在与 {loser.user.username} 的石头剪刀布游戏中获胜，获得 {game.bet_amount} 积分',
+                'related_object_type': 'game',
+                'related_object_id': game.id,
+                'extra_data': {
+                    'game_type': 'rock_paper_scissors',
+                    'result': 'win',
+                    'your_choice': winner.action['choice'],
+                    'opponent_choice': loser.action['choice'],
+                    'opponent_username': loser.user.username,
+                    'opponent_id': loser.user.id,
+                    'bet_amount': game.bet_amount,
+                    'coins_change': game.bet_amount
+                },
+            },
+            {
+                'recipient': loser.user,
+                'notification_type': 'game_result',
+                'actor': winner.user,
+                'title': '石头剪刀布失败',
+                'message': f'很遗憾，您在与 {winner.user.username} 的石头剪刀布游戏中失败，'
+                           f'锁时间增加{RPS_LOSER_PENALTY_MINUTES}分钟',
+                'related_object_type': 'game',
+                'related_object_id': game.id,
+                'extra_data': {
+                    'game_type': 'rock_paper_scissors',
+                    'result': 'lose',
+                    'your_choice': loser.action['choice'],
+                    'opponent_choice': winner.action['choice'],
+                    'opponent_username': winner.user.username,
+                    'opponent_id': winner.user.id,
+                    'bet_amount': game.bet_amount,
+                    'time_penalty_minutes': RPS_LOSER_PENALTY_MINUTES
+                },
+            },
+        ])
+        return game.result
+
+    @classmethod
+    def _restart_after_tie(cls, game, participants, results):
+        """平局：返还发起人积分，清空座位，游戏重新开始等待玩家"""
+        creator = game.creator
+        CoinsLedgerService.apply_changes([{
+            'user': creator,
+            'amount': game.bet_amount,
+            'change_type': 'game_refund',
+            'description': '石头剪刀布游戏平局返还',
+            'metadata': {'game_id': str(game.id), 'result': 'tie'},
+        }])
+
+        GameParticipant.objects.filter(game=game).delete()
+        game.status = 'waiting'
+        game.player_count = 0
+        game.started_at = None
+        game.result = {'tie': True, 'game_results': results, 'coins_refunded': game.bet_amount}
+        game.save(update_fields=['status', 'player_count', 'started_at', 'result'])
+
+        notifications = []
+        for participant, opponent in ((participants[0], participants[1]), (participants[1], participants[0])):
+            is_creator = participant.user_id == creator.id
+            message = f'与 {opponent.user.username} 的石头剪刀布游戏平局，游戏重新开始'
+            if is_creator:
+                message += f'，已返还 {game.bet_amount} 积分'
+            notifications.append({
+                'recipient': participant.user,
+                'notification_type': 'game_result',
+                'actor': opponent.user,
+                'title': '石头剪刀布平局',
+                'message': message,
+                'related_object_type': 'game',
+                'related_object_id': game.id,
+                'extra_data': {
+                    'game_type': 'rock_paper_scissors',
+                    'result': 'tie',
+                    'your_choice': participant.action['choice'],
+                    'opponent_choice': opponent.action['choice'],
+                    'opponent_username': opponent.user.username,
+                    'opponent_id': opponent.user.id,
+                    'bet_amount': game.bet_amount,
+                    'coins_refunded': game.bet_amount if is_creator else 0
+                },
+            })
+        Notification.bulk_create_notifications(notifications)
+        return game.result
+
+    @staticmethod
+    def _add_loser_penalty(game, winner, loser):
+        """输家的进行中锁任务加时"""
+        for task in LockTask.objects.filter(user=loser, status='active'):
+            previous_end_time = task.end_time
+            if task.end_time:
+                task.end_time += timedelta(minutes=RPS_LOSER_PENALTY_MINUTES)
+            else:
+                task.end_time = timezone.now() + timedelta(minutes=RPS_LOSER_PENALTY_MINUTES)
+            task.save(update_fields=['end_time'])
+
+            # 创建时间线事件记录游戏加时
+            TaskTimelineEvent.objects.create(
+                task=task,
+                event_type='overtime_added',
+                user=None,  # 系统操作
+                time_change_minutes=RPS_LOSER_PENALTY_MINUTES,
+                previous_end_time=previous_end_time,
+                new_end_time=task.end_time,
+                description=f'游戏失败加时: {loser.username} 在{game.game_type}游戏中败给 {winner.username}，'
+                            f'增加{RPS_LOSER_PENALTY_MINUTES}分钟锁时间',
+                metadata={
+                    'game_id': str(game.id),
+                    'game_type': game.game_type,
+                    'winner': winner.username,
+                    'loser': loser.username,
+                    'penalty_minutes': RPS_LOSER_PENALTY_MINUTES
+                }
+            )
+
+    @classmethod
+    def _settle_dice(cls, game, participants):
+        if not participants:
+            return None
+
+        participant = participants[0]
+        user = participant.user
+        creator = game.creator
+        guess = participant.action.get('guess', 'big')
+
+        # 预先掷好的骰子结果，4、5、6 为大，1、2、3 为小
+        dice_result = game.game_data.get('dice_result', 1)
+        is_big = dice_result >= 4
+        is_correct = (guess == 'big' and is_big) or (guess == 'small' and not is_big)
+
+        # 创建者总是获得参与费用
+        CoinsLedgerService.apply_changes([{
+            'user': creator,
+            'amount': game.bet_amount,
+            'change_type': 'game_refund',
+            'description': '掷骰子游戏参与费用',
+            'metadata': {'game_id': str(game.id), 'participant': user.username},
+        }])
+
+        # 奖励物品：猜中则转移给参与者，否则归还给创建者
+        item_transferred = False
+        item_reward_details = None
+        item_reward_id = game.game_data.get('item_reward_id')
+        if item_reward_id:
+            reward_item = Item.objects.filter(id=item_reward_id, owner=creator, status='in_game').first()
+            if reward_item is not None:
+                receiver = user if is_correct else creator
+                reward_item.owner = receiver
+                reward_item.inventory, _ = UserInventory.objects.get_or_create(user=receiver)
+                reward_item.status = 'available'
+                reward_item.save()
+                if is_correct:
+                    item_transferred = True
+                    item_reward_details = game.game_data.get('item_reward_details')
+
+        sessions = [GameSession(
+            user=creator,
+            game_type='dice',
+            bet_amount=game.bet_amount,
+            result_data={
+                'dice_result': dice_result,
+                'participant_guess': guess,
+                'participant_won': is_correct,
+                'coins_earned': game.bet_amount,
+                'item_given': item_transferred,
+                'participant': user.username
+            }
+        )]
+        if item_transferred:
+            sessions.append(GameSession(
+                user=user,
+                game_type='dice',
+                bet_amount=game.bet_amount,
+                result_data={
+                    'dice_result': dice_result,
+                    'guess': guess,
+                    'is_correct': is_correct,
+                    'item_received': item_reward_details,
+                    'creator': creator.username
+                }
+            ))
+        GameSession.objects.bulk_create(sessions)
+
+        game.status = 'completed'
+        game.completed_at = timezone.now()
+        game.result = {
+            'dice_result': dice_result,
+            'participant_guess': guess,
+            'is_correct': is_correct,
+            'creator': creator.username,
+            'participant': user.username,
+            'item_transferred': item_transferred,
+            'item_details': item_reward_details
+        }
+        game.save(update_fields=['status', 'completed_at', 'result'])
+
+        if is_correct:
+            title = '掷骰子获胜'
+            message = f'恭喜！您猜{guess}，骰子结果是{dice_result}，猜中了！'
+            if item_transferred:
+                message += f'获得奖励物品：{item_reward_details["display_name"]}'
+        else:
+            title = '掷骰子失败'
+            message = f'很遗憾，您猜{guess}，骰子结果是{dice_result}，没有猜中。'
+
+        creator_message = (
+            f'{user.username} 参与了您的掷骰子游戏，猜{guess}，'
+            f'骰子结果{dice_result}，{"猜中了" if is_correct else "没猜中"}，'
+            f'您获得了 {game.bet_amount} 积分'
+        )
+        if item_transferred:
+            creator_message += '，奖励物品已转移给对方'
+
+        Notification.bulk_create_notifications([
+            {
+                'recipient': user,
+                'notification_type': 'game_result',
+                'actor': creator,
+                'title': title,
+                'message': message,
+                'related_object_type': 'game',
+                'related_object_id': game.id,
+                'extra_data': {
+                    'game_type': 'dice',
+                    'dice_result': dice_result,
+                    'guess': guess,
+                    'is_correct': is_correct,
+                    'item_received': item_reward_details if item_transferred else None,
+                    'creator_username': creator.username,
+                    'creator_id': creator.id,
+                    'bet_amount': game.bet_amount
+                },
+            },
+            {
+                'recipient': creator,
+                'notification_type': 'game_result',
+                'actor': user,
+                'title': '掷骰子游戏完成',
+                'message': creator_message,
+                'related_object_type': 'game',
+                'related_object_id': game.id,
+                'extra_data': {
+                    'game_type': 'dice',
+                    'dice_result': dice_result,
+                    'participant_guess': guess,
+                    'participant_won': is_correct,
+                    'coins_earned': game.bet_amount,
+                    'item_given': item_transferred,
+                    'participant_username': user.username,
+                    'participant_id': user.id,
+                    'bet_amount': game.bet_amount
+                },
+            },
+        ])
+        return game.result
@@ -0,0 +1,144 @@
+"""
+商店购买服务
+
+库存、每日限购与背包格数都以条件 UPDATE 原子扣减（例如
+stock = stock - n WHERE stock >= n），并发抢购时不会超卖或超出背包容量；
+任一步失败时整个事务回滚。道具与购买记录使用 bulk_create 批量创建，
+因此背包计数在这里直接维护，不经过道具保存信号。
+"""
+
+import logging
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import status
+
+from store.catalogue import invalidate_store_catalogue
+from store.models import DailyPurchaseCounter, Item, Purchase, StoreItem, UserInventory
+from users.services.coins_ledger import CoinsLedgerService, InsufficientCoinsError
+
+logger = logging.getLogger(__name__)
+
+
+class PurchaseError(Exception):
+    """购买失败（message 直接返回给用户）"""
+
+    def __init__(self, message, status_code=status.HTTP_400_BAD_REQUEST):
+        self.message = message
+        self.status_code = status_code
+        super().__init__(message)
+
+
+class PurchaseService:
+    """商店购买：库存、限购、背包与积分在同一事务内原子扣减"""
+
+    @classmethod
+    def purchase(cls, user, store_item_id, quantity=1):
+        """
+        购买商品
+
+        Returns:
+            dict: {'store_item', 'items', 'remaining_coins', 'remaining_slots'}
+
+        Raises:
+            PurchaseError: 商品不可用、等级不足、库存/限购/背包/积分不足
+        """
+        with transaction.atomic():
+            store_item = StoreItem.objects.select_related('item_type').filter(
+                id=store_item_id, is_available=True
+            ).first()
+            if store_item is None:
+                raise PurchaseError('商品不存在或已下架', status.HTTP_404_NOT_FOUND)
+
+            if user.level < store_item.level_requirement:
+                raise PurchaseError(
+                    f'需要等级 {store_item.level_requirement} 才能购买此商品', status.HTTP_403_FORBIDDEN
+                )
+
+            cls._reserve_stock(store_item, quantity)
+            cls._reserve_daily_limit(user, store_item, quantity)
+            inventory = cls._reserve_slots(user, quantity)
+
+            total_cost = store_item.price * quantity
+            try:
+                CoinsLedgerService.debit(
+                    user,
+                    total_cost,
+                    change_type='store_purchase',
+                    description=f'购买 {store_item.name} x{quantity}',
+                    metadata={
+                        'store_item_id': str(store_item.id),
+                        'store_item_name': store_item.name,
+                        'quantity': quantity,
+                        'unit_price': store_item.price,
+                        'total_cost': total_cost
+                    }
+                )
+            except InsufficientCoinsError:
+                raise PurchaseError('积分不足')
+
+            items = Item.objects.bulk_create([
+                Item(
+                    item_type=store_item.item_type,
+                    owner=user,
+                    original_owner=user,  # 设置原始拥有者为购买者
+                    inventory=inventory
+                )
+                for _ in range(quantity)
+            ])
+            Purchase.objects.bulk_create([
+                Purchase(user=user, store_item=store_item, item=item, price_paid=store_item.price)
+                for item in items
+            ])
+
+        logger.info(f"User {user.username} purchased {quantity} x {store_item.name} for {total_cost} coins")
+        return {
+            'store_item': store_item,
+            'items': items,
+            'remaining_coins': user.coins,
+            'remaining_slots': inventory.available_slots,
+        }
+
+    @staticmethod
+    def _reserve_stock(store_item, quantity):
+        """扣减库存（null 表示无限库存）"""
+        if store_item.stock is None:
+            return
+        updated = StoreItem.objects.filter(
+            pk=store_item.pk, stock__gte=quantity
+        ).update(stock=F('stock') - quantity)
+        if not updated:
+            raise PurchaseError('库存不足')
+        store_item.stock -= quantity
+        # 目录中显示库存，有限库存商品售出后使目录缓存失效
+        invalidate_store_catalogue()
+
+    @staticmethod
+    def _reserve_daily_limit(user, store_item, quantity):
+        """占用当日限购额度"""
+        if not store_item.daily_limit:
+            return
+        counter, _ = DailyPurchaseCounter.objects.get_or_create(
+            user=user, store_item=store_item, date=timezone.now().date()
+        )
+        updated = DailyPurchaseCounter.objects.filter(
+            pk=counter.pk, count__lte=store_item.daily_limit - quantity
+        ).update(count=F('count') + quantity)
+        if not updated:
+            counter.refresh_from_db(fields=['count'])
+            raise PurchaseError(f'今日购买限制：{store_item.daily_limit}个，已购买{counter.count}个')
+
+    @staticmethod
+    def _reserve_slots(user, quantity):
+        """占用背包格数，返回计数已更新的背包"""
+        inventory, _ = UserInventory.objects.get_or_create(user=user)
+        inventory.user = user
+        max_slots = UserInventory.max_slots_for_level(user.level)
+        updated = UserInventory.objects.filter(
+            pk=inventory.pk, used_slot_count__lte=max_slots - quantity
+        ).update(used_slot_count=F('used_slot_count') + quantity, updated_at=timezone.now())
+        inventory.refresh_from_db(fields=['used_slot_count'])
+        if not updated:
+            raise PurchaseError(f'背包空间不足，剩余{max(max_slots - inventory.used_slot_count, 0)}格')
+        return inventory
@@ -0,0 +1,183 @@
+"""
+分享道具领取
+
+热门分享在群聊中会同时收到大量领取请求。领取先经过缓存闸门：
+cache.add（Redis 上即 SETNX）只有一个请求能占住分享令牌，其余请求
+不进入事务、不查询数据库直接被拒绝；领取成功后闸门改为"已领取"标记，
+保留到分享过期。占住闸门的请求在事务内以条件 UPDATE
+（status='active' AND 未过期 AND 不是分享者本人）认领分享记录，再以条件
+UPDATE 占用背包格数并转移道具；任一步失败则事务回滚并释放闸门。
+"""
+
+import logging
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import status
+
+from store.models import Item, SharedItem, UserInventory
+from users.models import Notification
+
+logger = logging.getLogger(__name__)
+
+# 闸门最长占用时间（领取进程崩溃时自动释放）
+SHARE_CLAIM_GATE_SECONDS = 30
+
+
+class ShareClaimError(Exception):
+    """
+    领取分享失败（message 直接返回给用户）
+
+    code: not_found / own_share / already_claimed / in_progress /
+          item_unavailable / inventory_full
+    """
+
+    def __init__(self, message, code, status_code=status.HTTP_400_BAD_REQUEST, claimer=None):
+        self.message = message
+        self.code = code
+        self.status_code = status_code
+        self.claimer = claimer
+        super().__init__(message)
+
+
+class ShareClaimService:
+    """分享道具领取：缓存闸门快速拒绝 + 条件 UPDATE 认领"""
+
+    @staticmethod
+    def _gate_key(share_token):
+        return f'share_claim:{share_token}'
+
+    @classmethod
+    def claim(cls, user, share_token, claimer_display=None):
+        """
+        领取分享的道具
+
+        Args:
+            claimer_display: 通知与"已被领取"提示中显示的领取者名称，默认用户名
+
+        Returns:
+            dict: {'shared_item', 'item', 'inventory'}
+
+        Raises:
+            ShareClaimError
+        """
+        claimer_display = claimer_display or user.username
+        gate_key = cls._gate_key(share_token)
+
+        if not cache.add(gate_key, {'state': 'pending', 'user_id': user.id}, SHARE_CLAIM_GATE_SECONDS):
+            cls._reject_from_gate(cache.get(gate_key))
+
+        try:
+            claimed = cls._claim(user, share_token, claimer_display)
+        except Exception:
+            cache.delete(gate_key)
+            raise
+
+        shared_item = claimed['shared_item']
+        marker = {'state': 'claimed', 'claimer': claimer_display}
+        ttl = max(1, int((shared_item.expires_at - shared_item.claimed_at).total_seconds()))
+        transaction.on_commit(lambda: cache.set(gate_key, marker, ttl))
+
+        logger.info(f"User {user.username} claimed shared item {shared_item.id} from {shared_item.sharer.username}")
+        return claimed
+
+    @staticmethod
+    def _reject_from_gate(marker):
+        if marker and marker.get('state') == 'claimed':
+            raise ShareClaimError(
+                f'物品已被 {marker["claimer"]} 领取', 'already_claimed',
+                status.HTTP_409_CONFLICT, claimer=marker['claimer']
+            )
+        raise ShareClaimError('物品正在被其他人领取，请稍后再试', 'in_progress', status.HTTP_409_CONFLICT)
+
+    @classmethod
+    def _claim(cls, user, share_token, claimer_display):
+        with transaction.atomic():
+            now = timezone.now()
+            claimed = SharedItem.objects.filter(
+                share_token=share_token,
+                status='active',
+                expires_at__gt=now
+            ).exclude(sharer=user).update(status='claimed', claimer=user, claimed_at=now)
+            if not claimed:
+                cls._raise_unclaimable(user, share_token)
+
+            shared_item = SharedItem.objects.select_related('sharer', 'item__item_type').get(share_token=share_token)
+            item = shared_item.item
+            if item.owner_id != shared_item.sharer_id:
+                raise ShareClaimError('物品已不属于原分享者，无法领取', 'item_unavailable')
+            if item.status != 'available':
+                raise ShareClaimError(f'物品状态异常（{item.status}），无法领取', 'item_unavailable')
+
+            inventory = cls._reserve_slot(user)
+
+            # 条件转移（道具仍在分享者原背包中）；背包计数在这里直接维护，不经过道具保存信号
+            moved = Item.objects.filter(
+                pk=item.pk,
+                owner_id=shared_item.sharer_id,
+                inventory_id=item.inventory_id,
+                status='available'
+            ).update(owner=user, inventory=inventory)
+            if not moved:
+                raise ShareClaimError('物品已被领取或不存在', 'item_unavailable')
+            if item.inventory_id is not None:
+                UserInventory.objects.filter(pk=item.inventory_id).update(
+                    used_slot_count=F('used_slot_count') - 1
+                )
+            item.owner = user
+            item.inventory = inventory
+            item._original_inventory_id = inventory.pk
+
+            Notification.create_notification(
+                recipient=shared_item.sharer,
+                notification_type='item_shared',
+                actor=user,
+                title='物品被领取',
+                message=f'{claimer_display} 领取了您分享的 {item.item_type.display_name}',
+                related_object_type='shared_item',
+                related_object_id=shared_item.id,
+                extra_data={
+                    'item_type': item.item_type.name,
+                    'item_display_name': item.item_type.display_name,
+                    'claimed_by': claimer_display,
+                    'claimer_id': user.id,
+                    'claimed_at': shared_item.claimed_at.isoformat()
+                }
+            )
+
+            # 给分享者增加活跃度
+            shared_item.sharer.update_activity(points=1)
+
+        return {'shared_item': shared_item, 'item': item, 'inventory': inventory}
+
+    @staticmethod
+    def _raise_unclaimable(user, share_token):
+        """认领失败时说明原因"""
+        shared_item = SharedItem.objects.select_related('claimer').filter(share_token=share_token).first()
+        if shared_item is None or shared_item.status == 'expired' or shared_item.expires_at <= timezone.now():
+            raise ShareClaimError('分享链接无效或已过期', 'not_found', status.HTTP_404_NOT_FOUND)
+        if shared_item.sharer_id == user.id:
+            raise ShareClaimError('不能领取自己分享的物品', 'own_share')
+        claimer = shared_item.claimer.username if shared_item.claimer else None
+        raise ShareClaimError(
+            f'物品已被 {claimer} 领取' if claimer else '物品已被领取', 'already_claimed',
+            status.HTTP_409_CONFLICT, claimer=claimer
+        )
+
+    @staticmethod
+    def _reserve_slot(user):
+        """占用领取者的一格背包，返回计数已更新的背包"""
+        inventory, _ = UserInventory.objects.get_or_create(user=user)
+        inventory.user = user
+        max_slots = UserInventory.max_slots_for_level(user.level)
+        updated = UserInventory.objects.filter(
+            pk=inventory.pk, used_slot_count__lte=max_slots - 1
+        ).update(used_slot_count=F('used_slot_count') + 1, updated_at=timezone.now())
+        inventory.refresh_from_db(fields=['used_slot_count'])
+        if not updated:
+            raise ShareClaimError(
+                f'背包空间不足，剩余{max(max_slots - inventory.used_slot_count, 0)}格', 'inventory_full'
+            )
+        return inventory
@@ -1,7 +1,11 @@
-from django.db.models.signals import post_save
+from django.db.models import F
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from .models import UserInventory
+from .active_effects import invalidate_active_effects
+from .catalogue import invalidate_store_catalogue
+from .models import UserInventory, UserEffect, Item, ItemType, StoreItem, BuriedTreasure
+from .treasure_index import invalidate_treasure_index
 
 User = get_user_model()
 
@@ -17,4 +21,62 @@ def create_user_inventory(sender, instance, created, **kwargs):
 def save_user_inventory(sender, instance, **kwargs):
     """确保用户有背包"""
     if not hasattr(instance, 'inventory'):
-        UserInventory.objects.create(user=instance)
\ No newline at end of file
+        UserInventory.objects.create(user=instance)
+
+
+@receiver(post_save, sender=UserEffect)
+@receiver(post_delete, sender=UserEffect)
+def invalidate_user_effect_cache(sender, instance, **kwargs):
+    """道具效果变化时清除用户活跃效果缓存"""
+    invalidate_active_effects(instance.user_id)
+
+
+def _adjust_slot_count(item, inventory_id, delta):
+    """调整背包已占用格数，并同步道具上缓存的背包实例"""
+    UserInventory.objects.filter(pk=inventory_id).update(used_slot_count=F('used_slot_count') + delta)
+    cached_inventory = item._state.fields_cache.get('inventory')
+    if cached_inventory is not None and cached_inventory.pk == inventory_id:
+        cached_inventory.used_slot_count += delta
+
+
+@receiver(post_init, sender=Item)
+def remember_item_inventory(sender, instance, **kwargs):
+    """记录加载时的背包，用于保存时判断道具是否移入/移出背包"""
+    instance._original_inventory_id = instance.__dict__.get('inventory_id')
+
+
+@receiver(post_save, sender=Item)
+def update_inventory_slots_on_save(sender, instance, created, update_fields=None, **kwargs):
+    """道具进入或离开背包时维护 UserInventory.used_slot_count（bulk 操作需自行维护）"""
+    if update_fields is not None and 'inventory' not in update_fields and 'inventory_id' not in update_fields:
+        return
+    old_inventory_id = None if created else instance._original_inventory_id
+    new_inventory_id = instance.inventory_id
+    if old_inventory_id != new_inventory_id:
+        if old_inventory_id is not None:
+            _adjust_slot_count(instance, old_inventory_id, -1)
+        if new_inventory_id is not None:
+            _adjust_slot_count(instance, new_inventory_id, 1)
+    instance._original_inventory_id = new_inventory_id
+
+
+@receiver(post_delete, sender=Item)
+def update_inventory_slots_on_delete(sender, instance, **kwargs):
+    if instance._original_inventory_id is not None:
+        _adjust_slot_count(instance, instance._original_inventory_id, -1)
+
+
+@receiver(post_save, sender=StoreItem)
+@receiver(post_delete, sender=StoreItem)
+@receiver(post_save, sender=ItemType)
+@receiver(post_delete, sender=ItemType)
+def invalidate_catalogue_cache(sender, **kwargs):
+    """商品或道具类型变化时使商品目录缓存失效"""
+    invalidate_store_catalogue()
+
+
+@receiver(post_save, sender=BuriedTreasure)
+@receiver(post_delete, sender=BuriedTreasure)
+def invalidate_zone_treasure_index(sender, instance, **kwargs):
+    """宝物掩埋、被发现或删除时重建所在区域的宝物索引"""
+    invalidate_treasure_index(instance.location_zone)
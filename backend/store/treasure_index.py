@@ -0,0 +1,179 @@
+"""
+探索区域宝物索引
+
+每个区域的可发现宝物（status='buried' 且未过期）预先整理成一个只读列表缓存起来，
+包含卡牌展示所需的全部字段：探索时随机抽取宝物与分配卡牌位置都在内存中完成，
+只有被翻开的那张卡牌需要锁定对应的宝物记录。宝物被掩埋、被发现或删除时
+（store.signals）在事务提交后重建所在区域的索引。
+
+同时缓存用户当天在各区域的探索状态（次数与最后探索时间），冷却中的请求直接
+由缓存拒绝，不需要查询或锁定 UserZoneExploration。
+"""
+
+import random
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+TREASURE_INDEX_TTL = 60 * 60  # 秒
+
+# 各区域的卡牌数量（翻牌时最多放置 卡牌数-1 个宝物）
+ZONE_CARD_COUNTS = {
+    'beach': 3,
+    'forest': 6,
+    'mountain': 9,
+    'desert': 6,
+    'cave': 9,
+}
+DEFAULT_CARD_COUNT = 6
+
+
+def _index_key(zone_name):
+    return f'treasure_index:{zone_name}'
+
+
+def _exploration_key(user_id, zone_name, date):
+    return f'zone_exploration:{user_id}:{zone_name}:{date.isoformat()}'
+
+
+def build_treasure_index(zone_name, now=None):
+    """从数据库重建区域宝物索引并写入缓存（一次查询）"""
+    from .models import BuriedTreasure
+
+    now = now or timezone.now()
+    rows = BuriedTreasure.objects.filter(
+        location_zone=zone_name,
+        status='buried',
+        expires_at__gt=now
+    ).order_by('created_at').values_list(
+        'id', 'burier_id', 'burier__username', 'location_hint', 'difficulty',
+        'item__item_type__display_name', 'expires_at'
+    )
+    entries = tuple(
+        {
+            'id': str(treasure_id),
+            'burier_id': burier_id,
+            'burier': burier_username,
+            'location_hint': location_hint,
+            'difficulty': difficulty,
+            'item_type': item_type,
+            'expires_at': expires_at,
+        }
+        for treasure_id, burier_id, burier_username, location_hint, difficulty, item_type, expires_at in rows
+    )
+    index = {'zone': zone_name, 'built_at': now, 'entries': entries}
+
+    # 缓存不超过最早过期宝物的剩余时间，缓存中的条目因此始终未过期
+    ttl = TREASURE_INDEX_TTL
+    if entries:
+        earliest = min(entry['expires_at'] for entry in entries)
+        ttl = min(ttl, int((earliest - now).total_seconds()))
+    if ttl > 0:
+        cache.set(_index_key(zone_name), index, ttl)
+    return index
+
+
+def get_treasure_index(zone_name, now=None):
+    """获取区域宝物索引 {'zone', 'built_at', 'entries'}，缓存缺失时重建"""
+    index = cache.get(_index_key(zone_name))
+    if index is None:
+        index = build_treasure_index(zone_name, now)
+    return index
+
+
+def get_treasure_counts(zone_names, now=None):
+    """批量获取各区域可发现宝物数量 {zone_name: count}"""
+    cached = cache.get_many([_index_key(zone_name) for zone_name in zone_names])
+    counts = {}
+    for zone_name in zone_names:
+        index = cached.get(_index_key(zone_name)) or build_treasure_index(zone_name, now)
+        counts[zone_name] = len(index['entries'])
+    return counts
+
+
+def invalidate_treasure_index(*zone_names):
+    """区域宝物变化时清除索引，并在事务提交后重建"""
+    if not zone_names:
+        return
+    cache.delete_many([_index_key(zone_name) for zone_name in zone_names])
+
+    def rebuild():
+        for zone_name in zone_names:
+            build_treasure_index(zone_name)
+
+    transaction.on_commit(rebuild)
+
+
+def draw_treasures(zone_name, exclude_user_id, count, now=None):
+    """
+    从区域索引中随机抽取至多 count 个宝物（不包含 exclude_user_id 埋藏的）
+
+    按随机下标抽取并跳过自己埋藏的宝物，只有候选不足时才遍历整个索引。
+    """
+    entries = get_treasure_index(zone_name, now)['entries']
+    if count <= 0 or not entries:
+        return []
+
+    drawn = []
+    for position in random.sample(range(len(entries)), min(len(entries), count * 4)):
+        entry = entries[position]
+        if entry['burier_id'] != exclude_user_id:
+            drawn.append(entry)
+            if len(drawn) == count:
+                return drawn
+
+    candidates = [entry for entry in entries if entry['burier_id'] != exclude_user_id]
+    return random.sample(candidates, min(count, len(candidates)))
+
+
+def deal_cards(treasures, card_count):
+    """把抽到的宝物随机分配到卡牌位置，返回 {position: treasure}"""
+    positions = random.sample(range(card_count), min(len(treasures), card_count))
+    return dict(zip(positions, treasures))
+
+
+def _seconds_until_tomorrow(now):
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), time.min, tzinfo=now.tzinfo)
+    return max(1, int((tomorrow - now).total_seconds()))
+
+
+def remember_exploration_state(user_id, zone_name, date, daily_count, last_exploration_at):
+    """事务提交后缓存用户当天在该区域的探索状态"""
+    key = _exploration_key(user_id, zone_name, date)
+    state = {'daily_count': daily_count, 'last_exploration_at': last_exploration_at}
+    transaction.on_commit(lambda: cache.set(key, state, _seconds_until_tomorrow(last_exploration_at)))
+
+
+def get_exploration_state(user_id, zone_name, date):
+    """缓存中的探索状态 {'daily_count', 'last_exploration_at'}，没有则返回 None"""
+    return cache.get(_exploration_key(user_id, zone_name, date))
+
+
+def get_exploration_states(user_id, zone_names, date):
+    """
+    批量获取用户当天在各区域的探索状态
+
+    缓存缺失的区域用一次查询补齐（没有记录的区域不出现在结果中）。
+    """
+    from .models import UserZoneExploration
+
+    keys = {zone_name: _exploration_key(user_id, zone_name, date) for zone_name in zone_names}
+    cached = cache.get_many(list(keys.values()))
+    states = {zone_name: cached[key] for zone_name, key in keys.items() if key in cached}
+
+    missing = [zone_name for zone_name in zone_names if zone_name not in states]
+    if missing:
+        records = UserZoneExploration.objects.filter(
+            user_id=user_id,
+            zone_name__in=missing,
+            exploration_date=date
+        ).values_list('zone_name', 'daily_count', 'last_exploration_at')
+        ttl = _seconds_until_tomorrow(timezone.now())
+        for zone_name, daily_count, last_exploration_at in records:
+            states[zone_name] = {'daily_count': daily_count, 'last_exploration_at': last_exploration_at}
+            # 不覆盖探索时写入的更新状态
+            cache.add(keys[zone_name], states[zone_name], ttl)
+
+    return states
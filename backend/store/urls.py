@@ -18,6 +18,7 @@ urlpatterns = [
     path('games/', views.GameListCreateView.as_view(), name='games'),
     path('games/<uuid:game_id>/join/', views.join_game, name='join-game'),
     path('games/<uuid:game_id>/cancel/', views.cancel_game, name='cancel-game'),
+    path('games/<uuid:game_id>/status/', views.get_game_status, name='game-status'),
 
     # 漂流瓶相关
     path('drift-bottles/', views.create_drift_bottle, name='create-drift-bottle'),
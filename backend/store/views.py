@@ -4,7 +4,8 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-from django.db import transaction
+from django.db import transaction, IntegrityError
+from django.db.models import F, OuterRef, Subquery
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 import random
@@ -18,9 +19,21 @@ logger = logging.getLogger(__name__)
 from .models import (
     ItemType, UserInventory, Item, StoreItem, Purchase,
     Game, GameParticipant, DriftBottle, BuriedTreasure, GameSession, SharedItem,
-    UserEffect, SharedTaskAccess, TaskSnapshot, UserZoneExploration
+    UserEffect, SharedTaskAccess, TaskSnapshot, UserZoneExploration,
+    ArenaMatch, ArenaAudience, ArenaVote
 )
 from users.models import Notification
+from users.services.coins_ledger import CoinsLedgerService
+from .services.purchase import PurchaseService, PurchaseError
+from .services.games import GameMatchmakingService, GameError
+from .services.sharing import ShareClaimService, ShareClaimError
+from .catalogue import (
+    EXPLORATION_ZONES, conditional_response, get_catalogue_for_user, get_store_catalogue, payload_etag
+)
+from .treasure_index import (
+    DEFAULT_CARD_COUNT, ZONE_CARD_COUNTS, deal_cards, draw_treasures, get_exploration_state,
+    get_exploration_states, get_treasure_counts, invalidate_treasure_index, remember_exploration_state
+)
 from .serializers import (
     ItemTypeSerializer, UserInventorySerializer, ItemSerializer,
     StoreItemSerializer, PurchaseSerializer, GameSerializer,
@@ -59,20 +72,23 @@ COOLDOWN_SECONDS = 30  # 探索冷却时间（秒）
 
 
 class StoreItemListView(generics.ListAPIView):
-    """商店商品列表"""
+    """商店商品列表（读取缓存的商品目录，支持 ETag / Last-Modified 条件请求）"""
     queryset = StoreItem.objects.filter(is_available=True)
     serializer_class = StoreItemSerializer
     permission_classes = [IsAuthenticated]
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        user = self.request.user
+    def list(self, request, *args, **kwargs):
+        catalogue = get_store_catalogue()
+        user = request.user
+        items = get_catalogue_for_user(user, catalogue)
 
-        # 根据用户等级过滤
-        if hasattr(user, 'level'):
-            queryset = queryset.filter(level_requirement__lte=user.level)
+        page = self.paginate_queryset(items)
+        data = self.get_paginated_response(page).data if page is not None else items
 
-        return queryset
+        # 可购买商品随目录版本与用户等级变化；分页参数也计入 ETag
+        etag = f"{catalogue['version']}-{getattr(user, 'level', 0)}-{payload_etag(request.query_params)}"
+        last_modified = max(catalogue['updated_at'], user.updated_at or catalogue['updated_at'])
+        return conditional_response(request, data, etag, last_modified)
 
 
 class UserInventoryView(generics.RetrieveAPIView):
@@ -95,109 +111,22 @@ def purchase_item(request):
         quantity = serializer.validated_data.get('quantity', 1)
 
         try:
-            with transaction.atomic():
-                store_item = get_object_or_404(StoreItem, id=store_item_id, is_available=True)
-                user = request.user
-
-                # 检查用户等级要求
-                if hasattr(user, 'level') and user.level < store_item.level_requirement:
-                    return Response({
-                        'error': f'需要等级 {store_item.level_requirement} 才能购买此商品'
-                    }, status=status.HTTP_403_FORBIDDEN)
-
-                # 检查库存
-                if store_item.stock is not None and store_item.stock < quantity:
-                    return Response({
-                        'error': '库存不足'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-
-                # 检查每日购买限制
-                if store_item.daily_limit:
-                    # 使用日期范围查询避免timezone问题
-                    today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-                    today_end = today_start + timedelta(days=1)
-
-                    today_purchases = Purchase.objects.filter(
-                        user=user,
-                        store_item=store_item,
-                        created_at__gte=today_start,
-                        created_at__lt=today_end
-                    ).count()
-
-                    if today_purchases + quantity > store_item.daily_limit:
-                        return Response({
-                            'error': f'今日购买限制：{store_item.daily_limit}个，已购买{today_purchases}个'
-                        }, status=status.HTTP_400_BAD_REQUEST)
-
-
-                # 检查用户积分
-                total_cost = store_item.price * quantity
-                if hasattr(user, 'coins') and user.coins < total_cost:
-                    return Response({
-                        'error': '积分不足'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-
-                # 检查背包容量
-                inventory, _ = UserInventory.objects.get_or_create(user=user)
-                if inventory.available_slots < quantity:
-                    return Response({
-                        'error': f'背包空间不足，剩余{inventory.available_slots}格'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-
-                # 扣除积分
-                if hasattr(user, 'coins'):
-                    user.deduct_coins(
-                        amount=total_cost,
-                        change_type='store_purchase',
-                        description=f'购买 {store_item.name} x{quantity}',
-                        metadata={
-                            'store_item_id': str(store_item.id),
-                            'store_item_name': store_item.name,
-                            'quantity': quantity,
-                            'unit_price': store_item.price,
-                            'total_cost': total_cost
-                        }
-                    )
-
-                # 减少库存
-                if store_item.stock is not None:
-                    store_item.stock -= quantity
-                    store_item.save()
-
-                # 创建购买记录和物品
-                items_created = []
-                for _ in range(quantity):
-                    # 先创建物品实例
-                    item = Item.objects.create(
-                        item_type=store_item.item_type,
-                        owner=user,
-                        original_owner=user,  # 设置原始拥有者为购买者
-                        inventory=inventory
-                    )
-
-                    # 然后创建购买记录，关联到物品
-                    purchase = Purchase.objects.create(
-                        user=user,
-                        store_item=store_item,
-                        item=item,
-                        price_paid=store_item.price
-                    )
-                    items_created.append(item)
-
-
-                # 返回购买结果
-                return Response({
-                    'message': f'成功购买 {quantity} 个 {store_item.name}',
-                    'items': [{'id': str(item.id), 'type': item.item_type.name} for item in items_created],
-                    'remaining_coins': getattr(user, 'coins', 0),
-                    'remaining_slots': inventory.available_slots
-                }, status=status.HTTP_201_CREATED)
-
+            result = PurchaseService.purchase(request.user, store_item_id, quantity)
+        except PurchaseError as e:
+            return Response({'error': e.message}, status=e.status_code)
         except Exception as e:
             return Response({
                 'error': f'购买失败: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+        # 返回购买结果
+        return Response({
+            'message': f'成功购买 {quantity} 个 {result["store_item"].name}',
+            'items': [{'id': str(item.id), 'type': item.item_type.name} for item in result['items']],
+            'remaining_coins': result['remaining_coins'],
+            'remaining_slots': result['remaining_slots']
+        }, status=status.HTTP_201_CREATED)
+
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -618,459 +547,54 @@ class GameListCreateView(generics.ListCreateAPIView):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def join_game(request, game_id):
-    """加入游戏"""
-    # Ensure Notification is available in local scope to prevent scoping issues
-    from users.models import Notification as NotificationModel
+    """
+    加入游戏
 
+    占座后立即返回；满员的游戏由结算任务异步结算，结果通过游戏状态接口获取。
+    """
     serializer = JoinGameSerializer(data=request.data)
-    if serializer.is_valid():
-        try:
-            with transaction.atomic():
-                game = get_object_or_404(Game, id=game_id, status='waiting')
-                user = request.user
-
-                # 只对非掷骰子游戏检查带锁任务限制
-                if game.game_type != 'dice':
-                    # 检查用户是否有正在进行的锁任务
-                    active_lock_tasks = LockTask.objects.filter(
-                        user=user,
-                        status='active'
-                    )
-
-                    if not active_lock_tasks.exists():
-                        return Response({
-                            'error': '只有正在进行锁任务时才能参与游戏'
-                        }, status=status.HTTP_400_BAD_REQUEST)
-
-                # 检查是否已经参与
-                if GameParticipant.objects.filter(game=game, user=user).exists():
-                    return Response({
-                        'error': '您已经参与了这个游戏'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-
-                # 检查积分
-                if hasattr(user, 'coins') and user.coins < game.bet_amount:
-                    return Response({
-                        'error': '积分不足'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-
-                # 对于掷骰子游戏，如果有物品奖励，需要检查参与者背包空间
-                if game.game_type == 'dice' and game.game_data.get('item_reward_id'):
-                    from .models import UserInventory
-                    inventory, _ = UserInventory.objects.get_or_create(user=user)
-                    if inventory.available_slots < 1:
-                        return Response({
-                            'error': f'背包空间不足，剩余{inventory.available_slots}格，无法参与有奖励物品的游戏'
-                        }, status=status.HTTP_400_BAD_REQUEST)
-
-                # 扣除积分
-                if hasattr(user, 'coins'):
-                    user.deduct_coins(
-                        amount=game.bet_amount,
-                        change_type='game_participation',
-                        description=f'参与{game.get_game_type_display()}游戏消耗',
-                        metadata={'game_id': str(game.id), 'game_type': game.game_type}
-                    )
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-                # 获取玩家的行动选择
-                action_data = serializer.validated_data.get('action', {})
-
-                # 创建参与记录，存储玩家的选择
-                GameParticipant.objects.create(
-                    game=game,
-                    user=user,
-                    action=action_data
-                )
-
-                # 小游戏活跃度奖励
-                request.user.update_activity(points=1)
-
-                # 检查是否可以开始游戏
-                participant_count = game.participants.count()
-                print(f"DEBUG: Game {game.id}, type: {game.game_type}, participant_count: {participant_count}, max_players: {game.max_players}")
-                if participant_count >= game.max_players:
-                    game.status = 'active'
-                    game.save()
-
-                    # 开始游戏逻辑（简单的猜拳游戏）
-                    if game.game_type == 'rock_paper_scissors':
-                        participants = list(GameParticipant.objects.filter(game=game))
-                        valid_choices = ['rock', 'paper', 'scissors']
-
-                        # 收集玩家选择并验证
-                        results = []
-                        valid_participants = []
-
-                        for participant in participants:
-                            player_choice = participant.action.get('choice')
-
-                            # 如果玩家没有提供有效选择，随机分配一个
-                            if not player_choice or player_choice not in valid_choices:
-                                player_choice = random.choice(valid_choices)
-                                # 更新参与者的action记录
-                                participant.action = {'choice': player_choice}
-                                participant.save()
-
-                            valid_participants.append(participant)
-                            results.append({
-                                'player': participant.user.username,
-                                'choice': player_choice
-                            })
-
-                        # 确定赢家
-                        if len(valid_participants) == 2:
-                            p1, p2 = valid_participants
-                            choice1 = p1.action['choice']
-                            choice2 = p2.action['choice']
-
-                            winner = None
-                            if choice1 == choice2:
-                                # 平局，重新开始
-                                game.status = 'waiting'
-                                game.save()
-
-                                # 平局时返还发起人（游戏创建者）的积分
-                                creator = game.creator
-                                if hasattr(creator, 'coins'):
-                                    creator.add_coins(
-                                        amount=game.bet_amount,
-                                        change_type='game_refund',
-                                        description='石头剪刀布游戏平局返还',
-                                        metadata={'game_id': str(game.id), 'result': 'tie'}
-                                    )
-
-                                # 给双方发送平局通知
-                                for participant in valid_participants:
-                                    opponent = valid_participants[1] if participant == valid_participants[0] else valid_participants[0]
-                                    is_creator = participant.user == creator
-                                    message = f'与 {opponent.user.username} 的石头剪刀布游戏平局，游戏重新开始'
-                                    if is_creator:
-                                        message += f'，已返还 {game.bet_amount} 积分'
-
-                                    NotificationModel.create_notification(
-                                        recipient=participant.user,
-                                        notification_type='game_result',
-                                        actor=opponent.user,
-                                        title='石头剪刀布平局',
-                                        message=message,
-                                        related_object_type='game',
-                                        related_object_id=game.id,
-                                        extra_data={
-                                            'game_type': 'rock_paper_scissors',
-                                            'result': 'tie',
-                                            'your_choice': participant.action['choice'],
-                                            'opponent_choice': opponent.action['choice'],
-                                            'opponent_username': opponent.user.username,
-                                            'opponent_id': opponent.user.id,
-                                            'bet_amount': game.bet_amount,
-                                            'coins_refunded': game.bet_amount if is_creator else 0
-                                        },
-                                        priority='normal'
-                                    )
-
-                                return Response({
-                                    'message': '平局！游戏重新开始，发起人积分已返还',
-                                    'results': results,
-                                    'coins_refunded': game.bet_amount
-                                })
-                            elif (choice1 == 'rock' and choice2 == 'scissors') or \
-                                 (choice1 == 'paper' and choice2 == 'rock') or \
-                                 (choice1 == 'scissors' and choice2 == 'paper'):
-                                winner = p1.user
-                                loser = p2.user
-                            else:
-                                winner = p2.user
-                                loser = p1.user
-
-                            # 处理结果 - 存储在result字段中，因为Game模型没有winner字段
-                            game.result = {
-                                'winner': winner.username,
-                                'loser': loser.username,
-                                'winner_choice': choice1 if winner == p1.user else choice2,
-                                'loser_choice': choice2 if winner == p1.user else choice1,
-                                'game_results': results
-                            }
-                            game.status = 'completed'
-                            game.completed_at = timezone.now()
-                            game.save()
-
-                            # 输家加时30分钟
-                            loser_lock_tasks = LockTask.objects.filter(
-                                user=loser,
-                                status='active'
-                            )
-                            for task in loser_lock_tasks:
-                                previous_end_time = task.end_time
-                                if task.end_time:
-                                    task.end_time += timedelta(minutes=30)
-                                else:
-                                    task.end_time = timezone.now() + timedelta(minutes=30)
-                                task.save()
-
-                                # 创建时间线事件记录游戏加时
-                                TaskTimelineEvent.objects.create(
-                                    task=task,
-                                    event_type='overtime_added',
-                                    user=None,  # 系统操作
-                                    time_change_minutes=30,
-                                    previous_end_time=previous_end_time,
-                                    new_end_time=task.end_time,
-                                    description=f'游戏失败加时: {loser.username} 在{game.game_type}游戏中败给 {winner.username}，增加30分钟锁时间',
-                                    metadata={
-                                        'game_id': str(game.id),
-                                        'game_type': game.game_type,
-                                        'winner': winner.username,
-                                        'loser': loser.username,
-                                        'penalty_minutes': 30
-                                    }
-                                )
-
-                            # 给获胜者发送胜利通知
-                            NotificationModel.create_notification(
-                                recipient=winner,
-                                notification_type='game_result',
-                                actor=loser,
-                                title='石头剪刀布获胜',
-                                message=f'恭喜！您在与 {loser.username} 的石头剪刀布游戏中获胜，获得 {game.bet_amount} 积分',
-                                related_object_type='game',
-                                related_object_id=game.id,
-                                extra_data={
-                                    'game_type': 'rock_paper_scissors',
-                                    'result': 'win',
-                                    'your_choice': game.result['winner_choice'],
-                                    'opponent_choice': game.result['loser_choice'],
-                                    'opponent_username': loser.username,
-                                    'opponent_id': loser.id,
-                                    'bet_amount': game.bet_amount,
-                                    'coins_change': game.bet_amount  # 获胜者得到积分
-                                },
-                                priority='normal'
-                            )
-
-                            # 给失败者发送失败通知
-                            NotificationModel.create_notification(
-                                recipient=loser,
-                                notification_type='game_result',
-                                actor=winner,
-                                title='石头剪刀布失败',
-                                message=f'很遗憾，您在与 {winner.username} 的石头剪刀布游戏中失败，锁时间增加30分钟',
-                                related_object_type='game',
-                                related_object_id=game.id,
-                                extra_data={
-                                    'game_type': 'rock_paper_scissors',
-                                    'result': 'lose',
-                                    'your_choice': game.result['loser_choice'],
-                                    'opponent_choice': game.result['winner_choice'],
-                                    'opponent_username': winner.username,
-                                    'opponent_id': winner.id,
-                                    'bet_amount': game.bet_amount,
-                                    'time_penalty_minutes': 30  # 失败者增加锁时间
-                                },
-                                priority='normal'
-                            )
-
-                            return Response({
-                                'message': f'{winner.username} 获胜！{loser.username} 增加30分钟锁时间',
-                                'winner': winner.username,
-                                'loser': loser.username,
-                                'results': results,
-                                'coins_change': game.bet_amount,  # 为前端显示积分变化
-                                'remaining_coins': getattr(winner, 'coins', 0)  # 获胜者的剩余积分
-                            })
-
-                    # 掷骰子游戏逻辑
-                    elif game.game_type == 'dice':
-                        print(f"DEBUG: Starting dice game logic for game {game.id}")
-                        participant = GameParticipant.objects.get(game=game, user=user)
-                        participant_guess = participant.action.get('guess', 'big')
-
-                        # 获取预先掷好的骰子结果
-                        dice_result = game.game_data.get('dice_result', 1)
-                        print(f"DEBUG: Dice result: {dice_result}, participant guess: {participant_guess}")
-
-                        # 判断大小 (4,5,6为大，1,2,3为小)
-                        is_big = dice_result >= 4
-                        is_correct = (participant_guess == 'big' and is_big) or (participant_guess == 'small' and not is_big)
-                        print(f"DEBUG: is_big: {is_big}, is_correct: {is_correct}")
-
-                        # 创建者总是获得参与费用
-                        creator = game.creator
-                        creator.coins += game.bet_amount
-                        creator.save()
-
-                        # 处理物品奖励转移
-                        item_transferred = False
-                        item_reward_details = None
-
-                        if is_correct and game.game_data.get('item_reward_id'):
-                            try:
-                                # 验证物品仍然存在且在游戏中
-                                reward_item = Item.objects.get(
-                                    id=game.game_data['item_reward_id'],
-                                    owner=creator,
-                                    status='in_game'
-                                )
-
-                                # 获取参与者背包
-                                participant_inventory, _ = UserInventory.objects.get_or_create(user=user)
-
-                                # 转移物品给获胜者
-                                reward_item.owner = user
-                                reward_item.inventory = participant_inventory
-                                reward_item.status = 'available'
-                                reward_item.save()
-                                item_transferred = True
-                                item_reward_details = game.game_data.get('item_reward_details')
-
-                                # 记录物品转移到游戏会话中
-                                GameSession.objects.create(
-                                    user=user,
-                                    game_type='dice',
-                                    bet_amount=game.bet_amount,
-                                    result_data={
-                                        'dice_result': dice_result,
-                                        'guess': participant_guess,
-                                        'is_correct': is_correct,
-                                        'item_received': item_reward_details,
-                                        'creator': creator.username
-                                    }
-                                )
-
-                            except Item.DoesNotExist:
-                                # 物品不再可用，只给积分奖励
-                                pass
-
-                        # 如果有奖励物品但参与者没猜中，归还物品给创建者
-                        if not is_correct and game.game_data.get('item_reward_id'):
-                            try:
-                                reward_item = Item.objects.get(
-                                    id=game.game_data['item_reward_id'],
-                                    owner=creator,
-                                    status='in_game'
-                                )
-                                # 归还给创建者
-                                creator_inventory, _ = UserInventory.objects.get_or_create(user=creator)
-                                reward_item.inventory = creator_inventory
-                                reward_item.status = 'available'
-                                reward_item.save()
-                            except Item.DoesNotExist:
-                                pass
-
-                        # 记录创建者的游戏会话
-                        GameSession.objects.create(
-                            user=creator,
-                            game_type='dice',
-                            bet_amount=game.bet_amount,
-                            result_data={
-                                'dice_result': dice_result,
-                                'participant_guess': participant_guess,
-                                'participant_won': is_correct,
-                                'coins_earned': game.bet_amount,
-                                'item_given': item_transferred,
-                                'participant': user.username
-                            }
-                        )
-
-                        # 完成游戏
-                        game.status = 'completed'
-                        game.completed_at = timezone.now()
-                        game.result = {
-                            'dice_result': dice_result,
-                            'participant_guess': participant_guess,
-                            'is_correct': is_correct,
-                            'creator': creator.username,
-                            'participant': user.username,
-                            'item_transferred': item_transferred,
-                            'item_details': item_reward_details
-                        }
-                        game.save()
-
-                        # 发送通知给参与者
-                        if is_correct:
-                            title = '掷骰子获胜'
-                            message = f'恭喜！您猜{participant_guess}，骰子结果是{dice_result}，猜中了！'
-                            if item_transferred:
-                                message += f'获得奖励物品：{item_reward_details["display_name"]}'
-                        else:
-                            title = '掷骰子失败'
-                            message = f'很遗憾，您猜{participant_guess}，骰子结果是{dice_result}，没有猜中。'
-
-                        NotificationModel.create_notification(
-                            recipient=user,
-                            notification_type='game_result',
-                            actor=creator,
-                            title=title,
-                            message=message,
-                            related_object_type='game',
-                            related_object_id=game.id,
-                            extra_data={
-                                'game_type': 'dice',
-                                'dice_result': dice_result,
-                                'guess': participant_guess,
-                                'is_correct': is_correct,
-                                'item_received': item_reward_details if item_transferred else None,
-                                'creator_username': creator.username,
-                                'creator_id': creator.id,
-                                'bet_amount': game.bet_amount
-                            },
-                            priority='normal'
-                        )
-
-                        # 发送通知给创建者
-                        creator_message = f'{user.username} 参与了您的掷骰子游戏，猜{participant_guess}，'
-                        creator_message += f'骰子结果{dice_result}，{"猜中了" if is_correct else "没猜中"}，'
-                        creator_message += f'您获得了 {game.bet_amount} 积分'
-                        if item_transferred:
-                            creator_message += f'，奖励物品已转移给对方'
-
-                        NotificationModel.create_notification(
-                            recipient=creator,
-                            notification_type='game_result',
-                            actor=user,
-                            title='掷骰子游戏完成',
-                            message=creator_message,
-                            related_object_type='game',
-                            related_object_id=game.id,
-                            extra_data={
-                                'game_type': 'dice',
-                                'dice_result': dice_result,
-                                'participant_guess': participant_guess,
-                                'participant_won': is_correct,
-                                'coins_earned': game.bet_amount,
-                                'item_given': item_transferred,
-                                'participant_username': user.username,
-                                'participant_id': user.id,
-                                'bet_amount': game.bet_amount
-                            },
-                            priority='normal'
-                        )
-
-                        # 刷新用户对象以获取最新的积分
-                        user.refresh_from_db()
-                        print(f"DEBUG: Final user coins: {getattr(user, 'coins', 0)}")
+    try:
+        joined = GameMatchmakingService.join(
+            request.user, game_id, serializer.validated_data.get('action', {})
+        )
+    except GameError as e:
+        return Response({'error': e.message}, status=e.status_code)
+    except Exception as e:
+        logger.error(f"Error joining game {game_id}: {e}")
+        return Response({
+            'error': f'加入游戏失败: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-                        return Response({
-                            'message': f'掷骰子结果：{dice_result}，您猜{participant_guess}，{"猜中了！" if is_correct else "没猜中"}',
-                            'dice_result': dice_result,
-                            'guess': participant_guess,
-                            'is_correct': is_correct,
-                            'item_received': item_reward_details if item_transferred else None,
-                            'creator_coins_change': game.bet_amount,
-                            'remaining_coins': getattr(user, 'coins', 0)
-                        })
+    game = joined['game']
+    if joined['is_full']:
+        return Response({
+            'message': '游戏已满员，正在结算',
+            'game_id': str(game.id),
+            'status': game.status,
+            'participants': joined['participants'],
+            'max_participants': joined['max_participants']
+        }, status=status.HTTP_202_ACCEPTED)
 
-                return Response({
-                    'message': '成功加入游戏',
-                    'participants': participant_count + 1,
-                    'max_participants': game.max_players
-                })
+    return Response({
+        'message': '成功加入游戏',
+        'game_id': str(game.id),
+        'status': game.status,
+        'participants': joined['participants'],
+        'max_participants': joined['max_participants']
+    })
 
-        except Exception as e:
-            return Response({
-                'error': f'加入游戏失败: {str(e)}'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_game_status(request, game_id):
+    """获取游戏状态与结算结果"""
+    try:
+        return Response(GameMatchmakingService.get_status(request.user, game_id))
+    except GameError as e:
+        return Response({'error': e.message}, status=e.status_code)
 
 
 def get_zone_display_name(zone_name: str) -> str:
@@ -1169,6 +693,21 @@ def bury_item(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def _exploration_cooldown_response(last_exploration_at, now):
+    """探索仍在冷却中时返回 429 响应，否则返回 None"""
+    time_since_last = now - last_exploration_at
+    cooldown_remaining = max(0, COOLDOWN_SECONDS - int(time_since_last.total_seconds()))
+    if cooldown_remaining <= 0:
+        return None
+
+    retry_after = now + timedelta(seconds=cooldown_remaining)
+    return Response({
+        'error': '探索冷却中',
+        'cooldown_seconds': cooldown_remaining,
+        'retry_after': retry_after.isoformat()
+    }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def explore_zone(request):
@@ -1178,11 +717,19 @@ def explore_zone(request):
         zone_name = serializer.validated_data['zone_name']
         card_position = serializer.validated_data.get('card_position', 0)  # 用户选择的卡牌位置
 
+        user = request.user
+        now = timezone.now()
+        today = now.date()
+
+        # 冷却检查优先使用缓存的探索状态，冷却中的请求不访问数据库
+        cached_state = get_exploration_state(user.id, zone_name, today)
+        if cached_state:
+            cooldown_response = _exploration_cooldown_response(cached_state['last_exploration_at'], now)
+            if cooldown_response:
+                return cooldown_response
+
         try:
             with transaction.atomic():
-                user = request.user
-                today = timezone.now().date()
-
                 # 获取或创建今日探索记录
                 exploration_record, created = UserZoneExploration.objects.get_or_create(
                     user=user,
@@ -1190,21 +737,18 @@ def explore_zone(request):
                     exploration_date=today,
                     defaults={
                         'daily_count': 0,
-                        'last_exploration_at': timezone.now() - timedelta(seconds=COOLDOWN_SECONDS + 1)
+                        'last_exploration_at': now - timedelta(seconds=COOLDOWN_SECONDS + 1)
                     }
                 )
 
                 # 检查冷却时间
-                time_since_last = timezone.now() - exploration_record.last_exploration_at
-                cooldown_remaining = max(0, COOLDOWN_SECONDS - int(time_since_last.total_seconds()))
-
-                if cooldown_remaining > 0:
-                    retry_after = timezone.now() + timedelta(seconds=cooldown_remaining)
-                    return Response({
-                        'error': '探索冷却中',
-                        'cooldown_seconds': cooldown_remaining,
-                        'retry_after': retry_after.isoformat()
-                    }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+                cooldown_response = _exploration_cooldown_response(exploration_record.last_exploration_at, now)
+                if cooldown_response:
+                    remember_exploration_state(
+                        user.id, zone_name, today,
+                        exploration_record.daily_count, exploration_record.last_exploration_at
+                    )
+                    return cooldown_response
 
                 # 计算本次探索费用（基于今日探索次数，斐波那契递增）
                 next_exploration_number = exploration_record.daily_count + 1
@@ -1218,6 +762,18 @@ def explore_zone(request):
                         'current': user.coins
                     }, status=status.HTTP_400_BAD_REQUEST)
 
+                # 条件更新探索记录（无需行锁）：并发的探索只有一个能更新成功
+                updated = UserZoneExploration.objects.filter(
+                    pk=exploration_record.pk,
+                    daily_count=exploration_record.daily_count,
+                    last_exploration_at=exploration_record.last_exploration_at
+                ).update(daily_count=next_exploration_number, last_exploration_at=now)
+                if not updated:
+                    return _exploration_cooldown_response(now, now)
+                exploration_record.daily_count = next_exploration_number
+                exploration_record.last_exploration_at = now
+                remember_exploration_state(user.id, zone_name, today, next_exploration_number, now)
+
                 # 扣除探索费用
                 if hasattr(user, 'coins'):
                     user.deduct_coins(
@@ -1227,65 +783,32 @@ def explore_zone(request):
                         metadata={'zone': zone_name, 'exploration_number': next_exploration_number}
                     )
 
-                # 更新探索记录
-                exploration_record.daily_count = next_exploration_number
-                exploration_record.last_exploration_at = timezone.now()
-                exploration_record.save()
-
                 # 计算下次探索费用
                 next_cost = get_fibonacci_cost(next_exploration_number + 1)
 
                 # 探索活跃度奖励
                 request.user.update_activity(points=1)
 
-                # 查找该区域的可发现宝物
-                available_treasures = BuriedTreasure.objects.filter(
-                    location_zone=zone_name,
-                    status='buried',
-                    expires_at__gt=timezone.now()
-                ).exclude(burier=user)  # 不能发现自己埋的宝物
-
                 # 根据区域确定难度和卡牌数量
-                zone_config = {
-                    'beach': {'difficulty': 'easy', 'card_count': 3},
-                    'forest': {'difficulty': 'normal', 'card_count': 6},
-                    'mountain': {'difficulty': 'hard', 'card_count': 9},
-                    'desert': {'difficulty': 'normal', 'card_count': 6},
-                    'cave': {'difficulty': 'hard', 'card_count': 9}
-                }
+                difficulty = get_zone_difficulty(zone_name)
+                card_count = ZONE_CARD_COUNTS.get(zone_name, DEFAULT_CARD_COUNT)
 
-                config = zone_config.get(zone_name, {'difficulty': 'normal', 'card_count': 6})
-                card_count = config['card_count']
+                # 从区域宝物索引中随机抽取宝物（不能发现自己埋的），最多放置卡数量-1个，确保至少有一个空卡
+                drawn_treasures = draw_treasures(zone_name, user.id, card_count - 1, now)
+                position_to_treasure = deal_cards(drawn_treasures, card_count)
 
-                # 生成卡牌并处理翻牌结果
-                cards = []
-                treasure_positions = set()
-                selected_treasure = None
                 found_item = None
-                selected_treasures = []
-                position_to_treasure = {}
-
-                if available_treasures.exists():
-                    # 随机选择一些宝物放入卡牌中
-                    treasure_list = list(available_treasures)
-                    # 最多放置卡数量-1个宝物，确保至少有一个空卡
-                    max_treasures = min(len(treasure_list), card_count - 1)
-                    selected_treasures = random.sample(treasure_list, max_treasures)
-
-                    # 随机分配位置 - 将宝物分配到随机位置
-                    possible_positions = list(range(card_count))
-                    # 随机选择位置（保持列表顺序用于映射）
-                    selected_positions = random.sample(possible_positions, len(selected_treasures))
-                    treasure_positions = set(selected_positions)
-
-                    # 创建位置到宝物的映射
-                    # selected_positions[i] 位置对应 selected_treasures[i] 宝物
-                    position_to_treasure = {pos: treasure for pos, treasure in zip(selected_positions, selected_treasures)}
-
-                    # 检查用户选择的卡牌是否有宝物
-                    if card_position in treasure_positions:
-                        selected_treasure = position_to_treasure[card_position]
-
+                selected_entry = position_to_treasure.get(card_position)
+                if selected_entry is not None:
+                    # 只锁定被翻开的宝物；索引过期（宝物已被他人发现）时按空卡处理
+                    selected_treasure = BuriedTreasure.objects.select_for_update(of=('self',)).select_related(
+                        'burier', 'item__item_type'
+                    ).filter(id=selected_entry['id'], status='buried').first()
+
+                    if selected_treasure is None:
+                        del position_to_treasure[card_position]
+                        invalidate_treasure_index(zone_name)
+                    else:
                         # 检查背包容量
                         inventory, _ = UserInventory.objects.get_or_create(user=user)
                         if inventory.available_slots < 1:
@@ -1349,25 +872,20 @@ def explore_zone(request):
                             'properties': item.properties
                         }
 
-                # 创建所有卡牌（展示完整结果）
-                # position_to_treasure 已在上方创建，直接使用
-
+                # 创建所有卡牌（展示完整结果，不打乱卡牌顺序，保持位置一致性）
+                cards = []
                 for i in range(card_count):
-                    if i in treasure_positions:
-                        treasure = position_to_treasure[i]
-
-                        # 如果这个宝物已经被找到，标记为已找到
-                        is_found = treasure == selected_treasure
-
+                    treasure = position_to_treasure.get(i)
+                    if treasure is not None:
                         cards.append({
                             'position': i,
                             'has_treasure': True,
-                            'treasure_id': str(treasure.id),
-                            'location_hint': treasure.location_hint,
-                            'difficulty': treasure.difficulty,
-                            'item_type': treasure.item.item_type.display_name,
-                            'burier': treasure.burier.username,
-                            'is_found': is_found
+                            'treasure_id': treasure['id'],
+                            'location_hint': treasure['location_hint'],
+                            'difficulty': treasure['difficulty'],
+                            'item_type': treasure['item_type'],
+                            'burier': treasure['burier'],
+                            'is_found': found_item is not None and i == card_position
                         })
                     else:
                         cards.append({
@@ -1375,8 +893,6 @@ def explore_zone(request):
                             'has_treasure': False
                         })
 
-                # 不打乱卡牌顺序，保持位置一致性
-
                 return Response({
                     'message': f'在 {get_zone_display_name(zone_name)} 区域探索完成！花费{exploration_cost}积分',
                     'zone': zone_name,
@@ -1384,7 +900,7 @@ def explore_zone(request):
                     'today_count': exploration_record.daily_count,
                     'cooldown_remaining': COOLDOWN_SECONDS,
                     'next_cost': next_cost,
-                    'difficulty': config['difficulty'],
+                    'difficulty': difficulty,
                     'card_count': card_count,
                     'cards': cards,
                     'selected_position': card_position,
@@ -1517,78 +1033,39 @@ class BuriedTreasureListView(generics.ListAPIView):
 @permission_classes([IsAuthenticated])
 def get_available_zones(request):
     """获取可探索的区域列表（包含冷却状态和费用信息）"""
-    zones = [
-        {
-            'name': 'forest',
-            'display_name': '神秘森林',
-            'description': '古老的森林，充满了未知的秘密',
-            'difficulty': 'normal'
-        },
-        {
-            'name': 'mountain',
-            'display_name': '雾山',
-            'description': '云雾缭绕的高山，隐藏着珍贵的宝物',
-            'difficulty': 'hard'
-        },
-        {
-            'name': 'beach',
-            'display_name': '月光海滩',
-            'description': '月光下的海滩，经常有意外收获',
-            'difficulty': 'easy'
-        },
-        {
-            'name': 'desert',
-            'display_name': '沙漠绿洲',
-            'description': '干燥的沙漠中的生命之源',
-            'difficulty': 'normal'
-        },
-        {
-            'name': 'cave',
-            'display_name': '深邃洞穴',
-            'description': '黑暗的洞穴深处藏着最珍贵的财宝',
-            'difficulty': 'hard'
-        }
-    ]
-
     user = request.user
-    today = timezone.now().date()
+    now = timezone.now()
+    today = now.date()
 
-    # 统计每个区域的宝物数量和冷却状态
-    for zone in zones:
-        zone_name = zone['name']
+    zone_names = [zone['name'] for zone in EXPLORATION_ZONES]
 
-        # 宝物数量
-        treasure_count = BuriedTreasure.objects.filter(
-            location_zone=zone_name,
-            status='buried',
-            expires_at__gt=timezone.now()
-        ).count()
-        zone['treasure_count'] = treasure_count
+    # 各区域宝物数量与今日探索状态（均优先读缓存）
+    treasure_counts = get_treasure_counts(zone_names, now)
+    exploration_states = get_exploration_states(user.id, zone_names, today)
 
-        # 获取或创建今日探索记录
-        exploration_record, _ = UserZoneExploration.objects.get_or_create(
-            user=user,
-            zone_name=zone_name,
-            exploration_date=today,
-            defaults={
-                'daily_count': 0,
-                'last_exploration_at': timezone.now() - timedelta(seconds=COOLDOWN_SECONDS + 1)
-            }
-        )
+    zones = []
+    for zone_definition in EXPLORATION_ZONES:
+        zone = dict(zone_definition)
+        zone_name = zone['name']
+        zone['treasure_count'] = treasure_counts.get(zone_name, 0)
 
-        # 计算冷却状态
-        time_since_last = timezone.now() - exploration_record.last_exploration_at
-        cooldown_remaining = max(0, COOLDOWN_SECONDS - int(time_since_last.total_seconds()))
+        # 计算冷却状态（没有记录的区域按未探索处理，记录在实际探索时创建）
+        exploration_state = exploration_states.get(zone_name)
+        daily_count = exploration_state['daily_count'] if exploration_state else 0
+        cooldown_remaining = 0
+        if exploration_state:
+            time_since_last = now - exploration_state['last_exploration_at']
+            cooldown_remaining = max(0, COOLDOWN_SECONDS - int(time_since_last.total_seconds()))
 
         # 添加冷却和费用信息
         zone['cooldown_seconds'] = cooldown_remaining
         zone['is_cooldown'] = cooldown_remaining > 0
-        zone['today_count'] = exploration_record.daily_count
-        zone['next_cost'] = get_fibonacci_cost(exploration_record.daily_count + 1)
+        zone['today_count'] = daily_count
+        zone['next_cost'] = get_fibonacci_cost(daily_count + 1)
+        zones.append(zone)
 
-    return Response({
-        'zones': zones
-    }, status=status.HTTP_200_OK)
+    data = {'zones': zones}
+    return conditional_response(request, data, payload_etag(data))
 
 
 @api_view(['DELETE'])
@@ -1597,7 +1074,8 @@ def cancel_game(request, game_id):
     """取消游戏"""
     try:
         with transaction.atomic():
-            game = get_object_or_404(Game, id=game_id)
+            # 锁定游戏，避免与正在进行的加入并发
+            game = get_object_or_404(Game.objects.select_for_update(), id=game_id)
             user = request.user
 
             # 检查权限：只能取消自己创建的且状态为waiting的游戏
@@ -1891,9 +1369,9 @@ def create_share_link(request):
         with transaction.atomic():
             user = request.user
 
-            # 获取要分享的物品
+            # 锁定要分享的物品，并发创建时复用同一个分享链接
             item = get_object_or_404(
-                Item,
+                Item.objects.select_for_update(of=('self',)).select_related('item_type'),
                 id=item_id,
                 owner=user,
                 status='available'
@@ -1955,90 +1433,26 @@ def create_share_link(request):
 def claim_shared_item(request, share_token):
     """领取分享的物品"""
     try:
-        with transaction.atomic():
-            user = request.user
-
-            # 获取分享记录
-            shared_item = get_object_or_404(
-                SharedItem,
-                share_token=share_token,
-                status='active',
-                expires_at__gt=timezone.now()
-            )
-
-            # 检查不能领取自己分享的物品
-            if shared_item.sharer == user:
-                return Response({
-                    'error': '不能领取自己分享的物品'
-                }, status=status.HTTP_400_BAD_REQUEST)
-
-            # 验证物品仍然属于原分享者且状态为可用
-            item = shared_item.item
-            if item.owner != shared_item.sharer:
-                return Response({
-                    'error': '物品已不属于原分享者，无法领取'
-                }, status=status.HTTP_400_BAD_REQUEST)
-
-            if item.status != 'available':
-                return Response({
-                    'error': f'物品状态异常（{item.status}），无法领取'
-                }, status=status.HTTP_400_BAD_REQUEST)
-
-            # 检查背包容量
-            inventory, _ = UserInventory.objects.get_or_create(user=user)
-            if inventory.available_slots < 1:
-                return Response({
-                    'error': f'背包空间不足，剩余{inventory.available_slots}格'
-                }, status=status.HTTP_400_BAD_REQUEST)
-
-            # 转移物品所有权（从原主人背包转移到领取者背包）
-            item.owner = user
-            item.inventory = inventory  # 移到领取者背包
-            item.status = 'available'
-            item.save()
-
-            # 更新分享状态
-            shared_item.claimer = user
-            shared_item.status = 'claimed'
-            shared_item.claimed_at = timezone.now()
-            shared_item.save()
-
-            # 创建通知给分享者
-            Notification.create_notification(
-                recipient=shared_item.sharer,
-                notification_type='item_shared',
-                actor=user,
-                title='物品被领取',
-                message=f'{user.username} 领取了您分享的 {item.item_type.display_name}',
-                related_object_type='shared_item',
-                related_object_id=shared_item.id,
-                extra_data={
-                    'item_type': item.item_type.name,
-                    'item_display_name': item.item_type.display_name,
-                    'claimed_by': user.username,
-                    'claimed_at': shared_item.claimed_at.isoformat()
-                }
-            )
-
-            # 给分享者增加活跃度
-            shared_item.sharer.update_activity(points=1)
-
-            return Response({
-                'message': f'成功领取 {item.item_type.display_name}！',
-                'item': {
-                    'id': str(item.id),
-                    'type': item.item_type.display_name,
-                    'properties': item.properties
-                },
-                'sharer': shared_item.sharer.username,
-                'remaining_slots': inventory.available_slots
-            }, status=status.HTTP_200_OK)
-
+        claimed = ShareClaimService.claim(request.user, share_token)
+    except ShareClaimError as e:
+        return Response({'error': e.message}, status=e.status_code)
     except Exception as e:
         return Response({
             'error': f'领取物品失败: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    item = claimed['item']
+    return Response({
+        'message': f'成功领取 {item.item_type.display_name}！',
+        'item': {
+            'id': str(item.id),
+            'type': item.item_type.display_name,
+            'properties': item.properties
+        },
+        'sharer': claimed['shared_item'].sharer.username,
+        'remaining_slots': claimed['inventory'].available_slots
+    }, status=status.HTTP_200_OK)
+
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -3707,7 +3121,7 @@ def create_arena_game(request):
             # 计算截止时间
             deadline = timezone.now() + timedelta(hours=deadline_hours)
 
-            # 创建游戏
+            # 创建游戏（观众与投票存放在 ArenaAudience/ArenaVote，计数在 ArenaMatch）
             game = Game.objects.create(
                 game_type='arena',
                 creator=user,
@@ -3720,20 +3134,16 @@ def create_arena_game(request):
                         'uploaded_at': timezone.now().isoformat()
                     },
                     'challenger_photo': None,
-                    'config': {
-                        'audience_ticket_price': audience_ticket_price,
-                        'max_audience': max_audience,
-                        'deadline': deadline.isoformat(),
-                        'winner_reward_percentage': winner_reward_percentage
-                    },
-                    'audience': [],
-                    'votes': {
-                        'creator': 0,
-                        'challenger': 0
-                    }
                 },
                 result={}
             )
+            ArenaMatch.objects.create(
+                game=game,
+                audience_ticket_price=audience_ticket_price,
+                max_audience=max_audience,
+                winner_reward_percentage=winner_reward_percentage,
+                deadline=deadline,
+            )
 
             # 创建发起者参与记录
             GameParticipant.objects.create(
@@ -3783,11 +3193,6 @@ def join_arena_game(request, game_id):
             if game.creator == user:
                 return Response({'error': '不能挑战自己创建的游戏'}, status=status.HTTP_400_BAD_REQUEST)
 
-            # 检查是否已有挑战者
-            existing_participants = GameParticipant.objects.filter(game=game).count()
-            if existing_participants >= 2:
-                return Response({'error': '此游戏已有挑战者'}, status=status.HTTP_400_BAD_REQUEST)
-
             # 检查用户积分
             if hasattr(user, 'coins') and user.coins < game.bet_amount:
                 return Response({'error': '积分不足'}, status=status.HTTP_400_BAD_REQUEST)
@@ -3802,6 +3207,13 @@ def join_arena_game(request, game_id):
             if ext not in ['.jpg', '.jpeg', '.png', '.gif', '.webp']:
                 return Response({'error': '不支持的图片格式'}, status=status.HTTP_400_BAD_REQUEST)
 
+            # 原子占用挑战者席位，并发加入时只有一个请求成功
+            claimed = ArenaMatch.objects.filter(
+                game_id=game.id, challenger__isnull=True
+            ).update(challenger=user)
+            if not claimed:
+                return Response({'error': '此游戏已有挑战者'}, status=status.HTTP_400_BAD_REQUEST)
+
             # 生成时间戳命名格式: YYYYMMDD_HHMMSS_milliseconds.jpg (与发布动态相同)
             now = timezone.now()
             timestamp = now.strftime('%Y%m%d_%H%M%S')
@@ -3889,50 +3301,53 @@ def enter_arena_audience(request, game_id):
     try:
         with transaction.atomic():
             user = request.user
-            game = get_object_or_404(Game, id=game_id, game_type='arena')
+            game = get_object_or_404(Game.objects.select_related('arena_match'), id=game_id, game_type='arena')
+            match = game.arena_match
 
             # 检查游戏状态
             if game.status != 'active':
                 return Response({'error': '游戏不在进行中'}, status=status.HTTP_400_BAD_REQUEST)
 
             # 检查是否是发起者或挑战者
-            participant = GameParticipant.objects.filter(game=game, user=user).first()
-            if participant:
-                role = participant.action.get('role')
-                if role in ['creator', 'challenger']:
-                    return Response({
-                        'error': '发起者和挑战者不能以观众身份入场',
-                        'has_access': True,
-                        'role': role
-                    }, status=status.HTTP_400_BAD_REQUEST)
-
-            # 检查是否已经在观众列表中
-            audience_list = game.game_data.get('audience', [])
-            existing_audience = [a for a in audience_list if a.get('user_id') == user.id]
-            if existing_audience:
+            if user.id in (game.creator_id, match.challenger_id):
                 return Response({
-                    'message': '您已经是观众',
+                    'error': '发起者和挑战者不能以观众身份入场',
                     'has_access': True,
-                    'remaining_coins': getattr(user, 'coins', 0)
-                })
-
-            # 检查观众人数上限
-            if len(audience_list) >= game.game_data['config']['max_audience']:
-                return Response({'error': '观众人数已满'}, status=status.HTTP_400_BAD_REQUEST)
+                    'role': 'creator' if user.id == game.creator_id else 'challenger'
+                }, status=status.HTTP_400_BAD_REQUEST)
 
             # 检查截止时间
-            from django.utils.dateparse import parse_datetime
-            deadline = parse_datetime(game.game_data['config']['deadline'])
-            if deadline and timezone.now() > deadline:
+            if timezone.now() > match.deadline:
                 return Response({'error': '游戏已截止'}, status=status.HTTP_400_BAD_REQUEST)
 
             # 获取门票价格
-            ticket_price = game.game_data['config']['audience_ticket_price']
+            ticket_price = match.audience_ticket_price
 
             # 检查用户积分
             if hasattr(user, 'coins') and user.coins < ticket_price:
                 return Response({'error': '积分不足'}, status=status.HTTP_400_BAD_REQUEST)
 
+            # 唯一约束保证同一观众只入场一次
+            try:
+                with transaction.atomic():
+                    ArenaAudience.objects.create(game=game, user=user, ticket_price=ticket_price)
+            except IntegrityError:
+                return Response({
+                    'message': '您已经是观众',
+                    'has_access': True,
+                    'remaining_coins': getattr(user, 'coins', 0)
+                })
+
+            # 条件递增观众计数，满员时不更新
+            seated = ArenaMatch.objects.filter(
+                game_id=game.id,
+                game__status='active',
+                audience_count__lt=F('max_audience'),
+            ).update(audience_count=F('audience_count') + 1)
+            if not seated:
+                transaction.set_rollback(True)
+                return Response({'error': '观众人数已满'}, status=status.HTTP_400_BAD_REQUEST)
+
             # 扣除门票费用
             if hasattr(user, 'coins'):
                 user.deduct_coins(
@@ -3942,17 +3357,6 @@ def enter_arena_audience(request, game_id):
                     metadata={'game_id': str(game.id)}
                 )
 
-            # 添加观众到列表
-            new_audience = {
-                'user_id': user.id,
-                'username': user.username,
-                'joined_at': timezone.now().isoformat(),
-                'has_voted': False,
-                'vote_for': None
-            }
-            game.game_data['audience'].append(new_audience)
-            game.save()
-
             # 创建观众参与记录
             GameParticipant.objects.get_or_create(
                 game=game,
@@ -3993,42 +3397,36 @@ def vote_arena_game(request, game_id):
                 return Response({'error': '投票选择无效'}, status=status.HTTP_400_BAD_REQUEST)
 
             # 检查用户是否是观众
-            audience_list = game.game_data.get('audience', [])
-            audience_entry = None
-            for a in audience_list:
-                if a.get('user_id') == user.id:
-                    audience_entry = a
-                    break
-
-            if not audience_entry:
+            if not ArenaAudience.objects.filter(game=game, user=user).exists():
                 return Response({'error': '您不是此游戏的观众'}, status=status.HTTP_403_FORBIDDEN)
 
-            # 检查是否已经投票
-            if audience_entry.get('has_voted'):
+            # 唯一约束保证每位观众只投一票
+            try:
+                with transaction.atomic():
+                    ArenaVote.objects.create(game=game, voter=user, vote_for=vote_for)
+            except IntegrityError:
                 return Response({'error': '您已经投过票了'}, status=status.HTTP_400_BAD_REQUEST)
 
-            # 记录投票
-            audience_entry['has_voted'] = True
-            audience_entry['vote_for'] = vote_for
-            audience_entry['voted_at'] = timezone.now().isoformat()
-
-            # 更新票数统计
-            game.game_data['votes'][vote_for] += 1
-            game.save()
+            # 更新票数统计（F() 原子累加，不读写整段 game_data）
+            counter = 'creator_votes' if vote_for == 'creator' else 'challenger_votes'
+            counted = ArenaMatch.objects.filter(game_id=game.id, game__status='active').update(**{
+                counter: F(counter) + 1,
+                'voted_count': F('voted_count') + 1,
+            })
+            if not counted:
+                transaction.set_rollback(True)
+                return Response({'error': '游戏不在进行中'}, status=status.HTTP_400_BAD_REQUEST)
 
-            # 检查是否所有观众都已投票
-            all_voted = all(a.get('has_voted', False) for a in audience_list)
-            total_audience = len(audience_list)
-            max_audience = game.game_data.get('config', {}).get('max_audience', 20)
+            match = ArenaMatch.objects.get(game_id=game.id)
 
             # 只有当达到最大观众数且全部投票后才自动结算
             # 否则等待截止时间到达后手动结算
-            if all_voted and total_audience >= max_audience:
+            if match.voted_count >= match.audience_count >= match.max_audience:
                 result = settle_arena_game_internal(game)
                 return Response({
                     'message': '投票成功！所有观众已投票，游戏已结算',
                     'vote_for': vote_for,
-                    'current_votes': game.game_data['votes'],
+                    'current_votes': match.votes,
                     'is_completed': True,
                     'result': result
                 })
@@ -4036,10 +3434,10 @@ def vote_arena_game(request, game_id):
             return Response({
                 'message': '投票成功',
                 'vote_for': vote_for,
-                'current_votes': game.game_data['votes'],
+                'current_votes': match.votes,
                 'is_completed': False,
-                'total_audience': total_audience,
-                'voted_count': sum(1 for a in audience_list if a.get('has_voted', False))
+                'total_audience': match.audience_count,
+                'voted_count': match.voted_count
             }, status=status.HTTP_200_OK)
 
     except Exception as e:
@@ -4081,15 +3479,27 @@ def settle_arena_game(request, game_id):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _arena_user_payload(user):
+    """角斗场对局中的用户信息"""
+    if not user:
+        return None
+    return {
+        'id': user.id,
+        'username': user.username,
+        'avatar': user.avatar.url if user.avatar else None,
+        'level': user.level,
+        'active_lock_task': None
+    }
+
+
 def settle_arena_game_internal(game):
-    """内部结算函数"""
+    """内部结算函数（基于 ArenaMatch 计数器）"""
     from users.models import Notification as NotificationModel
 
     with transaction.atomic():
-        votes = game.game_data.get('votes', {'creator': 0, 'challenger': 0})
-        audience_list = game.game_data.get('audience', [])
-        config = game.game_data.get('config', {})
-        winner_reward_percentage = config.get('winner_reward_percentage', 80)
+        match = ArenaMatch.objects.select_related('challenger').get(game_id=game.id)
+        votes = match.votes
+        winner_reward_percentage = match.winner_reward_percentage
 
         # 确定胜者
         if votes['creator'] > votes['challenger']:
@@ -4102,7 +3512,7 @@ def settle_arena_game_internal(game):
 
         # 计算总奖池
         total_bet = game.bet_amount * 2  # 发起者 + 挑战者
-        total_tickets = sum(config.get('audience_ticket_price', 5) for _ in audience_list)
+        total_tickets = match.audience_ticket_price * match.audience_count
         total_pot = total_bet + total_tickets
 
         # 计算奖励分配
@@ -4117,64 +3527,46 @@ def settle_arena_game_internal(game):
             winner_reward = total_pot // 2
             loser_reward = total_pot - winner_reward
 
-        # 获取参与用户
-        participants = GameParticipant.objects.filter(game=game)
-        creator_user = None
-        challenger_user = None
-
-        for p in participants:
-            role = p.action.get('role')
-            if role == 'creator':
-                creator_user = p.user
-            elif role == 'challenger':
-                challenger_user = p.user
-
-        # 发放奖励
-        if creator_user and hasattr(creator_user, 'coins'):
-            if winner == 'creator':
-                creator_user.add_coins(
-                    amount=winner_reward,
-                    change_type='arena_game_reward',
-                    description='角斗场游戏获胜奖励',
-                    metadata={'game_id': str(game.id), 'votes': votes}
-                )
-            else:
-                creator_user.add_coins(
-                    amount=loser_reward,
-                    change_type='arena_game_reward',
-                    description='角斗场游戏参与奖励',
-                    metadata={'game_id': str(game.id), 'votes': votes}
-                )
-
-        if challenger_user and hasattr(challenger_user, 'coins'):
-            if winner == 'challenger':
-                challenger_user.add_coins(
-                    amount=winner_reward,
-                    change_type='arena_game_reward',
-                    description='角斗场游戏获胜奖励',
-                    metadata={'game_id': str(game.id), 'votes': votes}
-                )
-            else:
-                challenger_user.add_coins(
-                    amount=loser_reward,
-                    change_type='arena_game_reward',
-                    description='角斗场游戏参与奖励',
-                    metadata={'game_id': str(game.id), 'votes': votes}
-                )
-
-        # 更新游戏状态
-        game.status = 'completed'
-        game.completed_at = timezone.now()
-        game.result = {
+        completed_at = timezone.now()
+        result = {
             'winner': winner,
             'total_pot': total_pot,
             'creator_reward': winner_reward if winner == 'creator' else loser_reward,
             'challenger_reward': winner_reward if winner == 'challenger' else loser_reward,
             'final_votes': votes,
-            'audience_count': len(audience_list),
-            'completed_at': timezone.now().isoformat()
+            'audience_count': match.audience_count,
+            'completed_at': completed_at.isoformat()
         }
-        game.save()
+
+        # 条件更新游戏状态，并发结算时只有一个请求发放奖励
+        claimed = Game.objects.filter(id=game.id, status='active').update(
+            status='completed', completed_at=completed_at, result=result
+        )
+        if not claimed:
+            game.refresh_from_db(fields=['status', 'completed_at', 'result'])
+            return game.result
+
+        game.status = 'completed'
+        game.completed_at = completed_at
+        game.result = result
+
+        creator_user = game.creator
+        challenger_user = match.challenger
+
+        # 发放奖励（双方奖励在同一批次内原子入账）
+        payouts = []
+        for user, role in ((creator_user, 'creator'), (challenger_user, 'challenger')):
+            if not user:
+                continue
+            is_winner = winner == role
+            payouts.append({
+                'user': user,
+                'amount': winner_reward if is_winner else loser_reward,
+                'change_type': 'arena_game_reward',
+                'description': '角斗场游戏获胜奖励' if is_winner else '角斗场游戏参与奖励',
+                'metadata': {'game_id': str(game.id), 'votes': votes}
+            })
+        CoinsLedgerService.apply_changes(payouts)
 
         # 发送通知
         if creator_user:
@@ -4225,31 +3617,34 @@ def settle_arena_game_internal(game):
                 priority='normal'
             )
 
-        # 发送通知给所有观众
-        from users.models import User
-        for audience_member in audience_list:
-            try:
-                audience_user = User.objects.get(id=audience_member['user_id'])
-                voted_for = audience_member.get('vote_for', 'unknown')
-                vote_result = '猜中了！' if (voted_for == winner or (voted_for == 'creator' and winner == 'creator') or (voted_for == 'challenger' and winner == 'challenger')) else '很遗憾，您支持的一方没有获胜。'
-
-                NotificationModel.create_notification(
-                    recipient=audience_user,
-                    notification_type='game_result',
-                    actor=creator_user or challenger_user,
-                    title='角斗场游戏结束',
-                    message=f'您参与的角斗场对决已结束！最终投票：发起者 {votes["creator"]} 票 vs 挑战者 {votes["challenger"]} 票。{vote_result}',
-                    related_object_type='game',
-                    related_object_id=game.id,
-                    extra_data={
-                        'game_type': 'arena',
-                        'result': game.result,
-                        'your_vote': voted_for
-                    },
-                    priority='normal'
-                )
-            except User.DoesNotExist:
-                continue
+        # 批量通知所有观众
+        audience_votes = ArenaAudience.objects.filter(game=game).annotate(
+            vote_for=Subquery(
+                ArenaVote.objects.filter(game=game, voter_id=OuterRef('user_id')).values('vote_for')[:1]
+            )
+        ).values_list('user_id', 'vote_for')
+
+        NotificationModel.bulk_create_notifications([
+            {
+                'recipient_id': user_id,
+                'notification_type': 'game_result',
+                'actor': creator_user or challenger_user,
+                'title': '角斗场游戏结束',
+                'message': (
+                    f'您参与的角斗场对决已结束！最终投票：发起者 {votes["creator"]} 票 vs 挑战者 {votes["challenger"]} 票。'
+                    + ('猜中了！' if voted_for == winner else '很遗憾，您支持的一方没有获胜。')
+                ),
+                'related_object_type': 'game',
+                'related_object_id': game.id,
+                'extra_data': {
+                    'game_type': 'arena',
+                    'result': game.result,
+                    'your_vote': voted_for or 'unknown'
+                },
+                'priority': 'normal',
+            }
+            for user_id, voted_for in audience_votes
+        ])
 
         return game.result
 
@@ -4259,35 +3654,21 @@ def settle_arena_game_internal(game):
 def get_arena_game_status(request, game_id):
     """获取角斗场游戏状态"""
     try:
-        game = get_object_or_404(Game, id=game_id, game_type='arena')
+        game = get_object_or_404(
+            Game.objects.select_related('creator', 'arena_match', 'arena_match__challenger'),
+            id=game_id, game_type='arena'
+        )
+        match = game.arena_match
         user = request.user
 
         # 检查用户权限
-        is_creator = game.creator == user
-        is_challenger = False
-        is_audience = False
-        has_access = False
-
-        participant = GameParticipant.objects.filter(game=game, user=user).first()
-        if participant:
-            role = participant.action.get('role')
-            if role == 'challenger':
-                is_challenger = True
-                has_access = True
-            elif role == 'creator':
-                has_access = True
-            elif role == 'audience':
-                is_audience = True
-                # 检查是否在观众列表中且已支付
-                for a in game.game_data.get('audience', []):
-                    if a.get('user_id') == user.id:
-                        has_access = True
-                        break
+        is_creator = game.creator_id == user.id
+        is_challenger = match.challenger_id == user.id
+        is_audience = ArenaAudience.objects.filter(game=game, user=user).exists()
+        has_access = is_creator or is_challenger or is_audience
 
         # 检查截止时间
-        from django.utils.dateparse import parse_datetime
-        deadline = parse_datetime(game.game_data['config']['deadline'])
-        is_expired = deadline and timezone.now() > deadline
+        is_expired = timezone.now() > match.deadline
 
         # 如果游戏已截止但未结算，自动结算
         if is_expired and game.status == 'active':
@@ -4300,35 +3681,16 @@ def get_arena_game_status(request, game_id):
                 }
             })
 
-        # 获取挑战者信息
-        challenger = None
-        for p in GameParticipant.objects.filter(game=game):
-            if p.action.get('role') == 'challenger':
-                challenger = p.user
-                break
-
         # 构建响应数据
         response_data = {
             'id': str(game.id),
             'status': game.status,
             'bet_amount': game.bet_amount,
-            'creator': {
-                'id': game.creator.id,
-                'username': game.creator.username,
-                'avatar': game.creator.avatar.url if game.creator.avatar else None,
-                'level': game.creator.level,
-                'active_lock_task': None
-            },
-            'challenger': {
-                'id': challenger.id,
-                'username': challenger.username,
-                'avatar': challenger.avatar.url if challenger.avatar else None,
-                'level': challenger.level,
-                'active_lock_task': None
-            } if challenger else None,
-            'config': game.game_data.get('config', {}),
-            'votes': game.game_data.get('votes', {'creator': 0, 'challenger': 0}),
-            'audience_count': len(game.game_data.get('audience', [])),
+            'creator': _arena_user_payload(game.creator),
+            'challenger': _arena_user_payload(match.challenger),
+            'config': match.config,
+            'votes': match.votes,
+            'audience_count': match.audience_count,
             'is_expired': is_expired,
             'user_role': 'creator' if is_creator else ('challenger' if is_challenger else ('audience' if is_audience else 'none')),
             'has_access': has_access
@@ -4355,11 +3717,27 @@ def get_arena_game_status(request, game_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_arena_games(request):
-    """获取角斗场游戏列表"""
+    """获取角斗场游戏列表
+
+    单条查询：挑战者通过 select_related 关联，计数来自 ArenaMatch，
+    当前用户的入场/投票状态通过子查询注解。audience 仅包含当前用户自己的记录。
+    """
     try:
         status_filter = request.query_params.get('status', 'all')
+        user = request.user
 
-        games = Game.objects.filter(game_type='arena')
+        games = Game.objects.filter(
+            game_type='arena', arena_match__isnull=False
+        ).select_related(
+            'creator', 'arena_match', 'arena_match__challenger'
+        ).annotate(
+            my_joined_at=Subquery(
+                ArenaAudience.objects.filter(game=OuterRef('pk'), user=user).values('joined_at')[:1]
+            ),
+            my_vote_for=Subquery(
+                ArenaVote.objects.filter(game=OuterRef('pk'), voter=user).values('vote_for')[:1]
+            ),
+        )
 
         if status_filter != 'all':
             games = games.filter(status=status_filter)
@@ -4368,38 +3746,27 @@ def list_arena_games(request):
 
         result = []
         for game in games:
-            # 获取挑战者信息
-            challenger = None
-            for p in GameParticipant.objects.filter(game=game):
-                if p.action.get('role') == 'challenger':
-                    challenger = p.user
-                    break
+            match = game.arena_match
+            audience = []
+            if game.my_joined_at:
+                audience.append({
+                    'user_id': user.id,
+                    'username': user.username,
+                    'joined_at': game.my_joined_at.isoformat(),
+                    'has_voted': game.my_vote_for is not None,
+                    'vote_for': game.my_vote_for
+                })
 
             result.append({
                 'id': str(game.id),
-                'creator': {
-                    'id': game.creator.id,
-                    'username': game.creator.username,
-                    'avatar': game.creator.avatar.url if game.creator.avatar else None,
-                    'level': game.creator.level,
-                    'active_lock_task': None
-                },
-                'challenger': {
-                    'id': challenger.id,
-                    'username': challenger.username,
-                    'avatar': challenger.avatar.url if challenger.avatar else None,
-                    'level': challenger.level,
-                    'active_lock_task': None
-                } if challenger else None,
+                'creator': _arena_user_payload(game.creator),
+                'challenger': _arena_user_payload(match.challenger),
                 'bet_amount': game.bet_amount,
                 'status': game.status,
-                'config': {
-                    'audience_ticket_price': game.game_data.get('config', {}).get('audience_ticket_price', 5),
-                    'max_audience': game.game_data.get('config', {}).get('max_audience', 20)
-                },
-                'audience_count': len(game.game_data.get('audience', [])),
-                'audience': game.game_data.get('audience', []),
-                'votes': game.game_data.get('votes', {'creator': 0, 'challenger': 0}),
+                'config': match.config,
+                'audience_count': match.audience_count,
+                'audience': audience,
+                'votes': match.votes,
                 'result': game.result,
                 'created_at': game.created_at.isoformat()
             })
@@ -4,7 +4,7 @@ from django.utils.html import format_html
 from django.db.models import Count
 from .models import (
     LockTask, TaskKey, TaskVote, OvertimeAction,
-    TaskTimelineEvent, HourlyReward, TaskSubmissionFile, TaskParticipant, PinnedUser
+    TaskTimelineEvent, HourlyReward, TaskSubmissionFile, TaskParticipant, PinnedUser, JobRun
 )
 
 
@@ -442,3 +442,37 @@ class PinnedUserAdmin(admin.ModelAdmin):
             '<span style="color: #28a745; font-weight: bold;">✓</span>'
         )
     is_active.short_description = '活跃'
+
+
+@admin.register(JobRun)
+class JobRunAdmin(admin.ModelAdmin):
+    """定时任务运行记录（只读）"""
+
+    list_display = ['job_name', 'status_badge', 'started_at', 'duration_ms', 'processed_count', 'failed_count']
+    list_filter = ['job_name', 'status', 'started_at']
+    search_fields = ['job_name', 'error']
+    ordering = ['-started_at']
+    date_hierarchy = 'started_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def status_badge(self, obj):
+        """显示状态徽章"""
+        colors = {
+            'success': '#28a745',
+            'partial': '#ffc107',
+            'failed': '#dc3545'
+        }
+        color = colors.get(obj.status, '#6c757d')
+        return format_html(
+            '<span style="background-color: {}; color: white; padding: 2px 8px; '
+            'border-radius: 12px; font-size: 11px; font-weight: bold;">{}</span>',
+            color,
+            obj.get_status_display()
+        )
+    status_badge.short_description = '状态'
+    status_badge.admin_order_field = 'status'
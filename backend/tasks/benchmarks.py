@@ -0,0 +1,378 @@
+"""
+接口与定时任务基准测试
+
+BenchmarkDataset 用 bulk_create 快速生成接近生产规模的合成数据（默认 10 万用户、
+100 万时间线事件、50 万动态与点赞、5 万进行中的带锁任务），随机数使用固定种子，
+同一 scale/seed 生成的数据完全相同。
+
+SCENARIOS 是可重复的计时场景：热门列表接口（任务列表、动态流、通知）和
+批量定时任务（小时奖励、活跃度衰减、安检口破绽）。场景运行在独立的本地内存
+缓存上（不碰配置的共享缓存），每次运行前清空该缓存并重置随机种子；会写数据的
+任务在事务中执行后回滚，多次运行面对的数据相同。
+
+由 benchmark 管理命令调用，结果输出为便于在提交之间 diff 的 JSON 报告。
+"""
+
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from utils.instrumentation import measure
+
+# scale=1 时的数据规模
+DEFAULT_SIZES = {
+    'users': 100_000,
+    'lock_tasks': 50_000,
+    'timeline_events': 1_000_000,
+    'posts': 500_000,
+    'post_likes': 500_000,
+    'notifications': 200_000,
+    'checkpoint_players': 2_000,
+}
+
+USERNAME_PREFIX = 'bench_'
+
+# 基准运行期间替换默认缓存，清空缓存时不会影响共享的 Redis
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark',
+    }
+}
+VIEWER_USERNAME = f'{USERNAME_PREFIX}viewer'
+
+
+def scaled_sizes(scale):
+    """按比例缩放数据规模（每类至少 1 条）"""
+    return {name: max(1, int(size * scale)) for name, size in DEFAULT_SIZES.items()}
+
+
+class BenchmarkDataset:
+    """合成基准数据生成器"""
+
+    def __init__(self, scale=1.0, seed=42, batch_size=5000, log=None):
+        self.sizes = scaled_sizes(scale)
+        self.seed = seed
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.now = timezone.now()
+        self.log = log or (lambda message: None)
+
+    def exists(self):
+        """当前数据库中是否已有同规模的基准数据"""
+        from users.models import User
+        # 额外的 1 是查看者账号
+        return User.objects.filter(username__startswith=USERNAME_PREFIX).count() == self.sizes['users'] + 1
+
+    def generate(self):
+        """生成全部数据，返回各表写入条数"""
+        started = time.perf_counter()
+        user_ids = self._create_users()
+        task_ids = self._create_lock_tasks(user_ids)
+        self._create_timeline_events(task_ids, user_ids)
+        post_ids = self._create_posts(user_ids)
+        self._create_post_likes(post_ids, user_ids)
+        self._create_notifications(user_ids)
+        self._create_checkpoint_players(user_ids)
+        self.log(f'Dataset generated in {time.perf_counter() - started:.1f}s')
+        return dict(self.sizes)
+
+    def _bulk_create(self, model, objects):
+        """分批写入，避免一次构造全部对象"""
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                model.objects.bulk_create(batch, batch_size=self.batch_size)
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch, batch_size=self.batch_size)
+
+    def _create_users(self):
+        from users.models import User
+
+        self.log(f"Creating {self.sizes['users']} users...")
+        # 所有基准用户共用一个密码哈希，避免逐个计算
+        password = make_password('benchmark')
+        rng = self.rng
+        now = self.now
+
+        def users():
+            yield User(username=VIEWER_USERNAME, password=password, is_staff=True, last_active=now)
+            for i in range(self.sizes['users']):
+                # 约 10% 的用户多日未活跃，进入每日活跃度衰减
+                inactive_days = rng.randint(2, 30) if rng.random() < 0.1 else 0
+                yield User(
+                    username=f'{USERNAME_PREFIX}{i}',
+                    password=password,
+                    level=rng.randint(1, 5),
+                    coins=rng.randint(0, 5000),
+                    activity_score=rng.randint(1, 500),
+                    last_active=now - timedelta(days=inactive_days, minutes=rng.randint(0, 600)),
+                )
+
+        self._bulk_create(User, users())
+        return list(User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).exclude(username=VIEWER_USERNAME).order_by('id').values_list('id', flat=True))
+
+    def _create_lock_tasks(self, user_ids):
+        from .models import LockTask
+
+        self.log(f"Creating {self.sizes['lock_tasks']} active lock tasks...")
+        rng = self.rng
+        now = self.now
+        owners = rng.sample(user_ids, min(len(user_ids), self.sizes['lock_tasks']))
+
+        def tasks():
+            for i in range(self.sizes['lock_tasks']):
+                # 下一次小时奖励固定为奇数小时（每2小时的基础奖励），每次运行恰好发放一小时
+                elapsed_hours = rng.randrange(1, 200, 2)
+                start_time = now - timedelta(hours=elapsed_hours, minutes=rng.randint(1, 59))
+                yield LockTask(
+                    user_id=owners[i % len(owners)],
+                    task_type='lock',
+                    title=f'基准任务 {i}',
+                    status='active',
+                    difficulty=rng.choice(['easy', 'normal', 'hard']),
+                    unlock_type=rng.choice(['time', 'vote']),
+                    duration_type='fixed',
+                    duration_value=60 * 24 * 7,
+                    start_time=start_time,
+                    end_time=start_time + timedelta(days=7),
+                    total_hourly_rewards=elapsed_hours - 1,
+                    last_hourly_reward_at=now - timedelta(minutes=61),
+                )
+
+        self._bulk_create(LockTask, tasks())
+        return list(LockTask.objects.filter(title__startswith='基准任务').order_by('title').values_list('id', flat=True))
+
+    def _create_timeline_events(self, task_ids, user_ids):
+        from .models import TaskTimelineEvent
+
+        self.log(f"Creating {self.sizes['timeline_events']} timeline events...")
+        rng = self.rng
+        event_types = ['time_wheel_increase', 'time_wheel_decrease', 'overtime_added', 'task_started']
+
+        def events():
+            for i in range(self.sizes['timeline_events']):
+                yield TaskTimelineEvent(
+                    task_id=task_ids[i % len(task_ids)],
+                    event_type=rng.choice(event_types),
+                    user_id=rng.choice(user_ids),
+                    time_change_minutes=rng.randint(-60, 60),
+                    description='基准事件',
+                )
+
+        self._bulk_create(TaskTimelineEvent, events())
+
+    def _create_posts(self, user_ids):
+        from posts.models import Post
+
+        self.log(f"Creating {self.sizes['posts']} posts...")
+        rng = self.rng
+
+        def posts():
+            for i in range(self.sizes['posts']):
+                yield Post(
+                    user_id=rng.choice(user_ids),
+                    content=f'基准动态 {i}',
+                    post_type='checkin' if rng.random() < 0.2 else 'normal',
+                )
+
+        self._bulk_create(Post, posts())
+        return list(Post.objects.filter(content__startswith='基准动态').order_by('content').values_list('id', flat=True))
+
+    def _create_post_likes(self, post_ids, user_ids):
+        from posts.models import Post, PostLike
+
+        self.log(f"Creating {self.sizes['post_likes']} post likes...")
+        rng = self.rng
+        # 点赞集中在少数热门动态上
+        hot_posts = post_ids[:max(1, len(post_ids) // 20)]
+        seen = set()
+
+        def likes():
+            attempts = 0
+            while len(seen) < self.sizes['post_likes'] and attempts < self.sizes['post_likes'] * 3:
+                attempts += 1
+                post_id = rng.choice(hot_posts) if rng.random() < 0.5 else rng.choice(post_ids)
+                pair = (post_id, rng.choice(user_ids))
+                if pair in seen:
+                    continue
+                seen.add(pair)
+                yield PostLike(post_id=pair[0], user_id=pair[1])
+
+        self._bulk_create(PostLike, likes())
+        self.sizes['post_likes'] = len(seen)
+
+        # 点赞计数一次 UPDATE 回填
+        like_counts = PostLike.objects.filter(post=OuterRef('pk')).values('post').annotate(total=Count('id')).values('total')
+        Post.objects.filter(content__startswith='基准动态').update(likes_count=Coalesce(Subquery(like_counts), 0))
+
+    def _create_notifications(self, user_ids):
+        from users.models import Notification, User
+
+        self.log(f"Creating {self.sizes['notifications']} notifications...")
+        rng = self.rng
+        viewer_id = User.objects.get(username=VIEWER_USERNAME).id
+
+        def notifications():
+            for i in range(self.sizes['notifications']):
+                # 约 5% 发给查看者账号，通知列表场景读取的就是这些
+                recipient_id = viewer_id if i % 20 == 0 else rng.choice(user_ids)
+                yield Notification(
+                    recipient_id=recipient_id,
+                    actor_id=rng.choice(user_ids),
+                    notification_type='post_liked',
+                    title='基准通知',
+                    message=f'基准通知 {i}',
+                    is_read=rng.random() < 0.7,
+                )
+
+        self._bulk_create(Notification, notifications())
+
+    def _create_checkpoint_players(self, user_ids):
+        from phantom_city.models import CheckpointSession, GameZone, MimicProfile, PlayerZonePresence
+
+        self.log(f"Creating {self.sizes['checkpoint_players']} checkpoint players...")
+        rng = self.rng
+        zone, _ = GameZone.objects.get_or_create(
+            name='checkpoint',
+            defaults={'display_name': '安检口', 'description': '基准测试安检口'}
+        )
+        CheckpointSession.objects.get_or_create(zone=zone, status='active')
+
+        players = rng.sample(user_ids, min(len(user_ids), self.sizes['checkpoint_players']))
+        self._bulk_create(MimicProfile, (
+            MimicProfile(
+                user_id=user_id,
+                depilation_charge=rng.randint(0, 100),
+                suppression_value=rng.randint(0, 100),
+            )
+            for user_id in players
+        ))
+        self._bulk_create(PlayerZonePresence, (PlayerZonePresence(user_id=user_id, zone=zone) for user_id in players))
+
+
+# ============================================================================
+# 计时场景
+# ============================================================================
+
+def _api_client():
+    from rest_framework.test import APIClient
+    from users.models import User
+
+    client = APIClient()
+    client.force_authenticate(User.objects.get(username=VIEWER_USERNAME))
+    return client
+
+
+def _get(path):
+    def run():
+        response = _api_client().get(path)
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {path} returned {response.status_code}')
+    return run
+
+
+def _hourly_rewards():
+    from .celery_tasks import process_hourly_rewards
+    process_hourly_rewards()
+
+
+def _activity_decay():
+    from .celery_tasks import process_activity_decay
+    process_activity_decay()
+
+
+def _checkpoint_tells():
+    from phantom_city.celery_tasks import generate_tell_events
+    generate_tell_events()
+
+
+# 名称: (说明, 执行函数, 是否写数据——写数据的场景在回滚的事务中运行)
+SCENARIOS = {
+    'task_list': ('GET /api/tasks/', _get('/api/tasks/'), False),
+    'feed': ('GET /api/posts/', _get('/api/posts/'), False),
+    'notifications': ('GET /api/auth/notifications/', _get('/api/auth/notifications/'), False),
+    'hourly_rewards': ('process_hourly_rewards', _hourly_rewards, True),
+    'activity_decay': ('process_activity_decay', _activity_decay, True),
+    'checkpoint_tells': ('phantom_city.generate_tell_events', _checkpoint_tells, True),
+}
+
+
+class _Rollback(Exception):
+    pass
+
+
+def isolated_cache():
+    """把默认缓存替换为基准专用的本地内存缓存（上下文管理器）"""
+    return override_settings(CACHES=BENCHMARK_CACHES)
+
+
+def _run_once(func, writes, seed):
+    """运行一次场景，返回 (耗时毫秒, 查询数)"""
+    cache.clear()
+    random.seed(seed)
+    started = time.perf_counter()
+    with measure() as measurement:
+        if writes:
+            try:
+                with transaction.atomic():
+                    func()
+                    raise _Rollback
+            except _Rollback:
+                pass
+        else:
+            func()
+    return (time.perf_counter() - started) * 1000, measurement.queries
+
+
+def run_scenario(name, repeat=3, seed=42):
+    """
+    运行一个场景：先预热一次，再计时 repeat 次
+
+    Returns:
+        dict: 耗时统计（毫秒）与每次运行的查询数；失败时包含 error
+    """
+    description, func, writes = SCENARIOS[name]
+    try:
+        _run_once(func, writes, seed)
+        runs = [_run_once(func, writes, seed) for _ in range(repeat)]
+    except Exception as exc:
+        return {'description': description, 'error': f'{type(exc).__name__}: {exc}'}
+
+    timings = [elapsed for elapsed, _ in runs]
+    return {
+        'description': description,
+        'runs': repeat,
+        'min_ms': round(min(timings), 1),
+        'median_ms': round(statistics.median(timings), 1),
+        'max_ms': round(max(timings), 1),
+        'queries': runs[-1][1],
+    }
+
+
+def run_benchmarks(names=None, repeat=3, seed=42, log=None):
+    """依次运行场景，返回 {场景名: 结果}"""
+    log = log or (lambda message: None)
+    results = {}
+    with isolated_cache():
+        for name in names or SCENARIOS:
+            log(f'Running {name}...')
+            results[name] = run_scenario(name, repeat=repeat, seed=seed)
+    return results
+
+
+def database_info():
+    return {'vendor': connection.vendor, 'name': str(connection.settings_dict['NAME'])}
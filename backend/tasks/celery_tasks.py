@@ -30,22 +30,28 @@ def process_hourly_rewards(self):
     转换为 Celery 任务以提供更好的错误处理和重试机制。
 
     Returns:
-        dict: 包含处理结果的字典
+        dict: 简要处理统计（明细见 JobRun 运行记录）
     """
     try:
+        from store.active_effects import get_active_effects_bulk
+        from .job_runs import record_job_run
+
         logger.info("Starting hourly rewards processing...")
 
-        with transaction.atomic():
+        with record_job_run('process_hourly_rewards') as run, transaction.atomic():
             now = timezone.now()
-            processed_rewards = []
 
             # 找到所有活跃状态的带锁任务
-            active_lock_tasks = LockTask.objects.select_for_update().filter(
+            active_lock_tasks = list(LockTask.objects.select_for_update().filter(
                 task_type='lock',
                 status__in=['active', 'voting']  # 活跃状态和投票期都算活跃
-            )
+            ).select_related('user'))
+
+            logger.info(f"Found {len(active_lock_tasks)} active lock tasks to process")
+            run.metrics['active_tasks'] = len(active_lock_tasks)
 
-            logger.info(f"Found {active_lock_tasks.count()} active lock tasks to process")
+            # 一次性解析所有任务用户的活跃效果（幸运符）
+            user_effects = get_active_effects_bulk((task.user_id for task in active_lock_tasks), now=now)
 
             for task in active_lock_tasks:
                 if not task.start_time:
@@ -82,9 +88,13 @@ def process_hourly_rewards(self):
                     logger.info(f"Processing {rewards_to_give} hourly rewards for task {task.id} (user: {task.user.username})")
 
                     # 处理每个小时的奖励
-                    task_rewards = _process_task_hourly_rewards(
-                        task, now, next_reward_hour, rewards_to_give, processed_rewards
+                    task_rewards = []
+                    _process_task_hourly_rewards(
+                        task, now, next_reward_hour, rewards_to_give, task_rewards,
+                        active_effects=user_effects[task.user_id]
                     )
+                    for reward in task_rewards:
+                        run.item(reward)
 
                     # 更新任务的奖励记录
                     task.total_hourly_rewards += rewards_to_give
@@ -93,12 +103,11 @@ def process_hourly_rewards(self):
 
                     logger.info(f"Completed {rewards_to_give} hourly rewards for {task.user.username}: {task.title}")
 
-        logger.info(f"Successfully processed {len(processed_rewards)} hourly rewards")
+        logger.info(f"Successfully processed {run.processed_count} hourly rewards")
 
         return {
             'status': 'success',
-            'processed_count': len(processed_rewards),
-            'processed_rewards': processed_rewards,
+            **run.summary(),
             'timestamp': now.isoformat()
         }
 
@@ -111,7 +120,7 @@ def process_hourly_rewards(self):
             countdown=min(60 * (2 ** self.request.retries), 300)  # Max 5 minutes
         )
 
-def _process_task_hourly_rewards(task, now, next_reward_hour, rewards_to_give, processed_rewards):
+def _process_task_hourly_rewards(task, now, next_reward_hour, rewards_to_give, processed_rewards, active_effects=None):
     """
     处理单个任务的小时奖励
 
@@ -127,14 +136,13 @@ def _process_task_hourly_rewards(task, now, next_reward_hour, rewards_to_give, p
         next_reward_hour: 下一个奖励小时数
         rewards_to_give: 需要发放的奖励数量
         processed_rewards: 处理结果列表（用于累积结果）
+        active_effects: 任务用户的活跃效果快照（批量处理时预先解析）
     """
     # 检查用户是否有幸运符效果
-    from store.models import UserEffect
-    lucky_charm_effect = UserEffect.objects.filter(
-        user=task.user,
-        effect_type='lucky_charm',
-        is_active=True
-    ).first()
+    if active_effects is None:
+        from store.active_effects import get_active_effects
+        active_effects = get_active_effects(task.user_id, now=now)
+    lucky_charm_effect = active_effects.get('lucky_charm')
 
     luck_boost = 0.0
     if lucky_charm_effect:
@@ -313,11 +321,13 @@ def _process_task_hourly_rewards(task, now, next_reward_hour, rewards_to_give, p
                 'other_keys_count': other_keys_count
             })
 
-            # 如果使用了幸运符效果，记录使用次数
+            # 如果使用了幸运符效果，记录使用次数（快照只读，需重新加载效果记录）
             if lucky_charm_effect and lucky_bonus > 0:
-                uses_count = lucky_charm_effect.properties.get('uses_count', 0)
-                lucky_charm_effect.properties['uses_count'] = uses_count + 1
-                lucky_charm_effect.save()
+                from store.models import UserEffect
+                effect = UserEffect.objects.filter(id=lucky_charm_effect.id).first()
+                if effect:
+                    effect.properties['uses_count'] = effect.properties.get('uses_count', 0) + 1
+                    effect.save(update_fields=['properties'])
 
             logger.debug(f"Processed hour {hour_num} reward for task {task.id}")
 
@@ -363,11 +373,17 @@ def health_check_hourly_rewards(self):
 
         stale_tasks_count = stale_tasks.count()
 
+        # 检查最近一次奖励任务运行（每小时执行，超过2小时未运行视为异常）
+        from .job_runs import job_run_health
+        job_issues, last_run = job_run_health('process_hourly_rewards', timedelta(hours=2), now=now)
+
         health_status = {
-            'status': 'healthy' if stale_tasks_count == 0 else 'warning',
+            'status': 'healthy' if stale_tasks_count == 0 and not job_issues else 'warning',
             'timestamp': now.isoformat(),
             'active_tasks_count': active_tasks_count,
             'today_rewards_count': today_rewards_count,
+            'last_run': last_run,
+            'job_issues': job_issues,
             'stale_tasks_count': stale_tasks_count,
             'stale_tasks': [
                 {
@@ -381,6 +397,8 @@ def health_check_hourly_rewards(self):
             ]
         }
 
+        if job_issues:
+            logger.warning(f"Hourly rewards job issues detected: {job_issues}")
         if stale_tasks_count > 0:
             logger.warning(f"Found {stale_tasks_count} stale tasks that may need attention")
         else:
@@ -862,11 +880,23 @@ def process_pinning_queue(self):
         logger.info("Starting pinning queue processing...")
 
         from .pinning_service import PinningQueueManager
+        from .job_runs import JobRunRecorder
+
+        run = JobRunRecorder('process_pinning_queue')
 
         # 更新队列状态
         result = PinningQueueManager.update_queue()
 
         if result['success']:
+            for change in result['position_changes']:
+                run.item(change)
+            run.metrics.update({
+                'expired_count': result['expired_count'],
+                'active_positions': result['active_positions'],
+                'queue_count': result['queue_count']
+            })
+            run.finish()
+
             logger.info(f"Pinning queue processed successfully: "
                        f"{result['expired_count']} expired, "
                        f"{len(result['position_changes'])} position changes, "
@@ -875,13 +905,11 @@ def process_pinning_queue(self):
 
             return {
                 'status': 'success',
-                'expired_count': result['expired_count'],
-                'position_changes': result['position_changes'],
-                'active_positions': result['active_positions'],
-                'queue_count': result['queue_count'],
+                **run.summary(),
                 'timestamp': timezone.now().isoformat()
             }
         else:
+            run.finish(error=result.get('error', 'Unknown error'))
             logger.error(f"Pinning queue processing failed: {result.get('error', 'Unknown error')}")
             return {
                 'status': 'error',
@@ -910,51 +938,31 @@ def expire_pinned_users(self):
 
         now = timezone.now()
 
-        with transaction.atomic():
-            # 查找过期的置顶记录
-            expired_pins = PinnedUser.objects.select_for_update().filter(
-                is_active=True,
-                expires_at__lt=now
-            )
-
-            expired_count = 0
-            for pin in expired_pins:
-                # 设置为非活跃状态
-                pin.is_active = False
-                pin.position = None
-                pin.save()
-
-                # 创建过期事件
-                TaskTimelineEvent.objects.create(
-                    task=pin.task,
-                    event_type='user_unpinned',
-                    user=None,  # 系统事件
-                    description=f'{pin.pinned_user.username} 的置顶时间已到期',
-                    metadata={
-                        'expired': True,
-                        'duration_minutes': pin.duration_minutes,
-                        'pinned_user_id': str(pin.pinned_user.id),
-                        'key_holder_id': str(pin.key_holder.id),
-                        'expired_at': now.isoformat()
-                    }
-                )
+        from .pinning_service import PinningQueueManager
 
-                # 发送过期通知
-                Notification.create_notification(
-                    recipient=pin.pinned_user,
-                    notification_type='user_unpinned',
-                    actor=None,
-                    related_object_type='task',
-                    related_object_id=pin.task.id,
-                    extra_data={
-                        'task_title': pin.task.title,
-                        'expired': True,
-                        'duration_minutes': pin.duration_minutes
-                    },
-                    priority='low'
-                )
+        # 过期和补位在同一个事务中批量完成
+        result = PinningQueueManager.update_queue()
+        if not result['success']:
+            raise RuntimeError(result.get('error', 'Unknown error'))
+
+        # 批量发送过期通知
+        Notification.bulk_create_notifications([
+            {
+                'recipient_id': expired['pinned_user_id'],
+                'notification_type': 'user_unpinned',
+                'related_object_type': 'task',
+                'related_object_id': expired['task_id'],
+                'extra_data': {
+                    'task_title': expired['task_title'],
+                    'expired': True,
+                    'duration_minutes': expired['duration_minutes']
+                },
+                'priority': 'low'
+            }
+            for expired in result['expired_pins']
+        ])
 
-                expired_count += 1
+        expired_count = result['expired_count']
 
         logger.info(f"Expired {expired_count} pinned users")
 
@@ -1034,9 +1042,13 @@ def pinning_health_check(self):
                 'duplicates': duplicate_positions
             })
 
+        # 检查最近一次队列处理运行（每分钟执行，超过5分钟未运行视为异常）
+        from .job_runs import job_run_health
+        job_issues, last_queue_run = job_run_health('process_pinning_queue', timezone.timedelta(minutes=5), now=now)
+
         # 确定健康状态
         health_status = 'healthy'
-        if overdue_count > 0 or position_issues:
+        if overdue_count > 0 or position_issues or job_issues:
             health_status = 'warning'
 
         health_report = {
@@ -1046,6 +1058,8 @@ def pinning_health_check(self):
             'queued_pins_count': queued_pins_count,
             'overdue_pins_count': overdue_count,
             'position_issues': position_issues,
+            'last_queue_run': last_queue_run,
+            'job_issues': job_issues,
             'overdue_pins': [
                 {
                     'id': str(pin.id),
@@ -1089,87 +1103,73 @@ def process_checkin_voting_results(self):
     - 如果通过票 >= 拒绝票：将收集的积分平分给通过投票者
 
     Returns:
-        dict: 处理结果
+        dict: 简要处理统计（明细见 JobRun 运行记录）
     """
     try:
         import time
+        from .job_runs import record_job_run
         logger.info("Starting check-in voting results processing...")
 
         now = timezone.now()
         from posts.models import CheckinVotingSession
 
-        # 获取需要处理的会话ID列表（只查询ID，避免锁定）
-        pending_session_ids = list(CheckinVotingSession.objects.filter(
-            voting_deadline__lte=now,
-            is_processed=False
-        ).values_list('id', flat=True))
+        with record_job_run('process_checkin_voting_results') as run:
+            # 获取需要处理的会话ID列表（只查询ID，避免锁定）
+            pending_session_ids = list(CheckinVotingSession.objects.filter(
+                voting_deadline__lte=now,
+                is_processed=False
+            ).values_list('id', flat=True))
 
-        total_sessions = len(pending_session_ids)
-        logger.info(f"Found {total_sessions} voting sessions to process")
+            total_sessions = len(pending_session_ids)
+            logger.info(f"Found {total_sessions} voting sessions to process")
 
-        if total_sessions == 0:
-            return {
-                'status': 'success',
-                'processed_count': 0,
-                'processed_sessions': [],
-                'message': 'No sessions to process',
-                'timestamp': now.isoformat()
-            }
-
-        # 分批处理，避免长时间锁定数据库
-        BATCH_SIZE = 10  # 每批处理10个会话
-        processed_sessions = []
-        failed_count = 0
-
-        # 分批处理会话
-        for i in range(0, total_sessions, BATCH_SIZE):
-            batch_ids = pending_session_ids[i:i + BATCH_SIZE]
-            batch_number = i // BATCH_SIZE + 1
+            # 分批处理，避免长时间锁定数据库
+            BATCH_SIZE = 10  # 每批处理10个会话
             total_batches = (total_sessions + BATCH_SIZE - 1) // BATCH_SIZE
+            run.metrics.update({'total_sessions': total_sessions, 'batches_processed': total_batches})
 
-            try:
-                # 使用独立的事务处理每个批次
-                with transaction.atomic():
-                    batch_sessions = CheckinVotingSession.objects.select_for_update().filter(
-                        id__in=batch_ids,
-                        is_processed=False  # 再次检查避免重复处理
-                    )
-
-                    for session in batch_sessions:
-                        try:
-                            result = _process_single_voting_session(session, now)
-                            processed_sessions.append(result)
-                            logger.debug(f"Processed voting session for post {session.post.id}: {result['result']}")
-                        except Exception as e:
-                            logger.error(f"Failed to process voting session {session.id}: {e}")
-                            failed_count += 1
-                            # 继续处理其他会话，不让单个失败影响整体处理
-                            processed_sessions.append({
-                                'session_id': str(session.id),
-                                'post_id': str(session.post.id) if hasattr(session, 'post') else 'unknown',
-                                'result': 'error',
-                                'error': str(e)
-                            })
+            # 分批处理会话
+            for i in range(0, total_sessions, BATCH_SIZE):
+                batch_ids = pending_session_ids[i:i + BATCH_SIZE]
+                batch_number = i // BATCH_SIZE + 1
 
-                logger.info(f"Completed batch {batch_number}/{total_batches}: processed {len(batch_ids)} sessions")
-
-                # 批次间短暂休息，释放数据库锁，让其他操作有机会执行
-                if i + BATCH_SIZE < total_sessions:  # 不是最后一批
-                    time.sleep(0.1)  # 100ms休息
+                try:
+                    # 使用独立的事务处理每个批次
+                    with transaction.atomic():
+                        batch_sessions = CheckinVotingSession.objects.select_for_update().filter(
+                            id__in=batch_ids,
+                            is_processed=False  # 再次检查避免重复处理
+                        )
 
-            except Exception as batch_error:
-                logger.error(f"Error processing batch {batch_number}: {batch_error}")
-                failed_count += len(batch_ids)
-                # 继续处理下一批次，不中断整个流程
-                continue
+                        for session in batch_sessions:
+                            try:
+                                result = _process_single_voting_session(session, now)
+                                run.item(result)
+                                logger.debug(f"Processed voting session for post {session.post.id}: {result['result']}")
+                            except Exception as e:
+                                logger.error(f"Failed to process voting session {session.id}: {e}")
+                                # 继续处理其他会话，不让单个失败影响整体处理
+                                run.failure({
+                                    'session_id': str(session.id),
+                                    'post_id': str(session.post_id)
+                                }, error=e)
+
+                    logger.info(f"Completed batch {batch_number}/{total_batches}: processed {len(batch_ids)} sessions")
+
+                    # 批次间短暂休息，释放数据库锁，让其他操作有机会执行
+                    if i + BATCH_SIZE < total_sessions:  # 不是最后一批
+                        time.sleep(0.1)  # 100ms休息
+
+                except Exception as batch_error:
+                    logger.error(f"Error processing batch {batch_number}: {batch_error}")
+                    for session_id in batch_ids:
+                        run.failure({'session_id': str(session_id)}, error=batch_error)
+                    # 继续处理下一批次，不中断整个流程
+                    continue
 
         result = {
             'status': 'success',
-            'processed_count': len(processed_sessions),
-            'failed_count': failed_count,
-            'total_sessions': total_sessions,
-            'batches_processed': total_batches,
-            'processed_sessions': processed_sessions,
+            **run.summary(),
             'timestamp': now.isoformat()
         }
 
@@ -1192,7 +1192,10 @@ def process_checkin_voting_results(self):
 
 def _calculate_weighted_checkin_vote_counts(post):
     """
-    计算带有影响力皇冠效果的加权打卡投票统计
+    读取带有影响力皇冠效果的加权打卡投票统计
+
+    加权票数在投票时原子累加到投票会话上（投票权重在投票时固定），
+    这里只读取会话字段，不扫描投票记录。
 
     Args:
         post: Post实例
@@ -1200,38 +1203,11 @@ def _calculate_weighted_checkin_vote_counts(post):
     Returns:
         dict: 包含total_votes, pass_votes和reject_votes的字典，已应用影响力皇冠倍数
     """
-    from store.models import UserEffect
-    from posts.models import CheckinVote
-
-    votes = CheckinVote.objects.filter(post=post)
-    total_weighted_votes = 0
-    pass_weighted_votes = 0
-    reject_weighted_votes = 0
-
-    for vote in votes:
-        # 检查投票者是否有活跃的影响力皇冠效果
-        crown_effect = UserEffect.objects.filter(
-            user=vote.voter,
-            effect_type='influence_crown',
-            is_active=True,
-            expires_at__gt=timezone.now()
-        ).first()
-
-        # 计算投票权重
-        vote_weight = 1
-        if crown_effect:
-            vote_weight = crown_effect.properties.get('vote_multiplier', 3)
-
-        total_weighted_votes += vote_weight
-        if vote.vote_type == 'pass':
-            pass_weighted_votes += vote_weight
-        elif vote.vote_type == 'reject':
-            reject_weighted_votes += vote_weight
-
+    session = post.voting_session
     return {
-        'total_votes': total_weighted_votes,
-        'pass_votes': pass_weighted_votes,
-        'reject_votes': reject_weighted_votes
+        'total_votes': session.weighted_pass_votes + session.weighted_reject_votes,
+        'pass_votes': session.weighted_pass_votes,
+        'reject_votes': session.weighted_reject_votes
     }
 
 
@@ -1272,7 +1248,7 @@ def _process_single_voting_session(session, current_time):
     # 标记会话为已处理
     session.is_processed = True
     session.processed_at = current_time
-    session.save()
+    session.save(update_fields=['result', 'is_processed', 'processed_at'])
 
     return {
         'session_id': str(session.id),
@@ -1516,8 +1492,21 @@ def _update_strict_mode_verification_codes(current_time):
         current_time: 当前时间
 
     Returns:
-        dict: 更新结果统计
+        dict: 简要更新统计（明细见 JobRun 运行记录）
     """
+    from .job_runs import JobRunRecorder
+    from .strict_codes import is_derived_mode
+
+    run = JobRunRecorder('update_strict_mode_verification_codes')
+
+    if is_derived_mode():
+        result = _record_derived_strict_code_rollover(current_time)
+        run.metrics.update({
+            key: result[key] for key in ('mode', 'code_window', 'total_active_strict_tasks', 'audit_events')
+        })
+        run.finish()
+        return {**result, 'job_run_id': run.job_run.id if run.job_run else None}
+
     try:
         logger.info("Starting daily strict mode verification code update...")
 
@@ -1528,9 +1517,6 @@ def _update_strict_mode_verification_codes(current_time):
             strict_mode=True
         )
 
-        updated_count = 0
-        updated_tasks = []
-
         for task in active_strict_tasks:
             old_code = task.strict_code
 
@@ -1554,30 +1540,30 @@ def _update_strict_mode_verification_codes(current_time):
                 }
             )
 
-            updated_tasks.append({
+            # 样本中不记录验证码本身
+            run.item({
                 'task_id': str(task.id),
                 'task_title': task.title,
-                'user': task.user.username,
-                'old_code': old_code,
-                'new_code': new_code
+                'user': task.user.username
             })
-
-            updated_count += 1
             logger.info(f"Updated verification code for task {task.id} (user: {task.user.username}): {old_code} → {new_code}")
 
+        run.metrics['total_active_strict_tasks'] = active_strict_tasks.count()
+        run.finish()
+
         result = {
             'status': 'success',
-            'updated_count': updated_count,
-            'total_active_strict_tasks': active_strict_tasks.count(),
-            'updated_tasks': updated_tasks,
+            'updated_count': run.processed_count,
+            **run.summary(),
             'timestamp': current_time.isoformat()
         }
 
-        logger.info(f"Verification code update completed: {updated_count} tasks updated")
+        logger.info(f"Verification code update completed: {run.processed_count} tasks updated")
         return result
 
     except Exception as exc:
         logger.error(f"Verification code update failed: {exc}", exc_info=True)
+        run.finish(error=exc)
         return {
             'status': 'error',
             'error': str(exc),
@@ -1585,6 +1571,61 @@ def _update_strict_mode_verification_codes(current_time):
         }
 
 
+def _record_derived_strict_code_rollover(current_time):
+    """
+    推导验证码模式下的每日换码
+
+    验证码按日期窗口推导，换日后自动变化，不需要锁定或写入任务；
+    开启 STRICT_CODE_AUDIT_EVENTS 时为每个任务记录一条审计时间线事件（一次批量插入）。
+
+    Args:
+        current_time: 当前时间
+
+    Returns:
+        dict: 处理结果统计
+    """
+    from django.conf import settings
+    from .strict_codes import code_window, derive_strict_code
+
+    window = code_window(current_time)
+    task_ids = list(LockTask.objects.filter(
+        task_type='lock',
+        status__in=['active', 'voting'],
+        strict_mode=True
+    ).values_list('id', flat=True))
+
+    audit_events = 0
+    if settings.STRICT_CODE_AUDIT_EVENTS and task_ids:
+        TaskTimelineEvent.objects.bulk_create([
+            TaskTimelineEvent(
+                task_id=task_id,
+                event_type='verification_code_updated',
+                user=None,  # 系统事件
+                description='每日验证码更新（按日期推导）',
+                metadata={
+                    'new_code': derive_strict_code(task_id, window),
+                    'code_window': window.isoformat(),
+                    'update_reason': 'daily_auto_update',
+                    'update_time': current_time.isoformat(),
+                    'processed_by': 'celery_task'
+                }
+            )
+            for task_id in task_ids
+        ])
+        audit_events = len(task_ids)
+
+    logger.info(f"Derived verification codes rolled over to window {window} for {len(task_ids)} strict mode tasks")
+    return {
+        'status': 'success',
+        'mode': 'derived',
+        'updated_count': 0,
+        'total_active_strict_tasks': len(task_ids),
+        'audit_events': audit_events,
+        'code_window': window.isoformat(),
+        'timestamp': current_time.isoformat()
+    }
+
+
 def _generate_strict_code():
     """
     生成4位严格模式验证码（格式：字母数字字母数字，如A1B2）
@@ -1592,11 +1633,8 @@ def _generate_strict_code():
     Returns:
         str: 4位验证码
     """
-    import random
-    import string
-    letters = random.choices(string.ascii_uppercase, k=2)
-    digits = random.choices(string.digits, k=2)
-    return f"{letters[0]}{digits[0]}{letters[1]}{digits[1]}"
+    from .strict_codes import generate_strict_code
+    return generate_strict_code()
 
 
 @shared_task(bind=True, max_retries=3, default_retry_delay=300)
@@ -1800,6 +1838,21 @@ def auto_freeze_strict_mode_tasks(self):
         raise exc
 
 
+@shared_task(bind=True, max_retries=3, default_retry_delay=5)
+def flush_activity_buffer(self):
+    """
+    把写回缓冲中的活跃度增量批量写入数据库
+    每隔几秒运行一次（ACTIVITY_FLUSH_INTERVAL_SECONDS）
+    """
+    from users.services.activity_buffer import ActivityBuffer
+
+    try:
+        return ActivityBuffer.flush()
+    except Exception as exc:
+        logger.error(f"Activity buffer flush failed: {exc}", exc_info=True)
+        raise self.retry(exc=exc)
+
+
 @shared_task(bind=True, max_retries=3, default_retry_delay=300)
 def process_activity_decay(self):
     """
@@ -1821,6 +1874,7 @@ def process_activity_decay(self):
         import time
         from users.models import User
         from datetime import timedelta
+        from store.active_effects import get_active_effects_bulk
 
         logger.info("Starting daily activity decay processing")
 
@@ -1860,13 +1914,14 @@ def process_activity_decay(self):
                 # 使用独立的事务处理每个批次
                 with transaction.atomic():
                     batch_users = User.objects.select_for_update().filter(id__in=batch_ids)
+                    batch_effects = get_active_effects_bulk(batch_ids)
 
                     for user in batch_users:
                         try:
                             old_score = user.activity_score
 
                             # 应用衰减
-                            user.apply_time_decay()
+                            user.apply_time_decay(active_effects=batch_effects[user.id])
 
                             if user.activity_score != old_score:
                                 processed_count += 1
@@ -2205,4 +2260,142 @@ def process_deadline_reminders_custom(self):
         raise self.retry(
             exc=exc,
             countdown=min(60 * (2 ** self.request.retries), 300)
-        )
\ No newline at end of file
+        )
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def create_task_state_checkpoints(self, batch_size=200):
+    """
+    为进行中的带锁任务写入状态检查点 - 每小时运行一次
+    累计足够多的可回退事件或距上个检查点过久的任务会被写入新检查点，
+    时间沙漏等历史状态重建只需回放检查点之后的事件
+    """
+    from .utils import get_tasks_due_for_checkpoint, create_task_checkpoints
+
+    logger.info("Starting task state checkpoint creation")
+
+    try:
+        now = timezone.now()
+        due_task_ids = get_tasks_due_for_checkpoint(now)
+
+        created_count = 0
+        for start in range(0, len(due_task_ids), batch_size):
+            created_count += len(create_task_checkpoints(due_task_ids[start:start + batch_size], now))
+
+        result = {
+            'status': 'success',
+            'due_tasks': len(due_task_ids),
+            'checkpoints_created': created_count,
+            'timestamp': now.isoformat()
+        }
+
+        logger.info(f"Task state checkpoint creation completed: {result}")
+        return result
+
+    except Exception as exc:
+        logger.error(f"Failed to create task state checkpoints: {exc}", exc_info=True)
+        raise self.retry(
+            exc=exc,
+            countdown=min(60 * (2 ** self.request.retries), 300)
+        )
+
+
+@shared_task(bind=True)
+def cleanup_job_runs(self):
+    """
+    清理超过 JOB_RUN_RETENTION_DAYS 天的定时任务运行记录（每小时执行）
+    """
+    from .job_runs import prune_job_runs
+
+    try:
+        deleted_count = prune_job_runs()
+        logger.info(f"Deleted {deleted_count} expired job run records")
+        return {
+            'status': 'success',
+            'deleted_count': deleted_count,
+            'timestamp': timezone.now().isoformat()
+        }
+    except Exception as exc:
+        logger.error(f"Job run cleanup failed: {exc}", exc_info=True)
+        return {
+            'status': 'error',
+            'error': str(exc),
+            'timestamp': timezone.now().isoformat()
+        }
+
+
+@shared_task(bind=True)
+def expire_temporary_unlock(self, record_id):
+    """
+    在临时开锁的最大结束时间处理超时（批准/开始临时开锁时以 ETA 调度）
+
+    幂等：记录已结束则跳过；提前投递时按最大结束时间重新调度。
+
+    Args:
+        record_id (str): 临时开锁记录ID
+    """
+    from .cron import expire_temporary_unlock_record, schedule_temporary_unlock_timeout
+    from .models import TemporaryUnlockRecord
+
+    try:
+        if expire_temporary_unlock_record(record_id):
+            logger.info(f"Temporary unlock {record_id} timed out")
+            return {
+                'status': 'success',
+                'record_id': record_id,
+                'timestamp': timezone.now().isoformat()
+            }
+
+        record = TemporaryUnlockRecord.objects.filter(id=record_id, status='active').first()
+        if record and record.max_end_time and record.max_end_time >= timezone.now():
+            schedule_temporary_unlock_timeout(record)
+            return {
+                'status': 'rescheduled',
+                'record_id': record_id,
+                'scheduled_for': record.max_end_time.isoformat()
+            }
+
+        return {
+            'status': 'skipped',
+            'record_id': record_id,
+            'timestamp': timezone.now().isoformat()
+        }
+
+    except Exception as exc:
+        logger.error(f"Temporary unlock timeout failed for record {record_id}: {exc}", exc_info=True)
+        return {
+            'status': 'error',
+            'record_id': record_id,
+            'error': str(exc),
+            'timestamp': timezone.now().isoformat()
+        }
+
+
+@shared_task(bind=True)
+def reconcile_temporary_unlock_timeouts(self):
+    """
+    临时开锁超时对账（每15分钟执行）
+
+    处理 ETA 任务遗漏的超时记录（调度失败、worker 丢失任务等）。
+    """
+    from .cron import check_temporary_unlock_timeouts
+    from .job_runs import record_job_run
+
+    try:
+        with record_job_run('reconcile_temporary_unlock_timeouts') as run:
+            timeout_count = check_temporary_unlock_timeouts()
+            run.processed_count = timeout_count
+
+        if timeout_count:
+            logger.warning(f"Reconciled {timeout_count} temporary unlocks missed by their scheduled timeout")
+        return {
+            'status': 'success',
+            'timeout_count': timeout_count,
+            'timestamp': timezone.now().isoformat()
+        }
+    except Exception as exc:
+        logger.error(f"Temporary unlock reconciliation failed: {exc}", exc_info=True)
+        return {
+            'status': 'error',
+            'error': str(exc),
+            'timestamp': timezone.now().isoformat()
+        }
@@ -1,116 +1,165 @@
 """
-临时开锁超时检测定时任务
+临时开锁超时检测
+
+批准/开始临时开锁时在最大结束时间调度一次 Celery ETA 任务精确处理超时；
+低频对账任务扫描遗漏的记录（调度失败、worker 重启丢失等）作为兜底。
 """
+import logging
+
+from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta
 from .models import TemporaryUnlockRecord, LockTask, PinnedUser, TaskTimelineEvent
 from users.models import Notification
 
+logger = logging.getLogger(__name__)
+
+
+def schedule_temporary_unlock_timeout(record):
+    """事务提交后在临时开锁的最大结束时间调度超时处理任务"""
+    from .celery_tasks import expire_temporary_unlock
+
+    record_id = str(record.id)
+    eta = record.max_end_time
+
+    def _schedule():
+        try:
+            expire_temporary_unlock.apply_async(args=[record_id], eta=eta)
+        except Exception as e:
+            # 调度失败时由对账任务兜底
+            logger.error(f"Failed to schedule temporary unlock timeout for record {record_id}: {e}")
+
+    transaction.on_commit(_schedule)
+
+
+def expire_temporary_unlock_record(record_id, now=None):
+    """
+    处理单条临时开锁超时（幂等）
+
+    锁定记录后再次检查状态和最大结束时间，已结束或未到期的记录直接跳过，
+    重复投递的 ETA 任务和对账扫描不会重复处理。
+
+    Returns:
+        bool: 是否执行了超时处理
+    """
+    with transaction.atomic():
+        record = TemporaryUnlockRecord.objects.select_for_update(of=('self',)).select_related('task', 'user').filter(
+            id=record_id
+        ).first()
+        now = now or timezone.now()
+        if record is None or record.status != 'active' or record.max_end_time is None or record.max_end_time >= now:
+            return False
+
+        _apply_temporary_unlock_timeout(record)
+        return True
+
 
 def check_temporary_unlock_timeouts():
-    """检查临时开锁超时"""
-    # 获取所有超时的记录
-    timeout_records = TemporaryUnlockRecord.objects.filter(
+    """对账：处理所有已超时但尚未处理的临时开锁记录"""
+    now = timezone.now()
+    record_ids = list(TemporaryUnlockRecord.objects.filter(
         status='active',
-        max_end_time__lt=timezone.now()
+        max_end_time__lt=now
+    ).values_list('id', flat=True))
+
+    return sum(1 for record_id in record_ids if expire_temporary_unlock_record(record_id, now=now))
+
+
+def _apply_temporary_unlock_timeout(record):
+    """结束超时的临时开锁：解冻任务、记录事件、置顶惩罚并通知用户"""
+    task = record.task
+
+    # 标记为超时
+    record.status = 'timeout'
+    record.ended_at = timezone.now()
+    record.penalty_applied = True
+    record.save()
+
+    # 解冻任务并调整时间
+    # 优先使用 task.frozen_end_time 以获取最新的时间（包含加时）
+    original_end_time = task.frozen_end_time or record.task_frozen_end_time or task.end_time
+    frozen_duration = record.ended_at - record.started_at
+    new_end_time = original_end_time + frozen_duration
+
+    # 手动解冻并设置新的结束时间
+    if task.is_frozen:
+        task.is_frozen = False
+        task.total_frozen_duration += frozen_duration
+        task.frozen_at = None
+        task.frozen_end_time = None
+
+    task.end_time = new_end_time
+    task.save(update_fields=[
+        'is_frozen', 'end_time', 'total_frozen_duration',
+        'frozen_at', 'frozen_end_time'
+    ])
+
+    # 创建时间线事件 - 临时开锁超时
+    TaskTimelineEvent.objects.create(
+        task=task,
+        event_type='temporary_unlock_timeout',
+        user=None,  # 系统事件
+        description=f'临时开锁超时自动结束，持续 {record.duration_minutes} 分钟，已应用30分钟置顶惩罚',
+        metadata={
+            'record_id': str(record.id),
+            'duration_minutes': record.duration_minutes,
+            'max_duration': task.temporary_unlock_max_duration,
+            'penalty_minutes': 30,
+            'timeout_at': timezone.now().isoformat()
+        }
+    )
+
+    # 创建时间线事件 - 任务解冻
+    TaskTimelineEvent.objects.create(
+        task=task,
+        event_type='task_unfrozen',
+        user=None,  # 系统事件
+        description='临时开锁超时，任务恢复计时',
+        metadata={
+            'reason': 'temporary_unlock_timeout',
+            'unfrozen_at': timezone.now().isoformat(),
+            'frozen_duration_minutes': int(frozen_duration.total_seconds() / 60)
+        }
+    )
+
+    # 创建时间线事件 - 用户被置顶（惩罚）
+    TaskTimelineEvent.objects.create(
+        task=task,
+        event_type='user_pinned',
+        user=None,  # 系统事件
+        description='临时开锁超时惩罚：用户被系统自动置顶30分钟',
+        metadata={
+            'reason': 'temporary_unlock_timeout_penalty',
+            'duration_minutes': 30,
+            'is_system_action': True
+        }
     )
 
-    for record in timeout_records:
-        task = record.task
-
-        # 标记为超时
-        record.status = 'timeout'
-        record.ended_at = timezone.now()
-        record.penalty_applied = True
-        record.save()
-
-        # 解冻任务并调整时间
-        # 优先使用 task.frozen_end_time 以获取最新的时间（包含加时）
-        original_end_time = task.frozen_end_time or record.task_frozen_end_time or task.end_time
-        frozen_duration = record.ended_at - record.started_at
-        new_end_time = original_end_time + frozen_duration
-
-        # 手动解冻并设置新的结束时间
-        if task.is_frozen:
-            task.is_frozen = False
-            task.total_frozen_duration += frozen_duration
-            task.frozen_at = None
-            task.frozen_end_time = None
-
-        task.end_time = new_end_time
-        task.save(update_fields=[
-            'is_frozen', 'end_time', 'total_frozen_duration',
-            'frozen_at', 'frozen_end_time'
-        ])
-
-        # 创建时间线事件 - 临时开锁超时
-        TaskTimelineEvent.objects.create(
-            task=task,
-            event_type='temporary_unlock_timeout',
-            user=None,  # 系统事件
-            description=f'临时开锁超时自动结束，持续 {record.duration_minutes} 分钟，已应用30分钟置顶惩罚',
-            metadata={
-                'record_id': str(record.id),
-                'duration_minutes': record.duration_minutes,
-                'max_duration': task.temporary_unlock_max_duration,
-                'penalty_minutes': 30,
-                'timeout_at': timezone.now().isoformat()
-            }
-        )
-
-        # 创建时间线事件 - 任务解冻
-        TaskTimelineEvent.objects.create(
-            task=task,
-            event_type='task_unfrozen',
-            user=None,  # 系统事件
-            description='临时开锁超时，任务恢复计时',
-            metadata={
-                'reason': 'temporary_unlock_timeout',
-                'unfrozen_at': timezone.now().isoformat(),
-                'frozen_duration_minutes': int(frozen_duration.total_seconds() / 60)
-            }
-        )
-
-        # 创建时间线事件 - 用户被置顶（惩罚）
-        TaskTimelineEvent.objects.create(
-            task=task,
-            event_type='user_pinned',
-            user=None,  # 系统事件
-            description='临时开锁超时惩罚：用户被系统自动置顶30分钟',
-            metadata={
-                'reason': 'temporary_unlock_timeout_penalty',
-                'duration_minutes': 30,
-                'is_system_action': True
-            }
-        )
-
-        # 自动置顶惩罚（30分钟）
-        pin_end_time = timezone.now() + timedelta(minutes=30)
-
-        PinnedUser.objects.create(
-            task=task,
-            pinned_user=task.user,
-            key_holder=None,  # 系统自动置顶
-            duration_minutes=30,
-            is_active=True,
-            position=None,  # 加入队列
-            expires_at=pin_end_time
-        )
-
-        # 发送通知
-        Notification.create_notification(
-            recipient=record.user,
-            notification_type='temporary_unlock_timeout',
-            title='临时开锁已超时',
-            message=f'任务《{task.title}》的临时开锁已超时，已自动结束并应用30分钟置顶惩罚',
-            related_object_type='temporary_unlock',
-            related_object_id=str(record.id),
-            extra_data={
-                'task_id': str(task.id),
-                'task_title': task.title,
-                'penalty_minutes': 30,
-            },
-            priority='high'
-        )
-
-    return len(timeout_records)
+    # 自动置顶惩罚（30分钟）
+    pin_end_time = timezone.now() + timedelta(minutes=30)
+
+    PinnedUser.objects.create(
+        task=task,
+        pinned_user=task.user,
+        key_holder=None,  # 系统自动置顶
+        duration_minutes=30,
+        is_active=True,
+        position=None,  # 加入队列
+        expires_at=pin_end_time
+    )
+
+    # 发送通知
+    Notification.create_notification(
+        recipient=record.user,
+        notification_type='temporary_unlock_timeout',
+        title='临时开锁已超时',
+        message=f'任务《{task.title}》的临时开锁已超时，已自动结束并应用30分钟置顶惩罚',
+        related_object_type='temporary_unlock',
+        related_object_id=str(record.id),
+        extra_data={
+            'task_id': str(task.id),
+            'task_title': task.title,
+            'penalty_minutes': 30,
+        },
+        priority='high'
+    )
@@ -0,0 +1,149 @@
+"""
+定时任务运行记录
+
+批量任务（小时奖励、打卡投票结算、验证码轮换、置顶队列）过去把每个处理条目
+都放进 Celery 返回值，结果后端里堆积大量无上限的列表。现在每次运行写一条
+JobRun：计数、耗时、失败数，以及最多 JOB_RUN_SAMPLE_SIZE 条样本；Celery
+返回值只保留简要统计和 job_run_id。记录在后台管理中可查询，健康检查任务
+读取最近一次运行判断任务是否按时、是否失败。
+
+用法：
+
+    with record_job_run('process_hourly_rewards') as run:
+        for item in items:
+            run.item({'task_id': ...})
+        run.metrics['active_tasks'] = len(items)
+    return {'status': 'success', **run.summary()}
+
+运行记录在业务事务之外写入，写入失败只记日志，不影响任务本身。
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger('tasks.celery_tasks')
+
+
+class JobRunRecorder:
+    """收集一次运行的计数与有限样本"""
+
+    def __init__(self, job_name, sample_size=None):
+        self.job_name = job_name
+        self.sample_size = settings.JOB_RUN_SAMPLE_SIZE if sample_size is None else sample_size
+        self.processed_count = 0
+        self.failed_count = 0
+        self.metrics = {}
+        self.sample_items = []
+        self.failed_items = []
+        self.job_run = None
+        self.started_at = timezone.now()
+        self._started = time.monotonic()
+
+    def item(self, sample=None):
+        """记录一个处理成功的条目"""
+        self.processed_count += 1
+        if sample is not None and len(self.sample_items) < self.sample_size:
+            self.sample_items.append(sample)
+
+    def failure(self, sample=None, error=None):
+        """记录一个处理失败的条目"""
+        self.failed_count += 1
+        if len(self.failed_items) < self.sample_size:
+            entry = dict(sample or {})
+            if error is not None:
+                entry['error'] = str(error)
+            self.failed_items.append(entry)
+
+    def summary(self):
+        """Celery 返回值使用的简要统计"""
+        return {
+            'processed_count': self.processed_count,
+            'failed_count': self.failed_count,
+            'job_run_id': self.job_run.id if self.job_run else None,
+            **self.metrics
+        }
+
+    def finish(self, error=None):
+        """写入运行记录"""
+        from .models import JobRun
+
+        if error is not None:
+            status = 'failed'
+        elif self.failed_count:
+            status = 'partial'
+        else:
+            status = 'success'
+
+        try:
+            self.job_run = JobRun.objects.create(
+                job_name=self.job_name,
+                status=status,
+                started_at=self.started_at,
+                finished_at=timezone.now(),
+                duration_ms=int((time.monotonic() - self._started) * 1000),
+                processed_count=self.processed_count,
+                failed_count=self.failed_count,
+                metrics=self.metrics,
+                sample_items=self.sample_items,
+                failed_items=self.failed_items,
+                error=str(error) if error is not None else ''
+            )
+        except Exception as exc:
+            logger.warning(f"Failed to record job run for {self.job_name}: {exc}")
+        return self.job_run
+
+
+@contextmanager
+def record_job_run(job_name, sample_size=None):
+    """记录一次任务运行；块内抛出异常时记录为失败并继续抛出"""
+    recorder = JobRunRecorder(job_name, sample_size=sample_size)
+    try:
+        yield recorder
+    except Exception as exc:
+        recorder.finish(error=exc)
+        raise
+    recorder.finish()
+
+
+def job_run_health(job_name, max_age, now=None):
+    """
+    根据最近一次运行判断任务健康状况
+
+    Args:
+        job_name: 任务名称
+        max_age: 最近一次运行允许的最长间隔（timedelta）
+        now: 当前时间
+
+    Returns:
+        tuple: (问题列表, 最近一次运行的简要信息或 None)
+    """
+    from .models import JobRun
+
+    now = now or timezone.now()
+    last_run = JobRun.latest(job_name)
+    if last_run is None:
+        # 新部署还没有运行记录，不视为异常
+        return [], None
+
+    issues = []
+    if last_run.status == 'failed':
+        issues.append({'issue': 'last_run_failed', 'job_name': job_name, 'error': last_run.error})
+    elif last_run.failed_count:
+        issues.append({'issue': 'last_run_partial', 'job_name': job_name, 'failed_count': last_run.failed_count})
+    if now - last_run.finished_at > max_age:
+        issues.append({'issue': 'last_run_stale', 'job_name': job_name, 'finished_at': last_run.finished_at.isoformat()})
+    return issues, last_run.as_summary(now)
+
+
+def prune_job_runs(now=None):
+    """删除超过 JOB_RUN_RETENTION_DAYS 天的运行记录"""
+    from .models import JobRun
+
+    cutoff = (now or timezone.now()) - timedelta(days=settings.JOB_RUN_RETENTION_DAYS)
+    deleted, _ = JobRun.objects.filter(started_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,121 @@
+import json
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from tasks.benchmarks import SCENARIOS, BenchmarkDataset, database_info, isolated_cache, run_benchmarks
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a synthetic production-scale dataset in a throwaway test database and time the hottest '
+        'endpoints and Celery jobs; writes a JSON report that can be diffed between commits'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            type=float,
+            default=1.0,
+            help='Dataset scale factor (1.0 = 100k users, 1M timeline events, 500k posts/likes, 50k active lock tasks)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed for the dataset and for each scenario run',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Timed runs per scenario (after one warm-up run)',
+        )
+        parser.add_argument(
+            '--scenarios',
+            help=f'Comma-separated scenarios to run (default: all of {", ".join(SCENARIOS)})',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='bulk_create batch size for dataset generation',
+        )
+        parser.add_argument(
+            '--output',
+            help='Write the JSON report to this file instead of stdout',
+        )
+        parser.add_argument(
+            '--keepdb',
+            action='store_true',
+            help='Keep the benchmark database and reuse an existing dataset of the same scale',
+        )
+
+    def handle(self, *args, **options):
+        names = options['scenarios'].split(',') if options['scenarios'] else list(SCENARIOS)
+        unknown = [name for name in names if name not in SCENARIOS]
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(unknown)}')
+
+        # 基准数据写入独立的测试数据库，缓存使用私有的本地内存缓存，都不碰配置的服务；
+        # 测试环境下邮件只写入内存
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'], serialize=False)
+        try:
+            with isolated_cache():
+                report = self._run(names, options)
+        finally:
+            if not options['keepdb']:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2, sort_keys=True, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f'Benchmark report written to {options["output"]}'))
+        else:
+            self.stdout.write(output)
+
+    def _run(self, names, options):
+        log = self.stderr.write
+        dataset = BenchmarkDataset(
+            scale=options['scale'], seed=options['seed'], batch_size=options['batch_size'], log=log
+        )
+        if options['keepdb'] and dataset.exists():
+            log('Reusing existing benchmark dataset')
+        else:
+            dataset.generate()
+
+        scenarios = run_benchmarks(names, repeat=options['repeat'], seed=options['seed'], log=log)
+        for name, result in scenarios.items():
+            if 'error' in result:
+                log(self.style.ERROR(f'{name}: {result["error"]}'))
+            else:
+                log(f'{name}: median {result["median_ms"]}ms, {result["queries"]} queries')
+
+        return {
+            'meta': {
+                'commit': _git_commit(),
+                'database': database_info(),
+                'scale': options['scale'],
+                'seed': options['seed'],
+                'repeat': options['repeat'],
+                'generated_at': timezone.now().isoformat(),
+            },
+            'dataset': dataset.sizes,
+            'scenarios': scenarios,
+        }
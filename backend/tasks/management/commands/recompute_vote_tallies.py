@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from posts.models import CheckinVote, CheckinVotingSession
+from tasks.models import LockTask, TaskVote
+
+
+def _weighted_sum(model, parent_field, outer_field='pk', **filters):
+    """按投票时固定的权重汇总某个任务/动态的票数"""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{parent_field: OuterRef(outer_field)}, **filters).order_by().values(
+                parent_field
+            ).annotate(total=Sum('weight')).values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+class Command(BaseCommand):
+    help = 'Audit the stored weighted vote tallies of lock tasks and check-in voting sessions against the votes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report mismatched tallies without fixing them',
+        )
+        parser.add_argument(
+            '--include-finished',
+            action='store_true',
+            help='Also audit tasks that are no longer voting and processed voting sessions',
+        )
+
+    def handle(self, *args, **options):
+        tasks = LockTask.objects.annotate(
+            expected_total=_weighted_sum(TaskVote, 'task'),
+            expected_agree=_weighted_sum(TaskVote, 'task', agree=True)
+        ).filter(
+            ~Q(weighted_total_votes=F('expected_total')) | ~Q(weighted_agree_votes=F('expected_agree'))
+        )
+        sessions = CheckinVotingSession.objects.annotate(
+            expected_pass=_weighted_sum(CheckinVote, 'post', 'post', vote_type='pass'),
+            expected_reject=_weighted_sum(CheckinVote, 'post', 'post', vote_type='reject')
+        ).filter(
+            ~Q(weighted_pass_votes=F('expected_pass')) | ~Q(weighted_reject_votes=F('expected_reject'))
+        )
+        if not options['include_finished']:
+            tasks = tasks.filter(status='voting')
+            sessions = sessions.filter(is_processed=False)
+
+        mismatches = 0
+        for task in tasks:
+            mismatches += 1
+            self.stdout.write(self.style.ERROR(
+                f'MISMATCH task {task.title} (ID: {task.id}): '
+                f'stored {task.weighted_agree_votes}/{task.weighted_total_votes}, '
+                f'votes {task.expected_agree}/{task.expected_total}'
+            ))
+            if not options['dry_run']:
+                LockTask.objects.filter(pk=task.pk).update(
+                    weighted_total_votes=task.expected_total,
+                    weighted_agree_votes=task.expected_agree
+                )
+
+        for session in sessions:
+            mismatches += 1
+            self.stdout.write(self.style.ERROR(
+                f'MISMATCH check-in session {session.id} (post {session.post_id}): '
+                f'stored pass/reject {session.weighted_pass_votes}/{session.weighted_reject_votes}, '
+                f'votes {session.expected_pass}/{session.expected_reject}'
+            ))
+            if not options['dry_run']:
+                CheckinVotingSession.objects.filter(pk=session.pk).update(
+                    weighted_pass_votes=session.expected_pass,
+                    weighted_reject_votes=session.expected_reject
+                )
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('All weighted vote tallies match the recorded votes.'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{mismatches} mismatched tally(ies) found (dry run, nothing changed).'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Recomputed {mismatches} mismatched tally(ies).'))
@@ -16,12 +16,17 @@ This command sets up ALL periodic tasks in the django-celery-beat database sched
 - Event system execution: runs every minute to execute scheduled events
 - Event system cleanup: runs every hour to process expired effects
 - Event system health check: runs every 5 minutes to monitor event system health
+- Task state checkpoints: runs every hour to checkpoint active lock task state for rollback
+- Job run cleanup: runs every hour to delete expired job run metrics
+- Activity buffer flush: runs every few seconds to write buffered activity deltas in bulk
+- Temporary unlock timeout reconciliation: runs every 15 minutes to end unlocks missed by their ETA task
 
 Author: Claude Code
 Created: 2024-12-19
 Updated: 2024-12-25
 """
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django_celery_beat.models import PeriodicTask, IntervalSchedule, CrontabSchedule
 import json
@@ -1169,6 +1174,277 @@ class Command(BaseCommand):
                         self.style.WARNING(f'Periodic task "{board_settlement_task_name}" already exists and is up to date')
                     )
 
+        # Create periodic task for task state checkpoints (reuses hourly schedule)
+        checkpoint_task_name = 'create-task-state-checkpoints'
+        checkpoint_task_function = 'tasks.celery_tasks.create_task_state_checkpoints'
+
+        if dry_run:
+            existing_checkpoint_task = PeriodicTask.objects.filter(name=checkpoint_task_name).first()
+            if existing_checkpoint_task:
+                self.stdout.write(
+                    self.style.WARNING(f'[DRY RUN] Task "{checkpoint_task_name}" already exists')
+                )
+            else:
+                self.stdout.write(
+                    self.style.SUCCESS(f'[DRY RUN] Would create periodic task: {checkpoint_task_name}')
+                )
+        else:
+            checkpoint_periodic_task, created = PeriodicTask.objects.get_or_create(
+                name=checkpoint_task_name,
+                defaults={
+                    'interval': schedule,
+                    'task': checkpoint_task_function,
+                    'kwargs': json.dumps({}),
+                    'enabled': True,
+                    'description': 'Write state checkpoints for active lock tasks to speed up timeline rollback (Every hour)',
+                    'queue': 'default',
+                }
+            )
+
+            if created:
+                self.stdout.write(
+                    self.style.SUCCESS(f'Created periodic task: {checkpoint_task_name}')
+                )
+                self.stdout.write(f'  Task: {checkpoint_task_function}')
+                self.stdout.write(f'  Schedule: {schedule}')
+                self.stdout.write(f'  Queue: default')
+                self.stdout.write(f'  Enabled: {checkpoint_periodic_task.enabled}')
+            else:
+                # Update existing task if needed
+                updated = False
+                if checkpoint_periodic_task.task != checkpoint_task_function:
+                    checkpoint_periodic_task.task = checkpoint_task_function
+                    updated = True
+                if checkpoint_periodic_task.interval != schedule:
+                    checkpoint_periodic_task.interval = schedule
+                    updated = True
+                if not checkpoint_periodic_task.enabled:
+                    checkpoint_periodic_task.enabled = True
+                    updated = True
+
+                if updated:
+                    checkpoint_periodic_task.save()
+                    self.stdout.write(
+                        self.style.SUCCESS(f'Updated existing periodic task: {checkpoint_task_name}')
+                    )
+                else:
+                    self.stdout.write(
+                        self.style.WARNING(f'Periodic task "{checkpoint_task_name}" already exists and is up to date')
+                    )
+
+        # Create periodic task for job run cleanup (reuses hourly schedule)
+        job_run_cleanup_task_name = 'cleanup-job-runs'
+        job_run_cleanup_task_function = 'tasks.celery_tasks.cleanup_job_runs'
+
+        if dry_run:
+            existing_job_run_cleanup_task = PeriodicTask.objects.filter(name=job_run_cleanup_task_name).first()
+            if existing_job_run_cleanup_task:
+                self.stdout.write(
+                    self.style.WARNING(f'[DRY RUN] Task "{job_run_cleanup_task_name}" already exists')
+                )
+            else:
+                self.stdout.write(
+                    self.style.SUCCESS(f'[DRY RUN] Would create periodic task: {job_run_cleanup_task_name}')
+                )
+        else:
+            job_run_cleanup_periodic_task, created = PeriodicTask.objects.get_or_create(
+                name=job_run_cleanup_task_name,
+                defaults={
+                    'interval': schedule,
+                    'task': job_run_cleanup_task_function,
+                    'kwargs': json.dumps({}),
+                    'enabled': True,
+                    'description': 'Delete job run records older than JOB_RUN_RETENTION_DAYS (Every hour)',
+                    'queue': 'default',
+                }
+            )
+
+            if created:
+                self.stdout.write(
+                    self.style.SUCCESS(f'Created periodic task: {job_run_cleanup_task_name}')
+                )
+                self.stdout.write(f'  Task: {job_run_cleanup_task_function}')
+                self.stdout.write(f'  Schedule: {schedule}')
+                self.stdout.write(f'  Queue: default')
+                self.stdout.write(f'  Enabled: {job_run_cleanup_periodic_task.enabled}')
+            else:
+                # Update existing task if needed
+                updated = False
+                if job_run_cleanup_periodic_task.task != job_run_cleanup_task_function:
+                    job_run_cleanup_periodic_task.task = job_run_cleanup_task_function
+                    updated = True
+                if job_run_cleanup_periodic_task.interval != schedule:
+                    job_run_cleanup_periodic_task.interval = schedule
+                    updated = True
+                if not job_run_cleanup_periodic_task.enabled:
+                    job_run_cleanup_periodic_task.enabled = True
+                    updated = True
+
+                if updated:
+                    job_run_cleanup_periodic_task.save()
+                    self.stdout.write(
+                        self.style.SUCCESS(f'Updated existing periodic task: {job_run_cleanup_task_name}')
+                    )
+                else:
+                    self.stdout.write(
+                        self.style.WARNING(f'Periodic task "{job_run_cleanup_task_name}" already exists and is up to date')
+                    )
+
+        # ========================================================================
+        # Activity Buffer Flush Task Setup
+        # ========================================================================
+
+        self.stdout.write('\n' + '=' * 60)
+        self.stdout.write(self.style.SUCCESS('Setting up activity buffer flush task...'))
+
+        activity_flush_schedule, created = IntervalSchedule.objects.get_or_create(
+            every=settings.ACTIVITY_FLUSH_INTERVAL_SECONDS,
+            period=IntervalSchedule.SECONDS,
+        )
+
+        if created and not dry_run:
+            self.stdout.write(f'Created activity flush interval schedule: {activity_flush_schedule}')
+        elif created:
+            self.stdout.write(f'[DRY RUN] Would create activity flush interval schedule: {activity_flush_schedule}')
+        else:
+            self.stdout.write(f'Using existing activity flush interval schedule: {activity_flush_schedule}')
+
+        activity_flush_task_name = 'flush-activity-buffer'
+        activity_flush_task_function = 'tasks.celery_tasks.flush_activity_buffer'
+
+        if dry_run:
+            existing_activity_flush_task = PeriodicTask.objects.filter(name=activity_flush_task_name).first()
+            if existing_activity_flush_task:
+                self.stdout.write(
+                    self.style.WARNING(f'[DRY RUN] Task "{activity_flush_task_name}" already exists')
+                )
+            else:
+                self.stdout.write(
+                    self.style.SUCCESS(f'[DRY RUN] Would create periodic task: {activity_flush_task_name}')
+                )
+        else:
+            activity_flush_periodic_task, created = PeriodicTask.objects.get_or_create(
+                name=activity_flush_task_name,
+                defaults={
+                    'interval': activity_flush_schedule,
+                    'task': activity_flush_task_function,
+                    'kwargs': json.dumps({}),
+                    'enabled': True,
+                    'description': 'Write buffered activity score deltas and activity logs in bulk (Every few seconds)',
+                    'queue': 'activity',
+                }
+            )
+
+            if created:
+                self.stdout.write(
+                    self.style.SUCCESS(f'Created periodic task: {activity_flush_task_name}')
+                )
+                self.stdout.write(f'  Task: {activity_flush_task_function}')
+                self.stdout.write(f'  Schedule: {activity_flush_schedule}')
+                self.stdout.write(f'  Queue: activity')
+                self.stdout.write(f'  Enabled: {activity_flush_periodic_task.enabled}')
+            else:
+                # Update existing task if needed
+                updated = False
+                if activity_flush_periodic_task.task != activity_flush_task_function:
+                    activity_flush_periodic_task.task = activity_flush_task_function
+                    updated = True
+                if activity_flush_periodic_task.interval != activity_flush_schedule:
+                    activity_flush_periodic_task.interval = activity_flush_schedule
+                    updated = True
+                if not activity_flush_periodic_task.enabled:
+                    activity_flush_periodic_task.enabled = True
+                    updated = True
+                if getattr(activity_flush_periodic_task, 'queue', None) != 'activity':
+                    activity_flush_periodic_task.queue = 'activity'
+                    updated = True
+
+                if updated:
+                    activity_flush_periodic_task.save()
+                    self.stdout.write(
+                        self.style.SUCCESS(f'Updated existing periodic task: {activity_flush_task_name}')
+                    )
+                else:
+                    self.stdout.write(
+                        self.style.WARNING(f'Periodic task "{activity_flush_task_name}" already exists and is up to date')
+                    )
+
+        # ========================================================================
+        # Temporary Unlock Timeout Reconciliation Task Setup
+        # ========================================================================
+
+        self.stdout.write('\n' + '=' * 60)
+        self.stdout.write(self.style.SUCCESS('Setting up temporary unlock timeout reconciliation task...'))
+
+        unlock_reconcile_schedule, created = IntervalSchedule.objects.get_or_create(
+            every=15,  # 15 minutes
+            period=IntervalSchedule.MINUTES,
+        )
+
+        if created and not dry_run:
+            self.stdout.write(f'Created unlock reconciliation interval schedule: {unlock_reconcile_schedule}')
+        elif created:
+            self.stdout.write(f'[DRY RUN] Would create unlock reconciliation interval schedule: {unlock_reconcile_schedule}')
+        else:
+            self.stdout.write(f'Using existing unlock reconciliation interval schedule: {unlock_reconcile_schedule}')
+
+        unlock_reconcile_task_name = 'reconcile-temporary-unlock-timeouts'
+        unlock_reconcile_task_function = 'tasks.celery_tasks.reconcile_temporary_unlock_timeouts'
+
+        if dry_run:
+            existing_unlock_reconcile_task = PeriodicTask.objects.filter(name=unlock_reconcile_task_name).first()
+            if existing_unlock_reconcile_task:
+                self.stdout.write(
+                    self.style.WARNING(f'[DRY RUN] Task "{unlock_reconcile_task_name}" already exists')
+                )
+            else:
+                self.stdout.write(
+                    self.style.SUCCESS(f'[DRY RUN] Would create periodic task: {unlock_reconcile_task_name}')
+                )
+        else:
+            unlock_reconcile_periodic_task, created = PeriodicTask.objects.get_or_create(
+                name=unlock_reconcile_task_name,
+                defaults={
+                    'interval': unlock_reconcile_schedule,
+                    'task': unlock_reconcile_task_function,
+                    'kwargs': json.dumps({}),
+                    'enabled': True,
+                    'description': 'End temporary unlocks missed by their scheduled timeout task (Every 15 minutes)',
+                    'queue': 'default',
+                }
+            )
+
+            if created:
+                self.stdout.write(
+                    self.style.SUCCESS(f'Created periodic task: {unlock_reconcile_task_name}')
+                )
+                self.stdout.write(f'  Task: {unlock_reconcile_task_function}')
+                self.stdout.write(f'  Schedule: {unlock_reconcile_schedule}')
+                self.stdout.write(f'  Queue: default')
+                self.stdout.write(f'  Enabled: {unlock_reconcile_periodic_task.enabled}')
+            else:
+                # Update existing task if needed
+                updated = False
+                if unlock_reconcile_periodic_task.task != unlock_reconcile_task_function:
+                    unlock_reconcile_periodic_task.task = unlock_reconcile_task_function
+                    updated = True
+                if unlock_reconcile_periodic_task.interval != unlock_reconcile_schedule:
+                    unlock_reconcile_periodic_task.interval = unlock_reconcile_schedule
+                    updated = True
+                if not unlock_reconcile_periodic_task.enabled:
+                    unlock_reconcile_periodic_task.enabled = True
+                    updated = True
+
+                if updated:
+                    unlock_reconcile_periodic_task.save()
+                    self.stdout.write(
+                        self.style.SUCCESS(f'Updated existing periodic task: {unlock_reconcile_task_name}')
+                    )
+                else:
+                    self.stdout.write(
+                        self.style.WARNING(f'Periodic task "{unlock_reconcile_task_name}" already exists and is up to date')
+                    )
+
         # Show final task configurations
         self.stdout.write('\n' + '=' * 60)
         self.stdout.write(self.style.SUCCESS('Periodic Tasks Configuration:'))
@@ -1277,6 +1553,38 @@ class Command(BaseCommand):
             self.stdout.write(f'Enabled: {board_settlement_periodic_task.enabled}')
             self.stdout.write(f'Queue: {getattr(board_settlement_periodic_task, "queue", "default")}')
             self.stdout.write(f'Last Run: {board_settlement_periodic_task.last_run_at or "Never"}')
+
+            self.stdout.write('\n--- Task State Checkpoints Task ---')
+            self.stdout.write(f'Name: {checkpoint_periodic_task.name}')
+            self.stdout.write(f'Task: {checkpoint_periodic_task.task}')
+            self.stdout.write(f'Schedule: {checkpoint_periodic_task.interval}')
+            self.stdout.write(f'Enabled: {checkpoint_periodic_task.enabled}')
+            self.stdout.write(f'Queue: {getattr(checkpoint_periodic_task, "queue", "default")}')
+            self.stdout.write(f'Last Run: {checkpoint_periodic_task.last_run_at or "Never"}')
+
+            self.stdout.write('\n--- Job Run Cleanup Task ---')
+            self.stdout.write(f'Name: {job_run_cleanup_periodic_task.name}')
+            self.stdout.write(f'Task: {job_run_cleanup_periodic_task.task}')
+            self.stdout.write(f'Schedule: {job_run_cleanup_periodic_task.interval}')
+            self.stdout.write(f'Enabled: {job_run_cleanup_periodic_task.enabled}')
+            self.stdout.write(f'Queue: {getattr(job_run_cleanup_periodic_task, "queue", "default")}')
+            self.stdout.write(f'Last Run: {job_run_cleanup_periodic_task.last_run_at or "Never"}')
+
+            self.stdout.write('\n--- Activity Buffer Flush Task ---')
+            self.stdout.write(f'Name: {activity_flush_periodic_task.name}')
+            self.stdout.write(f'Task: {activity_flush_periodic_task.task}')
+            self.stdout.write(f'Schedule: {activity_flush_periodic_task.interval}')
+            self.stdout.write(f'Enabled: {activity_flush_periodic_task.enabled}')
+            self.stdout.write(f'Queue: {getattr(activity_flush_periodic_task, "queue", "default")}')
+            self.stdout.write(f'Last Run: {activity_flush_periodic_task.last_run_at or "Never"}')
+
+            self.stdout.write('\n--- Temporary Unlock Timeout Reconciliation Task ---')
+            self.stdout.write(f'Name: {unlock_reconcile_periodic_task.name}')
+            self.stdout.write(f'Task: {unlock_reconcile_periodic_task.task}')
+            self.stdout.write(f'Schedule: {unlock_reconcile_periodic_task.interval}')
+            self.stdout.write(f'Enabled: {unlock_reconcile_periodic_task.enabled}')
+            self.stdout.write(f'Queue: {getattr(unlock_reconcile_periodic_task, "queue", "default")}')
+            self.stdout.write(f'Last Run: {unlock_reconcile_periodic_task.last_run_at or "Never"}')
         else:
             self.stdout.write('\n[DRY RUN] Task configuration details not available in dry-run mode')
 
@@ -1309,7 +1617,11 @@ class Command(BaseCommand):
             'execute-pending-events',
             'process-expired-effects',
             'event-system-health-check',
-            'process-expired-board-tasks'
+            'process-expired-board-tasks',
+            'create-task-state-checkpoints',
+            'cleanup-job-runs',
+            'flush-activity-buffer',
+            'reconcile-temporary-unlock-timeouts'
         ]
 
         if dry_run:
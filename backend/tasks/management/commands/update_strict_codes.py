@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from tasks.models import LockTask, TaskTimelineEvent
+from tasks.strict_codes import get_strict_code, is_derived_mode
 import random
 import string
 import logging
@@ -53,6 +54,13 @@ class Command(BaseCommand):
 
         self.stdout.write(f"找到 {tasks.count()} 个严格模式任务")
 
+        if is_derived_mode():
+            # 推导验证码按日期窗口自动轮换，没有可更新的存储值
+            self.stdout.write(self.style.WARNING('当前为推导验证码模式（STRICT_CODE_MODE=derived），验证码按日期自动轮换，无需手动更新'))
+            for task in tasks:
+                self.stdout.write(f"  - {task.title} (用户: {task.user.username}, 当前验证码: {get_strict_code(task)})")
+            return
+
         if dry_run:
             self.stdout.write(self.style.WARNING('预览模式，不会实际更新'))
             for task in tasks:
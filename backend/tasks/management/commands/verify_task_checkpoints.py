@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tasks.models import LockTask, TaskStateCheckpoint
+from tasks.utils import verify_task_checkpoints
+
+
+class Command(BaseCommand):
+    help = 'Verify task state checkpoints against a full timeline replay from the current task state'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--task-id',
+            type=str,
+            help='Only verify checkpoints of this task',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=100,
+            help='Maximum number of tasks to verify (default: 100)',
+        )
+        parser.add_argument(
+            '--samples',
+            type=int,
+            default=4,
+            help='Extra evenly spaced target times per task to compare (default: 4)',
+        )
+        parser.add_argument(
+            '--delete-mismatched',
+            action='store_true',
+            help='Delete checkpoints that disagree with the full replay',
+        )
+
+    def handle(self, *args, **options):
+        tasks = LockTask.objects.filter(state_checkpoints__isnull=False).distinct().order_by('-updated_at')
+        if options['task_id']:
+            tasks = tasks.filter(id=options['task_id'])
+        tasks = list(tasks[:options['limit']])
+
+        if not tasks:
+            self.stdout.write(self.style.WARNING('No tasks with state checkpoints found.'))
+            return
+
+        now = timezone.now()
+        total_mismatches = 0
+        mismatched_checkpoint_ids = set()
+
+        for task in tasks:
+            sample_times = []
+            if options['samples'] > 0:
+                span = (now - task.created_at) / (options['samples'] + 1)
+                sample_times = [task.created_at + span * (i + 1) for i in range(options['samples'])]
+
+            mismatches = verify_task_checkpoints(task, sample_times)
+            if not mismatches:
+                self.stdout.write(f'OK: {task.title} (ID: {task.id})')
+                continue
+
+            total_mismatches += len(mismatches)
+            for mismatch in mismatches:
+                if mismatch['checkpoint_id']:
+                    mismatched_checkpoint_ids.add(mismatch['checkpoint_id'])
+                self.stdout.write(
+                    self.style.ERROR(
+                        f'MISMATCH: {task.title} (ID: {task.id}) at {mismatch["target_time"].isoformat()}\n'
+                        f'  checkpoint: {mismatch["checkpoint_state"]}\n'
+                        f'  replay:     {mismatch["replay_state"]}'
+                    )
+                )
+
+        if options['delete_mismatched'] and mismatched_checkpoint_ids:
+            deleted, _ = TaskStateCheckpoint.objects.filter(id__in=mismatched_checkpoint_ids).delete()
+            self.stdout.write(self.style.WARNING(f'Deleted {deleted} mismatched checkpoint(s).'))
+
+        if total_mismatches:
+            self.stdout.write(
+                self.style.ERROR(f'Verified {len(tasks)} task(s): {total_mismatches} mismatch(es) found.')
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f'Verified {len(tasks)} task(s): all checkpoints consistent.')
+            )
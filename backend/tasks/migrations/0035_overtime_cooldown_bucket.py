@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0034_locktask_daily_task_duration_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='overtimeaction',
+            name='cooldown_bucket',
+            field=models.BigIntegerField(blank=True, help_text='冷却时间桶（按两小时划分），用于并发去重', null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='overtimeaction',
+            constraint=models.UniqueConstraint(fields=('user', 'task_publisher', 'cooldown_bucket'), name='unique_overtime_cooldown_bucket'),
+        ),
+    ]
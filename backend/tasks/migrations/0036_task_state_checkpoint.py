@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-19 03:34
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0035_overtime_cooldown_bucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskStateCheckpoint',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('checkpoint_at', models.DateTimeField(help_text='检查点时间（已包含此时间之前的全部事件）')),
+                ('end_time', models.DateTimeField(blank=True, null=True)),
+                ('is_frozen', models.BooleanField(default=False)),
+                ('frozen_at', models.DateTimeField(blank=True, null=True)),
+                ('frozen_end_time', models.DateTimeField(blank=True, null=True)),
+                ('events_since_previous', models.IntegerField(default=0, help_text='距上一个检查点的可回退事件数')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='state_checkpoints', to='tasks.locktask')),
+            ],
+            options={
+                'verbose_name': '任务状态检查点',
+                'verbose_name_plural': '任务状态检查点',
+                'ordering': ['-checkpoint_at'],
+                'indexes': [models.Index(fields=['task', 'checkpoint_at'], name='tasks_tasks_task_id_5340a2_idx')],
+            },
+        ),
+    ]
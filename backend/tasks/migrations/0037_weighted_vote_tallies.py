@@ -0,0 +1,72 @@
+# Generated by Django 5.2.7 on 2026-10-19 04:51
+
+from django.db import migrations, models
+from django.db.models import IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def _current_crown_weights(apps):
+    """Vote multipliers of the currently active influence crowns (latest crown wins)."""
+    UserEffect = apps.get_model('store', 'UserEffect')
+    now = timezone.now()
+    crowns = UserEffect.objects.filter(
+        Q(expires_at__isnull=True) | Q(expires_at__gt=now),
+        effect_type='influence_crown',
+        is_active=True
+    ).order_by('created_at').values_list('user_id', 'properties')
+    return {user_id: int((properties or {}).get('vote_multiplier', 3)) for user_id, properties in crowns}
+
+
+def _weighted_sum(model, parent_field, outer_field='pk', **filters):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{parent_field: OuterRef(outer_field)}, **filters).order_by().values(parent_field).annotate(
+                total=Sum('weight')
+            ).values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def backfill_task_vote_tallies(apps, schema_editor):
+    """Freeze existing vote weights from the voters' current crowns (what reads used before) and derive the tallies."""
+    TaskVote = apps.get_model('tasks', 'TaskVote')
+    LockTask = apps.get_model('tasks', 'LockTask')
+
+    TaskVote.objects.update(weight=1)
+    for user_id, weight in _current_crown_weights(apps).items():
+        TaskVote.objects.filter(voter_id=user_id).update(weight=weight)
+
+    LockTask.objects.filter(id__in=TaskVote.objects.values('task_id')).update(
+        weighted_total_votes=_weighted_sum(TaskVote, 'task'),
+        weighted_agree_votes=_weighted_sum(TaskVote, 'task', agree=True)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0036_task_state_checkpoint'),
+        ('store', '0017_game_player_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='locktask',
+            name='weighted_agree_votes',
+            field=models.PositiveIntegerField(default=0, help_text='加权同意票数（投票时原子累加）'),
+        ),
+        migrations.AddField(
+            model_name='locktask',
+            name='weighted_total_votes',
+            field=models.PositiveIntegerField(default=0, help_text='加权总票数（投票时原子累加）'),
+        ),
+        migrations.AddField(
+            model_name='taskvote',
+            name='weight',
+            field=models.PositiveIntegerField(blank=True, null=True, help_text='投票权重（创建时按影响力皇冠效果固定）'),
+        ),
+        migrations.RunPython(backfill_task_vote_tallies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0037_weighted_vote_tallies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_name', models.CharField(help_text='任务名称', max_length=100)),
+                ('status', models.CharField(choices=[('success', '成功'), ('partial', '部分失败'), ('failed', '失败')], default='success', max_length=20)),
+                ('started_at', models.DateTimeField(help_text='开始时间')),
+                ('finished_at', models.DateTimeField(help_text='结束时间')),
+                ('duration_ms', models.PositiveIntegerField(default=0, help_text='耗时（毫秒）')),
+                ('processed_count', models.PositiveIntegerField(default=0, help_text='处理条目数')),
+                ('failed_count', models.PositiveIntegerField(default=0, help_text='失败条目数')),
+                ('metrics', models.JSONField(blank=True, default=dict, help_text='其他计数指标')),
+                ('sample_items', models.JSONField(blank=True, default=list, help_text='处理条目样本（最多 JOB_RUN_SAMPLE_SIZE 条）')),
+                ('failed_items', models.JSONField(blank=True, default=list, help_text='失败条目样本（最多 JOB_RUN_SAMPLE_SIZE 条）')),
+                ('error', models.TextField(blank=True, help_text='整体失败时的错误信息')),
+            ],
+            options={
+                'verbose_name': '定时任务运行记录',
+                'verbose_name_plural': '定时任务运行记录',
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['job_name', '-started_at'], name='tasks_jobru_job_nam_2d316f_idx'), models.Index(fields=['started_at'], name='tasks_jobru_started_d20793_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0038_job_runs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pinneduser',
+            name='key_holder',
+            field=models.ForeignKey(blank=True, help_text='执行置顶的钥匙持有者（系统自动置顶时为空）', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pinning_actions', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
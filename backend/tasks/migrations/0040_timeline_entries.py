@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0039_pinned_user_system_key_holder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskTimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('event', '单个事件'), ('hourly_rewards', '小时奖励区间')], default='event', max_length=20)),
+                ('event_type', models.CharField(help_text='事件类型（区间为 hourly_reward）', max_length=30)),
+                ('started_at', models.DateTimeField(help_text='区间第一个事件时间（单个事件同 occurred_at）')),
+                ('occurred_at', models.DateTimeField(help_text='最后一个事件时间，用于排序和增量折叠')),
+                ('event_count', models.PositiveIntegerField(default=1, help_text='聚合的原始事件数')),
+                ('data', models.JSONField(default=dict, help_text='预渲染的紧凑条目')),
+                ('event', models.OneToOneField(blank=True, help_text='对应的原始事件（区间为空）', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='read_entry', to='tasks.tasktimelineevent')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='tasks.locktask')),
+            ],
+            options={
+                'verbose_name': '任务时间线条目',
+                'verbose_name_plural': '任务时间线条目',
+                'ordering': ['-occurred_at', '-id'],
+                'indexes': [models.Index(fields=['task', '-occurred_at'], name='tasks_taskt_task_id_1de339_idx')],
+            },
+        ),
+    ]
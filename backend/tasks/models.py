@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
@@ -71,6 +72,8 @@ class LockTask(models.Model):
     voting_end_time = models.DateTimeField(blank=True, null=True, help_text='投票结束时间')
     voting_duration = models.IntegerField(default=10, help_text='投票持续时间（分钟）')
     vote_failed_penalty_minutes = models.IntegerField(blank=True, null=True, help_text='投票失败加时分钟数')
+    weighted_total_votes = models.PositiveIntegerField(default=0, help_text='加权总票数（投票时原子累加）')
+    weighted_agree_votes = models.PositiveIntegerField(default=0, help_text='加权同意票数（投票时原子累加）')
 
     # 任务板字段
     reward = models.IntegerField(blank=True, null=True, help_text='奖励金额')
@@ -261,6 +264,17 @@ class LockTask(models.Model):
 
         return max(0, int(remaining.total_seconds() / 60))
 
+    # 加权票数只由投票原子累加（见 TaskVote.save），整体保存任务时不写回，避免旧值覆盖并发投票
+    VOTE_TALLY_FIELDS = ('weighted_total_votes', 'weighted_agree_votes')
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.VOTE_TALLY_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     def freeze_task(self):
         """冻结任务（暂停计时）"""
         if not self.is_frozen:
@@ -312,6 +326,7 @@ class TaskVote(models.Model):
     task = models.ForeignKey(LockTask, on_delete=models.CASCADE, related_name='votes')
     voter = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='task_votes')
     agree = models.BooleanField(default=True)
+    weight = models.PositiveIntegerField(null=True, blank=True, help_text='投票权重（创建时按影响力皇冠效果固定）')
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -320,6 +335,21 @@ class TaskVote(models.Model):
     def __str__(self):
         return f"{self.voter.username} voted {'Yes' if self.agree else 'No'} for {self.task.title}"
 
+    def save(self, *args, **kwargs):
+        """新投票固定投票权重，并在同一事务内原子累加任务的加权票数"""
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+
+        if self.weight is None:
+            from store.active_effects import get_active_effects
+            self.weight = get_active_effects(self.voter_id).vote_weight
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            LockTask.objects.filter(pk=self.task_id).update(
+                weighted_total_votes=F('weighted_total_votes') + self.weight,
+                weighted_agree_votes=F('weighted_agree_votes') + (self.weight if self.agree else 0)
+            )
+
 
 class OvertimeAction(models.Model):
     """加时操作记录"""
@@ -329,10 +359,17 @@ class OvertimeAction(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='overtime_actions')
     task_publisher = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='received_overtime_actions')
     overtime_minutes = models.IntegerField(help_text='加时分钟数')
+    cooldown_bucket = models.BigIntegerField(blank=True, null=True, help_text='冷却时间桶（按两小时划分），用于并发去重')
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'task_publisher', 'cooldown_bucket'],
+                name='unique_overtime_cooldown_bucket'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.username} added {self.overtime_minutes} minutes to {self.task.title}"
@@ -603,7 +640,8 @@ class PinnedUser(models.Model):
     pinned_user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
                                    related_name='pinned_records', help_text='被置顶的用户（任务创建者）')
     key_holder = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
-                                  related_name='pinning_actions', help_text='执行置顶的钥匙持有者')
+                                  null=True, blank=True, related_name='pinning_actions',
+                                  help_text='执行置顶的钥匙持有者（系统自动置顶时为空）')
 
     # 置顶详情
     coins_spent = models.IntegerField(default=60, help_text='消费的金币数')
@@ -630,7 +668,9 @@ class PinnedUser(models.Model):
 
     def __str__(self):
         status = f"位置{self.position}" if self.position else "排队中"
-        return f"{self.key_holder.username} 置顶 {self.pinned_user.username} ({status})"
+        # 临时开锁超时的系统惩罚置顶没有钥匙持有者
+        operator = self.key_holder.username if self.key_holder_id else '系统'
+        return f"{operator} 置顶 {self.pinned_user.username} ({status})"
 
     def save(self, *args, **kwargs):
         # 确保 pinned_user 是 task 的创建者
@@ -638,6 +678,10 @@ class PinnedUser(models.Model):
             raise ValueError("被置顶用户必须是任务的创建者")
         super().save(*args, **kwargs)
 
+        # 置顶状态变化后重新发布社区轮播缓存
+        from .pinning_service import PinningQueueManager
+        transaction.on_commit(PinningQueueManager.publish_carousel)
+
 
 class TaskTimeRollback(models.Model):
     """任务时间回退记录"""
@@ -677,6 +721,127 @@ class TaskTimeRollback(models.Model):
         return f"{self.user.username} 回退任务 {self.task.title} ({self.reverted_events_count}个操作)"
 
 
+class TaskStateCheckpoint(models.Model):
+    """任务状态检查点 - 定期保存任务的时间状态，历史状态重建时只需回放检查点之后的事件"""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    task = models.ForeignKey(LockTask, on_delete=models.CASCADE, related_name='state_checkpoints')
+    checkpoint_at = models.DateTimeField(help_text='检查点时间（已包含此时间之前的全部事件）')
+
+    # 检查点时刻的任务时间状态
+    end_time = models.DateTimeField(null=True, blank=True)
+    is_frozen = models.BooleanField(default=False)
+    frozen_at = models.DateTimeField(null=True, blank=True)
+    frozen_end_time = models.DateTimeField(null=True, blank=True)
+
+    events_since_previous = models.IntegerField(default=0, help_text='距上一个检查点的可回退事件数')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-checkpoint_at']
+        verbose_name = '任务状态检查点'
+        verbose_name_plural = '任务状态检查点'
+        indexes = [
+            models.Index(fields=['task', 'checkpoint_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.task.title} @ {self.checkpoint_at}"
+
+    def as_state(self):
+        """转换为与 get_task_state_at_time 相同结构的状态字典"""
+        return {
+            'end_time': self.end_time,
+            'is_frozen': self.is_frozen,
+            'frozen_at': self.frozen_at,
+            'frozen_end_time': self.frozen_end_time
+        }
+
+
+class JobRun(models.Model):
+    """定时任务运行记录 - 记录每次运行的计数、耗时、失败数和有限的样本，代替庞大的 Celery 返回值"""
+
+    STATUS_CHOICES = [
+        ('success', '成功'),
+        ('partial', '部分失败'),
+        ('failed', '失败'),
+    ]
+
+    job_name = models.CharField(max_length=100, help_text='任务名称')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='success')
+    started_at = models.DateTimeField(help_text='开始时间')
+    finished_at = models.DateTimeField(help_text='结束时间')
+    duration_ms = models.PositiveIntegerField(default=0, help_text='耗时（毫秒）')
+
+    processed_count = models.PositiveIntegerField(default=0, help_text='处理条目数')
+    failed_count = models.PositiveIntegerField(default=0, help_text='失败条目数')
+    metrics = models.JSONField(default=dict, blank=True, help_text='其他计数指标')
+    sample_items = models.JSONField(default=list, blank=True, help_text='处理条目样本（最多 JOB_RUN_SAMPLE_SIZE 条）')
+    failed_items = models.JSONField(default=list, blank=True, help_text='失败条目样本（最多 JOB_RUN_SAMPLE_SIZE 条）')
+    error = models.TextField(blank=True, help_text='整体失败时的错误信息')
+
+    class Meta:
+        ordering = ['-started_at']
+        verbose_name = '定时任务运行记录'
+        verbose_name_plural = '定时任务运行记录'
+        indexes = [
+            models.Index(fields=['job_name', '-started_at']),
+            models.Index(fields=['started_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.job_name} @ {self.started_at} ({self.get_status_display()})"
+
+    @classmethod
+    def latest(cls, job_name):
+        """某个任务最近一次运行记录，没有时返回 None"""
+        return cls.objects.filter(job_name=job_name).order_by('-started_at').first()
+
+    def as_summary(self, now=None):
+        """健康检查使用的简要信息"""
+        now = now or timezone.now()
+        return {
+            'job_run_id': self.id,
+            'status': self.status,
+            'started_at': self.started_at.isoformat(),
+            'age_seconds': int((now - self.finished_at).total_seconds()),
+            'duration_ms': self.duration_ms,
+            'processed_count': self.processed_count,
+            'failed_count': self.failed_count,
+            'error': self.error
+        }
+
+
+class TaskTimelineEntry(models.Model):
+    """任务时间线读模型 - 预渲染的紧凑时间线条目，连续的小时奖励聚合为一个区间"""
+
+    KIND_CHOICES = [
+        ('event', '单个事件'),
+        ('hourly_rewards', '小时奖励区间'),
+    ]
+
+    task = models.ForeignKey(LockTask, on_delete=models.CASCADE, related_name='timeline_entries')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='event')
+    event_type = models.CharField(max_length=30, help_text='事件类型（区间为 hourly_reward）')
+    event = models.OneToOneField(TaskTimelineEvent, on_delete=models.CASCADE, null=True, blank=True,
+                                 related_name='read_entry', help_text='对应的原始事件（区间为空）')
+    started_at = models.DateTimeField(help_text='区间第一个事件时间（单个事件同 occurred_at）')
+    occurred_at = models.DateTimeField(help_text='最后一个事件时间，用于排序和增量折叠')
+    event_count = models.PositiveIntegerField(default=1, help_text='聚合的原始事件数')
+    data = models.JSONField(default=dict, help_text='预渲染的紧凑条目')
+
+    class Meta:
+        ordering = ['-occurred_at', '-id']
+        verbose_name = '任务时间线条目'
+        verbose_name_plural = '任务时间线条目'
+        indexes = [
+            models.Index(fields=['task', '-occurred_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} x{self.event_count} for task {self.task_id}"
+
+
 class TaskDeadlineReminder(models.Model):
     """任务截止提醒记录 - 防止重复发送提醒"""
 
@@ -5,15 +5,23 @@ Pinning Queue Management Service
 处理钥匙持有者置顶惩罚系统的队列管理逻辑
 """
 
+from datetime import datetime
+
+from django.core.cache import cache
 from django.utils import timezone
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Case, DateTimeField, F, IntegerField, Value, When
 from .models import PinnedUser, LockTask, TaskTimelineEvent
 from store.models import Item
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 社区轮播数据缓存（置顶或轮播中的任务变化时发布，轮播读取不访问数据库）；
+# 过期时间兜底批量更新等不触发保存信号的变更
+CAROUSEL_CACHE_KEY = 'pinning:carousel'
+CAROUSEL_CACHE_SECONDS = 300
+
 
 class PinningQueueManager:
     """置顶队列管理器"""
@@ -128,86 +136,108 @@ class PinningQueueManager:
         """
         更新置顶队列，处理过期和位置分配
 
+        在一个事务中完成：一次查询锁定所有活跃记录，过期记录一条 UPDATE 下线，
+        结束事件一次批量插入，位置变更一条 CASE UPDATE；有变化时在提交后把
+        轮播数据发布到缓存。查询数与队列长度无关。
+
         Returns:
-            dict: 队列更新结果
+            dict: 队列更新结果（expired_pins 为过期记录的简要信息）
         """
         try:
             with transaction.atomic():
                 now = timezone.now()
 
-                # 1. 移除过期的置顶记录
-                expired_pins = PinnedUser.objects.filter(
-                    is_active=True,
-                    expires_at__lt=now
-                )
-
-                expired_count = 0
-                for pin in expired_pins:
-                    pin.is_active = False
-                    pin.position = None
-                    pin.save()
-
-                    # 创建置顶结束事件
-                    TaskTimelineEvent.objects.create(
-                        task=pin.task,
-                        event_type='user_unpinned',
-                        user=None,  # 系统事件
-                        description=f'{pin.pinned_user.username} 的置顶时间已到期',
-                        metadata={
-                            'expired': True,
-                            'duration_minutes': pin.duration_minutes,
-                            'pinned_user_id': str(pin.pinned_user.id),
-                            'key_holder_id': str(pin.key_holder.id)
-                        }
-                    )
-                    expired_count += 1
-
-                # 2. 获取所有活跃的置顶记录，按创建时间排序
-                active_pins = PinnedUser.objects.filter(
+                # 1. 锁定所有活跃的置顶记录，按创建时间排队
+                active_rows = list(PinnedUser.objects.select_for_update(of=('self',)).filter(
                     is_active=True
-                ).order_by('created_at')
-
-                logger.info(f"Active pins count: {active_pins.count()}, MAX_ACTIVE_POSITIONS: {cls.MAX_ACTIVE_POSITIONS}")
-
-                # 3. 重新分配位置
+                ).order_by('created_at').values(
+                    'id', 'position', 'expires_at', 'duration_minutes', 'task_id', 'task__title',
+                    'pinned_user_id', 'pinned_user__username', 'key_holder_id'
+                ))
+
+                # 2. 过期记录批量下线，并批量记录置顶结束事件
+                expired_rows = [row for row in active_rows if row['expires_at'] < now]
+                if expired_rows:
+                    PinnedUser.objects.filter(
+                        id__in=[row['id'] for row in expired_rows]
+                    ).update(is_active=False, position=None)
+
+                    TaskTimelineEvent.objects.bulk_create([
+                        TaskTimelineEvent(
+                            task_id=row['task_id'],
+                            event_type='user_unpinned',
+                            user=None,  # 系统事件
+                            description=f"{row['pinned_user__username']} 的置顶时间已到期",
+                            metadata={
+                                'expired': True,
+                                'duration_minutes': row['duration_minutes'],
+                                'pinned_user_id': str(row['pinned_user_id']),
+                                'key_holder_id': str(row['key_holder_id']) if row['key_holder_id'] else None,
+                                'expired_at': now.isoformat()
+                            }
+                        )
+                        for row in expired_rows
+                    ])
+
+                # 3. 重新分配位置：前 MAX_ACTIVE_POSITIONS 个占位，其余排队
+                remaining_rows = [row for row in active_rows if row['expires_at'] >= now]
                 position_changes = []
-                for i, pin in enumerate(active_pins):
+                for i, row in enumerate(remaining_rows):
                     new_position = i + 1 if i < cls.MAX_ACTIVE_POSITIONS else None
-                    old_position = pin.position
-
-                    logger.info(f"Pin {pin.id} - Index: {i}, Old position: {old_position}, New position: {new_position}")
-
-                    if new_position != old_position:
-                        pin.position = new_position
-                        if new_position is not None and old_position is None:
-                            # 从队列中激活
-                            pin.activated_at = now
-                        pin.save()
-
+                    if new_position != row['position']:
                         position_changes.append({
-                            'pin_id': str(pin.id),
-                            'pinned_user': pin.pinned_user.username,
-                            'old_position': old_position,
+                            'pin_id': str(row['id']),
+                            'pinned_user': row['pinned_user__username'],
+                            'old_position': row['position'],
                             'new_position': new_position
                         })
-                        logger.info(f"Position changed for pin {pin.id}: {old_position} -> {new_position}")
 
-                # 4. 获取当前状态
-                active_positions = active_pins.filter(position__isnull=False).count()
-                queue_count = active_pins.filter(position__isnull=True).count()
-
-                # 5. Log position changes (no timeline event for system-level operations)
                 if position_changes:
+                    # 从队列中激活的记录同时写入激活时间
+                    activated_ids = [
+                        change['pin_id'] for change in position_changes
+                        if change['old_position'] is None and change['new_position'] is not None
+                    ]
+                    PinnedUser.objects.filter(
+                        id__in=[change['pin_id'] for change in position_changes]
+                    ).update(
+                        position=Case(
+                            *[When(id=change['pin_id'], then=Value(change['new_position'])) for change in position_changes],
+                            output_field=IntegerField()
+                        ),
+                        activated_at=Case(
+                            When(id__in=activated_ids, then=Value(now)),
+                            default=F('activated_at'),
+                            output_field=DateTimeField()
+                        )
+                    )
+
+                # 4. 当前状态
+                active_positions = min(len(remaining_rows), cls.MAX_ACTIVE_POSITIONS)
+                queue_count = len(remaining_rows) - active_positions
+
+                if expired_rows or position_changes:
                     logger.info(f"置顶队列已更新：{len(position_changes)}个位置变更, "
                                f"活跃位置: {active_positions}, 排队: {queue_count}, "
-                               f"过期: {expired_count}")
+                               f"过期: {len(expired_rows)}")
                     for change in position_changes:
                         logger.info(f"位置变更: {change['pinned_user']} "
                                    f"{change['old_position']} -> {change['new_position']}")
+                    transaction.on_commit(cls.publish_carousel)
 
                 return {
                     'success': True,
-                    'expired_count': expired_count,
+                    'expired_count': len(expired_rows),
+                    'expired_pins': [
+                        {
+                            'pin_id': str(row['id']),
+                            'task_id': str(row['task_id']),
+                            'task_title': row['task__title'],
+                            'pinned_user_id': row['pinned_user_id'],
+                            'duration_minutes': row['duration_minutes']
+                        }
+                        for row in expired_rows
+                    ],
                     'position_changes': position_changes,
                     'active_positions': active_positions,
                     'queue_count': queue_count
@@ -220,6 +250,70 @@ class PinningQueueManager:
                 'error': str(e)
             }
 
+    @classmethod
+    def build_carousel(cls):
+        """从数据库构建社区轮播数据（不含随时间变化的剩余时间）"""
+        return [
+            {
+                'id': str(pin.id),
+                'position': pin.position,
+                'task': {
+                    'id': str(pin.task.id),
+                    'title': pin.task.title,
+                    'status': pin.task.status,
+                    'difficulty': pin.task.difficulty,
+                    'task_type': pin.task.task_type
+                },
+                'pinned_user': {
+                    'id': str(pin.pinned_user.id),
+                    'username': pin.pinned_user.username
+                },
+                'key_holder': {
+                    'id': str(pin.key_holder.id),
+                    'username': pin.key_holder.username
+                } if pin.key_holder else None,
+                'expires_at': pin.expires_at.isoformat(),
+                'created_at': pin.created_at.isoformat()
+            }
+            for pin in cls.get_active_pinned_users()
+        ]
+
+    @classmethod
+    def publish_carousel(cls):
+        """把当前轮播数据发布到缓存（置顶变化后调用）"""
+        carousel = cls.build_carousel()
+        cache.set(CAROUSEL_CACHE_KEY, carousel, CAROUSEL_CACHE_SECONDS)
+        return carousel
+
+    @classmethod
+    def is_task_in_carousel(cls, task_id):
+        """已发布的轮播中是否展示该任务（只读缓存，不访问数据库）"""
+        carousel = cache.get(CAROUSEL_CACHE_KEY) or []
+        return any(entry['task']['id'] == str(task_id) for entry in carousel)
+
+    @classmethod
+    def get_carousel(cls, now=None):
+        """
+        读取社区轮播数据
+
+        从缓存读取并按当前时间计算剩余时间，已到期但尚未被队列任务处理的
+        记录直接过滤掉；缓存为空（冷启动）时从数据库构建一次并发布。
+
+        Returns:
+            list: 轮播条目
+        """
+        carousel = cache.get(CAROUSEL_CACHE_KEY)
+        if carousel is None:
+            carousel = cls.publish_carousel()
+
+        now = now or timezone.now()
+        items = []
+        for entry in carousel:
+            time_remaining = (datetime.fromisoformat(entry['expires_at']) - now).total_seconds()
+            if time_remaining > 0:
+                items.append({**entry, 'time_remaining': time_remaining})
+        return items
+
     @classmethod
     def get_active_pinned_users(cls):
         """
@@ -290,7 +384,7 @@ class PinningQueueManager:
                     'key_holder': {
                         'id': str(pin.key_holder.id),
                         'username': pin.key_holder.username
-                    },
+                    } if pin.key_holder else None,
                     'expires_at': pin.expires_at.isoformat(),
                     'time_remaining': max(0, (pin.expires_at - now).total_seconds())
                 }
@@ -332,7 +426,7 @@ class PinningQueueManager:
                     'key_holder': {
                         'id': str(pin.key_holder.id),
                         'username': pin.key_holder.username
-                    },
+                    } if pin.key_holder else None,
                     'created_at': pin.created_at.isoformat(),
                     'queue_time': (now - pin.created_at).total_seconds()
                 }
@@ -2,6 +2,7 @@ from rest_framework import serializers
 from .models import LockTask, TaskKey, TaskVote, TaskTimelineEvent, TaskSubmissionFile, TaskParticipant, TemporaryUnlockRecord
 from users.serializers import UserSerializer, UserMinimalSerializer, UserPublicSerializer
 from .utils import calculate_weighted_vote_counts
+from .strict_codes import get_strict_code
 from django.conf import settings
 
 
@@ -125,6 +126,7 @@ class LockTaskListSerializer(serializers.ModelSerializer):
     submitted_count = serializers.SerializerMethodField()
     approved_count = serializers.SerializerMethodField()
     can_take = serializers.SerializerMethodField()
+    strict_code = serializers.SerializerMethodField()
 
     class Meta:
         model = LockTask
@@ -154,6 +156,10 @@ class LockTaskListSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'user', 'created_at']
 
+    def get_strict_code(self, obj):
+        """获取当前有效的严格模式验证码（推导模式下按日期窗口计算）"""
+        return get_strict_code(obj)
+
     def get_vote_count(self, obj):
         """获取总投票数（包含影响力王冠权重）"""
         vote_counts = calculate_weighted_vote_counts(obj)
@@ -228,6 +234,7 @@ class LockTaskSerializer(serializers.ModelSerializer):
     submitted_count = serializers.SerializerMethodField()
     approved_count = serializers.SerializerMethodField()
     can_take = serializers.SerializerMethodField()
+    strict_code = serializers.SerializerMethodField()
 
     # 临时开锁相关信息
     temporary_unlock_config = serializers.SerializerMethodField()
@@ -276,6 +283,10 @@ class LockTaskSerializer(serializers.ModelSerializer):
             return UserPublicSerializer(obj.key.holder).data
         return None
 
+    def get_strict_code(self, obj):
+        """获取当前有效的严格模式验证码（推导模式下按日期窗口计算）"""
+        return get_strict_code(obj)
+
     def get_vote_count(self, obj):
         """获取总投票数（包含影响力王冠权重）"""
         vote_counts = calculate_weighted_vote_counts(obj)
@@ -444,6 +455,7 @@ class LockTaskCreateSerializer(serializers.ModelSerializer):
     )
     temporary_unlock_require_approval = serializers.BooleanField(required=False, default=False)
     temporary_unlock_require_photo = serializers.BooleanField(required=False, default=False)
+    strict_code = serializers.SerializerMethodField()
 
     class Meta:
         model = LockTask
@@ -469,7 +481,11 @@ class LockTaskCreateSerializer(serializers.ModelSerializer):
             'temporary_unlock_require_approval',
             'temporary_unlock_require_photo',
         ]
-        read_only_fields = ['id', 'status', 'strict_code']
+        read_only_fields = ['id', 'status']
+
+    def get_strict_code(self, obj):
+        """获取当前有效的严格模式验证码（推导模式下按日期窗口计算）"""
+        return get_strict_code(obj)
 
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
@@ -0,0 +1,20 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import LockTask, PinnedUser
+from .pinning_service import PinningQueueManager
+
+
+@receiver(post_delete, sender=PinnedUser)
+def republish_carousel_on_pin_delete(sender, instance, **kwargs):
+    """活跃置顶被删除（包括任务删除时级联删除）后重新发布社区轮播缓存"""
+    if instance.is_active and instance.position is not None:
+        transaction.on_commit(PinningQueueManager.publish_carousel)
+
+
+@receiver(post_save, sender=LockTask)
+def republish_carousel_on_task_change(sender, instance, created, **kwargs):
+    """轮播中展示的任务保存后（标题、状态等可能变化）重新发布社区轮播缓存"""
+    if not created and PinningQueueManager.is_task_in_carousel(instance.pk):
+        transaction.on_commit(PinningQueueManager.publish_carousel)
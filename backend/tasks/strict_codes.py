@@ -0,0 +1,61 @@
+"""
+严格模式验证码
+
+stored 模式（默认）：验证码随机生成后保存在 LockTask.strict_code，
+每日由定时任务或首次打卡轮换并写回任务。
+
+derived 模式：验证码由 HMAC(密钥, 任务ID + 日期窗口) 推导，读取时计算。
+日期窗口以每天凌晨4点（与打卡投票截止、自动冻结一致）为界，换日后验证码
+自动变化，每日轮换不再锁定、写入任务行。
+"""
+
+import hashlib
+import hmac
+import random
+import string
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+# 每日验证码窗口的起始时刻（本地时间）
+STRICT_CODE_DAY_START_HOUR = 4
+
+
+def is_derived_mode():
+    """是否使用推导验证码"""
+    return settings.STRICT_CODE_MODE == 'derived'
+
+
+def generate_strict_code():
+    """生成4位随机验证码（格式：字母数字字母数字，如A1B2）"""
+    letters = random.choices(string.ascii_uppercase, k=2)
+    digits = random.choices(string.digits, k=2)
+    return f"{letters[0]}{digits[0]}{letters[1]}{digits[1]}"
+
+
+def code_window(at=None):
+    """返回某一时刻所属的验证码日期窗口（凌晨4点换日）"""
+    local_time = timezone.localtime(at or timezone.now())
+    return (local_time - timedelta(hours=STRICT_CODE_DAY_START_HOUR)).date()
+
+
+def derive_strict_code(task_id, window):
+    """按任务ID和日期窗口推导4位验证码（格式与随机验证码一致）"""
+    digest = hmac.new(
+        settings.STRICT_CODE_SECRET.encode(),
+        f'{task_id}:{window.isoformat()}'.encode(),
+        hashlib.sha256
+    ).digest()
+    letters = string.ascii_uppercase
+    return f"{letters[digest[0] % 26]}{digest[1] % 10}{letters[digest[2] % 26]}{digest[3] % 10}"
+
+
+def get_strict_code(task, at=None):
+    """获取任务在某一时刻有效的验证码（非严格模式任务返回 None）"""
+    if not task.strict_mode:
+        return None
+    if is_derived_mode():
+        return derive_strict_code(task.id, code_window(at))
+    return task.strict_code
+
@@ -0,0 +1,307 @@
+"""
+任务时间线读模型
+
+TaskTimelineEvent 仍是唯一的写入来源。读取时把已稳定（早于 TIMELINE_SETTLE_SECONDS）
+的新事件增量折叠为预渲染的 TaskTimelineEntry：普通事件一条一行并去掉只用于记账的
+元数据，连续的小时奖励合并为一个区间。更新的事件在请求时实时渲染、不落库，
+避免较晚提交的事务写入的事件被水位线跳过。
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import TaskTimelineEntry, TaskTimelineEvent, TemporaryUnlockRecord
+
+logger = logging.getLogger(__name__)
+
+FOLD_LOCK_SECONDS = 30
+
+# 元数据中只用于记账、界面不展示的字段
+NOISY_METADATA_KEYS = {'total_coins', 'processed_by', 'auto_processed'}
+
+# 需要附带验证照片的事件类型
+PHOTO_EVENT_TYPES = {'temporary_unlock_ended', 'temporary_unlock_timeout'}
+
+REWARD_PARTS = [('base_reward', '基础'), ('key_bonus', '钥匙'), ('lucky_bonus', '幸运符')]
+
+EVENT_TYPE_DISPLAY = dict(TaskTimelineEvent.EVENT_TYPE_CHOICES)
+
+
+class TimelineEntries:
+    """实时条目（最新）+ 读模型查询结果的只读序列，供分页器切片"""
+
+    def __init__(self, live_entries, queryset):
+        self.live_entries = live_entries
+        self.queryset = queryset
+
+    def count(self):
+        return len(self.live_entries) + self.queryset.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+
+        start = key.start or 0
+        live_count = len(self.live_entries)
+        entries = self.live_entries[start:key.stop]
+
+        stored_start = max(0, start - live_count)
+        stored_stop = None if key.stop is None else key.stop - live_count
+        if stored_stop is None or stored_stop > stored_start:
+            entries = entries + list(self.queryset[stored_start:stored_stop])
+        return entries
+
+
+class TaskTimelineReadModel:
+    """任务时间线读模型"""
+
+    @classmethod
+    def get_entries(cls, task, exclude=(), now=None):
+        """
+        获取任务时间线条目（按时间倒序）
+
+        Args:
+            task: LockTask 实例
+            exclude: 排除的事件类型（小时奖励区间的类型为 hourly_reward）
+
+        Returns:
+            TimelineEntries: 可切片的预渲染条目序列
+        """
+        live_entries = cls.refresh(task, now=now)
+        queryset = TaskTimelineEntry.objects.filter(task=task)
+        if exclude:
+            queryset = queryset.exclude(event_type__in=exclude)
+            live_entries = [entry for entry in live_entries if entry['type'] not in exclude]
+
+        return TimelineEntries(live_entries, queryset.order_by('-occurred_at', '-id').values_list('data', flat=True))
+
+    @classmethod
+    def refresh(cls, task, now=None):
+        """
+        把已稳定的新事件折叠进读模型
+
+        Returns:
+            list: 尚未落库的最新条目（按时间倒序），由调用方和读模型合并展示
+        """
+        now = now or timezone.now()
+        settle_before = now - timedelta(seconds=settings.TIMELINE_SETTLE_SECONDS)
+
+        lock_key = f'timeline:fold:{task.id}'
+        locked = cache.add(lock_key, 1, FOLD_LOCK_SECONDS)
+        try:
+            last_entry = TaskTimelineEntry.objects.filter(task=task).order_by('-occurred_at', '-id').first()
+            events = TaskTimelineEvent.objects.filter(task=task).select_related('user').order_by('created_at', 'id')
+            if last_entry:
+                events = events.filter(created_at__gt=last_entry.occurred_at)
+            events = list(events)
+
+            settled = [event for event in events if event.created_at < settle_before]
+            if settled and locked:
+                cls._persist(task, settled, last_entry)
+                events = events[len(settled):]
+        finally:
+            if locked:
+                cache.delete(lock_key)
+
+        # 其余事件实时渲染（包括其他请求正在折叠时的全部新事件）
+        entries, _ = cls.fold(events)
+        return [entry.data for entry in reversed(entries)]
+
+    @classmethod
+    def rebuild(cls, task, now=None):
+        """丢弃任务的读模型并重新折叠"""
+        TaskTimelineEntry.objects.filter(task=task).delete()
+        return cls.refresh(task, now=now)
+
+    @classmethod
+    def _persist(cls, task, events, last_entry):
+        """在一个事务中写入新条目并更新被延长的区间"""
+        open_segment = last_entry if last_entry and last_entry.kind == 'hourly_rewards' else None
+        with transaction.atomic():
+            entries, extended = cls.fold(events, open_segment=open_segment)
+            if extended:
+                open_segment.save(update_fields=['occurred_at', 'event_count', 'data'])
+            TaskTimelineEntry.objects.bulk_create(entries)
+        logger.debug(f"Folded {len(events)} timeline events into {len(entries)} entries for task {task.id}")
+
+    @classmethod
+    def fold(cls, events, open_segment=None):
+        """
+        把按时间正序的原始事件折叠为（未保存的）条目
+
+        Args:
+            events: 按时间正序的 TaskTimelineEvent 列表
+            open_segment: 可继续延长的已保存小时奖励区间
+
+        Returns:
+            tuple: (新条目列表, open_segment 是否被延长)
+        """
+        photo_urls = cls._photo_urls(events)
+        max_hours = settings.TIMELINE_SEGMENT_MAX_HOURS
+
+        entries = []
+        extended = False
+        segment = open_segment
+        for event in events:
+            if event.event_type != 'hourly_reward':
+                segment = None
+                entries.append(TaskTimelineEntry(
+                    task_id=event.task_id,
+                    kind='event',
+                    event_type=event.event_type,
+                    event=event,
+                    started_at=event.created_at,
+                    occurred_at=event.created_at,
+                    data=cls.render_event(event, photo_urls),
+                ))
+                continue
+
+            if segment is not None and segment.event_count < max_hours:
+                cls._extend_segment(segment, event)
+                extended = extended or segment is open_segment
+                continue
+
+            segment = TaskTimelineEntry(
+                task_id=event.task_id,
+                kind='hourly_rewards',
+                event_type='hourly_reward',
+                started_at=event.created_at,
+                occurred_at=event.created_at,
+                event_count=0,
+                data={
+                    'id': str(event.id),
+                    'type': 'hourly_reward',
+                    'display': EVENT_TYPE_DISPLAY['hourly_reward'],
+                    'segment': True,
+                    'first_hour': None,
+                    'total_reward': 0,
+                    **{key: 0 for key, _ in REWARD_PARTS},
+                    'started_at': event.created_at.isoformat(),
+                },
+            )
+            cls._extend_segment(segment, event)
+            entries.append(segment)
+
+        return entries, extended
+
+    @classmethod
+    def render_event(cls, event, photo_urls=None):
+        """渲染单个事件为紧凑条目（省略空字段和记账元数据）"""
+        entry = {
+            'id': str(event.id),
+            'type': event.event_type,
+            'display': EVENT_TYPE_DISPLAY.get(event.event_type, event.event_type),
+            'created_at': event.created_at.isoformat(),
+        }
+        if event.user_id:
+            entry['user'] = {'id': event.user.id, 'username': event.user.username}
+        if event.description:
+            entry['description'] = event.description
+        if event.time_change_minutes is not None:
+            entry['time_change_minutes'] = event.time_change_minutes
+        if event.previous_end_time:
+            entry['previous_end_time'] = event.previous_end_time.isoformat()
+        if event.new_end_time:
+            entry['new_end_time'] = event.new_end_time.isoformat()
+
+        metadata = {key: value for key, value in (event.metadata or {}).items() if key not in NOISY_METADATA_KEYS}
+        if metadata:
+            entry['metadata'] = metadata
+
+        photo_url = (photo_urls or {}).get(str(event.id))
+        if photo_url:
+            entry['verification_photo_url'] = photo_url
+        return entry
+
+    @classmethod
+    def collapse(cls, entries, event_types):
+        """
+        把相邻的同类型条目合并为一个折叠条目（用于页内折叠嘈杂的事件类型）
+
+        Args:
+            entries: 按时间倒序的条目
+            event_types: 需要折叠的事件类型
+        """
+        collapsed = []
+        for entry in entries:
+            previous = collapsed[-1] if collapsed else None
+            if entry['type'] not in event_types or previous is None or previous['type'] != entry['type']:
+                collapsed.append(entry)
+                continue
+
+            if not previous.get('collapsed'):
+                previous = collapsed[-1] = {
+                    'id': previous['id'],
+                    'type': previous['type'],
+                    'display': previous['display'],
+                    'collapsed': True,
+                    'count': previous.get('hours', 1),
+                    'ids': [previous['id']],
+                    'started_at': previous.get('started_at', previous['created_at']),
+                    'created_at': previous['created_at'],
+                }
+            previous['count'] += entry.get('hours', 1)
+            previous['ids'].append(entry['id'])
+            previous['started_at'] = entry.get('started_at', entry['created_at'])
+        return collapsed
+
+    @staticmethod
+    def _extend_segment(segment, event):
+        """把一条小时奖励并入区间并重新生成描述"""
+        metadata = event.metadata or {}
+        data = segment.data
+        hour = metadata.get('hour_count')
+
+        data['first_hour'] = data['first_hour'] or hour
+        data['last_hour'] = hour or data.get('last_hour')
+        data['total_reward'] += metadata.get('reward_amount', 0)
+        for key, _ in REWARD_PARTS:
+            data[key] += metadata.get(key, 0)
+
+        segment.event_count += 1
+        segment.occurred_at = event.created_at
+        data['hours'] = segment.event_count
+        data['created_at'] = event.created_at.isoformat()
+
+        if data['first_hour'] and data['last_hour'] and data['first_hour'] != data['last_hour']:
+            description = f"第{data['first_hour']}-{data['last_hour']}小时奖励：共获得{data['total_reward']}积分"
+        elif data['first_hour']:
+            description = f"第{data['first_hour']}小时奖励：获得{data['total_reward']}积分"
+        else:
+            description = f"{segment.event_count}次小时奖励：共获得{data['total_reward']}积分"
+        reward_parts = [f'{label}{data[key]}' for key, label in REWARD_PARTS if data[key] > 0]
+        if reward_parts:
+            description += f' ({"+".join(reward_parts)})'
+        data['description'] = description
+
+    @staticmethod
+    def _photo_urls(events):
+        """批量获取临时开锁结束事件的验证照片 URL"""
+        record_ids = {
+            str(event.id): event.metadata.get('record_id')
+            for event in events
+            if event.event_type in PHOTO_EVENT_TYPES and event.metadata and event.metadata.get('record_id')
+        }
+        if not record_ids:
+            return {}
+
+        from utils.media import get_full_media_url
+
+        try:
+            photos = {
+                str(record.id): get_full_media_url(record.verification_photo.url)
+                for record in TemporaryUnlockRecord.objects.filter(
+                    id__in=set(record_ids.values())
+                ).only('id', 'verification_photo')
+                if record.verification_photo
+            }
+        except Exception:
+            return {}
+        return {event_id: photos[record_id] for event_id, record_id in record_ids.items() if record_id in photos}
@@ -48,6 +48,7 @@ urlpatterns = [
 
     # 任务时间线
     path('<uuid:pk>/timeline/', views.get_task_timeline, name='task-timeline'),
+    path('<uuid:pk>/timeline/entries/', views.get_task_timeline_entries, name='task-timeline-entries'),
 
     # 小时奖励
     path('process-hourly-rewards/', views.process_hourly_rewards, name='process-hourly-rewards'),
@@ -4,18 +4,23 @@ Task utilities for reusable business logic
 
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
-from django.db import transaction
+from django.db import transaction, IntegrityError
+from django.db.models import Case, Count, DateTimeField, F, IntegerField, Max, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
 from datetime import timedelta
 import random
 
-from .models import LockTask, OvertimeAction, TaskTimelineEvent, PinnedUser
+from .models import LockTask, OvertimeAction, TaskTimelineEvent, TaskStateCheckpoint, PinnedUser
 from store.models import Item
 from users.models import Notification
 
 
 def calculate_weighted_vote_counts(task):
     """
-    计算带有影响力皇冠效果的加权投票统计
+    读取带有影响力皇冠效果的加权投票统计
+
+    加权票数在投票创建时原子累加到任务上（投票权重在投票时固定，见 TaskVote.save），
+    这里只读取任务字段，不扫描投票记录。
 
     Args:
         task: LockTask实例
@@ -23,36 +28,120 @@ def calculate_weighted_vote_counts(task):
     Returns:
         dict: 包含total_votes和agree_votes的字典，已应用影响力皇冠倍数
     """
-    from store.models import UserEffect
-
-    votes = task.votes.all()
-    total_weighted_votes = 0
-    agree_weighted_votes = 0
-
-    for vote in votes:
-        # 检查投票者是否有活跃的影响力皇冠效果
-        crown_effect = UserEffect.objects.filter(
-            user=vote.voter,
-            effect_type='influence_crown',
-            is_active=True,
-            expires_at__gt=timezone.now()
-        ).first()
-
-        # 计算投票权重
-        vote_weight = 1
-        if crown_effect:
-            vote_weight = crown_effect.properties.get('vote_multiplier', 3)
-
-        total_weighted_votes += vote_weight
-        if vote.agree:
-            agree_weighted_votes += vote_weight
-
     return {
-        'total_votes': total_weighted_votes,
-        'agree_votes': agree_weighted_votes
+        'total_votes': task.weighted_total_votes,
+        'agree_votes': task.weighted_agree_votes
     }
 
 
+# 可调整时间的任务状态
+TIME_ADJUSTABLE_STATUSES = ('active', 'voting', 'voting_passed')
+
+# 同一用户对同一发布者的加时冷却时间
+OVERTIME_COOLDOWN = timedelta(hours=2)
+
+
+def get_overtime_cooldown_bucket(now=None):
+    """按冷却时长划分的时间桶编号，配合唯一约束防止并发重复加时"""
+    now = now or timezone.now()
+    return int(now.timestamp() // OVERTIME_COOLDOWN.total_seconds())
+
+
+@transaction.atomic
+def apply_task_time_delta(task, minutes, statuses=TIME_ADJUSTABLE_STATUSES,
+                          restart_expired_if=None, build_timeline_events=None):
+    """
+    原子地为带锁任务加时/减时
+
+    使用一条条件 UPDATE 完成 end_time = end_time + interval，不做读取-修改-保存，
+    并发加时不会互相覆盖。冻结任务调整 frozen_end_time，否则调整 end_time；
+    减时不会越过当前时间（冻结任务不越过冻结时刻）。
+    UPDATE、回读与时间线写入在同一事务中：UPDATE 持有的行锁保证回读到的正是
+    本次调整后的值，反推出的调整前时间不会混入并发调整。
+
+    Args:
+        task: LockTask 实例（成功后其时间字段会被刷新）
+        minutes: 调整分钟数，正数加时、负数减时
+        statuses: 允许调整的任务状态
+        restart_expired_if: Q 条件，满足时倒计时已结束的任务从当前时间重新加时
+        build_timeline_events: 可调用对象，接收调整结果并返回未保存的 TaskTimelineEvent 列表，
+                               调整成功后批量写入，未设置的时间字段会自动补全
+
+    Returns:
+        dict | None: 调整结果（前后结束时间及实际调整分钟数）；任务状态不满足条件时返回 None
+    """
+    now = timezone.now()
+    delta = timedelta(minutes=minutes)
+    now_value = Value(now, output_field=DateTimeField())
+
+    if minutes >= 0:
+        end_whens = [When(end_time__isnull=True, then=Value(now + delta))]
+        if restart_expired_if is not None:
+            end_whens.append(When(restart_expired_if & Q(end_time__lte=now), then=Value(now + delta)))
+        end_expr = Case(*end_whens, default=F('end_time') + delta, output_field=DateTimeField())
+        frozen_expr = Coalesce(F('frozen_end_time'), F('end_time'), now_value) + delta
+        condition = Q()
+    else:
+        end_expr = Greatest(F('end_time') + delta, now_value)
+        frozen_expr = Greatest(F('frozen_end_time') + delta, F('frozen_at'))
+        # 减时要求仍有剩余时间
+        condition = (
+            Q(is_frozen=False, end_time__gt=now) |
+            Q(is_frozen=True, frozen_end_time__gt=F('frozen_at'))
+        )
+
+    updated = LockTask.objects.filter(
+        condition, pk=task.pk, task_type='lock', status__in=statuses
+    ).update(
+        end_time=Case(When(is_frozen=True, then=F('end_time')), default=end_expr),
+        frozen_end_time=Case(When(is_frozen=True, then=frozen_expr), default=F('frozen_end_time')),
+        updated_at=now
+    )
+    if not updated:
+        return None
+
+    snapshot_end_time = task.end_time
+    snapshot_frozen_end_time = task.frozen_end_time
+    task.refresh_from_db(fields=['end_time', 'frozen_end_time', 'is_frozen', 'frozen_at', 'status'])
+
+    # 从新值反推调整前的值；命中重新计时/截断分支时退回调用方持有的快照
+    if task.is_frozen:
+        new_value, snapshot, floor = task.frozen_end_time, snapshot_frozen_end_time, task.frozen_at
+    else:
+        new_value, snapshot, floor = task.end_time, snapshot_end_time, now
+    if new_value == now + delta or (minutes < 0 and new_value == floor):
+        previous_value = snapshot
+    else:
+        previous_value = new_value - delta
+    if previous_value is not None and new_value is not None:
+        applied_minutes = int((new_value - previous_value).total_seconds() / 60) if minutes < 0 else minutes
+    else:
+        applied_minutes = minutes
+
+    previous_end_time = snapshot_end_time if task.is_frozen else previous_value
+    result = {
+        'previous_end_time': previous_end_time,
+        'new_end_time': task.end_time,
+        'previous_frozen_end_time': previous_value if task.is_frozen else task.frozen_end_time,
+        'new_frozen_end_time': task.frozen_end_time,
+        'applied_minutes': applied_minutes,
+    }
+
+    timeline_events = build_timeline_events(result) if build_timeline_events else []
+    if timeline_events:
+        for event in timeline_events:
+            event.task = task
+            if event.time_change_minutes is None:
+                event.time_change_minutes = applied_minutes
+            if event.previous_end_time is None:
+                event.previous_end_time = previous_end_time
+            if event.new_end_time is None:
+                event.new_end_time = task.end_time
+        TaskTimelineEvent.objects.bulk_create(timeline_events)
+
+    return result
+
+
 def add_overtime_to_task(task, user, minutes=None):
     """
     为进行中的带锁任务随机加时
@@ -72,7 +161,7 @@ def add_overtime_to_task(task, user, minutes=None):
         }
     """
     # If task is an ID, get the task object
-    if isinstance(task, (str, int)):
+    if not isinstance(task, LockTask):
         try:
             task = LockTask.objects.get(id=task)
         except LockTask.DoesNotExist:
@@ -115,21 +204,22 @@ def add_overtime_to_task(task, user, minutes=None):
         }
 
     # 检查两小时内是否已经为同一个发布者的任务加过时
-    two_hours_ago = timezone.now() - timedelta(hours=2)
+    now = timezone.now()
     recent_overtime = OvertimeAction.objects.filter(
         user=user,
         task_publisher=task.user,
-        created_at__gte=two_hours_ago
+        created_at__gte=now - OVERTIME_COOLDOWN
     ).exists()
 
+    cooldown_failure = {
+        'success': False,
+        'message': '两小时内只能对同一个发布者的带锁任务随机加时一次',
+        'overtime_minutes': 0,
+        'new_end_time': None,
+        'task': task
+    }
     if recent_overtime:
-        return {
-            'success': False,
-            'message': '两小时内只能对同一个发布者的带锁任务随机加时一次',
-            'overtime_minutes': 0,
-            'new_end_time': None,
-            'task': task
-        }
+        return cooldown_failure
 
     # 检查任务是否可以加时
     # 对于投票状态的任务，只要投票期未结束就可以加时
@@ -174,87 +264,64 @@ def add_overtime_to_task(task, user, minutes=None):
     if is_pinned:
         overtime_minutes *= 10  # 10倍惩罚效果
 
-    # 处理投票已通过状态的任务加时
-    if task.status == 'voting_passed':
-        # 投票已通过的任务被加时后，保持voting_passed状态和投票记录
-        # 一次投票通过后，无论被加时多少次，都不需要重新投票
-        pass  # 保持状态和投票记录不变
-
-    # 记录时间变化前的状态
-    previous_end_time = task.end_time
-    previous_frozen_end_time = task.frozen_end_time
-
-    # 更新任务结束时间 - 需要考虑冻结状态
-    now = timezone.now()
-
-    if task.is_frozen:
-        # 冻结状态：修改 frozen_end_time
-        if task.frozen_end_time:
-            # 从冻结的结束时间延长
-            task.frozen_end_time = task.frozen_end_time + timezone.timedelta(minutes=overtime_minutes)
-        else:
-            # 如果没有冻结结束时间，使用原结束时间作为基础
-            if task.end_time:
-                task.frozen_end_time = task.end_time + timezone.timedelta(minutes=overtime_minutes)
-            else:
-                # 如果都没有，从现在开始加时
-                task.frozen_end_time = now + timezone.timedelta(minutes=overtime_minutes)
-    else:
-        # 非冻结状态：修改 end_time（原有逻辑）
-        if task.end_time:
-            # 如果倒计时已经结束，从现在开始加时；否则从原结束时间加时
-            if now >= task.end_time:
-                # 倒计时已结束
-                if task.strict_mode:
-                    # 严格模式下，加时后任务立即结束
-                    task.end_time = now + timezone.timedelta(minutes=overtime_minutes)
-                else:
-                    # 普通模式下，从原结束时间延长
-                    task.end_time = task.end_time + timezone.timedelta(minutes=overtime_minutes)
-            else:
-                # 倒计时未结束，从原结束时间延长
-                task.end_time = task.end_time + timezone.timedelta(minutes=overtime_minutes)
-        else:
-            # 如果没有结束时间，从现在开始加时
-            task.end_time = now + timezone.timedelta(minutes=overtime_minutes)
-
-    task.save()
-
-    # 记录加时操作
-    OvertimeAction.objects.create(
-        task=task,
-        user=user,
-        task_publisher=task.user,
-        overtime_minutes=overtime_minutes
-    )
-
-    # 创建时间线事件
-    description = f'{user.username} 为任务随机加时 {overtime_minutes} 分钟'
-    if is_pinned:
-        description += f'（置顶惩罚：{original_overtime}×10）'
-    if task.is_frozen:
-        description += '（冻结状态下）'
+    # 投票已通过的任务被加时后，保持voting_passed状态和投票记录
+    # 一次投票通过后，无论被加时多少次，都不需要重新投票
+    source = 'telegram_bot' if hasattr(user, '_telegram_bot_source') else 'web'
+
+    def build_timeline_events(change):
+        description = f'{user.username} 为任务随机加时 {overtime_minutes} 分钟'
+        if is_pinned:
+            description += f'（置顶惩罚：{original_overtime}×10）'
+        if task.is_frozen:
+            description += '（冻结状态下）'
+        previous_frozen_end_time = change['previous_frozen_end_time']
+        return [TaskTimelineEvent(
+            event_type='overtime_added',
+            user=user,
+            description=description,
+            metadata={
+                'difficulty': task.difficulty,
+                'overtime_minutes': overtime_minutes,
+                'original_overtime': original_overtime,
+                'is_pinned': is_pinned,
+                'pinning_multiplier': 10 if is_pinned else 1,
+                'is_frozen': task.is_frozen,
+                'previous_frozen_end_time': previous_frozen_end_time.isoformat() if previous_frozen_end_time else None,
+                'new_frozen_end_time': task.frozen_end_time.isoformat() if task.frozen_end_time else None,
+                'source': source
+            }
+        )]
 
-    TaskTimelineEvent.objects.create(
-        task=task,
-        event_type='overtime_added',
-        user=user,
-        time_change_minutes=overtime_minutes,
-        previous_end_time=previous_end_time,
-        new_end_time=task.end_time,
-        description=description,
-        metadata={
-            'difficulty': task.difficulty,
-            'overtime_minutes': overtime_minutes,
-            'original_overtime': original_overtime,
-            'is_pinned': is_pinned,
-            'pinning_multiplier': 10 if is_pinned else 1,
-            'is_frozen': task.is_frozen,
-            'previous_frozen_end_time': previous_frozen_end_time.isoformat() if previous_frozen_end_time else None,
-            'new_frozen_end_time': task.frozen_end_time.isoformat() if task.frozen_end_time else None,
-            'source': 'telegram_bot' if hasattr(user, '_telegram_bot_source') else 'web'
-        }
-    )
+    with transaction.atomic():
+        # 冷却时间桶唯一约束保证并发点击只有一次加时生效
+        try:
+            with transaction.atomic():
+                OvertimeAction.objects.create(
+                    task=task,
+                    user=user,
+                    task_publisher=task.user,
+                    overtime_minutes=overtime_minutes,
+                    cooldown_bucket=get_overtime_cooldown_bucket(now)
+                )
+        except IntegrityError:
+            return cooldown_failure
+
+        # 倒计时已结束时，严格模式从现在开始加时，普通模式从原结束时间延长
+        change = apply_task_time_delta(
+            task,
+            overtime_minutes,
+            restart_expired_if=Q(strict_mode=True),
+            build_timeline_events=build_timeline_events
+        )
+        if change is None:
+            transaction.set_rollback(True)
+            return {
+                'success': False,
+                'message': '只能为进行中的任务（包括投票期和投票已通过）加时',
+                'overtime_minutes': 0,
+                'new_end_time': None,
+                'task': task
+            }
 
     # 创建加时通知
     notification_extra_data = {
@@ -365,6 +432,22 @@ def destroy_task_keys(task, reason="task_ended", user=None, metadata=None):
     }
 
 
+# 可回退的事件类型（影响任务时间状态，可逆向回放）
+REVERTIBLE_EVENT_TYPES = (
+    'time_wheel_increase',      # 时间转盘加时（也包括手动加时）
+    'time_wheel_decrease',      # 时间转盘减时（也包括手动减时）
+    'overtime_added',           # 他人加时
+    'task_frozen',              # 任务冻结
+    'task_unfrozen',            # 任务解冻
+    'vote_failed',              # 投票失败加时
+    'system_freeze',            # 系统冻结（暴雪瓶）
+)
+
+# 状态检查点策略：累计多少个可回退事件，或距上个检查点多久后写入新检查点
+TASK_CHECKPOINT_EVENT_INTERVAL = 50
+TASK_CHECKPOINT_MAX_AGE = timedelta(hours=6)
+
+
 def get_revertible_events(task, rollback_time):
     """
     获取可回退的时间线事件（30分钟内）
@@ -378,21 +461,10 @@ def get_revertible_events(task, rollback_time):
     """
     cutoff_time = rollback_time - timedelta(minutes=30)
 
-    # 可回退的事件类型
-    revertible_event_types = [
-        'time_wheel_increase',      # 时间转盘加时（也包括手动加时）
-        'time_wheel_decrease',      # 时间转盘减时（也包括手动减时）
-        'overtime_added',           # 他人加时
-        'task_frozen',              # 任务冻结
-        'task_unfrozen',            # 任务解冻
-        'vote_failed',              # 投票失败加时
-        'system_freeze',            # 系统冻结（暴雪瓶）
-    ]
-
     # 获取30分钟内的可回退事件，按时间倒序
     events = TaskTimelineEvent.objects.filter(
         task=task,
-        event_type__in=revertible_event_types,
+        event_type__in=REVERTIBLE_EVENT_TYPES,
         created_at__gte=cutoff_time,
         created_at__lte=rollback_time
     ).order_by('-created_at')
@@ -400,74 +472,190 @@ def get_revertible_events(task, rollback_time):
     return events
 
 
-def get_task_state_at_time(task, target_time):
+def get_task_state_at_time(task, target_time, use_checkpoints=True):
     """
     获取任务在指定时间点的状态
 
+    从目标时间之后最近的状态检查点（没有则从当前状态）开始，
+    只逆向回放检查点与目标时间之间的可回退事件。
+
     Args:
         task: LockTask 实例
         target_time: 目标时间点
+        use_checkpoints: 是否使用状态检查点（False 时从当前状态完整回放，用于校验）
 
     Returns:
-        dict: 包含任务状态信息的字典
+        dict: 包含任务状态信息的字典；任务在目标时间之后才创建时返回 None
     """
-    from .models import TaskTimelineEvent
-    from django.utils import timezone
-
-    # 获取目标时间之前的最后一个状态快照事件
-    # 如果没有状态快照，则使用任务创建时的状态
-
-    # 首先尝试从任务创建时的状态开始
-    if task.created_at <= target_time:
-        # 任务在目标时间之前就存在
-        initial_state = {
-            'end_time': task.end_time,  # 使用当前结束时间作为基准
-            'is_frozen': False,
-            'frozen_at': None,
-            'frozen_end_time': None
-        }
+    if task.created_at > target_time:
+        # 任务在目标时间之后才创建，返回None表示任务不存在
+        return None
 
-        # 获取目标时间之前的所有事件，按时间正序
-        events = TaskTimelineEvent.objects.filter(
+    checkpoint = None
+    if use_checkpoints:
+        checkpoint = TaskStateCheckpoint.objects.filter(
             task=task,
-            created_at__lte=target_time
-        ).order_by('created_at')
-
-        # 逆向计算：从当前状态回推到目标时间的状态
-        current_time = timezone.now()
+            checkpoint_at__gte=target_time
+        ).order_by('checkpoint_at').first()
 
-        # 获取目标时间之后的所有可回退事件，按时间倒序
-        future_events = TaskTimelineEvent.objects.filter(
-            task=task,
-            created_at__gt=target_time,
-            created_at__lte=current_time,
-            event_type__in=[
-                'time_wheel_increase',
-                'time_wheel_decrease',
-                'overtime_added',
-                'task_frozen',
-                'task_unfrozen',
-                'vote_failed',
-                'system_freeze'
-            ]
-        ).order_by('-created_at')
-
-        # 从当前状态开始，逆向应用事件
+    if checkpoint:
+        result_state = checkpoint.as_state()
+        replay_until = checkpoint.checkpoint_at
+    else:
         result_state = {
             'end_time': task.end_time,
             'is_frozen': task.is_frozen,
             'frozen_at': task.frozen_at,
             'frozen_end_time': task.frozen_end_time
         }
+        replay_until = None
+
+    # 获取目标时间之后（至检查点为止）的可回退事件，按时间倒序
+    future_events = TaskTimelineEvent.objects.filter(
+        task=task,
+        created_at__gt=target_time,
+        event_type__in=REVERTIBLE_EVENT_TYPES
+    )
+    if replay_until is not None:
+        future_events = future_events.filter(created_at__lte=replay_until)
 
-        # 逆向应用每个事件
-        for event in future_events:
-            result_state = _reverse_apply_event(result_state, event)
+    # 逆向应用每个事件
+    for event in future_events.order_by('-created_at'):
+        result_state = _reverse_apply_event(result_state, event)
 
-        return result_state
-    else:
-        # 任务在目标时间之后才创建，返回None表示任务不存在
-        return None
+    return result_state
+
+
+def create_task_checkpoints(task_ids, now=None):
+    """
+    为指定任务写入状态检查点（批量）
+
+    任务行被锁定后读取其当前时间状态，保证检查点与同一时刻已提交的事件一致；
+    正被其他事务修改的任务会被跳过，等待下一轮。
+
+    Returns:
+        list: 新建的 TaskStateCheckpoint 列表
+    """
+    now = now or timezone.now()
+
+    with transaction.atomic():
+        rows = list(
+            LockTask.objects.select_for_update(skip_locked=True)
+            .filter(id__in=task_ids)
+            .values_list('id', 'end_time', 'is_frozen', 'frozen_at', 'frozen_end_time')
+        )
+        if not rows:
+            return []
+
+        ids = [row[0] for row in rows]
+        last_checkpoint_at = dict(
+            TaskStateCheckpoint.objects.filter(task_id__in=ids)
+            .values('task_id')
+            .annotate(last=Max('checkpoint_at'))
+            .values_list('task_id', 'last')
+        )
+        event_filter = Q()
+        for task_id in ids:
+            since = last_checkpoint_at.get(task_id)
+            task_filter = Q(task_id=task_id)
+            if since:
+                task_filter &= Q(created_at__gt=since)
+            event_filter |= task_filter
+        event_counts = dict(
+            TaskTimelineEvent.objects.filter(
+                event_filter,
+                event_type__in=REVERTIBLE_EVENT_TYPES,
+                created_at__lte=now
+            ).values('task_id').annotate(count=Count('id')).values_list('task_id', 'count')
+        )
+
+        checkpoints = [
+            TaskStateCheckpoint(
+                task_id=task_id,
+                checkpoint_at=now,
+                end_time=end_time,
+                is_frozen=is_frozen,
+                frozen_at=frozen_at,
+                frozen_end_time=frozen_end_time,
+                events_since_previous=event_counts.get(task_id, 0)
+            )
+            for task_id, end_time, is_frozen, frozen_at, frozen_end_time in rows
+        ]
+        return TaskStateCheckpoint.objects.bulk_create(checkpoints)
+
+
+def get_tasks_due_for_checkpoint(now=None):
+    """
+    找出需要写入新检查点的进行中带锁任务（单条查询）
+
+    条件：自上个检查点（没有则自任务创建）以来的可回退事件数达到
+    TASK_CHECKPOINT_EVENT_INTERVAL，或已有新事件且距上个检查点超过 TASK_CHECKPOINT_MAX_AGE。
+    """
+    now = now or timezone.now()
+
+    last_checkpoint = TaskStateCheckpoint.objects.filter(
+        task=OuterRef('pk')
+    ).order_by('-checkpoint_at').values('checkpoint_at')[:1]
+
+    pending_events = TaskTimelineEvent.objects.filter(
+        task=OuterRef('pk'),
+        event_type__in=REVERTIBLE_EVENT_TYPES,
+        created_at__gt=OuterRef('checkpoint_base'),
+        created_at__lte=now
+    ).order_by().values('task').annotate(count=Count('id')).values('count')
+
+    return list(
+        LockTask.objects.filter(
+            task_type='lock',
+            status__in=TIME_ADJUSTABLE_STATUSES
+        ).annotate(
+            checkpoint_base=Coalesce(Subquery(last_checkpoint), F('created_at'))
+        ).annotate(
+            pending_events=Coalesce(Subquery(pending_events, output_field=IntegerField()), 0)
+        ).filter(
+            Q(pending_events__gte=TASK_CHECKPOINT_EVENT_INTERVAL) |
+            Q(pending_events__gt=0, checkpoint_base__lte=now - TASK_CHECKPOINT_MAX_AGE)
+        ).values_list('id', flat=True)
+    )
+
+
+def verify_task_checkpoints(task, sample_times=None):
+    """
+    校验任务的状态检查点：比较基于检查点的重建结果与从当前状态完整回放的结果
+
+    Args:
+        task: LockTask 实例
+        sample_times: 额外校验的时间点列表（默认只校验各检查点时刻）
+
+    Returns:
+        list: 不一致项，每项包含 target_time、checkpoint_state、replay_state 及对应检查点ID
+    """
+    mismatches = []
+    checkpoints = list(TaskStateCheckpoint.objects.filter(task=task).order_by('checkpoint_at'))
+
+    for checkpoint in checkpoints:
+        replay_state = get_task_state_at_time(task, checkpoint.checkpoint_at, use_checkpoints=False)
+        if replay_state != checkpoint.as_state():
+            mismatches.append({
+                'target_time': checkpoint.checkpoint_at,
+                'checkpoint_id': checkpoint.id,
+                'checkpoint_state': checkpoint.as_state(),
+                'replay_state': replay_state
+            })
+
+    for target_time in sample_times or []:
+        checkpoint_state = get_task_state_at_time(task, target_time)
+        replay_state = get_task_state_at_time(task, target_time, use_checkpoints=False)
+        if checkpoint_state != replay_state:
+            nearest = next((cp for cp in checkpoints if cp.checkpoint_at >= target_time), None)
+            mismatches.append({
+                'target_time': target_time,
+                'checkpoint_id': nearest.id if nearest else None,
+                'checkpoint_state': checkpoint_state,
+                'replay_state': replay_state
+            })
+
+    return mismatches
 
 
 def _reverse_apply_event(state, event):
@@ -680,46 +868,24 @@ def apply_penalty_overtime(task, user, penalty_minutes):
         user: 违规用户
         penalty_minutes: 惩罚加时分钟数
     """
-    # 记录时间变化前的状态
-    old_end_time = task.end_time
-    old_frozen_end_time = task.frozen_end_time
-
-    # 应用惩罚加时 - 需要考虑冻结状态
-    if task.is_frozen:
-        # 冻结状态：修改 frozen_end_time
-        if task.frozen_end_time:
-            task.frozen_end_time += timedelta(minutes=penalty_minutes)
-        else:
-            # 如果没有冻结结束时间，使用原结束时间作为基础
-            if task.end_time:
-                task.frozen_end_time = task.end_time + timedelta(minutes=penalty_minutes)
-            else:
-                # 如果都没有，从现在开始加时
-                task.frozen_end_time = timezone.now() + timedelta(minutes=penalty_minutes)
-    else:
-        # 非冻结状态：修改 end_time
-        task.end_time += timedelta(minutes=penalty_minutes)
-
-    task.save(update_fields=['end_time', 'frozen_end_time'])
+    def build_timeline_events(change):
+        previous_frozen_end_time = change['previous_frozen_end_time']
+        return [TaskTimelineEvent(
+            event_type='overtime_added',  # 使用现有的加时事件类型
+            user=user,
+            description=f'{user.username} 违规尝试提前完成任务，系统自动加时 {penalty_minutes} 分钟作为惩罚',
+            metadata={
+                'penalty_type': 'hidden_time_violation',
+                'automatic': True,
+                'penalty_minutes': penalty_minutes,
+                'is_frozen': task.is_frozen,
+                'previous_frozen_end_time': previous_frozen_end_time.isoformat() if previous_frozen_end_time else None,
+                'new_frozen_end_time': task.frozen_end_time.isoformat() if task.frozen_end_time else None,
+            }
+        )]
 
-    # 创建时间线事件
-    TaskTimelineEvent.objects.create(
-        task=task,
-        event_type='overtime_added',  # 使用现有的加时事件类型
-        user=user,
-        time_change_minutes=penalty_minutes,
-        previous_end_time=old_end_time,
-        new_end_time=task.end_time,
-        description=f'{user.username} 违规尝试提前完成任务，系统自动加时 {penalty_minutes} 分钟作为惩罚',
-        metadata={
-            'penalty_type': 'hidden_time_violation',
-            'automatic': True,
-            'penalty_minutes': penalty_minutes,
-            'is_frozen': task.is_frozen,
-            'previous_frozen_end_time': old_frozen_end_time.isoformat() if old_frozen_end_time else None,
-            'new_frozen_end_time': task.frozen_end_time.isoformat() if task.frozen_end_time else None,
-        }
-    )
+    # 冻结状态下延长 frozen_end_time，否则延长 end_time
+    apply_task_time_delta(task, penalty_minutes, build_timeline_events=build_timeline_events)
 
 
 def record_violation_attempt(task, user, violation_type, request=None):
@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.db import IntegrityError, transaction
 from django.db.models import Q, Count, F
 from datetime import timedelta
 import random
@@ -15,8 +16,9 @@ logger = logging.getLogger(__name__)
 
 from .models import LockTask, TaskKey, TaskVote, OvertimeAction, TaskTimelineEvent, HourlyReward, TaskParticipant, PinnedUser, DailyTaskConfig
 from store.models import ItemType, UserInventory, Item
-from users.models import Notification
-from .utils import destroy_task_keys, calculate_weighted_vote_counts
+from users.models import Notification, User
+from .strict_codes import generate_strict_code
+from .utils import destroy_task_keys, calculate_weighted_vote_counts, apply_task_time_delta
 from .pinning_service import PinningQueueManager
 from .pagination import DynamicPageNumberPagination
 from .serializers import (
@@ -559,11 +561,7 @@ class LockTaskListCreateView(generics.ListCreateAPIView):
 
     def generate_strict_code(self):
         """Generate 4-character code like A1B2"""
-        import random
-        import string
-        letters = random.choices(string.ascii_uppercase, k=2)
-        digits = random.choices(string.digits, k=2)
-        return f"{letters[0]}{digits[0]}{letters[1]}{digits[1]}"
+        return generate_strict_code()
 
 
 class LockTaskDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -1245,6 +1243,9 @@ def start_voting(request, pk):
 
     # 清除之前的投票记录（如果有的话）
     task.votes.all().delete()
+    LockTask.objects.filter(pk=task.pk).update(weighted_total_votes=0, weighted_agree_votes=0)
+    task.weighted_total_votes = 0
+    task.weighted_agree_votes = 0
 
     # 开始投票期
     task.status = 'voting'
@@ -1309,7 +1310,14 @@ def vote_task(request, pk):
     )
 
     if serializer.is_valid():
-        vote = serializer.save()
+        try:
+            vote = serializer.save()
+        except IntegrityError:
+            return Response(
+                {'error': '已经投过票了'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        task.refresh_from_db(fields=['weighted_total_votes', 'weighted_agree_votes'])
 
         # 获取当前投票统计（应用影响力皇冠效果）
         vote_counts = calculate_weighted_vote_counts(task)
@@ -1895,6 +1903,32 @@ def get_task_timeline(request, pk):
     })
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_task_timeline_entries(request, pk):
+    """
+    获取任务时间线（读模型）
+
+    分页返回预渲染的紧凑条目，连续的小时奖励聚合为区间。
+    查询参数：exclude=类型1,类型2 排除事件类型；collapse=类型1,类型2 合并页内相邻的同类型条目。
+    """
+    from .timeline import TaskTimelineReadModel
+
+    task = get_object_or_404(LockTask, pk=pk)
+    exclude = [t for t in request.query_params.get('exclude', '').split(',') if t]
+    collapse = {t for t in request.query_params.get('collapse', '').split(',') if t}
+
+    paginator = DynamicPageNumberPagination()
+    entries = paginator.paginate_queryset(TaskTimelineReadModel.get_entries(task, exclude=exclude), request)
+    if collapse:
+        entries = TaskTimelineReadModel.collapse(entries, collapse)
+
+    response = paginator.get_paginated_response(entries)
+    response.data['task_id'] = str(task.id)
+    response.data['task_title'] = task.title
+    return response
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def process_hourly_rewards(request):
@@ -2246,115 +2280,83 @@ def manual_time_adjustment(request, pk):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    # 固定时间调整（±20分钟）
-    adjustment_minutes = 20
-
-    # 记录原始结束时间
-    original_end_time = task.end_time
+    # 固定时间调整（±20分钟），剩余时间不足20分钟时减到倒计时结束（冻结任务减到冻结时刻）
+    adjustment_minutes = 20 if adjustment_type == 'increase' else -20
 
-    # 处理冻结状态的时间调整
+    # 基于当前快照给出明确的错误提示，实际调整以条件更新为准
     if task.is_frozen:
-        # 如果任务已冻结，调整冻结时保存的结束时间
         if not task.frozen_end_time or not task.frozen_at:
             return Response(
                 {'error': '冻结任务缺少必要的时间信息，无法调整'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-
-        # 计算冻结时的剩余时间
-        frozen_remaining_minutes = (task.frozen_end_time - task.frozen_at).total_seconds() / 60
-
-        if adjustment_type == 'decrease':
-            # 如果冻结时已经没有剩余时间，返回错误
-            if frozen_remaining_minutes <= 0:
-                return Response(
-                    {'error': '任务在冻结时已无剩余时间，无法进行减时操作'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            # 如果剩余时间不足20分钟，减到冻结时刻
-            if frozen_remaining_minutes < 20:
-                adjustment_minutes = -int(frozen_remaining_minutes)
-                task.frozen_end_time = task.frozen_at
-            else:
-                adjustment_minutes = -20
-                task.frozen_end_time = task.frozen_end_time + timezone.timedelta(minutes=adjustment_minutes)
-        else:  # increase
-            adjustment_minutes = 20
-            # 对于冻结的任务，直接在frozen_end_time基础上加时
-            task.frozen_end_time = task.frozen_end_time + timezone.timedelta(minutes=adjustment_minutes)
-
-        # 记录新的结束时间用于响应（实际上是frozen_end_time）
-        new_end_time = task.frozen_end_time
-
+        if adjustment_type == 'decrease' and task.frozen_end_time <= task.frozen_at:
+            return Response(
+                {'error': '任务在冻结时已无剩余时间，无法进行减时操作'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
     else:
-        # 正常情况下的时间调整逻辑（任务未冻结）
-        if task.end_time:
-            now = timezone.now()
-            time_remaining_minutes = (task.end_time - now).total_seconds() / 60
-
-            if adjustment_type == 'decrease':
-                # 如果倒计时已结束，返回错误
-                if time_remaining_minutes <= 0:
-                    return Response(
-                        {'error': '倒计时已结束，无法进行减时操作'},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-
-                # 如果剩余时间不足20分钟，直接减到倒计时结束
-                if time_remaining_minutes < 20:
-                    adjustment_minutes = -int(time_remaining_minutes)
-                    new_end_time = now
-                else:
-                    adjustment_minutes = -20
-                    new_end_time = task.end_time + timezone.timedelta(minutes=adjustment_minutes)
-            else:  # increase
-                adjustment_minutes = 20
-                # 如果倒计时已经结束，从现在开始加时；否则从原结束时间加时
-                if time_remaining_minutes <= 0:
-                    # 倒计时已结束，从现在开始延长
-                    new_end_time = now + timezone.timedelta(minutes=adjustment_minutes)
-                else:
-                    # 倒计时未结束，从原结束时间延长
-                    new_end_time = task.end_time + timezone.timedelta(minutes=adjustment_minutes)
-
-            task.end_time = new_end_time
-        else:
+        if not task.end_time:
             return Response(
                 {'error': '任务没有设置结束时间，无法调整'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if adjustment_type == 'decrease' and task.end_time <= timezone.now():
+            return Response(
+                {'error': '倒计时已结束，无法进行减时操作'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-    task.save()
-
-    # 扣除用户积分
-    request.user.coins -= cost
-    request.user.save()
-
-    # 创建时间线事件
     event_type = 'time_wheel_increase' if adjustment_type == 'increase' else 'time_wheel_decrease'
     frozen_status = '（冻结状态）' if task.is_frozen else ''
-    description = f'钥匙持有者手动{"加时" if adjustment_type == "increase" else "减时"}{abs(adjustment_minutes)}分钟{frozen_status}（消耗{cost}积分）'
 
-    TaskTimelineEvent.objects.create(
-        task=task,
-        event_type=event_type,
-        user=request.user,
-        time_change_minutes=adjustment_minutes,
-        previous_end_time=original_end_time,
-        new_end_time=new_end_time,
-        description=description,
-        metadata={
-            'adjustment_type': adjustment_type,
-            'adjustment_minutes': abs(adjustment_minutes),
-            'cost': cost,
-            'user_remaining_coins': request.user.coins,
-            'manual_adjustment': True,
-            'key_holder_action': True,
-            'is_frozen': task.is_frozen,
-            'frozen_end_time': task.frozen_end_time.isoformat() if task.frozen_end_time else None
-        }
-    )
+    def build_timeline_events(change):
+        applied = change['applied_minutes']
+        description = f'钥匙持有者手动{"加时" if adjustment_type == "increase" else "减时"}{abs(applied)}分钟{frozen_status}（消耗{cost}积分）'
+        return [TaskTimelineEvent(
+            event_type=event_type,
+            user=request.user,
+            description=description,
+            metadata={
+                'adjustment_type': adjustment_type,
+                'adjustment_minutes': abs(applied),
+                'cost': cost,
+                'user_remaining_coins': request.user.coins,
+                'manual_adjustment': True,
+                'key_holder_action': True,
+                'is_frozen': task.is_frozen,
+                'frozen_end_time': task.frozen_end_time.isoformat() if task.frozen_end_time else None
+            }
+        )]
+
+    with transaction.atomic():
+        # 条件扣除积分，避免并发操作透支
+        charged = User.objects.filter(pk=request.user.pk, coins__gte=cost).update(coins=F('coins') - cost)
+        if not charged:
+            request.user.refresh_from_db(fields=['coins'])
+            return Response(
+                {'error': f'积分不足，需要{cost}积分，当前{request.user.coins}积分'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        request.user.refresh_from_db(fields=['coins'])
+
+        # 倒计时已结束时加时从现在开始计算
+        change = apply_task_time_delta(
+            task,
+            adjustment_minutes,
+            restart_expired_if=Q(),
+            build_timeline_events=build_timeline_events
+        )
+        if change is None:
+            transaction.set_rollback(True)
+            request.user.coins += cost
+            return Response(
+                {'error': '任务不在可调整时间的状态'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+    adjustment_minutes = change['applied_minutes']
+    new_end_time = change['new_frozen_end_time'] if task.is_frozen else change['new_end_time']
 
     return Response({
         'message': f'成功{"加时" if adjustment_type == "increase" else "减时"}{abs(adjustment_minutes)}分钟{frozen_status}',
@@ -3386,40 +3388,8 @@ def unpin_task_owner(request, pk):
 def get_pinned_tasks_for_carousel(request):
     """获取置顶任务信息用于社区轮播组件"""
     try:
-        # 获取活跃的置顶用户
-        active_pins = PinningQueueManager.get_active_pinned_users()
-
-        carousel_data = []
-        for pin in active_pins:
-            task = pin.task
-            pinned_user = pin.pinned_user
-
-            # 计算剩余时间
-            now = timezone.now()
-            time_remaining = max(0, (pin.expires_at - now).total_seconds())
-
-            carousel_data.append({
-                'id': str(pin.id),
-                'position': pin.position,
-                'task': {
-                    'id': str(task.id),
-                    'title': task.title,
-                    'status': task.status,
-                    'difficulty': task.difficulty,
-                    'task_type': task.task_type
-                },
-                'pinned_user': {
-                    'id': str(pinned_user.id),
-                    'username': pinned_user.username
-                },
-                'key_holder': {
-                    'id': str(pin.key_holder.id),
-                    'username': pin.key_holder.username
-                },
-                'time_remaining': time_remaining,
-                'expires_at': pin.expires_at.isoformat(),
-                'created_at': pin.created_at.isoformat()
-            })
+        # 轮播数据在置顶变化时发布到缓存，这里只计算剩余时间
+        carousel_data = PinningQueueManager.get_carousel()
 
         return Response({
             'pinned_tasks': carousel_data,
@@ -3869,18 +3839,46 @@ def use_time_hourglass(request, pk):
             reverted_events_count=revertible_events.count() if revertible_events.exists() else 0
         )
 
-        # 更新任务状态
+        # 更新任务状态：以计算回退状态时的时间字段为条件，
+        # 期间若有他人加时则放弃本次回退，避免覆盖并发修改
+        restored = LockTask.objects.filter(
+            pk=task.pk,
+            status__in=['active', 'voting'],
+            end_time=task.end_time,
+            is_frozen=task.is_frozen,
+            frozen_end_time=task.frozen_end_time
+        ).update(
+            end_time=rollback_state['end_time'],
+            is_frozen=rollback_state['is_frozen'],
+            frozen_at=rollback_state['frozen_at'],
+            frozen_end_time=rollback_state['frozen_end_time'],
+            updated_at=timezone.now()
+        )
+        if not restored:
+            transaction.set_rollback(True)
+            return Response({'error': '任务时间刚刚发生变化，请重试'}, status=409)
+
         task.end_time = rollback_state['end_time']
         task.is_frozen = rollback_state['is_frozen']
         task.frozen_at = rollback_state['frozen_at']
         task.frozen_end_time = rollback_state['frozen_end_time']
-        task.save()
 
-        # 标记道具为已使用
+        # 标记道具为已使用（条件更新防止同一沙漏被重复使用）
+        used_at = timezone.now()
+        claimed = Item.objects.filter(pk=hourglass_item.pk, status='available').update(
+            status='used', used_at=used_at, inventory=None
+        )
+        if not claimed:
+            transaction.set_rollback(True)
+            return Response({'error': '您没有可用的时间沙漏'}, status=400)
+        # 条件更新不经过道具保存信号，背包计数在这里直接维护
+        if hourglass_item.inventory_id is not None:
+            UserInventory.objects.filter(pk=hourglass_item.inventory_id).update(
+                used_slot_count=F('used_slot_count') - 1
+            )
         hourglass_item.status = 'used'
-        hourglass_item.used_at = timezone.now()
+        hourglass_item.used_at = used_at
         hourglass_item.inventory = None
-        hourglass_item.save()
 
         # 记录使用记录
         try:
@@ -4198,6 +4196,7 @@ def toggle_shield(request, pk):
 from rest_framework.views import APIView
 from .models import TemporaryUnlockRecord
 from .serializers import TemporaryUnlockRecordSerializer
+from .cron import schedule_temporary_unlock_timeout
 from users.models import Notification, Conversation, PrivateMessage
 from django.core.exceptions import ValidationError
 
@@ -4318,6 +4317,9 @@ class TemporaryUnlockRequestView(APIView):
         record.started_at = timezone.now()
         record.save()
 
+        # 在最大结束时间调度超时处理
+        schedule_temporary_unlock_timeout(record)
+
         # 创建时间线事件 - 临时开锁开始
         TaskTimelineEvent.objects.create(
             task=task,
@@ -4436,6 +4438,9 @@ class TemporaryUnlockApproveView(APIView):
         record.max_end_time = timezone.now() + timedelta(minutes=task.temporary_unlock_max_duration)
         record.save()
 
+        # 在最大结束时间调度超时处理
+        schedule_temporary_unlock_timeout(record)
+
         # 创建时间线事件 - 临时开锁批准
         TaskTimelineEvent.objects.create(
             task=task,
@@ -0,0 +1,166 @@
+"""
+Telegram Bot 数据加载层
+
+每个命令处理器的数据库读取都集中在一个同步函数里，由处理器通过一次
+sync_to_async 调用执行，避免在异步处理器中多次往返线程池。
+
+Telegram 身份（chat_id / telegram_user_id）到用户ID的映射有短期缓存；
+命中后仍会按主键校验绑定关系，解绑或换绑后的旧缓存会自动失效。
+"""
+
+import logging
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count, F, Prefetch, Q
+from django.utils import timezone
+
+from tasks.models import LockTask, TaskParticipant
+from store.models import Game, Item, UserInventory
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+IDENTITY_CACHE_TTL = 60  # 秒
+
+SHAREABLE_ITEM_TYPES = [
+    'photo', 'note', 'key', 'little_treasury', 'detection_radar',
+    'blizzard_bottle', 'sun_bottle', 'time_hourglass', 'small_campfire',
+]
+
+
+def _identity_lookup(chat_type, chat_id, telegram_user_id):
+    """私聊按 chat_id 查找，群聊按 telegram_user_id 查找"""
+    if chat_type == 'private':
+        return 'telegram_chat_id', chat_id
+    return 'telegram_user_id', telegram_user_id
+
+
+def _identity_cache_key(field, value):
+    return f'telegram_identity:{field}:{value}'
+
+
+def invalidate_telegram_identity(telegram_user_id=None, telegram_chat_id=None):
+    """清除指定 Telegram 身份的缓存（绑定/解绑时调用）"""
+    keys = []
+    if telegram_user_id is not None:
+        keys.append(_identity_cache_key('telegram_user_id', telegram_user_id))
+    if telegram_chat_id is not None:
+        keys.append(_identity_cache_key('telegram_chat_id', telegram_chat_id))
+    if keys:
+        cache.delete_many(keys)
+
+
+def resolve_user(chat_type, chat_id, telegram_user_id):
+    """根据 Telegram 身份解析已绑定用户（同步，需在 sync_to_async 中调用）"""
+    field, value = _identity_lookup(chat_type, chat_id, telegram_user_id)
+    if value is None:
+        return None
+
+    key = _identity_cache_key(field, value)
+    cached_user_id = cache.get(key)
+    if cached_user_id is not None:
+        user = User.objects.filter(pk=cached_user_id, **{field: value}).first()
+        if user:
+            return user
+        cache.delete(key)
+
+    user = User.objects.filter(**{field: value}).first()
+    if user:
+        cache.set(key, user.pk, IDENTITY_CACHE_TTL)
+    return user
+
+
+def resolve_user_by_telegram_id(telegram_user_id):
+    """回调查询使用 telegram_user_id 解析用户"""
+    return resolve_user('group', None, telegram_user_id)
+
+
+def load_status(chat_type, chat_id, telegram_user_id):
+    """/status：用户及活跃带锁任务数"""
+    user = resolve_user(chat_type, chat_id, telegram_user_id)
+    if not user:
+        return {'user': None}
+    active_tasks_count = LockTask.objects.filter(
+        user=user, task_type='lock', status='active'
+    ).count()
+    return {'user': user, 'active_tasks_count': active_tasks_count}
+
+
+def load_task(chat_type, chat_id, telegram_user_id):
+    """/task：用户及其第一个活跃带锁任务"""
+    user = resolve_user(chat_type, chat_id, telegram_user_id)
+    if not user:
+        return {'user': None}
+    task = LockTask.objects.filter(
+        user=user, task_type='lock', status='active'
+    ).first()
+    return {'user': user, 'task': task}
+
+
+def load_board(chat_type, chat_id, telegram_user_id):
+    """/board：用户创建的可接取任务板任务（含参与者预览）"""
+    user = resolve_user(chat_type, chat_id, telegram_user_id)
+    if not user:
+        return {'user': None}
+    return {'user': user, 'tasks': get_available_board_tasks(user)}
+
+
+def get_available_board_tasks(user):
+    """查询用户创建的可接取任务板任务
+
+    查询条件：
+    1. 用户创建的任务板任务
+    2. 状态为可接取 (open, taken, submitted)
+    3. 未满员 (current_participants < max_participants)
+    4. 在有效期内 (deadline > now)
+    """
+    tasks = LockTask.objects.filter(
+        user=user,
+        task_type='board',
+        status__in=['open', 'taken', 'submitted'],
+        deadline__gt=timezone.now()
+    ).annotate(
+        participant_count=Count('participants', filter=Q(participants__status='joined'))
+    ).filter(
+        participant_count__lt=F('max_participants')
+    ).prefetch_related(
+        Prefetch('participants', queryset=TaskParticipant.objects.select_related('participant'))
+    ).order_by('-created_at')[:10]
+    return list(tasks)
+
+
+def load_share_item(chat_type, chat_id, telegram_user_id):
+    """/share_item：用户背包及可分享物品"""
+    user = resolve_user(chat_type, chat_id, telegram_user_id)
+    if not user:
+        return {'user': None}
+    inventory = UserInventory.objects.filter(user=user).first()
+    if not inventory:
+        return {'user': user, 'inventory': None, 'items': []}
+    items = list(
+        Item.objects.filter(
+            owner=user,
+            inventory=inventory,
+            status='available',
+            item_type__name__in=SHAREABLE_ITEM_TYPES,
+        ).select_related('item_type', 'original_owner', 'owner')
+    )
+    return {'user': user, 'inventory': inventory, 'items': items}
+
+
+def load_share_games(chat_type, chat_id, telegram_user_id):
+    """/share_games：用户等待中的游戏及参与人数（单条注解查询）"""
+    user = resolve_user(chat_type, chat_id, telegram_user_id)
+    if not user:
+        return {'user': None}
+    games = list(
+        Game.objects.filter(
+            creator=user,
+            status='waiting',
+            game_type__in=['dice', 'rock_paper_scissors'],
+        ).annotate(
+            participant_count=Count('participants')
+        ).order_by('-created_at')[:10]
+    )
+    return {'user': user, 'games': games}
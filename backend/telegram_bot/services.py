@@ -13,7 +13,8 @@ from telegram.ext import Application, CommandHandler, CallbackQueryHandler, Mess
 from tasks.models import LockTask
 from users.models import Notification
 from tasks.utils import add_overtime_to_task
-from store.models import Item, UserInventory
+from store.models import Item
+from . import loaders
 import logging
 
 User = get_user_model()
@@ -180,11 +181,8 @@ class TelegramBotService:
     async def _is_user_authorized(self, user_id: int) -> bool:
         """检查用户是否已绑定并授权使用Bot"""
         try:
-            user_query = await sync_to_async(User.objects.filter)(telegram_user_id=user_id)
-            user = await sync_to_async(user_query.first)()
-            if user:
-                return await sync_to_async(user.is_telegram_bound)()
-            return False
+            user = await sync_to_async(loaders.resolve_user_by_telegram_id)(user_id)
+            return bool(user and user.is_telegram_bound())
         except Exception:
             return False
 
@@ -664,15 +662,9 @@ class TelegramBotService:
             return
 
         try:
-            # 根据聊天类型确定如何查找用户
-            if chat_type == 'private':
-                # 私聊：使用 chat_id 查找
-                user_query = await sync_to_async(User.objects.filter)(telegram_chat_id=chat_id)
-            else:
-                # 群聊：使用 user_id 查找
-                user_query = await sync_to_async(User.objects.filter)(telegram_user_id=user_id)
-
-            user = await sync_to_async(user_query.first)()
+            # 加载用户及活跃任务数（一次 sync_to_async 完成全部读取）
+            data = await sync_to_async(loaders.load_status)(chat_type, chat_id, user_id)
+            user = data['user']
 
             if not user:
                 if chat_type == 'private':
@@ -688,13 +680,7 @@ class TelegramBotService:
                     )
                 return
 
-            # 获取用户活跃任务
-            active_tasks_query = await sync_to_async(LockTask.objects.filter)(
-                user=user,
-                task_type='lock',
-                status='active'
-            )
-            active_tasks_count = await sync_to_async(active_tasks_query.count)()
+            active_tasks_count = data['active_tasks_count']
 
             # 构建状态消息
             display_name = self._get_telegram_display_name(user, update.effective_user)
@@ -750,15 +736,9 @@ Telegram 通知：{'✅ 已开启' if user.telegram_notifications_enabled else '
             return
 
         try:
-            # 根据聊天类型确定如何查找用户
-            if chat_type == 'private':
-                # 私聊：使用 chat_id 查找
-                user_query = await sync_to_async(User.objects.filter)(telegram_chat_id=chat_id)
-            else:
-                # 群聊：使用 user_id 查找
-                user_query = await sync_to_async(User.objects.filter)(telegram_user_id=user_id)
-
-            user = await sync_to_async(user_query.first)()
+            # 加载用户及活跃带锁任务（一次 sync_to_async 完成全部读取）
+            data = await sync_to_async(loaders.load_task)(chat_type, chat_id, user_id)
+            user = data['user']
 
             if not user:
                 if chat_type == 'private':
@@ -775,15 +755,10 @@ Telegram 通知：{'✅ 已开启' if user.telegram_notifications_enabled else '
                     )
                 return
 
-            # 获取用户当前活跃的带锁任务
-            active_tasks_query = await sync_to_async(LockTask.objects.filter)(
-                user=user,
-                task_type='lock',
-                status='active'
-            )
-            active_tasks = await sync_to_async(list)(active_tasks_query)
+            # 用户当前活跃的带锁任务（显示第一个）
+            task = data['task']
 
-            if not active_tasks:
+            if not task:
                 # 用户没有活跃的带锁任务
                 display_name = self._get_telegram_display_name(user, update.effective_user)
                 if chat_type == 'private':
@@ -806,9 +781,6 @@ Telegram 通知：{'✅ 已开启' if user.telegram_notifications_enabled else '
                 )
                 return
 
-            # 显示第一个活跃任务（如果有多个，显示最新的）
-            task = active_tasks[0]
-
             # 计算剩余时间
             if task.end_time:
                 from django.utils import timezone
@@ -915,15 +887,9 @@ Telegram 通知：{'✅ 已开启' if user.telegram_notifications_enabled else '
             return
 
         try:
-            # 根据聊天类型确定如何查找用户
-            if chat_type == 'private':
-                # 私聊：使用 chat_id 查找
-                user_query = await sync_to_async(User.objects.filter)(telegram_chat_id=chat_id)
-            else:
-                # 群聊：使用 user_id 查找
-                user_query = await sync_to_async(User.objects.filter)(telegram_user_id=user_id)
-
-            user = await sync_to_async(user_query.first)()
+            # 加载用户及可接取任务板任务（一次 sync_to_async 完成全部读取）
+            data = await sync_to_async(loaders.load_board)(chat_type, chat_id, user_id)
+            user = data['user']
 
             if not user:
                 if chat_type == 'private':
@@ -940,8 +906,7 @@ Telegram 通知：{'✅ 已开启' if user.telegram_notifications_enabled else '
                     )
                 return
 
-            # 查询可接取的任务板任务
-            available_tasks = await self._get_user_available_board_tasks(user)
+            available_tasks = data['tasks']
 
             if not available_tasks:
                 # 用户没有可接取的任务板任务
@@ -996,15 +961,9 @@ Telegram 通知：{'✅ 已开启' if user.telegram_notifications_enabled else '
             return
 
         try:
-            # 根据聊天类型确定如何查找用户
-            if chat_type == 'private':
-                # 私聊：使用 chat_id 查找
-                user_query = await sync_to_async(User.objects.filter)(telegram_chat_id=chat_id)
-            else:
-                # 群聊：使用 user_id 查找
-                user_query = await sync_to_async(User.objects.filter)(telegram_user_id=user_id)
-
-            user = await sync_to_async(user_query.first)()
+            # 加载用户背包及可分享物品（一次 sync_to_async 完成全部读取）
+            data = await sync_to_async(loaders.load_share_item)(chat_type, chat_id, user_id)
+            user = data['user']
 
             if not user:
                 if chat_type == 'private':
@@ -1021,25 +980,15 @@ Telegram 通知：{'✅ 已开启' if user.telegram_notifications_enabled else '
                     )
                 return
 
-            # 获取用户背包
-            inventory_query = await sync_to_async(UserInventory.objects.filter)(user=user)
-            inventory = await sync_to_async(inventory_query.first)()
-
-            if not inventory:
+            if not data['inventory']:
                 await self._safe_send_message(
                     update.message.reply_text,
                     "❌ 您还没有背包，请先前往应用购买物品"
                 )
                 return
 
-            # 获取可分享的物品（支持多种类型且状态为 available）
-            shareable_items_query = await sync_to_async(Item.objects.filter)(
-                owner=user,
-                inventory=inventory,
-                status='available',
-                item_type__name__in=['photo', 'note', 'key', 'little_treasury', 'detection_radar', 'blizzard_bottle', 'sun_bottle', 'time_hourglass', 'small_campfire']
-            )
-            shareable_items = await sync_to_async(list)(shareable_items_query.select_related('item_type', 'original_owner'))
+            # 可分享的物品（支持多种类型且状态为 available）
+            shareable_items = data['items']
 
             if not shareable_items:
                 # 用户没有可分享的物品
@@ -1141,13 +1090,9 @@ Telegram 通知：{'✅ 已开启' if user.telegram_notifications_enabled else '
             return
 
         try:
-            # 根据聊天类型确定如何查找用户
-            if chat_type == 'private':
-                user_query = await sync_to_async(User.objects.filter)(telegram_chat_id=chat_id)
-            else:
-                user_query = await sync_to_async(User.objects.filter)(telegram_user_id=user_id)
-
-            user = await sync_to_async(user_query.first)()
+            # 加载用户等待中的游戏及参与人数（一次 sync_to_async 完成全部读取）
+            data = await sync_to_async(loaders.load_share_games)(chat_type, chat_id, user_id)
+            user = data['user']
 
             if not user:
                 if chat_type == 'private':
@@ -1164,16 +1109,8 @@ Telegram 通知：{'✅ 已开启' if user.telegram_notifications_enabled else '
                     )
                 return
 
-            # 获取用户等待中的游戏（掷骰子和石头剪刀布）
-            from store.models import Game
-            from django.utils import timezone
-
-            waiting_games_query = await sync_to_async(Game.objects.filter)(
-                creator=user,
-                status='waiting',
-                game_type__in=['dice', 'rock_paper_scissors']
-            )
-            waiting_games = await sync_to_async(list)(waiting_games_query.order_by('-created_at')[:10])
+            # 用户等待中的游戏（掷骰子和石头剪刀布）
+            waiting_games = data['games']
 
             if not waiting_games:
                 await self._safe_send_message(
@@ -1208,13 +1145,12 @@ Telegram 通知：{'✅ 已开启' if user.telegram_notifications_enabled else '
                 'rock_paper_scissors': {'emoji': '✂️', 'name': '石头剪刀布'}
             }
 
-            # 预先生成游戏列表信息（使用 sync_to_async 获取参与者数量）
-            # 过滤掉已满员的游戏
-            available_games = []
-            for game in waiting_games:
-                participant_count = await sync_to_async(game.participants.count)()
-                if participant_count < game.max_players:
-                    available_games.append((game, participant_count))
+            # 过滤掉已满员的游戏（参与者数量已在加载时注解）
+            available_games = [
+                (game, game.participant_count)
+                for game in waiting_games
+                if game.participant_count < game.max_players
+            ]
 
             if not available_games:
                 await self._safe_send_message(
@@ -1525,14 +1461,12 @@ Telegram 通知：{'✅ 已开启' if user.telegram_notifications_enabled else '
                 await self._handle_task_overtime_callback(query, callback_data, user_id)
                 return
 
-            # 检查用户是否已绑定（只对其他类型的回调检查）
-            if not await self._is_user_authorized(user_id):
+            # 检查用户是否已绑定（只对其他类型的回调检查），同一次查询得到当前用户
+            current_user = await sync_to_async(loaders.resolve_user_by_telegram_id)(user_id)
+            if not current_user or not current_user.is_telegram_bound():
                 await self._safe_callback_response(query, "❌ 请先绑定您的 Lockup 账户", show_alert=True)
                 return
 
-            user_query = await sync_to_async(User.objects.filter)(telegram_user_id=user_id)
-            current_user = await sync_to_async(user_query.first)()
-
             # 处理任务加时回调（原有的分享任务功能）
             if callback_data.startswith('overtime_'):
                 await self._handle_overtime_callback(query, callback_data, current_user)
@@ -1580,8 +1514,7 @@ Telegram 通知：{'✅ 已开启' if user.telegram_notifications_enabled else '
 
         try:
             # 检查点击加时按钮的用户是否已绑定
-            clicker_query = await sync_to_async(User.objects.filter)(telegram_user_id=clicker_user_id)
-            clicker_user = await sync_to_async(clicker_query.first)()
+            clicker_user = await sync_to_async(loaders.resolve_user_by_telegram_id)(clicker_user_id)
 
             if not clicker_user:
                 # 用户未绑定，引导绑定
@@ -1598,8 +1531,7 @@ Telegram 通知：{'✅ 已开启' if user.telegram_notifications_enabled else '
                 return
 
             # 获取任务信息
-            task_query = await sync_to_async(LockTask.objects.filter)(id=task_id)
-            task = await sync_to_async(task_query.first)()
+            task = await sync_to_async(LockTask.objects.filter(id=task_id).first)()
 
             if not task:
                 await self._safe_callback_response(query, "❌ 任务不存在", show_alert=True)
@@ -1612,25 +1544,7 @@ Telegram 通知：{'✅ 已开启' if user.telegram_notifications_enabled else '
                 logger.warning(f"Task {task_id} is not active, status: {task.status}")
                 return
 
-            # 使用 add_overtime_to_task 的逻辑来生成基于难度的随机时间
-            # 根据难度等级确定加时范围（分钟）
-            difficulty_overtime_map = {
-                'easy': 10,     # 简单：10分钟
-                'normal': 20,   # 普通：20分钟
-                'hard': 30,     # 困难：30分钟
-                'hell': 60      # 地狱：60分钟
-            }
-
-            base_overtime = difficulty_overtime_map.get(task.difficulty, 20)  # 默认20分钟
-
-            # 随机加时（在基础时间的50%-150%之间）
-            min_overtime = int(base_overtime * 0.5)
-            max_overtime = int(base_overtime * 1.5)
-            random_minutes = random.randint(min_overtime, max_overtime)
-
-            logger.info(f"Generated difficulty-based random minutes for {task.difficulty}: {random_minutes} (range: {min_overtime}-{max_overtime})")
-
-            # 执行加时操作（不传入minutes参数，让函数自己计算）
+            # 执行加时操作（不传入minutes参数，由 add_overtime_to_task 按难度随机生成）
             overtime_result = await sync_to_async(add_overtime_to_task)(task, clicker_user)
             logger.info(f"Overtime result: {overtime_result}")
 
@@ -1842,102 +1756,35 @@ Telegram 通知：{'✅ 已开启' if user.telegram_notifications_enabled else '
         share_token = callback_data.replace('share_claim_', '')
         logger.info(f"Processing share claim callback: share_token={share_token}, user_id={current_user.id}")
 
-        # Phase 1: Validate and transfer (wrapped in try-except for actual errors)
+        # Phase 1: Claim through the fast path (losing claimants are rejected before any transaction)
+        current_user_display = self._get_telegram_display_name(current_user, None)
         try:
-            from store.models import SharedItem
-            from django.db import transaction
-
-            def get_shared_item_with_lock(token):
-                with transaction.atomic():
-                    return SharedItem.objects.select_for_update().filter(
-                        share_token=token,
-                        status='active'
-                    ).select_related('sharer', 'item', 'item__item_type').first()
-
-            shared_item = await sync_to_async(get_shared_item_with_lock)(share_token)
-
-            if not shared_item:
-                await self._safe_callback_response(query, "❌ 分享链接无效或已过期", show_alert=True)
-                return
-
-            if shared_item.sharer.id == current_user.id:
-                await self._safe_callback_response(query, "❌ 不能获取自己分享的物品", show_alert=True)
-                return
-
-            if shared_item.claimer:
-                claimer_display = self._get_telegram_display_name(shared_item.claimer, None)
-                await self._safe_callback_response(query, f"❌ 物品已被 {claimer_display} 获取", show_alert=True)
-                return
-
-            # Check inventory space
-            claimer_inventory_query = await sync_to_async(UserInventory.objects.filter)(user=current_user)
-            claimer_inventory = await sync_to_async(claimer_inventory_query.first)()
-
-            if not claimer_inventory:
-                await self._safe_callback_response(query, "❌ 您还没有背包，请先前往应用购买背包", show_alert=True)
-                return
-
-            available_slots = await sync_to_async(lambda: claimer_inventory.available_slots)()
-            if available_slots <= 0:
-                await self._safe_callback_response(query, "❌ 您的背包空间不足，请先清理背包", show_alert=True)
-                return
-
-            # Transfer item
-            def transfer_item_and_update_record():
-                with transaction.atomic():
-                    item = Item.objects.select_for_update().get(id=shared_item.item.id)
-                    item.owner = current_user
-                    item.inventory = claimer_inventory
-                    item.status = 'available'
-                    item.save()
-
-                    shared_item_record = SharedItem.objects.select_for_update().get(id=shared_item.id)
-                    shared_item_record.claimer = current_user
-                    shared_item_record.status = 'claimed'
-                    shared_item_record.claimed_at = timezone.now()
-                    shared_item_record.save()
-
-                    return item, shared_item_record
-
-            item, shared_item_record = await sync_to_async(transfer_item_and_update_record)()
+            from store.services.sharing import ShareClaimService, ShareClaimError
 
+            claimed = await sync_to_async(ShareClaimService.claim)(
+                current_user, share_token, claimer_display=current_user_display
+            )
+            shared_item = claimed['shared_item']
+            item = claimed['item']
+
+        except ShareClaimError as e:
+            error_messages = {
+                'not_found': "❌ 分享链接无效或已过期",
+                'own_share': "❌ 不能获取自己分享的物品",
+                'already_claimed': f"❌ 物品已被 {e.claimer} 获取" if e.claimer else "❌ 物品已被领取",
+                'in_progress': "❌ 物品正在被其他人获取，请稍后再试",
+                'item_unavailable': "❌ 物品已被领取或不存在",
+                'inventory_full': "❌ 您的背包空间不足，请先清理背包",
+            }
+            await self._safe_callback_response(query, error_messages.get(e.code, f"❌ {e.message}"), show_alert=True)
+            return
         except Exception as e:
             logger.error(f"Error in item transfer: {e}", exc_info=True)
-            error_msg = "❌ 获取物品失败，请稍后重试"
-            if "does not exist" in str(e):
-                error_msg = "❌ 物品已被领取或不存在"
-            elif "space" in str(e).lower() or "slot" in str(e).lower():
-                error_msg = "❌ 背包空间不足"
-            elif "inventory" in str(e).lower():
-                error_msg = "❌ 背包系统错误"
-            await self._safe_callback_response(query, error_msg, show_alert=True)
+            await self._safe_callback_response(query, "❌ 获取物品失败，请稍后重试", show_alert=True)
             return  # Exit early on transfer failure
 
-        # Phase 2: Post-transfer operations (notification, message updates)
+        # Phase 2: Post-transfer message updates
         # These failures should NOT show error to user since item was already transferred
-        current_user_display = self._get_telegram_display_name(current_user, None)
-        try:
-            from users.models import Notification
-            await sync_to_async(Notification.create_notification)(
-                recipient=shared_item.sharer,
-                notification_type='item_shared',
-                actor=current_user,
-                title='物品被领取',
-                message=f'{current_user_display} 领取了您分享的 {item.item_type.display_name}',
-                related_object_type='shared_item',
-                related_object_id=shared_item.id,
-                extra_data={
-                    'item_type': item.item_type.name,
-                    'item_display_name': item.item_type.display_name,
-                    'claimer_id': current_user.id,
-                    'claimer_username': current_user_display,
-                    'claimed_at': shared_item_record.claimed_at.isoformat()
-                }
-            )
-        except Exception as e:
-            logger.error(f"Notification creation failed after successful item transfer: {e}", exc_info=True)
-            # Don't show error to user - item was already transferred
-
         # Update message and send success response
         try:
             original_text = query.message.text
@@ -2222,33 +2069,7 @@ Telegram 通知：{'✅ 已开启' if user.telegram_notifications_enabled else '
 
     async def _get_user_available_board_tasks(self, user):
         """查询用户创建的可接取任务板任务"""
-        from django.utils import timezone
-        from django.db.models import Count, F, Q
-
-        now = timezone.now()
-
-        # 查询条件：
-        # 1. 用户创建的任务板任务
-        # 2. 状态为可接取 (open, taken, submitted)
-        # 3. 未满员 (current_participants < max_participants)
-        # 4. 在有效期内 (deadline > now)
-        tasks_query = await sync_to_async(LockTask.objects.filter)(
-            user=user,  # 修正：使用 user 而不是 creator
-            task_type='board',
-            status__in=['open', 'taken', 'submitted'],  # 修正：可接取的状态
-            deadline__gt=now
-        )
-
-        # 使用注解查询参与者数量，过滤未满员的任务
-        tasks_query = tasks_query.annotate(
-            participant_count=Count('participants', filter=Q(participants__status='joined'))  # 修正：使用正确的关系名称和状态
-        ).filter(
-            participant_count__lt=F('max_participants')
-        )
-
-        return await sync_to_async(list)(
-            tasks_query.select_related().order_by('-created_at')[:10]
-        )
+        return await sync_to_async(loaders.get_available_board_tasks)(user)
 
     async def _send_task_selection_interface(self, update, user, tasks, chat_type):
         """发送任务选择界面"""
@@ -2273,14 +2094,13 @@ Telegram 通知：{'✅ 已开启' if user.telegram_notifications_enabled else '
             # 计算剩余时间
             remaining_time = self._format_remaining_time(task.deadline)
 
-            # 获取详细参与者信息
-            from tasks.models import TaskParticipant
-            participants = TaskParticipant.objects.filter(task=task)
-            current_count = participants.count()
+            # 获取详细参与者信息（已在加载时预取）
+            participants = list(task.participants.all())
+            current_count = len(participants)
 
             # 构建参与者预览（显示前3个参与者）
             participant_preview = ""
-            if participants.exists():
+            if participants:
                 preview_participants = participants[:3]
                 names = [self._get_telegram_display_name(p.participant, None) for p in preview_participants]
                 participant_preview = f" ({', '.join(names)}{'...' if current_count > 3 else ''})"
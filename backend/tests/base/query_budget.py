@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Query Budget Assertions for Endpoint Tests
+
+Mixin for TestCase subclasses that fails a test when an endpoint issues more
+SQL queries than its budget, listing every captured query in the failure
+message so N+1 regressions are easy to locate.
+
+Budgets can grow with the number of rows on the page (``per_row``) for
+endpoints that still have known per-row lookups; the fixed part and the
+per-row part are asserted together, so adding a query per row fails CI.
+"""
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+class QueryBudgetMixin:
+    """Assert per-endpoint SQL query budgets"""
+
+    def assertQueryBudget(self, client, url, budget, per_row=0, rows=0, method='get', **request_kwargs):
+        """
+        Request ``url`` and assert it issues at most ``budget + per_row * rows`` queries.
+
+        ``url`` may be a URL name (reversed without arguments) or a path.
+        Returns the response so callers can also check the payload.
+        """
+        path = url if url.startswith('/') else reverse(url)
+        limit = budget + per_row * rows
+
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method)(path, **request_kwargs)
+
+        if len(queries) > limit:
+            listing = '\n'.join(f'{i}. {query["sql"]}' for i, query in enumerate(queries.captured_queries, 1))
+            self.fail(
+                f'{method.upper()} {path} issued {len(queries)} queries, budget is {limit} '
+                f'({budget} + {per_row} per row x {rows} rows):\n{listing}'
+            )
+        return response
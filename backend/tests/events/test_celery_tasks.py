@@ -27,7 +27,7 @@ from events.models import (
 from events.celery_tasks import (
     schedule_pending_events, execute_pending_events,
     process_expired_effects, trigger_manual_event,
-    event_system_health_check, _execute_single_effect,
+    event_system_health_check,
     _cleanup_expired_persistent_effects, _send_event_notifications
 )
 from tests.events.test_base import EventTestCase, EventTransactionTestCase, EventMockHelpers
@@ -680,41 +680,6 @@ class EventSystemHealthCheckTaskTest(EventTestCase):
 class HelperFunctionsTest(EventTestCase):
     """Test helper functions"""
 
-    def test_execute_single_effect_success(self):
-        """Test _execute_single_effect helper function"""
-        event_def = self.create_test_event_definition()
-        effect = self.create_test_event_effect(
-            event_def,
-            effect_type='coins_add',
-            target_type='level_based',
-            effect_parameters={'amount': 25},
-            target_parameters={'levels': [1]}
-        )
-        occurrence = self.create_test_event_occurrence(event_def)
-
-        result = _execute_single_effect(occurrence, effect)
-
-        self.assertEqual(result['effect_type'], 'coins_add')
-        self.assertEqual(result['target_type'], 'level_based')
-        self.assertEqual(result['affected_count'], 1)  # Only level 1 user
-        self.assertEqual(result['total_targets'], 1)
-
-    def test_execute_single_effect_error(self):
-        """Test _execute_single_effect error handling"""
-        event_def = self.create_test_event_definition()
-        effect = self.create_test_event_effect(
-            event_def,
-            effect_type='item_distribute',
-            effect_parameters={'item_type': 'nonexistent'}
-        )
-        occurrence = self.create_test_event_occurrence(event_def)
-
-        result = _execute_single_effect(occurrence, effect)
-
-        self.assertEqual(result['effect_type'], 'item_distribute')
-        self.assertIn('error', result)
-        self.assertEqual(result['affected_count'], 0)
-
     def test_send_event_notifications(self):
         """Test _send_event_notifications helper function"""
         event_def = self.create_test_event_definition()
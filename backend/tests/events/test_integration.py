@@ -24,7 +24,7 @@ from events.models import (
     EventEffectExecution, UserGameEffect, UserCoinsMultiplier
 )
 from events.celery_tasks import (
-    schedule_pending_events, execute_pending_events,
+    schedule_pending_events, execute_pending_events, execute_event_chunk,
     process_expired_effects, trigger_manual_event
 )
 from store.models import Item, ItemType
@@ -366,8 +366,9 @@ class EventSystemConcurrencyTest(EventTransactionTestCase):
         # Store original coins
         original_coins = self.test_user.coins
 
-        # Execute both events
-        with EventMockHelpers.mock_notification_creation():
+        # Execute both events (chunk subtasks run eagerly)
+        with EventMockHelpers.mock_notification_creation(), \
+                patch.object(execute_event_chunk, 'delay', side_effect=lambda occurrence_id: execute_event_chunk(occurrence_id)):
             result = execute_pending_events()
 
         self.assertEqual(result['status'], 'success')
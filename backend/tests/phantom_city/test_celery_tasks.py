@@ -215,6 +215,33 @@ class ExpireControlTransfersTaskTest(PhantomCityTestCase):
         result = expire_control_transfers()
         self.assertEqual(result, 2)
 
+    def test_expired_transfer_records_revocation(self):
+        from phantom_city.celery_tasks import expire_control_transfers
+        transfer = self._make_transfer(expires_at=timezone.now() - timedelta(minutes=1))
+        expire_control_transfers()
+        transfer.refresh_from_db()
+        self.assertEqual(transfer.revoked_reason, 'expired')
+        self.assertIsNotNone(transfer.revoked_at)
+
+    def test_query_count_independent_of_transfer_count(self):
+        """集合更新：撤销与通知查询数不随记录数增长"""
+        from unittest import mock
+        from phantom_city.celery_tasks import expire_control_transfers
+        with mock.patch('users.models.Notification._send_telegram_notification_async'):
+            self._make_transfer(expires_at=timezone.now() - timedelta(minutes=1))
+            small = self._count_queries(expire_control_transfers)
+            for minutes in range(1, 6):
+                self._make_transfer(expires_at=timezone.now() - timedelta(minutes=minutes))
+            large = self._count_queries(expire_control_transfers)
+        self.assertEqual(small, large)
+
+    def _count_queries(self, func):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            func()
+        return len(ctx.captured_queries)
+
 
 class ProcessDetentionReleasesTaskTest(PhantomCityTestCase):
     """phantom_city.process_detention_releases"""
@@ -224,9 +251,9 @@ class ProcessDetentionReleasesTaskTest(PhantomCityTestCase):
         self.make_zone('control_room')
         self.make_zone('salon')
 
-    def _make_detention(self, release_at, status='active'):
+    def _make_detention(self, release_at, status='active', lock_task=None):
         self.make_patrol(self.user2)
-        self.make_mimic(self.user1)
+        self.make_mimic(self.user1, active_run_lock_task=lock_task)
         self.make_crystals(self.user1)
         from phantom_city.services import DetentionService
         detention = DetentionService.arrest(self.user2, self.user1)
@@ -266,6 +293,29 @@ class ProcessDetentionReleasesTaskTest(PhantomCityTestCase):
         result = process_detention_releases()
         self.assertEqual(result, 0)
 
+    def test_expired_detention_revokes_control_and_moves_to_salon(self):
+        from phantom_city.celery_tasks import process_detention_releases
+        from users.models import Notification
+        detention = self._make_detention(
+            release_at=timezone.now() - timedelta(minutes=1),
+            lock_task=self.create_test_lock_task(self.user1),
+        )
+        self.assertIsNotNone(detention.control_transfer)
+        with self.captureOnCommitCallbacks(execute=True):
+            process_detention_releases()
+        detention.refresh_from_db()
+        self.assertIsNotNone(detention.released_at)
+        self.assertFalse(detention.control_transfer.is_active)
+        self.assertEqual(detention.control_transfer.revoked_reason, 'released_timeout')
+        presence = PlayerZonePresence.objects.get(user=self.user1, exited_at__isnull=True)
+        self.assertEqual(presence.zone.name, 'salon')
+        self.assertTrue(
+            Notification.objects.filter(
+                recipient=self.user1,
+                notification_type='game_detention_released',
+            ).exists()
+        )
+
 
 class RegenAuthorityValuesTaskTest(PhantomCityTestCase):
     """phantom_city.regen_authority_values"""
@@ -371,6 +421,27 @@ class RecalculateMarketRatesTaskTest(PhantomCityTestCase):
         # After recalc with high demand, price should have changed
         self.assertIsNotNone(rate.current_price_crystals)
 
+    def test_price_truncates_and_resets_volume(self):
+        from phantom_city.celery_tasks import recalculate_market_rates
+        GameMarketRate.objects.create(
+            item_slug='high', item_display_name='high',
+            base_price_crystals=10, current_price_crystals=10,
+            demand_pressure=1.57, units_traded_last_period=5,
+        )
+        GameMarketRate.objects.create(
+            item_slug='low', item_display_name='low',
+            base_price_crystals=3, current_price_crystals=3,
+            demand_pressure=0.1,
+        )
+        result = recalculate_market_rates()
+        self.assertEqual(result, 2)
+        high = GameMarketRate.objects.get(item_slug='high')
+        low = GameMarketRate.objects.get(item_slug='low')
+        self.assertEqual(high.current_price_crystals, 15)
+        self.assertEqual(high.units_traded_last_period, 0)
+        # 最低1刀具
+        self.assertEqual(low.current_price_crystals, 1)
+
 
 class GenerateCheckpointNpcsTaskTest(PhantomCityTestCase):
     """phantom_city.generate_checkpoint_npcs"""
@@ -0,0 +1,72 @@
+"""
+Telegram Bot 数据加载层测试 — 身份缓存与单次加载。
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from tasks.models import LockTask
+from telegram_bot import loaders
+
+User = get_user_model()
+
+
+class TelegramIdentityCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='tg_loader', password='pass')
+        self.user.bind_telegram(telegram_user_id=1001, telegram_username='tg', telegram_chat_id=2002)
+
+    def test_private_chat_resolves_by_chat_id(self):
+        self.assertEqual(loaders.resolve_user('private', 2002, None), self.user)
+
+    def test_group_chat_resolves_by_telegram_user_id(self):
+        self.assertEqual(loaders.resolve_user('group', -5, 1001), self.user)
+
+    def test_unbound_identity_returns_none(self):
+        self.assertIsNone(loaders.resolve_user('group', -5, 9999))
+
+    def test_cached_identity_revalidated_after_unbind(self):
+        loaders.resolve_user('group', -5, 1001)
+        User.objects.filter(pk=self.user.pk).update(telegram_user_id=None, telegram_chat_id=None)
+        self.assertIsNone(loaders.resolve_user('group', -5, 1001))
+
+    def test_rebind_to_other_user_resolves_new_user(self):
+        loaders.resolve_user('group', -5, 1001)
+        self.user.unbind_telegram()
+        other = User.objects.create_user(username='tg_loader2', password='pass')
+        other.bind_telegram(telegram_user_id=1001, telegram_chat_id=2002)
+        self.assertEqual(loaders.resolve_user('group', -5, 1001), other)
+
+
+class TelegramHandlerLoaderTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='tg_status', password='pass')
+        self.user.bind_telegram(telegram_user_id=3003, telegram_chat_id=3003)
+        now = timezone.now()
+        for _ in range(2):
+            LockTask.objects.create(
+                user=self.user, task_type='lock', title='lock', status='active',
+                difficulty='normal', start_time=now, end_time=now + timezone.timedelta(hours=1),
+            )
+
+    def test_load_status_counts_active_lock_tasks(self):
+        data = loaders.load_status('private', 3003, 3003)
+        self.assertEqual(data['user'], self.user)
+        self.assertEqual(data['active_tasks_count'], 2)
+
+    def test_load_task_returns_none_for_unbound(self):
+        self.assertEqual(loaders.load_task('private', 1, 1), {'user': None})
+
+    def test_identity_cache_hit_uses_primary_key_lookup(self):
+        loaders.load_status('private', 3003, 3003)
+        with CaptureQueriesContext(connection) as ctx:
+            loaders.load_status('private', 3003, 3003)
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertIn('"users"."id" =', ctx.captured_queries[0]['sql'])
@@ -0,0 +1,133 @@
+"""
+Active Effect Resolver Unit Tests
+
+Covers the per-user active-effect snapshot: item and event effects in one
+snapshot, batched resolution, expiry-bounded caching, signal and admin bulk
+action invalidation and the vote weight that reads crowns through the resolver when a vote is cast.
+"""
+
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from events.effects import apply_coins_multiplier, apply_game_result_modifiers
+from events.models import UserCoinsMultiplier, UserGameEffect
+from store.active_effects import get_active_effects, get_active_effects_bulk
+from store.models import Item, ItemType, UserEffect
+from tasks.models import LockTask, TaskVote
+from tasks.utils import calculate_weighted_vote_counts
+
+User = get_user_model()
+
+
+class ActiveEffectsTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.now = timezone.now()
+        self.user = User.objects.create_user(username='effects_user', password='pass')
+        self.other = User.objects.create_user(username='effects_other', password='pass')
+
+    def create_item_effect(self, user, effect_type, properties=None, expires_at=None):
+        item_type, _ = ItemType.objects.get_or_create(name=effect_type, defaults={'display_name': effect_type})
+        item = Item.objects.create(item_type=item_type, owner=user)
+        return UserEffect.objects.create(
+            user=user, effect_type=effect_type, item=item,
+            properties=properties or {}, expires_at=expires_at
+        )
+
+
+class ActiveEffectsResolverTest(ActiveEffectsTestCase):
+
+    def test_snapshot_combines_item_and_event_effects(self):
+        self.create_item_effect(self.user, 'lucky_charm', {'luck_boost': 0.2})
+        UserCoinsMultiplier.objects.create(user=self.user, multiplier=2.0, expires_at=self.now + timedelta(hours=1))
+        UserGameEffect.objects.create(user=self.user, multiplier=1.5, expires_at=self.now + timedelta(hours=2))
+
+        effects = get_active_effects(self.user)
+        self.assertEqual(effects.get_property('lucky_charm', 'luck_boost'), 0.2)
+        self.assertFalse(effects.has('influence_crown'))
+        self.assertEqual(effects.coins_multiplier, 2.0)
+        self.assertEqual(effects.game_multiplier, 1.5)
+        self.assertEqual(effects.valid_until, self.now + timedelta(hours=1))
+        self.assertEqual(apply_coins_multiplier(self.user, 10), 20)
+        self.assertEqual(apply_game_result_modifiers(self.user, 10), 15)
+
+    def test_expired_and_inactive_effects_ignored(self):
+        self.create_item_effect(self.user, 'energy_potion', expires_at=self.now - timedelta(minutes=1))
+        UserCoinsMultiplier.objects.create(
+            user=self.user, multiplier=3.0, expires_at=self.now + timedelta(hours=1), is_active=False
+        )
+        effects = get_active_effects(self.user)
+        self.assertEqual(effects.effects, ())
+        self.assertEqual(effects.coins_multiplier, 1.0)
+
+    def test_bulk_resolution_uses_fixed_query_count(self):
+        users = [User.objects.create_user(username=f'bulk_effects{i}', password='pass') for i in range(5)]
+        for user in users:
+            self.create_item_effect(user, 'influence_crown', {'vote_multiplier': 3}, self.now + timedelta(hours=1))
+
+        with self.assertNumQueries(3):
+            snapshots = get_active_effects_bulk(users)
+        self.assertTrue(all(snapshots[user.id].has('influence_crown') for user in users))
+
+        with self.assertNumQueries(0):
+            get_active_effects_bulk(users)
+
+    def test_snapshot_cached_until_invalidated(self):
+        get_active_effects(self.user)
+        with self.assertNumQueries(0):
+            self.assertFalse(get_active_effects(self.user).has('lucky_charm'))
+
+        effect = self.create_item_effect(self.user, 'lucky_charm')
+        self.assertTrue(get_active_effects(self.user).has('lucky_charm'))
+
+        effect.is_active = False
+        effect.save()
+        self.assertFalse(get_active_effects(self.user).has('lucky_charm'))
+
+    def test_admin_bulk_deactivation_invalidates_snapshot(self):
+        expires_at = self.now + timedelta(hours=1)
+        UserCoinsMultiplier.objects.create(user=self.user, multiplier=2.0, expires_at=expires_at)
+        UserGameEffect.objects.create(user=self.other, multiplier=1.5, expires_at=expires_at)
+        self.assertEqual(get_active_effects(self.user).coins_multiplier, 2.0)
+        self.assertEqual(get_active_effects(self.other).game_multiplier, 1.5)
+
+        request = RequestFactory().post('/admin/')
+        for model, action in ((UserCoinsMultiplier, 'deactivate_multipliers'), (UserGameEffect, 'deactivate_effects')):
+            model_admin = admin.site._registry[model]
+            with mock.patch.object(model_admin, 'message_user'):
+                getattr(model_admin, action)(request, model.objects.all())
+
+        self.assertEqual(get_active_effects(self.user).coins_multiplier, 1.0)
+        self.assertEqual(get_active_effects(self.other).game_multiplier, 1.0)
+
+    def test_cached_snapshot_not_used_after_earliest_expiry(self):
+        self.create_item_effect(self.user, 'influence_crown', expires_at=self.now + timedelta(minutes=5))
+        self.assertTrue(get_active_effects(self.user, now=self.now).has('influence_crown'))
+        self.assertFalse(
+            get_active_effects(self.user, now=self.now + timedelta(minutes=6)).has('influence_crown')
+        )
+
+
+class WeightedVoteCountTest(ActiveEffectsTestCase):
+
+    def test_crown_weight_frozen_into_task_tallies(self):
+        owner = User.objects.create_user(username='vote_owner', password='pass')
+        task = LockTask.objects.create(
+            user=owner, task_type='lock', title='votes', status='voting', difficulty='normal'
+        )
+        self.create_item_effect(self.user, 'influence_crown', {'vote_multiplier': 3}, self.now + timedelta(hours=1))
+        TaskVote.objects.create(task=task, voter=self.user, agree=True)
+        TaskVote.objects.create(task=task, voter=self.other, agree=False)
+
+        task.refresh_from_db()
+        with self.assertNumQueries(0):
+            counts = calculate_weighted_vote_counts(task)
+        self.assertEqual(counts, {'total_votes': 4, 'agree_votes': 3})
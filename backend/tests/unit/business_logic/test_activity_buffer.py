@@ -0,0 +1,107 @@
+"""
+Activity Buffer Unit Tests
+
+Covers the write-behind activity accumulator: update_activity recording deltas
+without database writes, reads merging pending deltas, bulk flushing of
+aggregated score increments and activity logs, in-flight entry gaps, full saves
+of stale user instances leaving flushed scores alone, and the immediate-write
+path when the buffer is disabled.
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from tasks.celery_tasks import flush_activity_buffer
+from users.models import ActivityLog
+from users.serializers import UserSerializer
+from users.services.activity_buffer import ActivityBuffer
+
+User = get_user_model()
+
+
+@override_settings(ACTIVITY_WRITE_BEHIND=True)
+class ActivityBufferTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username='activity_user', password='pass', activity_score=10)
+        self.other = User.objects.create_user(username='activity_other', password='pass', activity_score=0)
+
+    def test_update_activity_is_buffered_and_merged_on_read(self):
+        with self.assertNumQueries(0):
+            self.user.update_activity(points=2)
+            self.user.update_activity()
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.activity_score, 10)
+        self.assertEqual(self.user.current_activity_score, 13)
+        self.assertEqual(UserSerializer(self.user).data['activity_score'], 13)
+        self.assertFalse(ActivityLog.objects.exists())
+
+    def test_flush_applies_aggregated_deltas_and_logs(self):
+        self.user.update_activity(points=2)
+        self.other.update_activity(points=1)
+        self.user.update_activity(points=3)
+
+        result = flush_activity_buffer()
+
+        self.assertEqual((result['entries'], result['users']), (3, 2))
+        self.user.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.user.activity_score, self.other.activity_score), (15, 1))
+        self.assertIsNotNone(self.user.last_active)
+        self.assertEqual(self.user.current_activity_score, 15)
+        self.assertEqual(
+            list(ActivityLog.objects.filter(user=self.user).order_by('new_total').values_list('points_change', 'new_total')),
+            [(2, 12), (3, 15)]
+        )
+        self.assertEqual(flush_activity_buffer()['entries'], 0)
+
+    def test_flush_query_count_does_not_grow_with_users(self):
+        self.user.update_activity()
+        with CaptureQueriesContext(connection) as small_flush:
+            ActivityBuffer.flush()
+
+        for i in range(10):
+            User.objects.create_user(username=f'activity_bulk_{i}', password='pass').update_activity()
+        with CaptureQueriesContext(connection) as large_flush:
+            result = ActivityBuffer.flush()
+
+        self.assertEqual(result['users'], 10)
+        self.assertEqual(len(large_flush), len(small_flush))
+
+    def test_in_flight_entry_waits_one_round_then_is_skipped(self):
+        self.user.update_activity(points=1)
+        # 序号已分配但条目尚未写入
+        cache.incr('activity_buffer:seq')
+        self.user.update_activity(points=4)
+
+        self.assertEqual(ActivityBuffer.flush()['entries'], 1)
+        self.assertEqual(ActivityBuffer.flush()['entries'], 1)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.activity_score, 15)
+        self.assertEqual(self.user.current_activity_score, 15)
+
+    def test_stale_full_save_keeps_flushed_score(self):
+        stale = User.objects.get(pk=self.user.pk)
+        self.user.update_activity(points=5)
+        ActivityBuffer.flush()
+
+        stale.coins += 1
+        stale.save()
+
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.activity_score, self.user.coins), (15, stale.coins))
+
+    @override_settings(ACTIVITY_WRITE_BEHIND=False)
+    def test_disabled_buffer_writes_immediately(self):
+        self.user.update_activity(points=2)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.activity_score, 12)
+        self.assertEqual(ActivityLog.objects.get(user=self.user).new_total, 12)
@@ -0,0 +1,193 @@
+"""
+Arena Game Unit Tests
+
+Covers the normalized arena tables (ArenaMatch / ArenaAudience / ArenaVote):
+audience seating, one-vote-per-viewer, counter-based settlement and the
+single-query arena list endpoint.
+"""
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework.authtoken.models import Token
+
+from store.models import Game, GameParticipant, ArenaMatch, ArenaAudience, ArenaVote
+
+User = get_user_model()
+
+
+class ArenaGameTestCase(TestCase):
+    """角斗场测试基类"""
+
+    def setUp(self):
+        self.creator = User.objects.create_user(username='arena_creator', password='pass', coins=100)
+        self.challenger = User.objects.create_user(username='arena_challenger', password='pass', coins=100)
+        self.viewers = [
+            User.objects.create_user(username=f'arena_viewer{i}', password='pass', coins=100)
+            for i in range(3)
+        ]
+        self.client = APIClient()
+
+    def make_game(self, max_audience=5, ticket_price=5, bet_amount=10, deadline=None):
+        game = Game.objects.create(
+            game_type='arena',
+            creator=self.creator,
+            bet_amount=bet_amount,
+            max_players=max_audience + 2,
+            status='active',
+            game_data={'creator_photo': None, 'challenger_photo': None},
+        )
+        ArenaMatch.objects.create(
+            game=game,
+            challenger=self.challenger,
+            audience_ticket_price=ticket_price,
+            max_audience=max_audience,
+            deadline=deadline or timezone.now() + timedelta(hours=12),
+        )
+        GameParticipant.objects.create(game=game, user=self.creator, action={'role': 'creator'})
+        GameParticipant.objects.create(game=game, user=self.challenger, action={'role': 'challenger'})
+        return game
+
+    def login(self, user):
+        token, _ = Token.objects.get_or_create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def enter(self, game, user):
+        self.login(user)
+        return self.client.post(f'/api/store/arena-games/{game.id}/enter/')
+
+    def vote(self, game, user, vote_for):
+        self.login(user)
+        return self.client.post(f'/api/store/arena-games/{game.id}/vote/', {'vote_for': vote_for})
+
+
+class ArenaAudienceTest(ArenaGameTestCase):
+
+    def test_enter_creates_seat_and_increments_counter(self):
+        game = self.make_game()
+        response = self.enter(game, self.viewers[0])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(ArenaAudience.objects.filter(game=game, user=self.viewers[0]).exists())
+        self.assertEqual(ArenaMatch.objects.get(game=game).audience_count, 1)
+        self.viewers[0].refresh_from_db()
+        self.assertEqual(self.viewers[0].coins, 95)
+
+    def test_enter_twice_charges_once(self):
+        game = self.make_game()
+        self.enter(game, self.viewers[0])
+        response = self.enter(game, self.viewers[0])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['message'], '您已经是观众')
+        self.assertEqual(ArenaMatch.objects.get(game=game).audience_count, 1)
+        self.viewers[0].refresh_from_db()
+        self.assertEqual(self.viewers[0].coins, 95)
+
+    def test_full_audience_rejected_without_charge(self):
+        game = self.make_game(max_audience=1)
+        self.enter(game, self.viewers[0])
+        response = self.enter(game, self.viewers[1])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ArenaAudience.objects.filter(game=game, user=self.viewers[1]).exists())
+        self.viewers[1].refresh_from_db()
+        self.assertEqual(self.viewers[1].coins, 100)
+
+    def test_challenger_cannot_enter_as_audience(self):
+        game = self.make_game()
+        response = self.enter(game, self.challenger)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['role'], 'challenger')
+
+
+class ArenaVoteTest(ArenaGameTestCase):
+
+    def test_vote_increments_counters(self):
+        game = self.make_game()
+        self.enter(game, self.viewers[0])
+        response = self.vote(game, self.viewers[0], 'challenger')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['current_votes'], {'creator': 0, 'challenger': 1})
+        match = ArenaMatch.objects.get(game=game)
+        self.assertEqual(match.voted_count, 1)
+
+    def test_duplicate_vote_rejected(self):
+        game = self.make_game()
+        self.enter(game, self.viewers[0])
+        self.vote(game, self.viewers[0], 'creator')
+        response = self.vote(game, self.viewers[0], 'challenger')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ArenaVote.objects.filter(game=game).count(), 1)
+        self.assertEqual(ArenaMatch.objects.get(game=game).votes, {'creator': 1, 'challenger': 0})
+
+    def test_non_audience_cannot_vote(self):
+        game = self.make_game()
+        response = self.vote(game, self.viewers[0], 'creator')
+        self.assertEqual(response.status_code, 403)
+
+    def test_last_vote_of_full_audience_settles_from_counters(self):
+        game = self.make_game(max_audience=2, ticket_price=5, bet_amount=10)
+        self.enter(game, self.viewers[0])
+        self.enter(game, self.viewers[1])
+        self.vote(game, self.viewers[0], 'creator')
+        response = self.vote(game, self.viewers[1], 'creator')
+        self.assertTrue(response.data['is_completed'])
+
+        game.refresh_from_db()
+        self.assertEqual(game.status, 'completed')
+        # 奖池 = 10*2 + 5*2 = 30，胜者 80%
+        self.assertEqual(game.result['total_pot'], 30)
+        self.assertEqual(game.result['creator_reward'], 24)
+        self.assertEqual(game.result['challenger_reward'], 6)
+        self.assertEqual(game.result['audience_count'], 2)
+
+
+class ArenaSettlementTest(ArenaGameTestCase):
+
+    def test_settlement_is_idempotent(self):
+        from store.views import settle_arena_game_internal
+        game = self.make_game()
+        first = settle_arena_game_internal(game)
+        self.creator.refresh_from_db()
+        coins_after_first = self.creator.coins
+
+        stale = Game.objects.get(id=game.id)
+        stale.status = 'active'
+        second = settle_arena_game_internal(stale)
+        self.creator.refresh_from_db()
+        self.assertEqual(first, second)
+        self.assertEqual(self.creator.coins, coins_after_first)
+
+
+class ArenaListTest(ArenaGameTestCase):
+
+    def test_list_reports_own_audience_entry(self):
+        game = self.make_game()
+        self.enter(game, self.viewers[0])
+        self.vote(game, self.viewers[0], 'challenger')
+
+        self.login(self.viewers[0])
+        response = self.client.get('/api/store/arena-games/list/')
+        self.assertEqual(response.status_code, 200)
+        entry = response.data['games'][0]
+        self.assertEqual(entry['challenger']['id'], self.challenger.id)
+        self.assertEqual(entry['audience_count'], 1)
+        self.assertEqual(entry['votes'], {'creator': 0, 'challenger': 1})
+        self.assertEqual(len(entry['audience']), 1)
+        self.assertTrue(entry['audience'][0]['has_voted'])
+        self.assertEqual(entry['audience'][0]['vote_for'], 'challenger')
+
+    def test_list_query_count_independent_of_game_count(self):
+        self.login(self.viewers[0])
+        self.make_game()
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/store/arena-games/list/')
+        for _ in range(4):
+            self.make_game()
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get('/api/store/arena-games/list/')
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
@@ -0,0 +1,65 @@
+"""
+Benchmark Suite Unit Tests
+
+Covers the synthetic benchmark dataset and timing scenarios on a tiny scale:
+dataset sizes, repeatable generation, write scenarios rolling back so every
+timed run sees the same data, and scenario runs leaving the configured cache alone.
+"""
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from posts.models import Post, PostLike
+from tasks.benchmarks import BenchmarkDataset, run_benchmarks, scaled_sizes
+from tasks.models import HourlyReward, LockTask, TaskTimelineEvent
+from users.models import User
+
+
+class BenchmarkSuiteTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dataset = BenchmarkDataset(scale=0.0005, seed=7)
+        cls.dataset.generate()
+
+    def test_dataset_matches_scaled_sizes(self):
+        sizes = scaled_sizes(0.0005)
+
+        self.assertTrue(self.dataset.exists())
+        self.assertEqual(LockTask.objects.filter(status='active').count(), sizes['lock_tasks'])
+        self.assertEqual(TaskTimelineEvent.objects.count(), sizes['timeline_events'])
+        self.assertEqual(Post.objects.count(), sizes['posts'])
+        self.assertEqual(PostLike.objects.count(), self.dataset.sizes['post_likes'])
+        self.assertEqual(
+            sum(Post.objects.values_list('likes_count', flat=True)), self.dataset.sizes['post_likes']
+        )
+
+    def test_same_seed_generates_same_users(self):
+        values = list(User.objects.filter(username__startswith='bench_').order_by('id').values_list(
+            'username', 'coins', 'activity_score'
+        ))
+        User.objects.filter(username__startswith='bench_').delete()
+
+        BenchmarkDataset(scale=0.0005, seed=7)._create_users()
+
+        self.assertEqual(values, list(User.objects.filter(username__startswith='bench_').order_by('id').values_list(
+            'username', 'coins', 'activity_score'
+        )))
+
+    def test_scenarios_report_timings_and_roll_back_writes(self):
+        results = run_benchmarks(['task_list', 'hourly_rewards'], repeat=2)
+
+        for result in results.values():
+            self.assertNotIn('error', result)
+            self.assertEqual(result['runs'], 2)
+            self.assertLessEqual(result['min_ms'], result['max_ms'])
+            self.assertGreater(result['queries'], 0)
+        self.assertFalse(HourlyReward.objects.exists())
+
+    def test_scenarios_do_not_clear_configured_cache(self):
+        cache.set('benchmark_sentinel', 1)
+        self.addCleanup(cache.delete, 'benchmark_sentinel')
+
+        run_benchmarks(['task_list'], repeat=1)
+
+        self.assertEqual(cache.get('benchmark_sentinel'), 1)
@@ -0,0 +1,95 @@
+"""
+Cached Token Authentication Unit Tests
+
+Covers the token to user-snapshot cache: cache hits on read-only requests run
+no queries, write requests and cache misses load the user from the database,
+and the snapshot is invalidated by logout, password changes, user saves and
+coin ledger writes.
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory
+
+from users.authentication import CachedTokenAuthentication
+from users.services.coins_ledger import CoinsLedgerService
+
+User = get_user_model()
+
+
+class CachedTokenAuthenticationTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username='auth_user', password='old-pass-123', coins=100)
+        self.token = Token.objects.create(user=self.user)
+        self.factory = APIRequestFactory()
+
+    def authenticate(self, method='get'):
+        request = getattr(self.factory, method)('/api/auth/profile/', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        return CachedTokenAuthentication().authenticate(request)
+
+    def client_for_token(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        return client
+
+    def test_cache_hit_runs_no_queries(self):
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.authenticate()
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+
+        self.assertEqual((user.pk, token.key, token.user), (self.user.pk, self.token.key, user))
+
+    def test_created_token_is_cached(self):
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate()
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_write_requests_load_fresh_user(self):
+        User.objects.filter(pk=self.user.pk).update(coins=5)
+
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate('post')
+        self.assertEqual(user.coins, 5)
+        self.assertEqual(self.authenticate()[0].coins, 5)
+
+    def test_profile_reflects_ledger_debit(self):
+        client = self.client_for_token()
+        self.assertEqual(client.get('/api/auth/profile/').data['coins'], 100)
+
+        CoinsLedgerService.debit(self.user, 30, 'store_purchase')
+
+        self.assertEqual(client.get('/api/auth/profile/').data['coins'], 70)
+
+    def test_logout_invalidates_cached_token(self):
+        client = self.client_for_token()
+        self.assertEqual(client.get('/api/auth/profile/').status_code, 200)
+
+        self.assertEqual(client.post('/api/auth/logout/').status_code, 200)
+
+        self.assertEqual(client.get('/api/auth/profile/').status_code, 401)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_user_save_and_password_change_invalidate(self):
+        self.authenticate()
+        self.user.bio = '新的简介'
+        self.user.save()
+        self.assertEqual(self.authenticate()[0].bio, '新的简介')
+
+        self.user.set_password('new-pass-456')
+        self.user.save()
+        user, _ = self.authenticate()
+        self.assertTrue(user.check_password('new-pass-456'))
+
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
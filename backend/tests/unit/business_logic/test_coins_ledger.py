@@ -0,0 +1,128 @@
+"""
+Coins Ledger Unit Tests
+
+Covers the atomic coins ledger: conditional credit/debit without lost updates,
+insufficient-balance rejection with rollback, multi-user transfers and batches,
+per-entry balance_after in CoinsLog and the reconciliation command.
+"""
+
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from users.models import CoinsLog
+from users.services.coins_ledger import CoinsLedgerService, InsufficientCoinsError
+
+User = get_user_model()
+
+
+class CoinsLedgerServiceTest(TestCase):
+
+    def setUp(self):
+        self.alice = User.objects.create_user(username='ledger_alice', password='pass', coins=100)
+        self.bob = User.objects.create_user(username='ledger_bob', password='pass', coins=10)
+
+    def test_credit_and_debit_log_balance(self):
+        self.assertEqual(self.alice.add_coins(20, 'task_complete', 'reward'), 120)
+        self.assertEqual(self.alice.deduct_coins(50, 'store_purchase', 'buy'), 70)
+        self.assertEqual(self.alice.coins, 70)
+
+        logs = list(CoinsLog.objects.filter(user=self.alice).order_by('created_at').values_list('amount', 'balance_after'))
+        self.assertEqual(logs, [(20, 120), (-50, 70)])
+
+    def test_stale_instances_do_not_lose_updates(self):
+        first = User.objects.get(pk=self.alice.pk)
+        second = User.objects.get(pk=self.alice.pk)
+        first.add_coins(5, 'task_complete')
+        second.add_coins(7, 'task_complete')
+
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.coins, 112)
+        self.assertEqual(second.coins, 112)
+
+    def test_insufficient_debit_is_rejected(self):
+        stale = User.objects.get(pk=self.bob.pk)
+        stale.coins = 1000
+        with self.assertRaises(InsufficientCoinsError):
+            stale.deduct_coins(50, 'store_purchase')
+
+        self.bob.refresh_from_db()
+        self.assertEqual(self.bob.coins, 10)
+        self.assertFalse(CoinsLog.objects.filter(user=self.bob).exists())
+
+    def test_transfer_is_atomic(self):
+        balances = CoinsLedgerService.transfer(self.alice, self.bob, 30, 'other_expense', 'other_income')
+        self.assertEqual(balances, {self.alice.pk: 70, self.bob.pk: 40})
+
+        with self.assertRaises(InsufficientCoinsError):
+            CoinsLedgerService.transfer(self.bob, self.alice, 500, 'other_expense', 'other_income')
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.alice.coins, self.bob.coins), (70, 40))
+        self.assertEqual(CoinsLog.objects.count(), 2)
+
+    def test_batch_with_repeated_user_records_running_balance(self):
+        CoinsLedgerService.apply_changes([
+            {'user': self.bob, 'amount': 15, 'change_type': 'task_complete'},
+            {'user_id': self.alice.pk, 'amount': -40, 'change_type': 'store_purchase'},
+            {'user': self.bob, 'amount': -20, 'change_type': 'store_purchase'},
+            {'user': self.bob, 'amount': 0, 'change_type': 'task_complete'},
+        ])
+
+        bob_logs = list(CoinsLog.objects.filter(user=self.bob).order_by('created_at').values_list('amount', 'balance_after'))
+        self.assertEqual(bob_logs, [(15, 25), (-20, 5)])
+        self.assertEqual(self.bob.coins, 5)
+        self.assertEqual(CoinsLog.objects.get(user=self.alice).balance_after, 60)
+
+    def test_batch_checks_net_balance(self):
+        # 同一批次内先收入后支出，净额不为负即可通过
+        CoinsLedgerService.apply_changes([
+            {'user': self.bob, 'amount': 50, 'change_type': 'task_complete'},
+            {'user': self.bob, 'amount': -55, 'change_type': 'store_purchase'},
+        ])
+        self.assertEqual(self.bob.coins, 5)
+
+    def test_credit_allowed_on_negative_balance(self):
+        # 历史数据中余额可能为负，净收入不应被非负校验拦截
+        User.objects.filter(pk=self.bob.pk).update(coins=-5)
+
+        self.assertEqual(CoinsLedgerService.credit(self.bob, 3, 'task_complete'), -2)
+        CoinsLedgerService.apply_changes([
+            {'user': self.alice, 'amount': -10, 'change_type': 'store_purchase'},
+            {'user': self.bob, 'amount': 1, 'change_type': 'task_complete'},
+        ])
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.alice.coins, self.bob.coins), (90, -1))
+
+        with self.assertRaises(InsufficientCoinsError):
+            CoinsLedgerService.debit(self.bob, 1, 'store_purchase')
+        self.bob.refresh_from_db()
+        self.assertEqual(self.bob.coins, -1)
+
+
+class CoinsReconciliationTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reconcile_user', password='pass', coins=100)
+        self.user.add_coins(10, 'task_complete')
+        self.user.deduct_coins(30, 'store_purchase')
+
+    def test_consistent_ledger_has_no_mismatch(self):
+        self.assertEqual(CoinsLedgerService.reconcile(), [])
+
+    def test_untracked_change_is_reported_and_baselined(self):
+        User.objects.filter(pk=self.user.pk).update(coins=95)
+
+        mismatches = CoinsLedgerService.reconcile([self.user.pk])
+        self.assertEqual(len(mismatches), 1)
+        self.assertEqual(mismatches[0]['expected'], 80)
+        self.assertEqual(mismatches[0]['difference'], 15)
+
+        out = StringIO()
+        call_command('reconcile_coins', '--record-adjustments', stdout=out)
+        self.assertIn('reconcile_user', out.getvalue())
+        self.assertEqual(CoinsLedgerService.reconcile(), [])
+        self.assertTrue(CoinsLog.objects.filter(user=self.user, metadata__reconciliation=True).exists())
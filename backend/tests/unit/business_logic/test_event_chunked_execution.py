@@ -0,0 +1,188 @@
+"""
+Chunked Event Execution Unit Tests
+
+Covers occurrence claiming and chunk planning as user ID ranges, per-chunk
+execution re-resolving targets within each range with progress recorded on
+the execution log, resuming after a failed chunk, ledger-backed coin effects
+and bulk event notifications.
+"""
+
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from events import celery_tasks
+from events.celery_tasks import (
+    _claim_occurrence, _process_next_chunk, _run_occurrence_inline,
+    execute_pending_events, trigger_manual_event
+)
+from events.effects import get_effect_executor
+from events.models import EventDefinition, EventEffect, EventEffectExecution, EventOccurrence
+from tasks.models import LockTask
+from users.models import CoinsLog, Notification
+
+User = get_user_model()
+
+
+class ChunkedEventExecutionTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.admin = User.objects.create_user(username='event_admin', password='pass')
+        self.users = [
+            User.objects.create_user(username=f'event_user_{i}', password='pass', coins=10, level=3)
+            for i in range(5)
+        ]
+        self.event_def = EventDefinition.objects.create(
+            name='chunk_test_event',
+            category='system',
+            title='积分雨',
+            description='所有人获得积分',
+            schedule_type='manual',
+            created_by=self.admin
+        )
+        self.effect = EventEffect.objects.create(
+            event_definition=self.event_def,
+            effect_type='coins_add',
+            target_type='level_based',
+            effect_parameters={'amount': 5},
+            target_parameters={'levels': [3]}
+        )
+
+    def create_occurrence(self):
+        return EventOccurrence.objects.create(
+            event_definition=self.event_def,
+            scheduled_at=timezone.now() - timedelta(minutes=1)
+        )
+
+    def test_claim_plans_chunks_once(self):
+        occurrence = self.create_occurrence()
+
+        with mock.patch.object(celery_tasks, 'EVENT_CHUNK_SIZE', 2):
+            claimed = _claim_occurrence(occurrence.id, timezone.now())
+            self.assertIsNone(_claim_occurrence(occurrence.id, timezone.now()))
+
+        self.assertEqual(claimed.status, 'executing')
+        entry = claimed.execution_log[0]
+        self.assertEqual(entry['total_targets'], 5)
+        ids = sorted(user.id for user in self.users)
+        self.assertEqual(
+            [(chunk['after_id'], chunk['through_id']) for chunk in entry['chunks']],
+            [(None, ids[1]), (ids[1], ids[3]), (ids[3], None)]
+        )
+        self.assertNotIn('user_ids', entry['chunks'][0])
+
+    def test_chunks_execute_and_complete_with_notifications(self):
+        occurrence = self.create_occurrence()
+
+        with mock.patch.object(celery_tasks, 'EVENT_CHUNK_SIZE', 2):
+            _claim_occurrence(occurrence.id, timezone.now())
+            self.assertEqual(_process_next_chunk(occurrence.id), 'chunk_done')
+
+            occurrence.refresh_from_db()
+            chunks = occurrence.execution_log[0]['chunks']
+            self.assertEqual([chunk['status'] for chunk in chunks], ['done', 'pending', 'pending'])
+            self.assertEqual(chunks[0]['size'], 2)
+            self.assertEqual(EventEffectExecution.objects.filter(occurrence=occurrence).count(), 2)
+
+            occurrence = _run_occurrence_inline(occurrence.id)
+
+        self.assertEqual(occurrence.status, 'completed')
+        self.assertEqual(occurrence.affected_users_count, 5)
+        self.assertIsNone(_process_next_chunk(occurrence.id))
+        for user in self.users:
+            user.refresh_from_db()
+            self.assertEqual(user.coins, 15)
+        self.assertEqual(CoinsLog.objects.filter(change_type='event_reward').count(), 5)
+        self.assertEqual(
+            Notification.objects.filter(notification_type='system_event_occurred').count(), 5
+        )
+
+    def test_targets_leaving_the_query_do_not_shift_later_chunks(self):
+        # 冻结后的用户不再是冻结效果的目标，按ID区间分块不会因此跳过后面的用户
+        for user in self.users:
+            LockTask.objects.create(user=user, task_type='lock', title='冻结目标', status='active')
+        self.effect.effect_type = 'task_freeze_all'
+        self.effect.target_type = 'active_task_users'
+        self.effect.save()
+        occurrence = self.create_occurrence()
+
+        with mock.patch.object(celery_tasks, 'EVENT_CHUNK_SIZE', 2):
+            _claim_occurrence(occurrence.id, timezone.now())
+            occurrence = _run_occurrence_inline(occurrence.id)
+
+        self.assertEqual(occurrence.affected_users_count, 5)
+        self.assertFalse(LockTask.objects.filter(is_frozen=False).exists())
+
+    def test_executor_resolves_ranges_without_state(self):
+        # 同一执行器可在不同区间间复用，区间不会残留到后续的全量查询
+        executor = get_effect_executor(self.effect)
+        ids = sorted(user.id for user in self.users)
+
+        self.assertEqual(executor.get_target_user_ids(ids[1], ids[3]), ids[2:4])
+        self.assertEqual(executor.get_target_user_ids(None, ids[0]), ids[:1])
+        self.assertEqual(sorted(user.id for user in executor.get_target_users()), ids)
+
+    def test_failed_chunk_rolls_back_and_resumes(self):
+        occurrence = self.create_occurrence()
+
+        with mock.patch.object(celery_tasks, 'EVENT_CHUNK_SIZE', 2):
+            _claim_occurrence(occurrence.id, timezone.now())
+            _process_next_chunk(occurrence.id)
+
+            with mock.patch.object(EventEffectExecution.objects, 'bulk_create', side_effect=RuntimeError('boom')):
+                with self.assertRaises(RuntimeError):
+                    _process_next_chunk(occurrence.id)
+
+            occurrence.refresh_from_db()
+            self.assertEqual(occurrence.execution_log[0]['chunks'][1]['status'], 'pending')
+            # 失败的分块整体回滚，积分未被重复发放
+            self.assertEqual(CoinsLog.objects.filter(change_type='event_reward').count(), 2)
+
+            occurrence = _run_occurrence_inline(occurrence.id)
+
+        self.assertEqual(occurrence.affected_users_count, 5)
+        self.assertEqual(CoinsLog.objects.filter(change_type='event_reward').count(), 5)
+
+    def test_execute_pending_events_dispatches_chunk_task(self):
+        occurrence = self.create_occurrence()
+
+        with mock.patch.object(celery_tasks.execute_event_chunk, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                result = execute_pending_events()
+
+        self.assertEqual(result['executed_count'], 1)
+        delay.assert_called_once_with(str(occurrence.id))
+        occurrence.refresh_from_db()
+        self.assertEqual(occurrence.status, 'executing')
+
+    def test_stalled_occurrence_is_resumed(self):
+        occurrence = self.create_occurrence()
+        _claim_occurrence(occurrence.id, timezone.now() - timedelta(hours=1))
+
+        with mock.patch.object(celery_tasks.execute_event_chunk, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                result = execute_pending_events()
+
+        self.assertEqual(result['resumed_count'], 1)
+        delay.assert_called_once_with(str(occurrence.id))
+
+    def test_coins_subtract_clamps_at_zero(self):
+        self.effect.effect_type = 'coins_subtract'
+        self.effect.effect_parameters = {'amount': 25}
+        self.effect.save()
+
+        result = trigger_manual_event(str(self.event_def.id))
+
+        self.assertEqual(result['affected_users'], 5)
+        for user in self.users:
+            user.refresh_from_db()
+            self.assertEqual(user.coins, 0)
+        self.assertEqual(
+            set(CoinsLog.objects.filter(change_type='event_cost').values_list('amount', flat=True)), {-10}
+        )
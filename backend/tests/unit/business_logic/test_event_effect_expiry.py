@@ -0,0 +1,126 @@
+"""
+Event Effect Expiry Unit Tests
+
+Covers bulk rollback of expired event effect executions: ledger-backed coin
+reversal, set-based task freeze rollback, persistent multiplier deactivation
+and a query count that does not grow with the number of expired executions.
+"""
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from events.celery_tasks import process_expired_effects, trigger_manual_event
+from events.models import EventDefinition, EventEffect, EventEffectExecution, UserCoinsMultiplier
+from store.active_effects import get_active_effects
+from tasks.models import LockTask
+from users.models import CoinsLog
+
+User = get_user_model()
+
+
+class EventEffectExpiryTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.admin = User.objects.create_user(username='expiry_admin', password='pass')
+        self.users = [
+            User.objects.create_user(username=f'expiry_user_{i}', password='pass', coins=10, level=4)
+            for i in range(4)
+        ]
+        self.event_def = EventDefinition.objects.create(
+            name='expiry_test_event',
+            category='system',
+            title='限时效果',
+            description='限时效果测试',
+            schedule_type='manual',
+            created_by=self.admin
+        )
+
+    def create_effect(self, effect_type, effect_parameters=None, target_type='level_based'):
+        return EventEffect.objects.create(
+            event_definition=self.event_def,
+            effect_type=effect_type,
+            target_type=target_type,
+            effect_parameters=effect_parameters or {},
+            target_parameters={'levels': [4]},
+            duration_minutes=30
+        )
+
+    def expire_all(self):
+        EventEffectExecution.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+
+    def test_coins_rollback_reverses_change_and_clamps(self):
+        self.create_effect('coins_add', {'amount': 20})
+        trigger_manual_event(str(self.event_def.id))
+
+        # 一名用户已花掉部分积分，扣回时不超过其余额
+        spender = self.users[0]
+        User.objects.filter(id=spender.id).update(coins=5)
+
+        self.expire_all()
+        result = process_expired_effects()
+
+        self.assertEqual(result['processed_count'], 4)
+        self.assertEqual(result['rolled_back_count'], 4)
+        balances = dict(User.objects.filter(id__in=[u.id for u in self.users]).values_list('id', 'coins'))
+        self.assertEqual(balances.pop(spender.id), 0)
+        self.assertEqual(set(balances.values()), {10})
+        self.assertEqual(CoinsLog.objects.filter(metadata__rollback=True).count(), 4)
+        self.assertFalse(EventEffectExecution.objects.filter(is_expired=False).exists())
+
+    def test_task_freeze_rollback_unfreezes_tasks(self):
+        now = timezone.now()
+        tasks = [
+            LockTask.objects.create(
+                user=user, task_type='lock', title='冻结测试', status='active',
+                start_time=now, end_time=now + timedelta(hours=2)
+            )
+            for user in self.users[:2]
+        ]
+        self.create_effect('task_freeze_all', target_type='active_task_users')
+        trigger_manual_event(str(self.event_def.id))
+        self.assertEqual(LockTask.objects.filter(id__in=[t.id for t in tasks], is_frozen=True).count(), 2)
+
+        self.expire_all()
+        result = process_expired_effects()
+
+        self.assertEqual(result['rolled_back_count'], 2)
+        self.assertFalse(LockTask.objects.filter(id__in=[t.id for t in tasks], is_frozen=True).exists())
+        self.assertEqual(EventEffectExecution.objects.filter(is_rolled_back=True).count(), 2)
+
+    def test_multiplier_rollback_deactivates_and_invalidates_cache(self):
+        self.create_effect('temporary_coins_multiplier', {'multiplier': 2.0})
+        trigger_manual_event(str(self.event_def.id))
+        user = self.users[0]
+        self.assertEqual(get_active_effects(user).coins_multiplier, 2.0)
+
+        self.expire_all()
+        with self.captureOnCommitCallbacks(execute=True):
+            process_expired_effects()
+
+        self.assertFalse(UserCoinsMultiplier.objects.filter(is_active=True).exists())
+        self.assertEqual(get_active_effects(user).coins_multiplier, 1.0)
+
+    def test_query_count_does_not_grow_with_executions(self):
+        self.create_effect('temporary_coins_multiplier', {'multiplier': 2.0})
+        trigger_manual_event(str(self.event_def.id))
+        self.expire_all()
+        with CaptureQueriesContext(connection) as small_run:
+            process_expired_effects()
+
+        for i in range(4, 12):
+            User.objects.create_user(username=f'expiry_user_{i}', password='pass', level=4)
+        trigger_manual_event(str(self.event_def.id))
+        self.expire_all()
+        with CaptureQueriesContext(connection) as large_run:
+            result = process_expired_effects()
+
+        self.assertEqual(result['processed_count'], 12)
+        self.assertEqual(len(large_run), len(small_run))
@@ -0,0 +1,120 @@
+"""
+Event Scheduler Unit Tests
+
+Covers the next_run_at based scheduler: lookahead pre-creation, advancing
+next_run_at, collapsing missed runs, non-positive intervals failing validation
+and falling back to one unit instead of looping forever, cancelling pre-created
+occurrences of deactivated definitions and a query count independent of the
+number of definitions.
+"""
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from events.celery_tasks import schedule_pending_events
+from events.models import EventDefinition, EventOccurrence
+
+User = get_user_model()
+
+
+@override_settings(EVENT_SCHEDULE_LOOKAHEAD_MINUTES=30)
+class EventSchedulerTest(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='scheduler_admin', password='pass')
+
+    def create_definition(self, name='scheduled_event', **kwargs):
+        defaults = {
+            'category': 'system',
+            'title': '定时事件',
+            'description': '定时事件测试',
+            'schedule_type': 'interval_hours',
+            'interval_value': 1,
+            'created_by': self.admin,
+        }
+        defaults.update(kwargs)
+        return EventDefinition.objects.create(name=name, **defaults)
+
+    def test_new_definition_is_scheduled_and_advanced(self):
+        event_def = self.create_definition()
+        first_run = event_def.next_run_at
+        self.assertIsNotNone(first_run)
+
+        result = schedule_pending_events()
+
+        self.assertEqual(result['scheduled_count'], 1)
+        occurrence = EventOccurrence.objects.get(event_definition=event_def)
+        self.assertEqual(occurrence.scheduled_at, first_run)
+        event_def.refresh_from_db()
+        self.assertEqual(event_def.next_run_at, first_run + timedelta(hours=1))
+        # 下一次执行在窗口之外，不会重复创建
+        self.assertEqual(schedule_pending_events()['scheduled_count'], 0)
+
+    def test_lookahead_pre_creates_occurrences_in_window(self):
+        now = timezone.now()
+        self.create_definition(next_run_at=now + timedelta(minutes=5))
+
+        with override_settings(EVENT_SCHEDULE_LOOKAHEAD_MINUTES=150):
+            result = schedule_pending_events()
+
+        self.assertEqual(result['scheduled_count'], 3)
+        self.assertEqual(
+            list(EventOccurrence.objects.order_by('scheduled_at').values_list('scheduled_at', flat=True)),
+            [now + timedelta(minutes=5, hours=h) for h in range(3)]
+        )
+
+    def test_missed_runs_collapse_into_one(self):
+        now = timezone.now()
+        event_def = self.create_definition(next_run_at=now - timedelta(hours=5, minutes=20))
+
+        result = schedule_pending_events()
+
+        self.assertEqual(result['scheduled_count'], 1)
+        occurrence = EventOccurrence.objects.get(event_definition=event_def)
+        self.assertEqual(occurrence.scheduled_at, now - timedelta(minutes=20))
+
+    def test_non_positive_interval_is_rejected_and_not_looped(self):
+        event_def = self.create_definition(interval_value=-2)
+
+        with self.assertRaises(ValidationError):
+            event_def.full_clean()
+        self.assertEqual(event_def.get_interval(), timedelta(hours=1))
+        self.assertEqual(schedule_pending_events()['scheduled_count'], 1)
+
+    def test_manually_created_occurrence_advances_next_run(self):
+        event_def = self.create_definition(interval_value=6)
+        EventOccurrence.objects.create(
+            event_definition=event_def, scheduled_at=timezone.now() - timedelta(hours=3)
+        )
+
+        self.assertEqual(schedule_pending_events()['scheduled_count'], 0)
+
+    def test_deactivation_cancels_pre_created_occurrences(self):
+        event_def = self.create_definition(next_run_at=timezone.now() + timedelta(minutes=5))
+        schedule_pending_events()
+        event_def.is_active = False
+        event_def.save()
+
+        result = schedule_pending_events()
+
+        self.assertEqual(result['cancelled_count'], 1)
+        self.assertEqual(EventOccurrence.objects.get(event_definition=event_def).status, 'cancelled')
+
+    def test_query_count_does_not_grow_with_definitions(self):
+        self.create_definition(name='event_0')
+        with CaptureQueriesContext(connection) as small_run:
+            schedule_pending_events()
+
+        for i in range(1, 10):
+            self.create_definition(name=f'event_{i}')
+        with CaptureQueriesContext(connection) as large_run:
+            result = schedule_pending_events()
+
+        self.assertEqual(result['scheduled_count'], 9)
+        self.assertEqual(len(large_run), len(small_run))
@@ -0,0 +1,124 @@
+"""
+Game Matchmaking Unit Tests
+
+Covers seat claiming with a conditional counter increment, asynchronous
+settlement dispatch once a game is full, ledger-backed dice and
+rock-paper-scissors settlement, and the game status endpoint.
+"""
+
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from store import celery_tasks
+from store.models import Game, GameParticipant
+from store.services.games import GameError, GameMatchmakingService, GameSettlementService
+from tasks.models import LockTask
+from users.models import CoinsLog
+
+User = get_user_model()
+
+
+class GameMatchmakingTest(TestCase):
+
+    def setUp(self):
+        self.creator = User.objects.create_user(username='game_creator', password='pass', coins=50)
+        self.player = User.objects.create_user(username='game_player', password='pass', coins=50)
+
+    def client_for(self, user):
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def create_dice_game(self, dice_result=5):
+        return Game.objects.create(
+            game_type='dice', creator=self.creator, bet_amount=10, max_players=1,
+            game_data={'dice_result': dice_result}
+        )
+
+    def create_lock_task(self, user):
+        now = timezone.now()
+        return LockTask.objects.create(
+            user=user, task_type='lock', title='游戏测试', status='active',
+            start_time=now, end_time=now + timedelta(hours=1)
+        )
+
+    def test_full_game_rejects_extra_seat(self):
+        game = self.create_dice_game()
+        Game.objects.filter(id=game.id).update(player_count=1)
+
+        with self.assertRaises(GameError) as ctx:
+            GameMatchmakingService.join(self.player, game.id, {'guess': 'big'})
+
+        self.assertEqual(ctx.exception.message, '游戏人数已满')
+        self.player.refresh_from_db()
+        self.assertEqual(self.player.coins, 50)
+        self.assertFalse(GameParticipant.objects.filter(game=game).exists())
+
+    def test_join_full_game_dispatches_settlement(self):
+        game = self.create_dice_game()
+
+        with mock.patch.object(celery_tasks.settle_game, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client_for(self.player).post(
+                    f'/api/store/games/{game.id}/join/', {'action': {'guess': 'big'}}, format='json'
+                )
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'active')
+        delay.assert_called_once_with(str(game.id))
+        game.refresh_from_db()
+        self.assertEqual((game.status, game.player_count), ('active', 1))
+        self.assertEqual(CoinsLog.objects.get(user=self.player).change_type, 'game_participation')
+
+    def test_dice_settlement_pays_creator_through_ledger(self):
+        game = self.create_dice_game(dice_result=2)
+        with mock.patch.object(celery_tasks.settle_game, 'delay'):
+            GameMatchmakingService.join(self.player, game.id, {'guess': 'big'})
+
+        result = celery_tasks.settle_game(str(game.id))
+
+        self.assertEqual(result['status'], 'success')
+        self.assertFalse(result['result']['is_correct'])
+        self.creator.refresh_from_db()
+        self.assertEqual(self.creator.coins, 60)
+        self.assertTrue(CoinsLog.objects.filter(user=self.creator, change_type='game_refund', amount=10).exists())
+        # 重复结算直接跳过
+        self.assertIsNone(GameSettlementService.settle(game.id))
+
+    def test_rock_paper_scissors_tie_reopens_game(self):
+        self.create_lock_task(self.creator)
+        self.create_lock_task(self.player)
+        game = Game.objects.create(game_type='rock_paper_scissors', creator=self.creator, bet_amount=5)
+
+        with mock.patch.object(celery_tasks.settle_game, 'delay'):
+            GameMatchmakingService.join(self.creator, game.id, {'choice': 'rock'})
+            GameMatchmakingService.join(self.player, game.id, {'choice': 'rock'})
+        result = GameSettlementService.settle(game.id)
+
+        self.assertTrue(result['tie'])
+        game.refresh_from_db()
+        self.assertEqual((game.status, game.player_count), ('waiting', 0))
+        self.assertFalse(GameParticipant.objects.filter(game=game).exists())
+        self.creator.refresh_from_db()
+        self.assertEqual(self.creator.coins, 50)
+
+    def test_status_endpoint_reports_result(self):
+        game = self.create_dice_game(dice_result=6)
+        with mock.patch.object(celery_tasks.settle_game, 'delay'):
+            GameMatchmakingService.join(self.player, game.id, {'guess': 'big'})
+        GameSettlementService.settle(game.id)
+
+        response = self.client_for(self.player).get(f'/api/store/games/{game.id}/status/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertTrue(response.data['is_participant'])
+        self.assertEqual(response.data['result']['dice_result'], 6)
+        self.assertTrue(response.data['result']['is_correct'])
@@ -0,0 +1,89 @@
+"""
+Hot-Path Instrumentation Unit Tests
+
+Covers the opt-in instrumentation middleware and Celery signal hook: per-URL-name
+request samples with query counts and cache hit ratio, per-task samples, the
+rolling window, the staff-only metrics endpoint, and the middleware staying out
+of the chain when disabled.
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from tasks.celery_tasks import cleanup_job_runs
+from utils.instrumentation import histogram, measure
+
+User = get_user_model()
+
+
+@override_settings(INSTRUMENTATION_ENABLED=True)
+class InstrumentationTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        histogram.reset()
+        self.addCleanup(cache.clear)
+        self.addCleanup(histogram.reset)
+        self.user = User.objects.create_user(username='metrics_user', password='pass')
+        self.staff = User.objects.create_user(username='metrics_staff', password='pass', is_staff=True)
+
+    def metrics(self, kind=None):
+        return {row['name']: row for row in histogram.snapshot(kind)}
+
+    def test_requests_are_tagged_by_url_name(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        # 创建 token 时会预先写入认证缓存，清空后第一次请求才会未命中
+        cache.clear()
+
+        client.get('/api/tasks/')
+        client.get('/api/tasks/')
+
+        row = self.metrics('request')['GET task-list-create']
+        self.assertEqual(row['count'], 2)
+        self.assertGreater(row['queries']['avg'], 0)
+        # 第一次请求未命中 token 缓存，第二次命中
+        self.assertGreaterEqual(row['cache']['hits'], 1)
+        self.assertGreaterEqual(row['cache']['misses'], 1)
+        self.assertEqual(sum(row['wall_ms']['buckets'].values()), 2)
+
+    def test_celery_tasks_are_recorded_by_task_name(self):
+        cleanup_job_runs.apply()
+
+        row = self.metrics('task')['tasks.celery_tasks.cleanup_job_runs']
+        self.assertEqual((row['count'], row['queries']['max']), (1, 1))
+
+    @override_settings(INSTRUMENTATION_WINDOW=3)
+    def test_window_keeps_latest_samples(self):
+        histogram.reset()
+        for _ in range(5):
+            with measure() as measurement:
+                User.objects.count()
+            histogram.record('task', 'demo', measurement)
+
+        self.assertEqual(self.metrics()['demo']['count'], 3)
+
+    def test_metrics_endpoint_is_staff_only(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/api/metrics/').status_code, 403)
+
+        client.force_authenticate(self.staff)
+        response = client.get('/api/metrics/', {'kind': 'request'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['enabled'])
+        self.assertIn('GET instrumentation-metrics', [row['name'] for row in response.data['metrics']])
+
+        self.assertEqual(client.delete('/api/metrics/').status_code, 200)
+
+    @override_settings(INSTRUMENTATION_ENABLED=False)
+    def test_disabled_records_nothing(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        client.get('/api/tasks/')
+        cleanup_job_runs.apply()
+
+        self.assertEqual(histogram.snapshot(), [])
@@ -0,0 +1,101 @@
+"""
+Job Run Metrics Unit Tests
+
+Covers the job-run metrics store: batch Celery tasks recording counts and a
+bounded item sample instead of returning per-item lists, failures being
+recorded per item and per run, health checks reading the latest run, and
+retention cleanup.
+"""
+
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from posts.models import CheckinVotingSession, Post
+from tasks.celery_tasks import (
+    cleanup_job_runs, health_check_hourly_rewards, pinning_health_check,
+    process_checkin_voting_results, process_hourly_rewards
+)
+from tasks.job_runs import record_job_run
+from tasks.models import JobRun, LockTask, TaskKey
+
+User = get_user_model()
+
+
+class JobRunMetricsTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='job_run_user', password='pass')
+
+    @override_settings(JOB_RUN_SAMPLE_SIZE=2)
+    def test_hourly_rewards_record_bounded_sample(self):
+        # 持有他人钥匙，保证每小时都有积分可发
+        keyholder_task = LockTask.objects.create(
+            user=User.objects.create_user(username='job_run_other', password='pass'), task_type='lock', title='他人任务'
+        )
+        TaskKey.objects.create(task=keyholder_task, holder=self.user)
+        LockTask.objects.create(
+            user=self.user, task_type='lock', title='带锁任务', status='active',
+            start_time=timezone.now() - timedelta(hours=5, minutes=10)
+        )
+
+        result = process_hourly_rewards()
+
+        run = JobRun.objects.get(job_name='process_hourly_rewards')
+        self.assertNotIn('processed_rewards', result)
+        self.assertEqual((result['processed_count'], result['job_run_id']), (5, run.id))
+        self.assertEqual((run.status, run.processed_count, run.metrics['active_tasks']), ('success', 5, 1))
+        self.assertEqual([item['hour_count'] for item in run.sample_items], [1, 2])
+
+    def test_voting_session_failures_are_counted(self):
+        post = Post.objects.create(user=self.user, content='打卡', post_type='checkin')
+        CheckinVotingSession.objects.create(post=post, voting_deadline=timezone.now() - timedelta(minutes=1))
+
+        with mock.patch('tasks.celery_tasks._process_single_voting_session', side_effect=ValueError('boom')):
+            result = process_checkin_voting_results()
+
+        run = JobRun.objects.get(job_name='process_checkin_voting_results')
+        self.assertNotIn('processed_sessions', result)
+        self.assertEqual((result['failed_count'], result['total_sessions']), (1, 1))
+        self.assertEqual(run.status, 'partial')
+        self.assertEqual(run.failed_items, [{'session_id': str(post.voting_session.id), 'post_id': str(post.id), 'error': 'boom'}])
+
+    def test_exception_records_failed_run_and_reraises(self):
+        with self.assertRaises(RuntimeError):
+            with record_job_run('broken_job') as run:
+                run.item({'n': 1})
+                raise RuntimeError('database unavailable')
+
+        run = JobRun.objects.get(job_name='broken_job')
+        self.assertEqual((run.status, run.processed_count, run.error), ('failed', 1, 'database unavailable'))
+
+    def test_health_checks_read_latest_run(self):
+        now = timezone.now()
+        JobRun.objects.create(
+            job_name='process_pinning_queue', status='failed', started_at=now, finished_at=now, error='lock timeout'
+        )
+        JobRun.objects.create(
+            job_name='process_hourly_rewards', started_at=now - timedelta(hours=3), finished_at=now - timedelta(hours=3)
+        )
+
+        pinning = pinning_health_check()
+        rewards = health_check_hourly_rewards()
+
+        self.assertEqual(pinning['status'], 'warning')
+        self.assertEqual(pinning['last_queue_run']['error'], 'lock timeout')
+        self.assertEqual([issue['issue'] for issue in pinning['job_issues']], ['last_run_failed'])
+        self.assertEqual(rewards['status'], 'warning')
+        self.assertEqual([issue['issue'] for issue in rewards['job_issues']], ['last_run_stale'])
+
+    @override_settings(JOB_RUN_RETENTION_DAYS=7)
+    def test_cleanup_deletes_expired_runs(self):
+        now = timezone.now()
+        old = now - timedelta(days=8)
+        JobRun.objects.create(job_name='process_pinning_queue', started_at=old, finished_at=old)
+        recent = JobRun.objects.create(job_name='process_pinning_queue', started_at=now, finished_at=now)
+
+        self.assertEqual(cleanup_job_runs()['deleted_count'], 1)
+        self.assertEqual(list(JobRun.objects.values_list('id', flat=True)), [recent.id])
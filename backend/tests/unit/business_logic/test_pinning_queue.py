@@ -0,0 +1,146 @@
+"""
+Pinning Queue Unit Tests
+
+Covers the set-based pinning queue processor: expiry and promotion in a fixed
+number of queries regardless of queue length, expiry notifications, and the
+community carousel being served from the published cache without hitting the
+database and republished when a pinned task changes or is deleted.
+"""
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from tasks.celery_tasks import expire_pinned_users
+from tasks.models import LockTask, PinnedUser, TaskTimelineEvent
+from tasks.pinning_service import CAROUSEL_CACHE_KEY, PinningQueueManager
+from users.models import Notification
+
+User = get_user_model()
+
+
+class PinningQueueTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.key_holder = User.objects.create_user(username='pin_holder', password='pass')
+
+    def pin(self, index, expires_in, position=None):
+        owner = User.objects.create_user(username=f'pin_owner_{index}', password='pass')
+        task = LockTask.objects.create(
+            user=owner, task_type='lock', title=f'置顶任务{index}', status='active', start_time=timezone.now()
+        )
+        now = timezone.now()
+        return PinnedUser.objects.create(
+            task=task,
+            pinned_user=owner,
+            key_holder=self.key_holder,
+            coins_spent=60,
+            duration_minutes=30,
+            position=position,
+            activated_at=now if position else None,
+            expires_at=now + expires_in,
+        )
+
+    def update_queue(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return PinningQueueManager.update_queue()
+
+    def test_query_count_does_not_grow_with_queue(self):
+        counts = []
+        for size in (2, 8):
+            PinnedUser.objects.all().delete()
+            for i in range(size):
+                self.pin(f'{size}_{i}', timedelta(minutes=-1 if i % 2 == 0 else 10 + i))
+
+            # 不执行提交回调，只统计队列处理本身的查询
+            with CaptureQueriesContext(connection) as queries:
+                result = PinningQueueManager.update_queue()
+            self.assertEqual(result['expired_count'], size // 2)
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+
+    def test_expired_pins_free_positions_for_queue(self):
+        expiring = self.pin(0, timedelta(minutes=-1), position=1)
+        active = [self.pin(i, timedelta(minutes=10), position=i) for i in (2, 3)]
+        queued = self.pin(4, timedelta(minutes=10))
+
+        result = self.update_queue()
+
+        self.assertEqual((result['expired_count'], result['active_positions'], result['queue_count']), (1, 3, 0))
+        expiring.refresh_from_db()
+        self.assertEqual((expiring.is_active, expiring.position), (False, None))
+        self.assertEqual(
+            list(PinnedUser.objects.filter(is_active=True).order_by('position').values_list('id', flat=True)),
+            [active[0].id, active[1].id, queued.id]
+        )
+        queued.refresh_from_db()
+        self.assertIsNotNone(queued.activated_at)
+        self.assertTrue(TaskTimelineEvent.objects.filter(task=expiring.task, event_type='user_unpinned').exists())
+
+        # 轮播缓存在提交后发布
+        self.assertEqual([entry['id'] for entry in cache.get(CAROUSEL_CACHE_KEY)],
+                         [str(active[0].id), str(active[1].id), str(queued.id)])
+
+    def test_expire_task_notifies_pinned_users(self):
+        expiring = self.pin(0, timedelta(minutes=-1), position=1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = expire_pinned_users.apply().get()
+
+        self.assertEqual(result['expired_count'], 1)
+        notification = Notification.objects.get(recipient=expiring.pinned_user, notification_type='user_unpinned')
+        self.assertEqual(notification.extra_data['task_title'], expiring.task.title)
+
+    def test_carousel_reads_from_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            pin = self.pin(0, timedelta(minutes=10), position=1)
+
+        client = APIClient()
+        client.force_authenticate(self.key_holder)
+        url = reverse('get-pinned-tasks-carousel')
+
+        with self.assertNumQueries(0):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['pinned_tasks'][0]['task']['title'], pin.task.title)
+        self.assertGreater(response.data['pinned_tasks'][0]['time_remaining'], 0)
+
+        # 取消置顶后缓存随之更新
+        with self.captureOnCommitCallbacks(execute=True):
+            pin.is_active = False
+            pin.position = None
+            pin.save()
+        self.assertEqual(client.get(url).data['count'], 0)
+
+    def test_carousel_follows_pinned_task_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            pin = self.pin(0, timedelta(minutes=10), position=1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pin.task.title = '改名后的任务'
+            pin.task.status = 'voting'
+            pin.task.save()
+        entry = PinningQueueManager.get_carousel()[0]
+        self.assertEqual((entry['task']['title'], entry['task']['status']), ('改名后的任务', 'voting'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pin.task.delete()
+        self.assertEqual(PinningQueueManager.get_carousel(), [])
+
+    def test_carousel_hides_entries_past_expiry(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pin(0, timedelta(minutes=10), position=1)
+
+        later = timezone.now() + timedelta(minutes=11)
+        self.assertEqual(PinningQueueManager.get_carousel(now=later), [])
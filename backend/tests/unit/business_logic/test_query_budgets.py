@@ -0,0 +1,56 @@
+"""
+Endpoint Query Budget Tests
+
+Pins the SQL query count of hot list endpoints. Each budget is a fixed part plus
+a per-row part; the per-row parts are the current per-item lookups on these
+endpoints and should only ever go down.
+"""
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from posts.models import Post
+from tasks.models import LockTask
+from tests.base.query_budget import QueryBudgetMixin
+from users.models import Notification
+
+User = get_user_model()
+
+ROWS = 4
+
+# URL 名称: (固定查询数, 每行查询数)
+QUERY_BUDGETS = {
+    'task-list-create': (3, 5),
+    'posts:post-list-create': (6, 10),
+    'users:notification-list': (2, 9),
+}
+
+
+class EndpointQueryBudgetTest(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user(username='budget_viewer', password='pass')
+        for i in range(ROWS):
+            author = User.objects.create_user(username=f'budget_author_{i}', password='pass')
+            LockTask.objects.create(
+                user=author, task_type='lock', title=f'任务{i}', status='active', start_time=timezone.now()
+            )
+            Post.objects.create(user=author, content=f'动态{i}')
+            Notification.create_notification(recipient=cls.viewer, notification_type='task_completed', actor=author)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def test_list_endpoints_stay_within_budget(self):
+        for url_name, (budget, per_row) in QUERY_BUDGETS.items():
+            with self.subTest(url_name=url_name):
+                response = self.assertQueryBudget(self.client, url_name, budget, per_row=per_row, rows=ROWS)
+                self.assertEqual(response.status_code, 200)
+
+    def test_budget_failure_lists_queries(self):
+        with self.assertRaisesRegex(AssertionError, r'budget is 1 .*\n1\. SELECT'):
+            self.assertQueryBudget(self.client, 'task-list-create', 1)
@@ -0,0 +1,100 @@
+"""
+Share Claim Unit Tests
+
+Covers the shared-item claim fast path: the cache gate that rejects losing
+claimants without touching the database, the conditional claim update,
+inventory slot accounting and gate release after a failed claim.
+"""
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from store.models import Item, ItemType, SharedItem, UserInventory
+from store.services.sharing import ShareClaimError, ShareClaimService
+
+User = get_user_model()
+
+
+class ShareClaimTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.sharer = User.objects.create_user(username='share_sharer', password='pass')
+        self.claimer = User.objects.create_user(username='share_claimer', password='pass')
+        self.other = User.objects.create_user(username='share_other', password='pass')
+        item_type, _ = ItemType.objects.get_or_create(name='note', defaults={'display_name': '纸条'})
+        self.item = Item.objects.create(
+            item_type=item_type, owner=self.sharer, inventory=UserInventory.objects.get(user=self.sharer)
+        )
+        self.share = SharedItem.objects.create(
+            sharer=self.sharer, item=self.item, share_token='token-123',
+            expires_at=timezone.now() + timedelta(hours=24)
+        )
+
+    def client_for(self, user):
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def test_claim_transfers_item_and_slot_counts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(self.claimer).post('/api/store/claim/token-123/')
+
+        self.assertEqual(response.status_code, 200)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.owner, self.claimer)
+        self.share.refresh_from_db()
+        self.assertEqual((self.share.status, self.share.claimer), ('claimed', self.claimer))
+        self.assertEqual(UserInventory.objects.get(user=self.claimer).used_slot_count, 1)
+        self.assertEqual(UserInventory.objects.get(user=self.sharer).used_slot_count, 0)
+
+    def test_losing_claimant_rejected_without_queries(self):
+        client = self.client_for(self.other)
+        with self.captureOnCommitCallbacks(execute=True):
+            ShareClaimService.claim(self.claimer, 'token-123')
+
+        # 只剩 Token 认证的一次查询
+        with self.assertNumQueries(1):
+            response = client.post('/api/store/claim/token-123/')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('share_claimer', response.data['error'])
+
+    def test_claim_in_progress_is_rejected(self):
+        cache.add('share_claim:token-123', {'state': 'pending', 'user_id': self.claimer.id}, 30)
+
+        with self.assertRaises(ShareClaimError) as ctx:
+            ShareClaimService.claim(self.other, 'token-123')
+
+        self.assertEqual(ctx.exception.code, 'in_progress')
+
+    def test_failed_claim_releases_gate(self):
+        with self.assertRaises(ShareClaimError) as ctx:
+            ShareClaimService.claim(self.sharer, 'token-123')
+        self.assertEqual(ctx.exception.code, 'own_share')
+
+        UserInventory.objects.filter(user=self.claimer).update(used_slot_count=6)
+        with self.assertRaises(ShareClaimError) as ctx:
+            ShareClaimService.claim(self.claimer, 'token-123')
+        self.assertEqual(ctx.exception.code, 'inventory_full')
+        self.share.refresh_from_db()
+        self.assertEqual(self.share.status, 'active')
+
+        ShareClaimService.claim(self.other, 'token-123')
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.owner, self.other)
+
+    def test_expired_share_not_found(self):
+        SharedItem.objects.filter(id=self.share.id).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        response = self.client_for(self.claimer).post('/api/store/claim/token-123/')
+
+        self.assertEqual(response.status_code, 404)
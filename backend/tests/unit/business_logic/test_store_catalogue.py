@@ -0,0 +1,91 @@
+"""
+Store Catalogue Cache Unit Tests
+
+Covers the versioned store catalogue: cached reads, per-user level filtering
+in memory, invalidation on admin edits and stock sales, and ETag /
+Last-Modified conditional requests on the item list and zone endpoints.
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from store.catalogue import get_catalogue_version, get_store_catalogue
+from store.models import ItemType, StoreItem
+from store.services.purchase import PurchaseService
+
+User = get_user_model()
+
+
+class StoreCatalogueTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username='catalogue_user', password='pass', coins=100)
+        self.item_type, _ = ItemType.objects.get_or_create(name='photo_paper', defaults={'display_name': '相纸'})
+        self.basic = StoreItem.objects.create(
+            item_type=self.item_type, name='相纸', description='paper', price=5
+        )
+        self.advanced = StoreItem.objects.create(
+            item_type=self.item_type, name='高级相纸', description='paper', price=50, level_requirement=3
+        )
+        self.client = APIClient()
+        token, _ = Token.objects.get_or_create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def item_names(self, response):
+        return [item['name'] for item in response.data['results']]
+
+    def test_catalogue_cached_between_requests(self):
+        get_store_catalogue()
+        with self.assertNumQueries(0):
+            catalogue = get_store_catalogue()
+        self.assertEqual(len(catalogue['items']), 2)
+
+    def test_list_filters_by_level_and_supports_etag(self):
+        response = self.client.get('/api/store/items/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.item_names(response), ['相纸'])
+        self.assertIn('Last-Modified', response)
+
+        cached = self.client.get('/api/store/items/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+        self.user.level = 3
+        self.user.save()
+        upgraded = self.client.get('/api/store/items/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(upgraded.status_code, 200)
+        self.assertEqual(self.item_names(upgraded), ['相纸', '高级相纸'])
+
+    def test_admin_edit_invalidates_catalogue(self):
+        response = self.client.get('/api/store/items/')
+        version = get_catalogue_version()['version']
+
+        self.basic.price = 8
+        self.basic.save()
+        self.assertNotEqual(get_catalogue_version()['version'], version)
+
+        updated = self.client.get('/api/store/items/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(updated.status_code, 200)
+        self.assertEqual(updated.data['results'][0]['price'], 8)
+
+    def test_limited_stock_sale_invalidates_catalogue(self):
+        self.basic.stock = 5
+        self.basic.save()
+        get_store_catalogue()
+
+        PurchaseService.purchase(self.user, self.basic.id, 2)
+        catalogue = get_store_catalogue()
+        self.assertEqual(catalogue['items'][0]['stock'], 3)
+
+    def test_zones_etag(self):
+        response = self.client.get('/api/store/zones/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['zones']), 5)
+        self.assertTrue(all(zone['next_cost'] == 1 for zone in response.data['zones']))
+
+        cached = self.client.get('/api/store/zones/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
@@ -0,0 +1,210 @@
+"""
+Store Purchase Unit Tests
+
+Covers the purchase engine: conditional stock, daily-limit and inventory-slot
+reservations, batched item/purchase creation, the maintained slot counter and
+a flash-sale concurrency test that must never oversell.
+"""
+
+import threading
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from store.models import DailyPurchaseCounter, Item, ItemType, Purchase, StoreItem, UserInventory
+from store.services.purchase import PurchaseError, PurchaseService
+from tasks.models import LockTask
+
+User = get_user_model()
+
+
+def make_store_item(**kwargs):
+    item_type, _ = ItemType.objects.get_or_create(name='photo_paper', defaults={'display_name': '相纸'})
+    defaults = {'item_type': item_type, 'name': '相纸', 'description': 'paper', 'price': 10}
+    defaults.update(kwargs)
+    return StoreItem.objects.create(**defaults)
+
+
+class PurchaseServiceTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='pass', coins=100)
+
+    def test_bulk_purchase_reserves_everything(self):
+        store_item = make_store_item(stock=5, daily_limit=4)
+
+        PurchaseService.purchase(self.user, store_item.id, 1)
+        with CaptureQueriesContext(connection) as single:
+            PurchaseService.purchase(self.user, store_item.id, 1)
+        with CaptureQueriesContext(connection) as batch:
+            result = PurchaseService.purchase(self.user, store_item.id, 2)
+
+        # 查询数量与购买数量无关
+        self.assertEqual(len(batch), len(single))
+
+        self.assertEqual(len(result['items']), 2)
+        self.assertEqual(result['remaining_coins'], 60)
+        self.assertEqual(result['remaining_slots'], 2)
+        store_item.refresh_from_db()
+        self.assertEqual(store_item.stock, 1)
+        self.assertEqual(Purchase.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(DailyPurchaseCounter.objects.get(user=self.user, store_item=store_item).count, 4)
+        self.assertEqual(self.user.inventory.items.count(), 4)
+
+    def test_stock_and_daily_limit_rejections(self):
+        store_item = make_store_item(stock=2, daily_limit=3)
+        with self.assertRaisesMessage(PurchaseError, '库存不足'):
+            PurchaseService.purchase(self.user, store_item.id, 3)
+
+        PurchaseService.purchase(self.user, store_item.id, 2)
+        store_item.stock = 10
+        store_item.save()
+        with self.assertRaisesMessage(PurchaseError, '已购买2个'):
+            PurchaseService.purchase(self.user, store_item.id, 2)
+
+    def test_failure_rolls_back_all_reservations(self):
+        store_item = make_store_item(stock=5, daily_limit=5, price=60)
+        with self.assertRaisesMessage(PurchaseError, '积分不足'):
+            PurchaseService.purchase(self.user, store_item.id, 2)
+
+        store_item.refresh_from_db()
+        self.assertEqual(store_item.stock, 5)
+        self.assertFalse(DailyPurchaseCounter.objects.filter(count__gt=0).exists())
+        self.assertEqual(UserInventory.objects.get(user=self.user).used_slot_count, 0)
+        self.assertFalse(Item.objects.filter(owner=self.user).exists())
+
+    def test_inventory_capacity(self):
+        store_item = make_store_item(price=1)
+        PurchaseService.purchase(self.user, store_item.id, 5)
+        with self.assertRaisesMessage(PurchaseError, '剩余1格'):
+            PurchaseService.purchase(self.user, store_item.id, 2)
+
+    def test_view_returns_errors_with_status(self):
+        store_item = make_store_item(level_requirement=3)
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=self.user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        response = client.post('/api/store/purchase/', {'store_item_id': str(store_item.id)})
+        self.assertEqual(response.status_code, 403)
+
+
+class InventorySlotCounterTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='slot_user', password='pass')
+        self.other = User.objects.create_user(username='slot_other', password='pass')
+        self.item_type, _ = ItemType.objects.get_or_create(name='note', defaults={'display_name': '纸条'})
+
+    def test_counter_follows_item_moves_and_deletes(self):
+        inventory = self.user.inventory
+        other_inventory = self.other.inventory
+        item = Item.objects.create(item_type=self.item_type, owner=self.user, inventory=inventory)
+        Item.objects.create(item_type=self.item_type, owner=self.user, inventory=inventory)
+        self.assertEqual(inventory.used_slots, 2)
+
+        item = Item.objects.get(pk=item.pk)
+        item.inventory = other_inventory
+        item.owner = self.other
+        item.save()
+        item.status = 'used'
+        item.save(update_fields=['status'])
+        inventory.refresh_from_db()
+        other_inventory.refresh_from_db()
+        self.assertEqual((inventory.used_slots, other_inventory.used_slots), (1, 1))
+
+        item.delete()
+        other_inventory.refresh_from_db()
+        self.assertEqual(other_inventory.used_slots, 0)
+
+    def test_recount_repairs_drift(self):
+        inventory = self.user.inventory
+        Item.objects.create(item_type=self.item_type, owner=self.user, inventory=inventory)
+        UserInventory.objects.filter(pk=inventory.pk).update(used_slot_count=5)
+        inventory.refresh_from_db()
+        self.assertEqual(inventory.recount_slots(), 1)
+        inventory.refresh_from_db()
+        self.assertEqual(inventory.used_slot_count, 1)
+
+
+    def test_hourglass_use_releases_slot(self):
+        task = LockTask.objects.create(
+            user=self.other, task_type='lock', title='沙漏任务', status='active',
+            start_time=timezone.now() - timedelta(hours=2), end_time=timezone.now() + timedelta(hours=2)
+        )
+        LockTask.objects.filter(pk=task.pk).update(created_at=timezone.now() - timedelta(hours=2))
+        key_type, _ = ItemType.objects.get_or_create(name='key', defaults={'display_name': '钥匙'})
+        hourglass_type, _ = ItemType.objects.get_or_create(name='time_hourglass', defaults={'display_name': '时间沙漏'})
+        inventory = self.user.inventory
+        Item.objects.create(item_type=key_type, owner=self.user, inventory=inventory,
+                            properties={'task_id': str(task.id)})
+        Item.objects.create(item_type=hourglass_type, owner=self.user, inventory=inventory)
+        inventory.refresh_from_db()
+        self.assertEqual(inventory.used_slot_count, 2)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(f'/api/tasks/{task.id}/use-time-hourglass/')
+
+        self.assertEqual(response.status_code, 200, response.data)
+        inventory.refresh_from_db()
+        self.assertEqual(inventory.used_slot_count, 1)
+        self.assertEqual(inventory.recount_slots(), 1)
+
+
+class FlashSaleConcurrencyTest(TransactionTestCase):
+    """
+    限量抢购并发测试：多个用户同时购买少量库存
+
+    内存 SQLite 共享缓存下部分请求会因表锁失败；无论成功多少，售出数量、
+    剩余库存、道具与购买记录、积分扣除必须严格一致，且不得超卖。
+    """
+
+    BUYERS = 8
+    STOCK = 3
+
+    def test_flash_sale_never_oversells(self):
+        store_item = make_store_item(stock=self.STOCK, price=10)
+        buyers = [
+            User.objects.create_user(username=f'flash_buyer{i}', password='pass', coins=50)
+            for i in range(self.BUYERS)
+        ]
+        barrier = threading.Barrier(self.BUYERS)
+        outcomes = []
+
+        def buy(user):
+            try:
+                barrier.wait()
+                PurchaseService.purchase(user, store_item.id, 1)
+                outcomes.append('ok')
+            except PurchaseError:
+                outcomes.append('sold_out')
+            except OperationalError:
+                outcomes.append('locked')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(user,)) for user in buyers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        sold = Purchase.objects.filter(store_item=store_item).count()
+        store_item.refresh_from_db()
+        self.assertLessEqual(sold, self.STOCK)
+        self.assertEqual(sold, outcomes.count('ok'))
+        self.assertEqual(store_item.stock, self.STOCK - sold)
+        self.assertEqual(Item.objects.filter(item_type=store_item.item_type).count(), sold)
+        self.assertEqual(
+            sum(50 - user.coins for user in User.objects.filter(pk__in=[b.pk for b in buyers])), sold * 10
+        )
+        if connection.vendor != 'sqlite':
+            self.assertEqual(sold, self.STOCK)
+            self.assertEqual(outcomes.count('sold_out'), self.BUYERS - self.STOCK)
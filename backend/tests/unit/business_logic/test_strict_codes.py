@@ -0,0 +1,92 @@
+"""
+Strict Code Unit Tests
+
+Covers derived strict-mode verification codes: deterministic HMAC codes per
+task and 4 AM window, the daily rollover writing nothing but optional bulk
+audit events, serializers exposing the current code, and the stored mode
+staying unchanged.
+"""
+
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from tasks.celery_tasks import _update_strict_mode_verification_codes
+from tasks.models import LockTask, TaskTimelineEvent
+from tasks.serializers import LockTaskCreateSerializer, LockTaskListSerializer
+from tasks.strict_codes import code_window, derive_strict_code, get_strict_code
+
+User = get_user_model()
+
+
+def local_time(day, hour, minute=0):
+    return timezone.make_aware(datetime(2026, 10, day, hour, minute))
+
+
+@override_settings(STRICT_CODE_MODE='derived', STRICT_CODE_SECRET='test-secret')
+class DerivedStrictCodeTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='strict_user', password='pass')
+        self.task = LockTask.objects.create(
+            user=self.user, task_type='lock', title='严格模式', status='active',
+            strict_mode=True, strict_code='A1B2'
+        )
+
+    def test_code_is_stable_within_window_and_rotates_at_4am(self):
+        before_rollover = get_strict_code(self.task, at=local_time(19, 3, 59))
+        morning = get_strict_code(self.task, at=local_time(19, 4, 0))
+
+        self.assertRegex(morning, r'^[A-Z][0-9][A-Z][0-9]$')
+        self.assertEqual(before_rollover, get_strict_code(self.task, at=local_time(18, 12)))
+        self.assertEqual(morning, get_strict_code(self.task, at=local_time(20, 3, 59)))
+        self.assertEqual(morning, derive_strict_code(self.task.id, code_window(local_time(19, 23))))
+        week = [get_strict_code(self.task, at=local_time(10 + d, 12)) for d in range(7)]
+        with override_settings(STRICT_CODE_SECRET='other-secret'):
+            self.assertNotEqual(week, [get_strict_code(self.task, at=local_time(10 + d, 12)) for d in range(7)])
+
+    def test_daily_rollover_writes_nothing(self):
+        # 一次任务查询 + 一条运行记录
+        with self.assertNumQueries(2):
+            result = _update_strict_mode_verification_codes(timezone.now())
+
+        self.assertEqual((result['mode'], result['total_active_strict_tasks']), ('derived', 1))
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.strict_code, 'A1B2')
+        self.assertFalse(TaskTimelineEvent.objects.filter(event_type='verification_code_updated').exists())
+
+    @override_settings(STRICT_CODE_AUDIT_EVENTS=True)
+    def test_audit_events_are_bulk_inserted(self):
+        LockTask.objects.create(
+            user=self.user, task_type='lock', title='严格模式2', status='voting', strict_mode=True
+        )
+        now = timezone.now()
+
+        with self.assertNumQueries(3):
+            result = _update_strict_mode_verification_codes(now)
+
+        self.assertEqual(result['audit_events'], 2)
+        event = TaskTimelineEvent.objects.get(task=self.task, event_type='verification_code_updated')
+        self.assertEqual(event.metadata['new_code'], get_strict_code(self.task, at=now))
+
+    def test_serializers_return_derived_code(self):
+        # 存储的验证码不符合推导格式，确保返回的是推导值
+        self.task.strict_code = 'ZZZZ'
+        code = get_strict_code(self.task)
+
+        self.assertEqual(LockTaskListSerializer(self.task).data['strict_code'], code)
+        self.assertEqual(LockTaskCreateSerializer(self.task).data['strict_code'], code)
+
+
+class StoredStrictCodeTest(TestCase):
+
+    def test_stored_mode_uses_task_code(self):
+        user = User.objects.create_user(username='stored_user', password='pass')
+        task = LockTask.objects.create(
+            user=user, task_type='lock', title='严格模式', status='active', strict_mode=True, strict_code='Q7R8'
+        )
+
+        self.assertEqual(get_strict_code(task), 'Q7R8')
+        self.assertIsNone(get_strict_code(LockTask(strict_mode=False, strict_code='Q7R8')))
@@ -0,0 +1,146 @@
+"""
+Task State Checkpoint Unit Tests
+
+Covers checkpoint-based reconstruction of historical task state: equivalence
+with the full replay, replaying only the events after the nearest checkpoint,
+checkpoint scheduling and the verification command.
+"""
+
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from tasks.celery_tasks import create_task_state_checkpoints
+from tasks.models import LockTask, TaskStateCheckpoint, TaskTimelineEvent
+from tasks.utils import (
+    TASK_CHECKPOINT_EVENT_INTERVAL,
+    apply_task_time_delta,
+    create_task_checkpoints,
+    get_task_state_at_time,
+    get_tasks_due_for_checkpoint,
+    verify_task_checkpoints,
+)
+
+User = get_user_model()
+
+
+class TaskStateCheckpointTestCase(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='checkpoint_owner', password='pass')
+        self.now = timezone.now()
+        self.task = LockTask.objects.create(
+            user=self.owner, task_type='lock', title='checkpoint', status='active',
+            difficulty='normal', start_time=self.now - timedelta(hours=10),
+            end_time=self.now + timedelta(hours=2),
+        )
+        LockTask.objects.filter(pk=self.task.pk).update(created_at=self.now - timedelta(hours=10))
+        self.task.refresh_from_db()
+
+    def hours_ago(self, hours):
+        return self.now - timedelta(hours=hours)
+
+    def adjust(self, minutes, hours_ago):
+        """在指定的历史时间点加/减时，并生成对应的时间线事件"""
+        event_type = 'time_wheel_increase' if minutes > 0 else 'time_wheel_decrease'
+        apply_task_time_delta(
+            self.task, minutes,
+            build_timeline_events=lambda change: [
+                TaskTimelineEvent(event_type=event_type, user=self.owner, description='adjust')
+            ]
+        )
+        event = TaskTimelineEvent.objects.filter(task=self.task).order_by('-created_at').first()
+        TaskTimelineEvent.objects.filter(pk=event.pk).update(created_at=self.hours_ago(hours_ago))
+        return event
+
+    def build_history(self):
+        """加时 +10(8h前) → 检查点(6h前) → +20(5h前) → 检查点(4h前) → -5(2h前)"""
+        self.adjust(10, 8)
+        create_task_checkpoints([self.task.id], now=self.hours_ago(6))
+        self.adjust(20, 5)
+        create_task_checkpoints([self.task.id], now=self.hours_ago(4))
+        return self.adjust(-5, 2)
+
+
+class CheckpointReconstructionTest(TaskStateCheckpointTestCase):
+
+    def test_checkpoint_matches_full_replay(self):
+        self.build_history()
+        for hours in (9, 7, 6, 4.5, 3, 1):
+            target = self.hours_ago(hours)
+            self.assertEqual(
+                get_task_state_at_time(self.task, target),
+                get_task_state_at_time(self.task, target, use_checkpoints=False),
+                msg=f'{hours}h ago'
+            )
+
+    def test_reconstruction_only_replays_events_after_checkpoint(self):
+        last_event = self.build_history()
+        original_end = self.task.end_time
+        # 篡改最近检查点之后的事件：检查点之前的目标时间不应受影响
+        TaskTimelineEvent.objects.filter(pk=last_event.pk).update(time_change_minutes=-500)
+
+        state = get_task_state_at_time(self.task, self.hours_ago(7))
+        self.assertEqual(state['end_time'], original_end + timedelta(minutes=5 - 20))
+
+    def test_before_creation_returns_none(self):
+        self.assertIsNone(get_task_state_at_time(self.task, self.hours_ago(11)))
+
+    def test_verify_detects_inconsistent_checkpoint(self):
+        self.build_history()
+        self.assertEqual(verify_task_checkpoints(self.task, [self.hours_ago(7)]), [])
+
+        checkpoint = TaskStateCheckpoint.objects.filter(task=self.task).order_by('checkpoint_at').first()
+        TaskStateCheckpoint.objects.filter(pk=checkpoint.pk).update(end_time=checkpoint.end_time + timedelta(hours=1))
+        mismatches = verify_task_checkpoints(self.task)
+        self.assertEqual(len(mismatches), 1)
+        self.assertEqual(mismatches[0]['checkpoint_id'], checkpoint.id)
+
+    def test_verify_command_deletes_mismatched(self):
+        self.build_history()
+        checkpoint = TaskStateCheckpoint.objects.filter(task=self.task).order_by('checkpoint_at').first()
+        TaskStateCheckpoint.objects.filter(pk=checkpoint.pk).update(is_frozen=True)
+
+        out = StringIO()
+        call_command('verify_task_checkpoints', '--delete-mismatched', stdout=out)
+        self.assertIn('MISMATCH', out.getvalue())
+        self.assertFalse(TaskStateCheckpoint.objects.filter(pk=checkpoint.pk).exists())
+
+
+class CheckpointSchedulingTest(TaskStateCheckpointTestCase):
+
+    def test_task_without_events_not_due(self):
+        self.assertNotIn(self.task.id, get_tasks_due_for_checkpoint())
+
+    def test_old_events_without_checkpoint_due(self):
+        self.adjust(10, 8)
+        self.assertIn(self.task.id, get_tasks_due_for_checkpoint())
+
+    def test_recent_checkpoint_with_few_events_not_due(self):
+        self.adjust(10, 8)
+        create_task_checkpoints([self.task.id], now=self.hours_ago(1))
+        self.adjust(10, 0.5)
+        self.assertNotIn(self.task.id, get_tasks_due_for_checkpoint())
+
+    def test_event_interval_triggers_checkpoint(self):
+        create_task_checkpoints([self.task.id], now=self.hours_ago(1))
+        TaskTimelineEvent.objects.bulk_create([
+            TaskTimelineEvent(task=self.task, event_type='overtime_added', time_change_minutes=1)
+            for _ in range(TASK_CHECKPOINT_EVENT_INTERVAL)
+        ])
+        self.assertIn(self.task.id, get_tasks_due_for_checkpoint())
+
+    def test_periodic_task_records_event_count(self):
+        self.adjust(10, 8)
+        self.adjust(10, 7)
+        result = create_task_state_checkpoints.apply().get()
+
+        self.assertEqual(result['checkpoints_created'], 1)
+        checkpoint = TaskStateCheckpoint.objects.get(task=self.task)
+        self.assertEqual(checkpoint.events_since_previous, 2)
+        self.assertEqual(checkpoint.end_time, self.task.end_time)
+        self.assertEqual(get_tasks_due_for_checkpoint(), [])
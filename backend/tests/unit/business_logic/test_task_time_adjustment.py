@@ -0,0 +1,266 @@
+"""
+Task Time Adjustment Unit Tests
+
+Covers the atomic time-delta primitive used by overtime, manual adjustment and
+the Telegram overtime button: no lost updates under concurrent clicks, the
+per-publisher cooldown bucket, clamping on decrease and batched timeline events.
+"""
+
+import threading
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection
+from django.db.models import Q
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework.authtoken.models import Token
+
+from store.models import Item, ItemType, UserInventory
+from tasks.models import LockTask, OvertimeAction, TaskTimelineEvent
+from tasks.utils import add_overtime_to_task, apply_task_time_delta
+
+User = get_user_model()
+
+
+def make_lock_task(owner, **kwargs):
+    now = timezone.now()
+    defaults = {
+        'task_type': 'lock',
+        'title': 'time adjustment',
+        'status': 'active',
+        'difficulty': 'normal',
+        'start_time': now,
+        'end_time': now + timedelta(hours=1),
+    }
+    defaults.update(kwargs)
+    return LockTask.objects.create(user=owner, **defaults)
+
+
+class ApplyTaskTimeDeltaTest(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='delta_owner', password='pass')
+
+    def test_stale_instances_do_not_lose_updates(self):
+        task = make_lock_task(self.owner)
+        original_end = task.end_time
+        first = LockTask.objects.get(pk=task.pk)
+        second = LockTask.objects.get(pk=task.pk)
+
+        apply_task_time_delta(first, 10)
+        apply_task_time_delta(second, 15)
+
+        task.refresh_from_db()
+        self.assertEqual(task.end_time, original_end + timedelta(minutes=25))
+
+    def test_frozen_task_adjusts_frozen_end_time(self):
+        now = timezone.now()
+        task = make_lock_task(
+            self.owner, is_frozen=True, frozen_at=now, frozen_end_time=now + timedelta(minutes=30)
+        )
+        original_end = task.end_time
+        change = apply_task_time_delta(task, 10)
+
+        self.assertEqual(task.end_time, original_end)
+        self.assertEqual(task.frozen_end_time, now + timedelta(minutes=40))
+        self.assertEqual(change['applied_minutes'], 10)
+
+    def test_decrease_clamps_to_now(self):
+        task = make_lock_task(self.owner, end_time=timezone.now() + timedelta(minutes=5))
+        change = apply_task_time_delta(task, -20)
+
+        self.assertIsNotNone(change)
+        self.assertLessEqual(task.end_time, timezone.now())
+        self.assertIn(change['applied_minutes'], (-4, -5))
+
+    def test_decrease_rejected_when_expired(self):
+        task = make_lock_task(self.owner, end_time=timezone.now() - timedelta(minutes=1))
+        self.assertIsNone(apply_task_time_delta(task, -20))
+
+    def test_expired_task_restarts_only_when_condition_matches(self):
+        expired = timezone.now() - timedelta(minutes=30)
+        normal = make_lock_task(self.owner, end_time=expired)
+        strict = make_lock_task(self.owner, end_time=expired, strict_mode=True)
+
+        apply_task_time_delta(normal, 10, restart_expired_if=Q(strict_mode=True))
+        apply_task_time_delta(strict, 10, restart_expired_if=Q(strict_mode=True))
+
+        self.assertEqual(normal.end_time, expired + timedelta(minutes=10))
+        self.assertGreater(strict.end_time, timezone.now())
+
+    def test_status_guard(self):
+        task = make_lock_task(self.owner, status='completed')
+        self.assertIsNone(apply_task_time_delta(task, 10))
+
+    def test_timeline_events_written_with_change(self):
+        task = make_lock_task(self.owner)
+        original_end = task.end_time
+        apply_task_time_delta(
+            task, 10,
+            build_timeline_events=lambda change: [
+                TaskTimelineEvent(event_type='overtime_added', user=self.owner, description='a'),
+                TaskTimelineEvent(event_type='manual_adjustment', user=self.owner, description='b'),
+            ]
+        )
+        events = TaskTimelineEvent.objects.filter(task=task)
+        self.assertEqual(events.count(), 2)
+        for event in events:
+            self.assertEqual(event.time_change_minutes, 10)
+            self.assertEqual(event.previous_end_time, original_end)
+            self.assertEqual(event.new_end_time, task.end_time)
+
+
+class AddOvertimeTest(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='overtime_owner', password='pass')
+        self.helper = User.objects.create_user(username='overtime_helper', password='pass')
+
+    def test_overtime_extends_and_records(self):
+        task = make_lock_task(self.owner)
+        original_end = task.end_time
+        result = add_overtime_to_task(task, self.helper, minutes=12)
+
+        self.assertTrue(result['success'])
+        task.refresh_from_db()
+        self.assertEqual(task.end_time, original_end + timedelta(minutes=12))
+        action = OvertimeAction.objects.get(task=task)
+        self.assertIsNotNone(action.cooldown_bucket)
+        event = TaskTimelineEvent.objects.get(task=task, event_type='overtime_added')
+        self.assertEqual(event.time_change_minutes, 12)
+
+    def test_cooldown_per_publisher(self):
+        first = make_lock_task(self.owner)
+        second = make_lock_task(self.owner)
+        self.assertTrue(add_overtime_to_task(first, self.helper, minutes=5)['success'])
+        result = add_overtime_to_task(second, self.helper, minutes=5)
+        self.assertFalse(result['success'])
+        self.assertEqual(OvertimeAction.objects.count(), 1)
+
+    def test_status_change_rolls_back_cooldown_record(self):
+        task = make_lock_task(self.owner)
+        LockTask.objects.filter(pk=task.pk).update(status='completed')
+        result = add_overtime_to_task(task, self.helper, minutes=5)
+        self.assertFalse(result['success'])
+        self.assertFalse(OvertimeAction.objects.exists())
+
+
+class ManualTimeAdjustmentTest(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='manual_owner', password='pass')
+        self.keyholder = User.objects.create_user(username='manual_keyholder', password='pass', coins=15)
+        self.task = make_lock_task(self.owner)
+        key_type, _ = ItemType.objects.get_or_create(
+            name='key', defaults={'display_name': '钥匙'}
+        )
+        inventory, _ = UserInventory.objects.get_or_create(user=self.keyholder)
+        Item.objects.create(
+            item_type=key_type, owner=self.keyholder, inventory=inventory,
+            properties={'task_id': str(self.task.id)}
+        )
+        self.client = APIClient()
+        token, _ = Token.objects.get_or_create(user=self.keyholder)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def adjust(self, adjustment_type):
+        return self.client.post(f'/api/tasks/{self.task.id}/manual-time-adjustment/', {'type': adjustment_type})
+
+    def test_increase_charges_and_extends(self):
+        original_end = self.task.end_time
+        response = self.adjust('increase')
+        self.assertEqual(response.status_code, 200)
+        self.task.refresh_from_db()
+        self.keyholder.refresh_from_db()
+        self.assertEqual(self.task.end_time, original_end + timedelta(minutes=20))
+        self.assertEqual(self.keyholder.coins, 5)
+        self.assertEqual(response.data['remaining_coins'], 5)
+
+    def test_second_adjustment_rejected_without_overdraw(self):
+        self.adjust('increase')
+        response = self.adjust('decrease')
+        self.assertEqual(response.status_code, 400)
+        self.keyholder.refresh_from_db()
+        self.assertEqual(self.keyholder.coins, 5)
+
+
+class OvertimeConcurrencyStressTest(TransactionTestCase):
+    """
+    并发加时压力测试：多线程同时点击加时按钮
+
+    无论有多少次尝试因数据库锁失败（内存 SQLite 共享缓存会立即报表锁），
+    已落库的加时记录、时间线事件与结束时间增量必须严格一致，不得丢失更新。
+    """
+
+    WORKERS = 8
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='stress_owner', password='pass')
+        self.helpers = [
+            User.objects.create_user(username=f'stress_helper{i}', password='pass')
+            for i in range(self.WORKERS)
+        ]
+
+    def run_concurrently(self, targets):
+        barrier = threading.Barrier(len(targets))
+        results = []
+        errors = []
+
+        def worker(target):
+            try:
+                barrier.wait()
+                results.append(target())
+            except OperationalError as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(target,)) for target in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def assert_consistent(self, task, original_end, minutes):
+        applied = OvertimeAction.objects.filter(task=task).count()
+        task.refresh_from_db()
+        self.assertEqual(task.end_time, original_end + timedelta(minutes=minutes * applied))
+        self.assertEqual(
+            TaskTimelineEvent.objects.filter(task=task, event_type='overtime_added').count(), applied
+        )
+        return applied
+
+    def test_concurrent_overtime_from_many_users_is_additive(self):
+        task = make_lock_task(self.owner)
+        original_end = task.end_time
+
+        results, errors = self.run_concurrently([
+            (lambda helper=helper: add_overtime_to_task(task.id, helper, minutes=5))
+            for helper in self.helpers
+        ])
+
+        applied = self.assert_consistent(task, original_end, 5)
+        self.assertGreaterEqual(applied, 1)
+        self.assertTrue(all(result['success'] for result in results))
+        if connection.vendor != 'sqlite':
+            self.assertEqual(errors, [])
+            self.assertEqual(applied, self.WORKERS)
+
+    def test_concurrent_clicks_from_one_user_apply_once(self):
+        task = make_lock_task(self.owner)
+        original_end = task.end_time
+        helper = self.helpers[0]
+
+        results, errors = self.run_concurrently([
+            (lambda: add_overtime_to_task(task.id, helper, minutes=5))
+            for _ in range(self.WORKERS)
+        ])
+
+        applied = self.assert_consistent(task, original_end, 5)
+        self.assertLessEqual(applied, 1)
+        if connection.vendor != 'sqlite':
+            self.assertEqual(applied, 1)
+        self.assertLessEqual(sum(1 for result in results if result['success']), 1)
@@ -0,0 +1,112 @@
+"""
+Temporary Unlock Timeout Unit Tests
+
+Covers exact-deadline handling of temporary unlocks: the approve path scheduling
+an ETA task at the maximum end time, the timeout task being idempotent and
+rescheduling itself when delivered early, and the reconciliation sweep picking
+up overdue unlocks whose task never ran.
+"""
+
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from tasks.celery_tasks import expire_temporary_unlock, reconcile_temporary_unlock_timeouts
+from tasks.models import LockTask, PinnedUser, TaskKey, TaskTimelineEvent, TemporaryUnlockRecord
+
+User = get_user_model()
+
+
+@mock.patch('tasks.celery_tasks.expire_temporary_unlock.apply_async')
+class TemporaryUnlockTimeoutTest(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='unlock_owner', password='pass')
+        self.key_holder = User.objects.create_user(username='unlock_holder', password='pass')
+        self.task = LockTask.objects.create(
+            user=self.owner,
+            task_type='lock',
+            title='临时开锁任务',
+            status='active',
+            start_time=timezone.now(),
+            end_time=timezone.now() + timedelta(hours=2),
+            allow_temporary_unlock=True,
+            temporary_unlock_max_duration=15,
+        )
+        TaskKey.objects.create(task=self.task, holder=self.key_holder)
+
+    def active_record(self, max_end_in):
+        self.task.freeze_task()
+        now = timezone.now()
+        return TemporaryUnlockRecord.objects.create(
+            task=self.task,
+            user=self.owner,
+            status='active',
+            started_at=now - timedelta(minutes=15),
+            max_end_time=now + max_end_in,
+            task_frozen_end_time=self.task.end_time,
+        )
+
+    def test_approve_schedules_timeout_at_max_end_time(self, apply_async):
+        record = TemporaryUnlockRecord.objects.create(
+            task=self.task, user=self.owner, status='pending', max_end_time=timezone.now()
+        )
+        client = APIClient()
+        client.force_authenticate(self.key_holder)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(
+                f'/api/tasks/{self.task.id}/temporary-unlock/approve/', {'record_id': str(record.id)}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        record.refresh_from_db()
+        apply_async.assert_called_once_with(args=[str(record.id)], eta=record.max_end_time)
+
+    def test_timeout_task_is_idempotent(self, apply_async):
+        record = self.active_record(timedelta(seconds=-1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first = expire_temporary_unlock.apply(args=[str(record.id)]).get()
+        second = expire_temporary_unlock.apply(args=[str(record.id)]).get()
+
+        self.assertEqual((first['status'], second['status']), ('success', 'skipped'))
+        record.refresh_from_db()
+        self.task.refresh_from_db()
+        self.assertEqual(record.status, 'timeout')
+        self.assertFalse(self.task.is_frozen)
+        self.assertEqual(
+            TaskTimelineEvent.objects.filter(task=self.task, event_type='temporary_unlock_timeout').count(), 1
+        )
+        pin = PinnedUser.objects.get(task=self.task)
+        self.assertIsNone(pin.key_holder)
+        self.assertTrue(str(pin).startswith('系统 置顶 unlock_owner'))
+        apply_async.assert_not_called()
+
+    def test_early_delivery_reschedules(self, apply_async):
+        record = self.active_record(timedelta(minutes=5))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = expire_temporary_unlock.apply(args=[str(record.id)]).get()
+
+        self.assertEqual(result['status'], 'rescheduled')
+        record.refresh_from_db()
+        self.assertEqual(record.status, 'active')
+        apply_async.assert_called_once_with(args=[str(record.id)], eta=record.max_end_time)
+
+    def test_reconciliation_ends_overdue_unlocks_only(self, apply_async):
+        overdue = self.active_record(timedelta(minutes=-10))
+        finished = TemporaryUnlockRecord.objects.create(
+            task=self.task, user=self.owner, status='completed', max_end_time=timezone.now() - timedelta(hours=1)
+        )
+
+        result = reconcile_temporary_unlock_timeouts.apply().get()
+
+        self.assertEqual(result['timeout_count'], 1)
+        overdue.refresh_from_db()
+        finished.refresh_from_db()
+        self.assertEqual((overdue.status, finished.status), ('timeout', 'completed'))
@@ -0,0 +1,109 @@
+"""
+Task Timeline Read Model Unit Tests
+
+Covers the pre-rendered timeline read model: hourly rewards folded into capped
+segments, incremental folding that extends the open segment, recent events
+served live without being stored, compact event payloads, and the paginated
+endpoint's exclude/collapse options.
+"""
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from tasks.models import LockTask, TaskTimelineEntry, TaskTimelineEvent
+from tasks.timeline import TaskTimelineReadModel
+
+User = get_user_model()
+
+
+@override_settings(TIMELINE_SETTLE_SECONDS=600, TIMELINE_SEGMENT_MAX_HOURS=24)
+class TaskTimelineReadModelTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='timeline_user', password='pass')
+        self.task = LockTask.objects.create(
+            user=self.user, task_type='lock', title='时间线任务', status='active', start_time=timezone.now()
+        )
+        self.base = timezone.now() - timedelta(days=3)
+        self.hour = 0
+
+    def event(self, event_type, at, **kwargs):
+        event = TaskTimelineEvent.objects.create(task=self.task, event_type=event_type, **kwargs)
+        TaskTimelineEvent.objects.filter(id=event.id).update(created_at=at)
+        return event
+
+    def hourly(self, count):
+        for _ in range(count):
+            self.hour += 1
+            self.event('hourly_reward', self.base + timedelta(hours=self.hour), description='小时奖励', metadata={
+                'reward_amount': 2, 'base_reward': self.hour % 2, 'key_bonus': 1, 'lucky_bonus': 0,
+                'hour_count': self.hour, 'total_coins': 100 + self.hour, 'processed_by': 'celery_task'
+            })
+
+    def entries(self, **kwargs):
+        return list(TaskTimelineReadModel.get_entries(self.task, **kwargs)[0:100])
+
+    def test_hourly_rewards_fold_into_capped_segments(self):
+        self.event('task_created', self.base, user=self.user, description='创建任务')
+        self.hourly(30)
+        self.event('overtime_added', self.base + timedelta(hours=30, minutes=30), time_change_minutes=15,
+                   metadata={'total_coins': 5, 'overtime_minutes': 15})
+        self.hourly(5)
+
+        entries = self.entries()
+
+        self.assertEqual([(e['type'], e.get('hours')) for e in entries], [
+            ('hourly_reward', 5), ('overtime_added', None), ('hourly_reward', 6),
+            ('hourly_reward', 24), ('task_created', None),
+        ])
+        self.assertEqual(TaskTimelineEntry.objects.filter(task=self.task).count(), 5)
+        self.assertEqual(entries[3]['description'], '第1-24小时奖励：共获得48积分 (基础12+钥匙24)')
+        self.assertEqual(entries[1]['metadata'], {'overtime_minutes': 15})
+        self.assertEqual(entries[4]['user'], {'id': self.user.id, 'username': 'timeline_user'})
+
+    def test_new_hourly_rewards_extend_the_open_segment(self):
+        self.hourly(3)
+        self.entries()
+
+        self.hourly(2)
+        entries = self.entries()
+
+        self.assertEqual(len(entries), 1)
+        self.assertEqual((entries[0]['first_hour'], entries[0]['last_hour'], entries[0]['hours']), (1, 5, 5))
+        self.assertEqual(TaskTimelineEntry.objects.get(task=self.task).event_count, 5)
+
+    def test_recent_events_are_served_live_until_settled(self):
+        self.hourly(2)
+        recent = self.event('task_frozen', timezone.now(), description='冻结')
+
+        entries = self.entries()
+
+        self.assertEqual([e['type'] for e in entries], ['task_frozen', 'hourly_reward'])
+        self.assertFalse(TaskTimelineEntry.objects.filter(event=recent).exists())
+
+        TaskTimelineReadModel.refresh(self.task, now=timezone.now() + timedelta(hours=1))
+        self.assertTrue(TaskTimelineEntry.objects.filter(event=recent).exists())
+
+    def test_endpoint_paginates_and_filters(self):
+        self.event('task_created', self.base, description='创建任务')
+        self.hourly(2)
+        for i in range(3):
+            self.event('verification_code_updated', self.base + timedelta(hours=5, minutes=i))
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = f'/api/tasks/{self.task.id}/timeline/entries/'
+
+        response = client.get(url, {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['task_id'], str(self.task.id))
+
+        response = client.get(url, {'exclude': 'hourly_reward', 'collapse': 'verification_code_updated'})
+        self.assertEqual([e['type'] for e in response.data['results']], ['verification_code_updated', 'task_created'])
+        self.assertEqual(response.data['results'][0]['count'], 3)
@@ -0,0 +1,100 @@
+"""
+Treasure Index Unit Tests
+
+Covers the cached per-zone treasure index (rebuilt on bury and claim),
+random draws that skip the explorer's own treasures, card dealing, and the
+cached daily exploration state used for cooldown checks.
+"""
+
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from store.models import BuriedTreasure, Item, ItemType
+from store.treasure_index import deal_cards, draw_treasures, get_treasure_index
+
+User = get_user_model()
+
+
+class TreasureIndexTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.burier = User.objects.create_user(username='treasure_burier', password='pass', coins=100)
+        self.explorer = User.objects.create_user(username='treasure_explorer', password='pass', coins=100)
+        self.item_type, _ = ItemType.objects.get_or_create(name='photo_paper', defaults={'display_name': '相纸'})
+
+    def client_for(self, user):
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def bury(self, user, zone='beach'):
+        item = Item.objects.create(item_type=self.item_type, owner=user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(user).post('/api/store/bury-item/', {
+                'item_id': str(item.id), 'location_zone': zone, 'location_hint': '在石头下面'
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['treasure_id']
+
+    def test_bury_rebuilds_index_and_draw_skips_own_treasures(self):
+        own = self.bury(self.explorer)
+        other = self.bury(self.burier)
+
+        with self.assertNumQueries(0):
+            index = get_treasure_index('beach')
+        self.assertEqual({entry['id'] for entry in index['entries']}, {own, other})
+
+        drawn = draw_treasures('beach', self.explorer.id, 2)
+        self.assertEqual([entry['id'] for entry in drawn], [other])
+        self.assertEqual(drawn[0]['burier'], self.burier.username)
+        self.assertEqual(drawn[0]['item_type'], '相纸')
+
+    def test_deal_cards_places_treasures_on_distinct_positions(self):
+        treasures = [{'id': str(i)} for i in range(5)]
+        cards = deal_cards(treasures, 6)
+        self.assertEqual(len(cards), 5)
+        self.assertTrue(all(0 <= position < 6 for position in cards))
+        self.assertEqual(sorted(t['id'] for t in cards.values()), [str(i) for i in range(5)])
+
+    def test_explore_claims_treasure_and_updates_index(self):
+        treasure_id = self.bury(self.burier)
+        client = self.client_for(self.explorer)
+
+        # 固定把抽到的宝物放在第一张牌上
+        with mock.patch('store.views.deal_cards', side_effect=lambda treasures, count: dict(enumerate(treasures))), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/store/explore-zone/', {
+                'zone_name': 'beach', 'card_position': 0
+            }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['success'])
+        self.assertTrue(response.data['cards'][0]['is_found'])
+        self.assertEqual(BuriedTreasure.objects.get(id=treasure_id).status, 'found')
+        self.assertEqual(get_treasure_index('beach')['entries'], ())
+        self.burier.refresh_from_db()
+        self.assertEqual(self.burier.coins, 105)
+
+    def test_cooldown_served_from_cached_state(self):
+        client = self.client_for(self.explorer)
+        with self.captureOnCommitCallbacks(execute=True):
+            first = client.post('/api/store/explore-zone/', {'zone_name': 'forest'}, format='json')
+        self.assertEqual(first.status_code, 200)
+
+        # 冷却检查只读缓存，只剩 Token 认证的一次查询
+        with self.assertNumQueries(1):
+            second = client.post('/api/store/explore-zone/', {'zone_name': 'forest'}, format='json')
+        self.assertEqual(second.status_code, 429)
+
+        zones = client.get('/api/store/zones/').data['zones']
+        forest = next(zone for zone in zones if zone['name'] == 'forest')
+        self.assertTrue(forest['is_cooldown'])
+        self.assertEqual(forest['today_count'], 1)
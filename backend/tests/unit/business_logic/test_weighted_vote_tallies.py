@@ -0,0 +1,119 @@
+"""
+Weighted Vote Tally Unit Tests
+
+Covers the incrementally maintained vote tallies: atomic increments when a
+task or check-in vote is cast, the crown weight frozen at vote time, full
+task saves not clobbering the tallies, and the recompute command used for
+audits.
+"""
+
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from posts.models import CheckinVote, CheckinVotingSession, Post
+from store.models import Item, ItemType, UserEffect
+from tasks.celery_tasks import _calculate_weighted_checkin_vote_counts
+from tasks.models import LockTask, TaskVote
+from tasks.utils import calculate_weighted_vote_counts
+
+User = get_user_model()
+
+
+class WeightedVoteTallyTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.owner = User.objects.create_user(username='tally_owner', password='pass')
+        self.crowned = User.objects.create_user(username='tally_crowned', password='pass', coins=20)
+        self.voter = User.objects.create_user(username='tally_voter', password='pass', coins=20)
+        self.task = LockTask.objects.create(
+            user=self.owner, task_type='lock', title='投票任务', status='voting', difficulty='normal',
+            unlock_type='vote'
+        )
+
+    def client_for(self, user):
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def give_crown(self, user, multiplier=3):
+        item_type, _ = ItemType.objects.get_or_create(
+            name='influence_crown', defaults={'display_name': '影响力皇冠'}
+        )
+        item = Item.objects.create(item_type=item_type, owner=user)
+        return UserEffect.objects.create(
+            user=user, effect_type='influence_crown', item=item,
+            properties={'vote_multiplier': multiplier}, expires_at=timezone.now() + timedelta(hours=1)
+        )
+
+    def test_vote_endpoint_increments_task_tallies(self):
+        self.give_crown(self.crowned)
+
+        response = self.client_for(self.crowned).post(f'/api/tasks/{self.task.id}/vote/', {'agree': True})
+        self.assertEqual(response.status_code, 201)
+        self.client_for(self.voter).post(f'/api/tasks/{self.task.id}/vote/', {'agree': False})
+
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.weighted_total_votes, self.task.weighted_agree_votes), (4, 3))
+        self.assertEqual(TaskVote.objects.get(voter=self.crowned).weight, 3)
+
+    def test_crown_weight_frozen_at_vote_time(self):
+        crown = self.give_crown(self.crowned, multiplier=5)
+        TaskVote.objects.create(task=self.task, voter=self.crowned, agree=True)
+        crown.delete()
+
+        self.task.refresh_from_db()
+        with self.assertNumQueries(0):
+            counts = calculate_weighted_vote_counts(self.task)
+        self.assertEqual(counts, {'total_votes': 5, 'agree_votes': 5})
+
+    def test_full_task_save_keeps_concurrent_votes(self):
+        stale = LockTask.objects.get(pk=self.task.pk)
+        TaskVote.objects.create(task=self.task, voter=self.voter, agree=True)
+
+        stale.title = '改名'
+        stale.save()
+
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.title, '改名')
+        self.assertEqual((self.task.weighted_total_votes, self.task.weighted_agree_votes), (1, 1))
+
+    def test_checkin_vote_updates_session_tallies(self):
+        post = Post.objects.create(user=self.owner, content='打卡', post_type='checkin')
+        CheckinVotingSession.objects.create(post=post, voting_deadline=timezone.now() + timedelta(hours=6))
+        self.give_crown(self.crowned, multiplier=2)
+
+        response = self.client_for(self.crowned).post(f'/api/posts/{post.id}/vote/', {'vote_type': 'reject'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['total_coins_collected'], 5)
+        CheckinVote.objects.create(post=post, voter=self.voter, vote_type='pass')
+
+        post = Post.objects.select_related('voting_session').get(pk=post.pk)
+        self.assertEqual(
+            _calculate_weighted_checkin_vote_counts(post),
+            {'total_votes': 3, 'pass_votes': 1, 'reject_votes': 2}
+        )
+
+    def test_recompute_command_repairs_drifted_tallies(self):
+        TaskVote.objects.create(task=self.task, voter=self.voter, agree=True)
+        LockTask.objects.filter(pk=self.task.pk).update(weighted_total_votes=7, weighted_agree_votes=0)
+
+        out = StringIO()
+        call_command('recompute_vote_tallies', '--dry-run', stdout=out)
+        self.assertIn('MISMATCH task', out.getvalue())
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.weighted_total_votes, 7)
+
+        call_command('recompute_vote_tallies', stdout=StringIO())
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.weighted_total_votes, self.task.weighted_agree_votes), (1, 1))
@@ -23,8 +23,8 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
 
-    readonly_fields = ['last_login', 'date_joined', 'activity_score', 'last_decay_processed', 'total_posts',
-                       'total_likes_received', 'total_tasks_completed']
+    readonly_fields = ['last_login', 'date_joined', 'activity_score', 'last_active', 'last_decay_processed',
+                       'total_posts', 'total_likes_received', 'total_tasks_completed']
 
 
 @admin.register(Friendship)
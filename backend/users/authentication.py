@@ -0,0 +1,88 @@
+"""
+带缓存的 Token 认证
+
+前端轮询大量接口（通知、计数、区域聊天），DRF TokenAuthentication 每次请求
+都要联表查询 authtoken_token 与 users_user。这里把 token → (用户快照, token)
+缓存 AUTH_TOKEN_CACHE_SECONDS 秒，命中时不访问数据库：
+
+- 只有安全方法（GET/HEAD/OPTIONS）使用缓存快照；写请求总是从数据库读取
+  最新的用户行并刷新缓存；
+- 登出（删除 token）、修改密码与保存、删除用户时由 users.signals 清除缓存，
+  登出视图也会直接清除；
+- 积分账本的条件 UPDATE 不触发保存信号，由 CoinsLedgerService 在记账后清除
+  相关用户的缓存；
+- 创建 token（登录）时预先写入缓存，登录后的第一个请求即可命中；
+- 缓存未命中时回退到数据库。
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def _token_cache_key(token_key):
+    # 不把原始 token 写进缓存键
+    return f'auth_token:{hashlib.sha256(token_key.encode()).hexdigest()}'
+
+
+def _user_index_key(user_id):
+    return f'auth_token_user:{user_id}'
+
+
+def cache_token(user, token):
+    """把 token → (用户快照, token) 写入认证缓存"""
+    timeout = settings.AUTH_TOKEN_CACHE_SECONDS
+    if timeout > 0:
+        cache_key = _token_cache_key(token.key)
+        cache.set(cache_key, (user, token), timeout)
+        cache.set(_user_index_key(user.pk), cache_key, timeout)
+
+
+def invalidate_token_cache(token_key):
+    """清除某个 token 的认证缓存"""
+    cache.delete(_token_cache_key(token_key))
+
+
+def invalidate_user_token_cache(*user_ids):
+    """
+    清除用户的认证缓存（用户行被修改时调用）
+
+    立即清除一次，并在事务提交后再清除一次，避免其他请求在提交前读到
+    旧的用户行并写回缓存。
+    """
+    if not user_ids:
+        return
+
+    def delete():
+        index_keys = [_user_index_key(user_id) for user_id in user_ids]
+        cache_keys = list(cache.get_many(index_keys).values())
+        cache.delete_many(cache_keys + index_keys)
+
+    delete()
+    transaction.on_commit(delete)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """缓存 token → 用户快照的 Token 认证"""
+
+    use_cache = False
+
+    def authenticate(self, request):
+        self.use_cache = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        cache_key = _token_cache_key(key)
+        if self.use_cache:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        user, token = super().authenticate_credentials(key)
+        cache_token(user, token)
+        return user, token
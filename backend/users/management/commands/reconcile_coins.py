@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Django管理命令：核对用户积分余额与积分日志
+
+使用方法：
+    python manage.py reconcile_coins                          # 核对所有有积分日志的用户
+    python manage.py reconcile_coins --user-id 123            # 只核对指定用户（可重复）
+    python manage.py reconcile_coins --record-adjustments     # 为差额写入校正日志，作为新的核对基线
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from users.models import CoinsLog
+from users.services.coins_ledger import CoinsLedgerService
+
+
+class Command(BaseCommand):
+    help = '核对用户积分余额是否等于积分日志的期初余额加累计变动'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user-id',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='只核对指定用户ID（可重复指定）'
+        )
+
+        parser.add_argument(
+            '--record-adjustments',
+            action='store_true',
+            help='为每个不一致的用户写入一条校正日志（不修改余额）'
+        )
+
+    def handle(self, *args, **options):
+        mismatches = CoinsLedgerService.reconcile(options['user_ids'])
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('所有用户积分余额与日志一致'))
+            return
+
+        for mismatch in mismatches:
+            self.stdout.write(self.style.WARNING(
+                f"用户 {mismatch['username']} (ID: {mismatch['user_id']}): "
+                f"余额 {mismatch['coins']}，日志推算 {mismatch['expected']}，差额 {mismatch['difference']:+d}"
+            ))
+
+        total_difference = sum(mismatch['difference'] for mismatch in mismatches)
+        self.stdout.write(self.style.ERROR(
+            f'共 {len(mismatches)} 个用户不一致，差额合计 {total_difference:+d}'
+        ))
+
+        if options['record_adjustments']:
+            with transaction.atomic():
+                CoinsLog.objects.bulk_create([
+                    CoinsLog(
+                        user_id=mismatch['user_id'],
+                        change_type='other_income' if mismatch['difference'] > 0 else 'other_expense',
+                        amount=mismatch['difference'],
+                        balance_after=mismatch['coins'],
+                        description='积分对账校正',
+                        metadata={'reconciliation': True, 'expected': mismatch['expected']}
+                    )
+                    for mismatch in mismatches
+                ])
+            self.stdout.write(self.style.SUCCESS(f'已写入 {len(mismatches)} 条校正日志'))
@@ -318,7 +318,13 @@ class User(AbstractUser):
         return self.promote_to_level(new_level, reason)
 
     def update_activity(self, points=1):
-        """更新用户活跃度 - 支持可变积分"""
+        """更新用户活跃度 - 支持可变积分（开启写回缓冲时只记录增量，由定时任务批量写入）"""
+        from users.services.activity_buffer import ActivityBuffer
+
+        if ActivityBuffer.is_enabled():
+            ActivityBuffer.record(self, points)
+            return
+
         self.last_active = timezone.now()
         self.activity_score += points
         self.save(update_fields=['activity_score', 'last_active'])
@@ -335,6 +341,15 @@ class User(AbstractUser):
             # 如果ActivityLog模型还不存在，忽略错误（迁移期间）
             pass
 
+    @property
+    def current_activity_score(self):
+        """当前活跃度（合并写回缓冲中尚未刷写的增量）"""
+        from users.services.activity_buffer import ActivityBuffer
+
+        if not ActivityBuffer.is_enabled():
+            return self.activity_score
+        return self.activity_score + ActivityBuffer.pending_points(self.pk)
+
     def calculate_fibonacci_decay(self):
         """计算斐波那契衰减值"""
         if not self.last_active:
@@ -358,8 +373,8 @@ class User(AbstractUser):
 
         return total_decay
 
-    def apply_time_decay(self):
-        """应用时间衰减"""
+    def apply_time_decay(self, active_effects=None):
+        """应用时间衰减（批量任务可传入预先解析的活跃效果快照）"""
         decay_amount = self.calculate_fibonacci_decay()
         if decay_amount > 0:
             # 检查是否有活跃的活力药水效果
@@ -367,13 +382,10 @@ class User(AbstractUser):
             decay_reduction = 0.0
 
             try:
-                from store.models import UserEffect
-                energy_effect = UserEffect.objects.filter(
-                    user=self,
-                    effect_type='energy_potion',
-                    is_active=True,
-                    expires_at__gt=timezone.now()
-                ).first()
+                if active_effects is None:
+                    from store.active_effects import get_active_effects
+                    active_effects = get_active_effects(self)
+                energy_effect = active_effects.get('energy_potion')
 
                 if energy_effect:
                     energy_potion_protection = True
@@ -500,8 +512,14 @@ class User(AbstractUser):
 
         return completed_lock_tasks + approved_participations
 
+    def _invalidate_telegram_identity_cache(self):
+        """清除 Bot 侧 Telegram 身份 → 用户 的缓存"""
+        from telegram_bot.loaders import invalidate_telegram_identity
+        invalidate_telegram_identity(self.telegram_user_id, self.telegram_chat_id)
+
     def bind_telegram(self, telegram_user_id, telegram_username=None, telegram_chat_id=None):
         """绑定 Telegram 账户"""
+        self._invalidate_telegram_identity_cache()
         self.telegram_user_id = telegram_user_id
         self.telegram_username = telegram_username
         self.telegram_chat_id = telegram_chat_id
@@ -510,6 +528,7 @@ class User(AbstractUser):
 
     def unbind_telegram(self):
         """解绑 Telegram 账户"""
+        self._invalidate_telegram_identity_cache()
         self.telegram_user_id = None
         self.telegram_username = None
         self.telegram_chat_id = None
@@ -518,46 +537,14 @@ class User(AbstractUser):
         self.save()
 
     def add_coins(self, amount: int, change_type: str, description: str = '', metadata: dict = None):
-        """增加用户积分并记录日志"""
-        if amount <= 0:
-            raise ValueError("Amount must be positive")
-
-        self.coins += amount
-        self.save(update_fields=['coins'])
-
-        # 创建积分日志
-        CoinsLog.objects.create(
-            user=self,
-            change_type=change_type,
-            amount=amount,
-            balance_after=self.coins,
-            description=description,
-            metadata=metadata or {}
-        )
-
-        return self.coins
+        """增加用户积分并记录日志（原子更新，返回新余额）"""
+        from users.services.coins_ledger import CoinsLedgerService
+        return CoinsLedgerService.credit(self, amount, change_type, description, metadata)
 
     def deduct_coins(self, amount: int, change_type: str, description: str = '', metadata: dict = None):
-        """扣除用户积分并记录日志"""
-        if amount <= 0:
-            raise ValueError("Amount must be positive")
-        if self.coins < amount:
-            raise ValueError("Insufficient coins")
-
-        self.coins -= amount
-        self.save(update_fields=['coins'])
-
-        # 创建积分日志
-        CoinsLog.objects.create(
-            user=self,
-            change_type=change_type,
-            amount=-amount,
-            balance_after=self.coins,
-            description=description,
-            metadata=metadata or {}
-        )
-
-        return self.coins
+        """扣除用户积分并记录日志（余额不足由数据库条件拒绝，返回新余额）"""
+        from users.services.coins_ledger import CoinsLedgerService
+        return CoinsLedgerService.debit(self, amount, change_type, description, metadata)
 
     def is_telegram_bound(self):
         """检查是否已绑定 Telegram"""
@@ -583,11 +570,21 @@ class User(AbstractUser):
         settings = self.get_telegram_priority_settings()
         return settings.get(priority, False)
 
+    # 活跃度只由 update_activity / 写回缓冲刷写 / 衰减按字段更新，整体保存用户时不写回，
+    # 避免持有旧实例的代码覆盖已刷写的活跃度
+    ACTIVITY_FIELDS = ('activity_score', 'last_active')
+
     def save(self, *args, **kwargs):
         """保存时验证头像文件并设置默认值"""
         # 如果是路径修复，跳过验证
         skip_validation = kwargs.pop('skip_file_validation', False)
 
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.ACTIVITY_FIELDS
+            ]
+
         # 设置默认 Telegram 优先级设置（仅对新用户）
         if not self.pk and not self.telegram_priority_settings:
             self.telegram_priority_settings = {'low': False, 'normal': False, 'high': True, 'urgent': True}
@@ -1059,6 +1056,53 @@ class Notification(models.Model):
 
         return notification
 
+    @classmethod
+    def bulk_create_notifications(cls, entries, batch_size=500):
+        """批量创建通知，供周期性任务一次性写入
+
+        entries 为字典列表，键与 create_notification 的参数一致，
+        recipient 可以传 User 实例或 recipient_id。
+        """
+        notifications = []
+        for entry in entries:
+            entry = dict(entry)
+            actor = entry.pop('actor', None)
+            recipient = entry.pop('recipient', None)
+            recipient_id = entry.pop('recipient_id', None) or (recipient.pk if recipient else None)
+            notification_type = entry['notification_type']
+            related_object_id = entry.get('related_object_id')
+
+            if actor and actor.pk == recipient_id and notification_type != 'system_announcement':
+                continue
+
+            notifications.append(cls(
+                recipient_id=recipient_id,
+                actor=actor,
+                notification_type=notification_type,
+                title=entry.get('title') or cls._get_default_title(notification_type, actor),
+                message=entry.get('message') or cls._get_default_message(notification_type, actor),
+                priority=entry.get('priority', 'normal'),
+                related_object_type=entry.get('related_object_type'),
+                related_object_id=str(related_object_id) if related_object_id else None,
+                extra_data=entry.get('extra_data') or {},
+            ))
+
+        if not notifications:
+            return []
+
+        created = cls.objects.bulk_create(notifications, batch_size=batch_size)
+
+        # 一次性加载接收者，避免 Telegram 推送时逐条查询
+        recipients = User.objects.in_bulk({n.recipient_id for n in created})
+        for notification in created:
+            recipient = recipients.get(notification.recipient_id)
+            if recipient is None:
+                continue
+            notification.recipient = recipient
+            cls._send_telegram_notification_async(notification)
+
+        return created
+
     @classmethod
     def _send_telegram_notification_async(cls, notification):
         """异步发送 Telegram 通知"""
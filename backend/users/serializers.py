@@ -42,6 +42,7 @@ class UserSerializer(serializers.ModelSerializer):
     task_completion_rate = serializers.SerializerMethodField()
     total_tasks_completed = serializers.SerializerMethodField()
     avatar = serializers.SerializerMethodField()
+    activity_score = serializers.IntegerField(source='current_activity_score', read_only=True)
 
     class Meta:
         model = User
@@ -154,6 +155,7 @@ class UserPublicSerializer(serializers.ModelSerializer):
     total_tasks_completed = serializers.SerializerMethodField()
     telegram_username = serializers.SerializerMethodField()
     avatar = serializers.SerializerMethodField()
+    activity_score = serializers.IntegerField(source='current_activity_score', read_only=True)
 
     class Meta:
         model = User
@@ -0,0 +1,172 @@
+"""
+活跃度写回缓冲
+
+update_activity 在游戏、动态、道具等热点动作中频繁调用，每次都写用户行并
+插入 ActivityLog，会与同一用户的积分更新争用行锁。开启写回缓冲
+（ACTIVITY_WRITE_BEHIND）后，活跃度增量只记录在缓存中（生产为 Redis，
+开发环境为进程内 locmem）：
+
+- 每次记录分配一个递增序号，条目 (user_id, points, 时间) 按序号写入缓存，
+  同时累加该用户的待刷写增量，读取活跃度时合并，保证读数准确；
+- 定时任务每隔几秒按序号顺序取出条目，按用户聚合后用一条 CASE UPDATE
+  原子累加 activity_score，并一次批量插入 ActivityLog，再扣减待刷写增量。
+
+序号已分配但条目尚未写入（记录进行中）时，刷写停在该序号等待下一轮；
+下一轮仍缺失的条目视为丢失并跳过。
+"""
+
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, DateTimeField, F, IntegerField, Value, When
+from django.utils import timezone
+
+from users.authentication import invalidate_user_token_cache
+from users.models import ActivityLog, User
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'activity_buffer'
+# 缓冲条目最长保留时间（刷写长时间停滞时兜底）
+ENTRY_TTL = 24 * 3600
+# 刷写锁最长占用时间（刷写进程崩溃时自动释放）
+FLUSH_LOCK_SECONDS = 60
+# 单次刷写最多处理的条目数
+FLUSH_BATCH_SIZE = 5000
+
+
+class ActivityBuffer:
+    """活跃度增量缓冲：记录、合并读取与批量刷写"""
+
+    @staticmethod
+    def is_enabled():
+        return getattr(settings, 'ACTIVITY_WRITE_BEHIND', False)
+
+    @staticmethod
+    def _key(*parts):
+        return ':'.join((KEY_PREFIX,) + tuple(str(part) for part in parts))
+
+    @staticmethod
+    def _incr(key, delta=1):
+        cache.add(key, 0, None)
+        try:
+            return cache.incr(key, delta)
+        except ValueError:
+            # 键在 add 与 incr 之间被删除
+            cache.set(key, delta, None)
+            return delta
+
+    @classmethod
+    def record(cls, user, points=1):
+        """记录一次活跃度增量（不写数据库）"""
+        user_id = user.pk if isinstance(user, User) else user
+        seq = cls._incr(cls._key('seq'))
+        cache.set(cls._key('entry', seq), (user_id, points, timezone.now()), ENTRY_TTL)
+        cls._incr(cls._key('pending', user_id), points)
+
+    @classmethod
+    def pending_points(cls, user_id):
+        """用户尚未刷写的活跃度增量"""
+        return cache.get(cls._key('pending', user_id), 0)
+
+    @classmethod
+    def flush(cls, batch_size=FLUSH_BATCH_SIZE):
+        """
+        把缓冲的增量批量写入数据库
+
+        Returns:
+            dict: {'status', 'entries', 'users'}
+        """
+        lock_key = cls._key('flush_lock')
+        if not cache.add(lock_key, 1, FLUSH_LOCK_SECONDS):
+            return {'status': 'skipped', 'entries': 0, 'users': 0}
+        try:
+            return cls._flush(batch_size)
+        finally:
+            cache.delete(lock_key)
+
+    @classmethod
+    def _flush(cls, batch_size):
+        flushed = cache.get(cls._key('flushed'), 0)
+        latest = cache.get(cls._key('seq'), 0)
+        seqs = range(flushed + 1, min(latest, flushed + batch_size) + 1)
+        entry_keys = {seq: cls._key('entry', seq) for seq in seqs}
+        cached = cache.get_many(list(entry_keys.values()))
+
+        entries = []
+        last_seq = flushed
+        for seq in seqs:
+            entry = cached.get(entry_keys[seq])
+            if entry is None:
+                if cache.get(cls._key('gap')) != seq:
+                    # 记录可能仍在进行中，下一轮再处理
+                    cache.set(cls._key('gap'), seq, ENTRY_TTL)
+                    break
+                logger.warning(f"Activity buffer entry {seq} is missing, skipped")
+            else:
+                entries.append(entry)
+            last_seq = seq
+
+        if last_seq == flushed:
+            return {'status': 'success', 'entries': 0, 'users': 0}
+
+        totals = defaultdict(int)
+        last_active = {}
+        for user_id, points, recorded_at in entries:
+            totals[user_id] += points
+            last_active[user_id] = max(recorded_at, last_active.get(user_id, recorded_at))
+
+        if totals:
+            with transaction.atomic():
+                cls._apply(entries, totals, last_active)
+
+        cache.set(cls._key('flushed'), last_seq, None)
+        cache.delete_many([entry_keys[seq] for seq in range(flushed + 1, last_seq + 1)])
+        for user_id, points in totals.items():
+            try:
+                cache.decr(cls._key('pending', user_id), points)
+            except ValueError:
+                pass
+
+        logger.info(f"Flushed {len(entries)} buffered activity entries for {len(totals)} users")
+        return {'status': 'success', 'entries': len(entries), 'users': len(totals)}
+
+    @staticmethod
+    def _apply(entries, totals, last_active):
+        """一条 UPDATE 累加所有用户的活跃度，并批量插入活动日志"""
+        User.objects.filter(pk__in=totals).update(
+            activity_score=F('activity_score') + Case(
+                *[When(pk=user_id, then=Value(points)) for user_id, points in totals.items()],
+                default=Value(0),
+                output_field=IntegerField()
+            ),
+            last_active=Case(
+                *[When(pk=user_id, then=Value(at)) for user_id, at in last_active.items()],
+                default=F('last_active'),
+                output_field=DateTimeField()
+            )
+        )
+        scores = dict(User.objects.filter(pk__in=totals).values_list('pk', 'activity_score'))
+
+        # 倒推每条日志记录时的总分
+        logs = []
+        running = dict(scores)
+        for user_id, points, recorded_at in reversed(entries):
+            if user_id not in running:
+                continue  # 用户已删除
+            logs.append(ActivityLog(
+                user_id=user_id,
+                action_type='activity_gain',
+                points_change=points,
+                new_total=running[user_id],
+                metadata={'buffered': True, 'recorded_at': recorded_at.isoformat()}
+            ))
+            running[user_id] -= points
+        logs.reverse()
+        ActivityLog.objects.bulk_create(logs)
+
+        # 批量 UPDATE 不触发保存信号，清除认证缓存中的用户快照（否则会与已扣减的待刷写增量不一致）
+        invalidate_user_token_cache(*totals)
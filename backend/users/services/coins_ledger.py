@@ -0,0 +1,219 @@
+"""
+积分账本服务
+
+所有积分变动都通过条件 UPDATE（coins = coins + delta）在数据库中原子完成，
+余额不足的扣除由 SQL 条件拒绝，不做内存中的读取-修改-保存；新余额通过
+RETURNING 取回并写入 CoinsLog。多用户转账与批量发放在同一事务内完成。
+"""
+
+import logging
+from collections import OrderedDict
+
+from django.db import connection, transaction
+from django.db.models import Case, Exists, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+
+from users.authentication import invalidate_user_token_cache
+from users.models import User, CoinsLog
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientCoinsError(ValueError):
+    """余额不足（兼容原 deduct_coins 抛出的 ValueError）"""
+
+    def __init__(self, user_ids):
+        self.user_ids = list(user_ids)
+        super().__init__("Insufficient coins")
+
+
+def _supports_update_returning():
+    """PostgreSQL 与 SQLite 3.35+ 支持 UPDATE ... RETURNING"""
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        import sqlite3
+        return sqlite3.sqlite_version_info >= (3, 35, 0)
+    return False
+
+
+class CoinsLedgerService:
+    """积分账本：原子记账、转账与批量发放"""
+
+    @classmethod
+    def credit(cls, user, amount, change_type, description='', metadata=None):
+        """增加积分，返回新余额"""
+        if amount <= 0:
+            raise ValueError("Amount must be positive")
+        return cls.apply_changes([{
+            'user': user, 'amount': amount, 'change_type': change_type,
+            'description': description, 'metadata': metadata,
+        }])[cls._user_id(user)]
+
+    @classmethod
+    def debit(cls, user, amount, change_type, description='', metadata=None):
+        """扣除积分（余额不足时抛出 InsufficientCoinsError），返回新余额"""
+        if amount <= 0:
+            raise ValueError("Amount must be positive")
+        return cls.apply_changes([{
+            'user': user, 'amount': -amount, 'change_type': change_type,
+            'description': description, 'metadata': metadata,
+        }])[cls._user_id(user)]
+
+    @classmethod
+    def transfer(cls, from_user, to_user, amount, debit_type, credit_type,
+                 description='', metadata=None):
+        """在同一事务内从一个用户转账给另一个用户，返回 {user_id: 新余额}"""
+        if amount <= 0:
+            raise ValueError("Amount must be positive")
+        return cls.apply_changes([
+            {'user': from_user, 'amount': -amount, 'change_type': debit_type,
+             'description': description, 'metadata': metadata},
+            {'user': to_user, 'amount': amount, 'change_type': credit_type,
+             'description': description, 'metadata': metadata},
+        ])
+
+    @classmethod
+    def apply_changes(cls, entries):
+        """
+        批量应用积分变动（单事务，全部成功或全部回滚）
+
+        Args:
+            entries: 列表，每项为 dict：
+                user / user_id: 用户实例或ID
+                amount: 变动数额（正数收入，负数支出，0 会被忽略）
+                change_type / description / metadata: 写入 CoinsLog 的字段
+
+        Returns:
+            dict: {user_id: 新余额}
+
+        Raises:
+            InsufficientCoinsError: 任一用户的净变动会使余额为负
+        """
+        entries = [entry for entry in entries if entry.get('amount')]
+        if not entries:
+            return {}
+
+        net_deltas = OrderedDict()
+        for entry in entries:
+            user_id = cls._user_id(entry.get('user', entry.get('user_id')))
+            entry['_user_id'] = user_id
+            net_deltas[user_id] = net_deltas.get(user_id, 0) + entry['amount']
+
+        with transaction.atomic():
+            balances = cls._apply_net_deltas(net_deltas)
+            missing = [user_id for user_id in net_deltas if user_id not in balances]
+            if missing:
+                raise InsufficientCoinsError(missing)
+
+            # 同一用户多条记录时，按顺序从最终余额倒推每条记录后的余额
+            running = dict(balances)
+            balance_after = []
+            for entry in reversed(entries):
+                balance_after.append(running[entry['_user_id']])
+                running[entry['_user_id']] -= entry['amount']
+            balance_after.reverse()
+
+            CoinsLog.objects.bulk_create([
+                CoinsLog(
+                    user_id=entry['_user_id'],
+                    change_type=entry['change_type'],
+                    amount=entry['amount'],
+                    balance_after=after,
+                    description=entry.get('description', ''),
+                    metadata=entry.get('metadata') or {}
+                )
+                for entry, after in zip(entries, balance_after)
+            ])
+
+        # 余额由条件 UPDATE 修改，不触发保存信号，需清除认证缓存中的用户快照
+        invalidate_user_token_cache(*net_deltas)
+
+        # 同步调用方持有的用户实例
+        for entry in entries:
+            user = entry.get('user')
+            if isinstance(user, User):
+                user.coins = balances[entry['_user_id']]
+
+        return balances
+
+    @classmethod
+    def _apply_net_deltas(cls, net_deltas):
+        """对每个用户应用净变动，只有净支出的用户要求余额充足（净收入不受当前余额限制）；返回成功用户的新余额"""
+        if _supports_update_returning():
+            return cls._apply_with_returning(net_deltas)
+
+        # 不支持 RETURNING 的数据库：锁定相关用户行后校验余额，再在同一事务内更新并读取
+        current = dict(
+            User.objects.select_for_update().filter(id__in=list(net_deltas)).values_list('id', 'coins')
+        )
+        updatable = [user_id for user_id, delta in net_deltas.items()
+                     if user_id in current and (delta >= 0 or current[user_id] + delta >= 0)]
+        if updatable:
+            delta_case = Case(
+                *[When(id=user_id, then=Value(net_deltas[user_id])) for user_id in updatable],
+                output_field=IntegerField()
+            )
+            User.objects.filter(id__in=updatable).update(coins=F('coins') + delta_case)
+        return dict(User.objects.filter(id__in=updatable).values_list('id', 'coins'))
+
+    @classmethod
+    def _apply_with_returning(cls, net_deltas):
+        table = connection.ops.quote_name(User._meta.db_table)
+        id_column = connection.ops.quote_name(User._meta.pk.column)
+        coins_column = connection.ops.quote_name(User._meta.get_field('coins').column)
+
+        case_sql = ' '.join(['WHEN %s THEN %s'] * len(net_deltas))
+        case_params = [value for pair in net_deltas.items() for value in pair]
+        ids_sql = ', '.join(['%s'] * len(net_deltas))
+        ids = list(net_deltas)
+
+        sql = (
+            f'UPDATE {table} SET {coins_column} = {coins_column} + (CASE {id_column} {case_sql} END) '
+            f'WHERE {id_column} IN ({ids_sql}) '
+            f'AND ((CASE {id_column} {case_sql} END) >= 0 '
+            f'OR {coins_column} + (CASE {id_column} {case_sql} END) >= 0) '
+            f'RETURNING {id_column}, {coins_column}'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, case_params + ids + case_params + case_params)
+            return dict(cursor.fetchall())
+
+    @staticmethod
+    def _user_id(user):
+        return user.pk if isinstance(user, User) else user
+
+    @classmethod
+    def reconcile(cls, user_ids=None):
+        """
+        核对用户余额与积分日志
+
+        期初余额取用户第一条日志的 balance_after - amount，期初余额加上全部日志
+        变动应等于当前余额；没有日志的用户不参与核对。
+
+        Returns:
+            list: 不一致项 {'user_id', 'username', 'coins', 'expected', 'difference'}
+        """
+        user_logs = CoinsLog.objects.filter(user=OuterRef('pk')).order_by()
+        opening = user_logs.order_by('created_at').annotate(
+            opening=F('balance_after') - F('amount')
+        ).values('opening')[:1]
+        log_total = user_logs.values('user').annotate(total=Sum('amount')).values('total')
+
+        users = User.objects.filter(Exists(user_logs))
+        if user_ids is not None:
+            users = users.filter(id__in=user_ids)
+        users = users.annotate(
+            expected=Subquery(opening, output_field=IntegerField()) + Subquery(log_total, output_field=IntegerField())
+        ).exclude(coins=F('expected'))
+
+        mismatches = [
+            {
+                'user_id': user_id,
+                'username': username,
+                'coins': coins,
+                'expected': expected,
+                'difference': coins - expected,
+            }
+            for user_id, username, coins, expected in users.values_list('id', 'username', 'coins', 'expected').iterator()
+        ]
+        return mismatches
@@ -0,0 +1,26 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import cache_token, invalidate_token_cache, invalidate_user_token_cache
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_auth_cache(sender, instance, **kwargs):
+    """用户资料、密码或状态变化时清除认证缓存中的用户快照"""
+    invalidate_user_token_cache(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token_cache(sender, instance, **kwargs):
+    """登出删除 token 时清除认证缓存"""
+    invalidate_token_cache(instance.key)
+
+
+@receiver(post_save, sender=Token)
+def cache_created_token(sender, instance, created, **kwargs):
+    """登录创建 token 时预先写入认证缓存"""
+    if created and instance.user.is_active:
+        cache_token(instance.user, instance)
@@ -11,6 +11,7 @@ from django.shortcuts import get_object_or_404
 from django.conf import settings
 from datetime import timedelta
 from tasks.pagination import DynamicPageNumberPagination
+from .authentication import invalidate_user_token_cache
 from .models import User, Friendship, UserLevelUpgrade, DailyLoginReward, UserCheckIn, Notification, EmailVerification, PasswordReset, ActivityLog, CoinsLog, Conversation, PrivateMessage
 from datetime import date, timedelta
 from .serializers import (
@@ -181,6 +182,7 @@ class UserLogoutView(generics.GenericAPIView):
             token.delete()
         except Token.DoesNotExist:
             pass
+        invalidate_user_token_cache(request.user.pk)
 
         logout(request)
         return Response({'message': '登出成功'})
@@ -901,7 +903,7 @@ class LevelProgressView(APIView):
         task_completion_rate = user.get_task_completion_rate()
 
         current_values = {
-            'activity_score': user.activity_score,
+            'activity_score': user.current_activity_score,
             'total_posts': user.total_posts,
             'total_likes_received': user.total_likes_received,
             'lock_duration_hours': lock_duration_hours,
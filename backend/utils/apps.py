@@ -13,4 +13,8 @@ class UtilsConfig(AppConfig):
         except Exception as e:
             import logging
             logger = logging.getLogger(__name__)
-            logger.warning(f"Email configuration validation failed: {e}")
\ No newline at end of file
+            logger.warning(f"Email configuration validation failed: {e}")
+
+        # Celery 任务性能采集（是否开启在运行时按 INSTRUMENTATION_ENABLED 判断）
+        from .instrumentation import connect_task_signals
+        connect_task_signals()
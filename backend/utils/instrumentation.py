@@ -0,0 +1,282 @@
+"""
+热点路径性能采集（可选开启，INSTRUMENTATION_ENABLED）
+
+按 URL 名称（请求）或任务名称（Celery）记录每次执行的：
+- 墙钟耗时
+- 数据库查询次数与耗时（connection.execute_wrapper，不依赖 DEBUG）
+- 缓存命中率（缓存后端 get/get_many 的计数包装）
+
+采样保存在进程内的滚动直方图中（每个标签保留最近 INSTRUMENTATION_WINDOW 次），
+由 /api/metrics/ 接口输出。Celery worker 是独立进程，worker 每隔
+INSTRUMENTATION_PUBLISH_SECONDS 秒把自己的快照写入缓存，metrics 接口一并返回
+（需要共享缓存，即 Redis）。
+
+未开启时中间件通过 MiddlewareNotUsed 从中间件链中移除，Celery 信号处理函数
+直接返回，不产生额外开销。
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# 耗时直方图的桶上限（毫秒），最后一个桶收集超过 5 秒的采样
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+WORKER_INDEX_KEY = 'instrumentation:workers'
+WORKER_SNAPSHOT_TIMEOUT = 300
+
+_current = ContextVar('instrumentation_measurement', default=None)
+
+
+class Measurement:
+    """一次请求或任务执行的计数"""
+
+    __slots__ = ('queries', 'query_ms', 'cache_hits', 'cache_misses', 'started', 'wall_ms')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.started = time.perf_counter()
+        self.wall_ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper 回调
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_ms += (time.perf_counter() - start) * 1000
+
+
+@contextmanager
+def measure():
+    """统计块内的数据库查询与缓存访问"""
+    measurement = Measurement()
+    token = _current.set(measurement)
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(measurement))
+            yield measurement
+    finally:
+        measurement.wall_ms = (time.perf_counter() - measurement.started) * 1000
+        _current.reset(token)
+
+
+class RollingHistogram:
+    """按标签保存最近 N 次采样的滚动直方图（进程内，线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(self._new_window)
+
+    @staticmethod
+    def _new_window():
+        return deque(maxlen=settings.INSTRUMENTATION_WINDOW)
+
+    def record(self, kind, name, measurement):
+        sample = (
+            measurement.wall_ms, measurement.queries, measurement.query_ms,
+            measurement.cache_hits, measurement.cache_misses
+        )
+        with self._lock:
+            self._samples[(kind, name)].append(sample)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+    def snapshot(self, kind=None):
+        """
+        输出每个标签的汇总，按总耗时降序
+
+        Returns:
+            list: [{'kind', 'name', 'count', 'wall_ms': {...}, 'queries': {...}, ...}]
+        """
+        with self._lock:
+            windows = {key: list(samples) for key, samples in self._samples.items() if kind in (None, key[0])}
+
+        rows = [_summarize(key_kind, name, samples) for (key_kind, name), samples in windows.items()]
+        rows.sort(key=lambda row: row['wall_ms']['total'], reverse=True)
+        return rows
+
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _summarize(kind, name, samples):
+    walls = sorted(sample[0] for sample in samples)
+    queries = sorted(sample[1] for sample in samples)
+    query_ms = sum(sample[2] for sample in samples)
+    hits = sum(sample[3] for sample in samples)
+    misses = sum(sample[4] for sample in samples)
+
+    buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    for wall in walls:
+        buckets[bisect_left(LATENCY_BUCKETS_MS, wall)] += 1
+
+    count = len(samples)
+    return {
+        'kind': kind,
+        'name': name,
+        'count': count,
+        'wall_ms': {
+            'total': round(sum(walls), 1),
+            'p50': round(_percentile(walls, 0.5), 1),
+            'p95': round(_percentile(walls, 0.95), 1),
+            'max': round(walls[-1], 1),
+            'buckets': dict(zip([f'le_{bound}' for bound in LATENCY_BUCKETS_MS] + ['inf'], buckets))
+        },
+        'queries': {
+            'avg': round(sum(queries) / count, 1),
+            'p95': _percentile(queries, 0.95),
+            'max': queries[-1],
+            'avg_ms': round(query_ms / count, 1)
+        },
+        'cache': {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 3) if hits + misses else None
+        }
+    }
+
+
+histogram = RollingHistogram()
+
+
+def _count_cache_get(original):
+    def get(self, key, default=None, *args, **kwargs):
+        value = original(self, key, default, *args, **kwargs)
+        measurement = _current.get()
+        if measurement is not None:
+            if value is default:
+                measurement.cache_misses += 1
+            else:
+                measurement.cache_hits += 1
+        return value
+    get._instrumented = True
+    return get
+
+
+def _count_cache_get_many(original):
+    def get_many(self, keys, *args, **kwargs):
+        keys = list(keys)
+        values = original(self, keys, *args, **kwargs)
+        measurement = _current.get()
+        if measurement is not None:
+            measurement.cache_hits += len(values)
+            measurement.cache_misses += len(keys) - len(values)
+        return values
+    get_many._instrumented = True
+    return get_many
+
+
+def install_cache_counters():
+    """给已配置的缓存后端类包装 get/get_many 计数（幂等）"""
+    for alias in settings.CACHES:
+        backend_class = type(caches[alias])
+        if not getattr(backend_class.get, '_instrumented', False):
+            backend_class.get = _count_cache_get(backend_class.get)
+        if not getattr(backend_class.get_many, '_instrumented', False):
+            backend_class.get_many = _count_cache_get_many(backend_class.get_many)
+
+
+class InstrumentationMiddleware:
+    """按 URL 名称记录请求耗时、查询数与缓存命中率"""
+
+    def __init__(self, get_response):
+        if not settings.INSTRUMENTATION_ENABLED:
+            raise MiddlewareNotUsed
+        install_cache_counters()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with measure() as measurement:
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = (match.view_name or match.route) if match else 'unresolved'
+        histogram.record('request', f'{request.method} {view_name}', measurement)
+        return response
+
+
+# ============================================================================
+# Celery 任务采集
+# ============================================================================
+
+_running_tasks = {}
+_last_published = 0.0
+
+
+def _task_prerun(task_id=None, **kwargs):
+    if not settings.INSTRUMENTATION_ENABLED:
+        return
+    install_cache_counters()
+    context = measure()
+    _running_tasks[task_id] = (context, context.__enter__())
+
+
+def _task_postrun(task_id=None, task=None, **kwargs):
+    running = _running_tasks.pop(task_id, None)
+    if running is None:
+        return
+    context, measurement = running
+    context.__exit__(None, None, None)
+    histogram.record('task', task.name, measurement)
+    _publish_worker_snapshot()
+
+
+def _worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _publish_worker_snapshot():
+    """worker 进程定期把任务快照写入共享缓存，供 metrics 接口读取"""
+    global _last_published
+
+    now = time.monotonic()
+    if now - _last_published < settings.INSTRUMENTATION_PUBLISH_SECONDS:
+        return
+    _last_published = now
+
+    worker_id = _worker_id()
+    try:
+        cache.set(f'instrumentation:worker:{worker_id}', histogram.snapshot('task'), WORKER_SNAPSHOT_TIMEOUT)
+        workers = cache.get(WORKER_INDEX_KEY) or []
+        if worker_id not in workers:
+            cache.set(WORKER_INDEX_KEY, workers + [worker_id], None)
+    except Exception as exc:
+        logger.warning(f"Failed to publish instrumentation snapshot: {exc}")
+
+
+def worker_snapshots():
+    """读取各 worker 最近发布的任务快照（过期的 worker 自动忽略）"""
+    workers = cache.get(WORKER_INDEX_KEY) or []
+    snapshots = cache.get_many([f'instrumentation:worker:{worker_id}' for worker_id in workers])
+    return {key.split(':', 2)[2]: rows for key, rows in snapshots.items()}
+
+
+def connect_task_signals():
+    """注册 Celery 任务前后信号（是否采集在运行时按设置判断）"""
+    from celery.signals import task_postrun, task_prerun
+
+    task_prerun.connect(_task_prerun, weak=False, dispatch_uid='instrumentation_task_prerun')
+    task_postrun.connect(_task_postrun, weak=False, dispatch_uid='instrumentation_task_postrun')
@@ -0,0 +1,29 @@
+from django.conf import settings
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from .instrumentation import histogram, worker_snapshots
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def instrumentation_metrics(request):
+    """
+    热点路径性能指标（仅管理员）
+
+    GET: 当前 web 进程的请求/任务直方图，以及各 worker 最近发布的任务快照；
+         ?kind=request 或 ?kind=task 只返回一类
+    DELETE: 清空当前进程的直方图
+    """
+    if request.method == 'DELETE':
+        histogram.reset()
+        return Response({'message': '性能指标已清空'})
+
+    kind = request.query_params.get('kind')
+    return Response({
+        'enabled': settings.INSTRUMENTATION_ENABLED,
+        'window': settings.INSTRUMENTATION_WINDOW,
+        'metrics': histogram.snapshot(kind),
+        'workers': worker_snapshots() if kind in (None, 'task') else {}
+    })
@@ -385,6 +385,38 @@ export const postsApi = {
   },
 };
 
+// 将游戏状态接口的结算结果转换为加入游戏接口原先同步返回的字段
+function gameResultToJoinResponse(game: { status: string; bet_amount: number; result?: Record<string, any> }) {
+  const result = game.result;
+  if (game.status === 'active' || !result) {
+    return { message: '游戏结算中，请稍后查看结果' };
+  }
+  if (result.tie) {
+    return {
+      message: '平局！游戏重新开始，发起人积分已返还',
+      results: result.game_results,
+      coins_refunded: result.coins_refunded,
+    };
+  }
+  if (result.winner) {
+    return {
+      message: `${result.winner} 获胜！${result.loser} 增加30分钟锁时间`,
+      winner: result.winner,
+      loser: result.loser,
+      results: result.game_results,
+      coins_change: game.bet_amount,
+    };
+  }
+  return {
+    message: `掷骰子结果：${result.dice_result}，您猜${result.participant_guess}，${result.is_correct ? '猜中了！' : '没猜中'}`,
+    dice_result: result.dice_result,
+    guess: result.participant_guess,
+    is_correct: result.is_correct,
+    item_received: result.item_transferred ? result.item_details : null,
+    creator_coins_change: game.bet_amount,
+  };
+}
+
 export const storeApi = {
   // Store items
   async getStoreItems(): Promise<StoreItem[]> {
@@ -472,11 +504,14 @@ export const storeApi = {
 
   async joinGame(gameId: string, action: Record<string, any> = {}): Promise<{
     message: string;
+    status?: string;
     participants?: number;
     max_participants?: number;
     winner?: string;
     loser?: string;
     results?: any[];
+    coins_change?: number;
+    coins_refunded?: number;
     // Dice game specific fields
     dice_result?: number;
     guess?: string;
@@ -485,10 +520,44 @@ export const storeApi = {
     creator_coins_change?: number;
     remaining_coins?: number;
   }> {
-    return apiRequest(`/store/games/${gameId}/join/`, {
+    const joined = await apiRequest<any>(`/store/games/${gameId}/join/`, {
       method: 'POST',
       body: JSON.stringify({ action }),
     });
+    if (joined.status !== 'active') {
+      return joined;
+    }
+
+    // 满员的游戏由后端异步结算，轮询状态接口获取结果
+    const game = await storeApi.waitForGameResult(gameId);
+    return { ...joined, ...gameResultToJoinResponse(game) };
+  },
+
+  async getGameStatus(gameId: string): Promise<{
+    id: string;
+    game_type: string;
+    status: string;
+    bet_amount: number;
+    participants: number;
+    max_participants: number;
+    is_creator: boolean;
+    is_participant: boolean;
+    your_action: Record<string, any> | null;
+    started_at: string | null;
+    completed_at: string | null;
+    result?: Record<string, any>;
+  }> {
+    return apiRequest(`/store/games/${gameId}/status/`);
+  },
+
+  async waitForGameResult(gameId: string, timeoutMs = 15000, intervalMs = 500) {
+    const deadline = Date.now() + timeoutMs;
+    let game = await storeApi.getGameStatus(gameId);
+    while (game.status === 'active' && Date.now() < deadline) {
+      await new Promise(resolve => setTimeout(resolve, intervalMs));
+      game = await storeApi.getGameStatus(gameId);
+    }
+    return game;
   },
 
   // Time wheel game - New implementation with frontend calculation